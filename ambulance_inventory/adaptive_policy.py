@@ -0,0 +1,142 @@
+"""
+自適應降級模組
+在 LLM 回答延遲或排隊深度超過 SLO 時暫停 LLM 回答，負載下降後自動恢復
+"""
+
+import threading
+import time
+from typing import Optional, Dict, Any, Tuple
+
+from .config import AdaptiveConfig
+from .utils.logger import get_logger
+
+
+class AdaptiveLLMPolicy:
+    """
+    LLM 回答的自適應降級策略
+
+    - 以指數移動平均 (EWMA) 追蹤 LLM 回答延遲
+    - 以進行中的 LLM 回答數作為排隊深度
+    - 任一指標超過 SLO 即進入降級（只回傳程式化結果）
+    - 兩個指標都低於 SLO * recovery_ratio 後恢復（遲滯，避免來回切換）
+    - 降級期間每隔 probe_interval 秒放行一個請求，以取得新的延遲樣本
+    - 放行與計入進行中在同一次加鎖內完成，並行請求不會同時通過排隊深度檢查
+    - 失敗或中止的 LLM 呼叫不計入延遲
+    """
+
+    def __init__(self, config: AdaptiveConfig):
+        """
+        初始化降級策略
+
+        Args:
+            config: 自適應降級配置
+        """
+        self.config = config
+        self.logger = get_logger(__name__)
+        self._lock = threading.Lock()
+        self._latency_ewma: Optional[float] = None
+        self._in_flight = 0
+        self._degraded = False
+        self._degraded_reason = ""
+        self._last_probe = 0.0
+        self._skipped = 0
+
+    def admit(self) -> Tuple[bool, str]:
+        """
+        決定是否執行 LLM 回答（放行時同時計入進行中，呼叫端結束後必須呼叫 release()）
+
+        Returns:
+            (是否執行, 略過原因)
+        """
+        if not self.config.enabled:
+            return True, ""
+
+        with self._lock:
+            self._update_state()
+
+            if not self._degraded:
+                self._in_flight += 1
+                return True, ""
+
+            # 降級期間定期放行探測請求，取得新的延遲樣本
+            now = time.monotonic()
+            if self._in_flight == 0 and now - self._last_probe >= self.config.probe_interval:
+                self._last_probe = now
+                self._in_flight += 1
+                return True, ""
+
+            self._skipped += 1
+            return False, self._degraded_reason
+
+    def release(self, latency: Optional[float] = None) -> None:
+        """
+        結束一次已放行的 LLM 回答
+
+        Args:
+            latency: 成功時的耗時（秒），失敗或中止時為 None（不計入延遲）
+        """
+        if not self.config.enabled:
+            return
+
+        with self._lock:
+            self._in_flight -= 1
+            if latency is not None:
+                self._record_latency(latency)
+            else:
+                self._update_state()
+
+    def status(self) -> Dict[str, Any]:
+        """
+        取得目前狀態
+
+        Returns:
+            狀態資訊
+        """
+        with self._lock:
+            return {
+                'enabled': self.config.enabled,
+                'degraded': self._degraded,
+                'reason': self._degraded_reason or None,
+                'latency_ewma': round(self._latency_ewma, 2) if self._latency_ewma is not None else None,
+                'in_flight': self._in_flight,
+                'latency_slo': self.config.latency_slo,
+                'queue_slo': self.config.queue_slo,
+                'skipped': self._skipped
+            }
+
+    def _record_latency(self, seconds: float) -> None:
+        """
+        更新延遲 EWMA（呼叫者需持有鎖）
+
+        Args:
+            seconds: 本次 LLM 回答耗時
+        """
+        if self._latency_ewma is None:
+            self._latency_ewma = seconds
+        else:
+            alpha = self.config.ewma_alpha
+            self._latency_ewma = alpha * seconds + (1 - alpha) * self._latency_ewma
+        self._update_state()
+
+    def _update_state(self) -> None:
+        """依目前指標更新降級狀態（呼叫者需持有鎖）"""
+        latency = self._latency_ewma or 0.0
+
+        if not self._degraded:
+            if latency > self.config.latency_slo:
+                reason = f"LLM 回答延遲 {latency:.1f}s 超過 SLO {self.config.latency_slo}s"
+            elif self._in_flight >= self.config.queue_slo:
+                reason = f"LLM 排隊深度 {self._in_flight} 達到 SLO {self.config.queue_slo}"
+            else:
+                return
+            self._degraded = True
+            self._degraded_reason = reason
+            self._last_probe = time.monotonic()
+            self.logger.warning(f"進入降級模式: {reason}")
+            return
+
+        ratio = self.config.recovery_ratio
+        if latency <= self.config.latency_slo * ratio and self._in_flight < self.config.queue_slo * ratio:
+            self._degraded = False
+            self._degraded_reason = ""
+            self.logger.info(f"負載下降，恢復 LLM 回答 (延遲 {latency:.1f}s, 排隊 {self._in_flight})")
@@ -0,0 +1,429 @@
+"""
+聚合 cube 模組
+在記憶體中以 (category, brand, supplier) 為維度保存彙總值（筆數、庫存總量、
+庫存總價值、單價總和與最小/最大值），啟動時由快照載入（不需啟用快照本地執行），隨資料列變更增量更新。
+維度內的 GROUP BY 查詢與 /stats 直接由 cube 回答，成本只與維度組合數有關
+"""
+
+import threading
+from collections import Counter
+from typing import Optional, Dict, Any, List, Tuple, Iterable
+
+from .database import DatabaseClient
+from .local_executor import LocalPlan, SelectItem, UnsupportedQuery, compile_sql
+from .utils.logger import get_logger
+
+
+CUBE_DIMENSIONS = ('category', 'brand', 'supplier')
+
+# 金額以「分」為單位的整數累加，增減後不產生浮點誤差
+_CENTS = 100
+
+
+class _Cell:
+    """單一維度組合的彙總值"""
+
+    __slots__ = ('count', 'stock', 'value_cents', 'price_cents', 'priced', 'prices', '_low', '_high', '_dirty')
+
+    def __init__(self):
+        self.count = 0
+        self.stock = 0
+        self.value_cents = 0
+        self.price_cents = 0
+        self.priced = 0
+        # 單價的多重集合：移除資料列後仍能得出正確的最小/最大值
+        self.prices: Counter = Counter()
+        self._low: Optional[int] = None
+        self._high: Optional[int] = None
+        self._dirty = False
+
+    def add(self, row: Dict[str, Any], sign: int) -> None:
+        """加入（sign=1）或移除（sign=-1）一筆資料列"""
+        stock = row.get('stock_quantity') or 0
+        self.count += sign
+        self.stock += sign * stock
+        price = row.get('unit_price')
+        if price is None:
+            return
+        cents = int(round(price * _CENTS))
+        self.value_cents += sign * stock * cents
+        self.price_cents += sign * cents
+        self.priced += sign
+        self.prices[cents] += sign
+        if self.prices[cents] <= 0:
+            del self.prices[cents]
+        self._dirty = True
+
+    def extremes(self) -> Tuple[Optional[int], Optional[int]]:
+        """最小/最大單價（分），變更後才重新計算"""
+        if self._dirty:
+            self._low = min(self.prices) if self.prices else None
+            self._high = max(self.prices) if self.prices else None
+            self._dirty = False
+        return self._low, self._high
+
+    def merge(self, other: '_Cell') -> None:
+        """合併另一個 cell（彙總用的 cell 只保留最小/最大值，不保留單價集合）"""
+        self.count += other.count
+        self.stock += other.stock
+        self.value_cents += other.value_cents
+        self.price_cents += other.price_cents
+        self.priced += other.priced
+        low, high = other.extremes()
+        if low is not None:
+            self._low = low if self._low is None else min(self._low, low)
+            self._high = high if self._high is None else max(self._high, high)
+
+    def metric(self, name: str) -> Any:
+        """取得彙總值（無資料時 SUM/AVG/MIN/MAX 為 None，與 SQL 相同）"""
+        if name == 'count':
+            return self.count
+        if name == 'stock':
+            return self.stock if self.count else None
+        if name == 'value':
+            return self.value_cents / _CENTS if self.priced else None
+        if name == 'price_sum':
+            return self.price_cents / _CENTS if self.priced else None
+        if name == 'avg_price':
+            return self.price_cents / _CENTS / self.priced if self.priced else None
+        if name == 'avg_stock':
+            return self.stock / self.count if self.count else None
+        if name == 'min_price':
+            low = self.extremes()[0]
+            return low / _CENTS if low is not None else None
+        if name == 'max_price':
+            high = self.extremes()[1]
+            return high / _CENTS if high is not None else None
+        raise KeyError(name)
+
+
+# SELECT 項目 (聚合函數, 欄位) 到 cube 彙總值的對應
+_METRICS = {
+    ('count', ()): 'count',
+    ('count', ('stock_quantity',)): 'count',
+    ('count', ('unit_price',)): 'count',
+    ('sum', ('stock_quantity',)): 'stock',
+    ('sum', ('stock_quantity', 'unit_price')): 'value',
+    ('sum', ('unit_price', 'stock_quantity')): 'value',
+    ('sum', ('unit_price',)): 'price_sum',
+    ('avg', ('unit_price',)): 'avg_price',
+    ('avg', ('stock_quantity',)): 'avg_stock',
+    ('min', ('unit_price',)): 'min_price',
+    ('max', ('unit_price',)): 'max_price',
+}
+
+# /stats 回傳的彙總欄位
+STATS_METRICS = (
+    ('product_count', 'count'),
+    ('total_stock', 'stock'),
+    ('total_value', 'value'),
+    ('avg_price', 'avg_price'),
+    ('min_price', 'min_price'),
+    ('max_price', 'max_price'),
+)
+
+
+class AggregateCube:
+    """(category, brand, supplier) 彙總 cube"""
+
+    def __init__(self, db_client: Optional[DatabaseClient] = None):
+        """
+        初始化 cube（由 reset() 或快照監聽載入資料）
+
+        Args:
+            db_client: 資料庫客戶端（cube 尚未載入時 /stats 回退查詢用，可為 None）
+        """
+        self.db_client = db_client
+        self.logger = get_logger(__name__)
+        self._cells: Dict[Tuple, _Cell] = {}
+        self._ready = False
+        self._lock = threading.Lock()
+        self._plans: Dict[str, Optional[LocalPlan]] = {}
+        self._hits = 0
+
+    @property
+    def ready(self) -> bool:
+        """cube 是否已載入"""
+        return self._ready
+
+    def reset(self, rows: Iterable[Dict[str, Any]]) -> None:
+        """
+        以所有資料列重建 cube
+
+        Args:
+            rows: inventory 資料列
+        """
+        cells: Dict[Tuple, _Cell] = {}
+        for row in rows:
+            key = tuple(row.get(dimension) for dimension in CUBE_DIMENSIONS)
+            cell = cells.get(key)
+            if cell is None:
+                cell = cells[key] = _Cell()
+            cell.add(row, 1)
+        with self._lock:
+            self._cells = cells
+            self._ready = True
+        self.logger.info(f"聚合 cube 已重建 ({len(cells)} 個維度組合)")
+
+    def update(self, old: Optional[Dict[str, Any]], new: Optional[Dict[str, Any]]) -> None:
+        """
+        增量套用單筆資料列變更
+
+        Args:
+            old: 變更前資料列（新增時為 None）
+            new: 變更後資料列（刪除時為 None）
+        """
+        with self._lock:
+            if old is not None:
+                key = tuple(old.get(dimension) for dimension in CUBE_DIMENSIONS)
+                cell = self._cells.get(key)
+                if cell is not None:
+                    cell.add(old, -1)
+                    if cell.count <= 0:
+                        del self._cells[key]
+            if new is not None:
+                key = tuple(new.get(dimension) for dimension in CUBE_DIMENSIONS)
+                cell = self._cells.get(key)
+                if cell is None:
+                    cell = self._cells[key] = _Cell()
+                cell.add(new, 1)
+
+    def rollup(
+        self,
+        dimensions: Tuple[str, ...] = (),
+        filters: Optional[Dict[str, Iterable[Any]]] = None
+    ) -> Dict[Tuple, _Cell]:
+        """
+        依指定維度彙總
+
+        Args:
+            dimensions: 分組維度（空元組為整體彙總）
+            filters: 維度到允許值的對應
+
+        Returns:
+            分組鍵到彙總值的對應
+        """
+        positions = [CUBE_DIMENSIONS.index(dimension) for dimension in dimensions]
+        conditions = [
+            (CUBE_DIMENSIONS.index(dimension), set(values)) for dimension, values in (filters or {}).items()
+        ]
+        groups: Dict[Tuple, _Cell] = {}
+        with self._lock:
+            for key, cell in self._cells.items():
+                if any(key[position] not in allowed for position, allowed in conditions):
+                    continue
+                group_key = tuple(key[position] for position in positions)
+                group = groups.get(group_key)
+                if group is None:
+                    group = groups[group_key] = _Cell()
+                group.merge(cell)
+        if not dimensions and not groups:
+            groups[()] = _Cell()
+        return groups
+
+    def stats(
+        self,
+        dimensions: Tuple[str, ...] = (),
+        filters: Optional[Dict[str, Iterable[Any]]] = None
+    ) -> Tuple[List[Dict[str, Any]], str]:
+        """
+        /stats 彙總（cube 未載入時回退資料庫）
+
+        Args:
+            dimensions: 分組維度
+            filters: 維度到允許值的對應
+
+        Returns:
+            (依庫存總價值排序的彙總列, 資料來源 'cube' 或 'database')
+
+        Raises:
+            ValueError: 維度不在 cube 中
+            RuntimeError: cube 未載入且未設定資料庫客戶端
+        """
+        for dimension in list(dimensions) + list((filters or {}).keys()):
+            if dimension not in CUBE_DIMENSIONS:
+                raise ValueError(f"不支援的維度: {dimension}")
+
+        if not self._ready:
+            if self.db_client is None:
+                raise RuntimeError("Aggregate cube not loaded")
+            return self._stats_from_database(dimensions, filters or {}), 'database'
+
+        rows = []
+        for key, cell in self.rollup(dimensions, filters).items():
+            row = dict(zip(dimensions, key))
+            row.update((name, cell.metric(metric)) for name, metric in STATS_METRICS)
+            rows.append(row)
+        rows.sort(key=lambda row: row['total_value'] or 0, reverse=True)
+        return rows, 'cube'
+
+    def _stats_from_database(self, dimensions: Tuple[str, ...], filters: Dict[str, Iterable[Any]]) -> List[Dict[str, Any]]:
+        """以 SQL 計算與 cube 相同格式的彙總"""
+        conditions, params = [], []
+        for dimension, values in filters.items():
+            values = list(values)
+            conditions.append(f"{dimension} IN ({', '.join(['%s'] * len(values))})")
+            params.extend(values)
+        select = list(dimensions) + [
+            "COUNT(*) AS product_count",
+            "SUM(stock_quantity) AS total_stock",
+            "SUM(stock_quantity * unit_price) AS total_value",
+            "AVG(unit_price) AS avg_price",
+            "MIN(unit_price) AS min_price",
+            "MAX(unit_price) AS max_price",
+        ]
+        sql = f"SELECT {', '.join(select)} FROM inventory"
+        if conditions:
+            sql += f" WHERE {' AND '.join(conditions)}"
+        if dimensions:
+            sql += f" GROUP BY {', '.join(dimensions)}"
+        sql += " ORDER BY total_value DESC NULLS LAST"
+        rows = self.db_client.execute_query(sql, tuple(params) or None)
+        return DatabaseClient.format_results(rows, limit=len(rows))
+
+    def execute(self, sql: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        以 cube 回答 GROUP BY 查詢
+
+        Args:
+            sql: SQL 語句
+
+        Returns:
+            查詢結果列表，無法由 cube 回答時返回 None
+        """
+        if not self._ready:
+            return None
+        plan = self._compile(sql)
+        if plan is None:
+            return None
+
+        dimensions = _dimensions(plan)
+        hidden = [target for target, _, _ in plan.order_by if isinstance(target, SelectItem)]
+        items = list(plan.items) + hidden
+        groups = self.rollup(dimensions, _filters(plan.where))
+
+        rows = []
+        for key, cell in groups.items():
+            values = dict(zip(dimensions, key))
+            rows.append([
+                values[item.columns[0]] if item.aggregate is None else _item_metric(item, cell, values)
+                for item in items
+            ])
+
+        for target, descending, nulls_first in reversed(plan.order_by):
+            position = target if isinstance(target, int) else len(plan.items) + hidden.index(target)
+            nulls = [row for row in rows if row[position] is None]
+            present = [row for row in rows if row[position] is not None]
+            present.sort(key=lambda row: row[position], reverse=descending)
+            rows = nulls + present if nulls_first else present + nulls
+
+        end = None if plan.limit is None else plan.offset + plan.limit
+        with self._lock:
+            self._hits += 1
+        return [
+            {item.name: row[position] for position, item in enumerate(plan.items)}
+            for row in rows[plan.offset:end]
+        ]
+
+    def can_answer(self, sql: str) -> bool:
+        """
+        SQL 是否可由 cube 回答
+
+        Args:
+            sql: SQL 語句
+
+        Returns:
+            是否可回答
+        """
+        return self._ready and self._compile(sql) is not None
+
+    @property
+    def hits(self) -> int:
+        """由 cube 回答的查詢數"""
+        with self._lock:
+            return self._hits
+
+    @property
+    def cell_count(self) -> int:
+        """維度組合數"""
+        with self._lock:
+            return len(self._cells)
+
+    def _compile(self, sql: str) -> Optional[LocalPlan]:
+        """編譯並檢查 SQL 是否落在 cube 範圍內（結果快取）"""
+        with self._lock:
+            if sql in self._plans:
+                return self._plans[sql]
+        try:
+            plan: Optional[LocalPlan] = compile_sql(sql)
+            _check_cube_plan(plan)
+        except UnsupportedQuery:
+            plan = None
+        with self._lock:
+            if len(self._plans) >= 256:
+                self._plans.clear()
+            self._plans[sql] = plan
+        return plan
+
+
+def _check_cube_plan(plan: LocalPlan) -> None:
+    """
+    檢查查詢是否可由 cube 回答
+
+    Raises:
+        UnsupportedQuery: 非聚合查詢、維度或彙總值不在 cube 中、條件不是維度等值比對
+    """
+    if not plan.grouped:
+        raise UnsupportedQuery("非聚合查詢")
+    if plan.distinct and any(len(item.columns) != 1 for item in plan.items):
+        raise UnsupportedQuery("DISTINCT 僅支援欄位")
+    dimensions = _dimensions(plan)
+    if any(dimension not in CUBE_DIMENSIONS for dimension in dimensions):
+        raise UnsupportedQuery("分組欄位不在 cube 維度中")
+    hidden = [target for target, _, _ in plan.order_by if isinstance(target, SelectItem)]
+    for item in list(plan.items) + hidden:
+        if item.aggregate is None:
+            continue
+        # COUNT(維度) 只有在以該維度分組時才能由 cell 得出
+        if (item.aggregate, item.columns) not in _METRICS and \
+                not (item.aggregate == 'count' and item.columns and item.columns[0] in dimensions):
+            raise UnsupportedQuery(f"cube 不支援 {item.aggregate}({', '.join(item.columns)})")
+    _filters(plan.where)
+
+
+def _dimensions(plan: LocalPlan) -> Tuple[str, ...]:
+    """查詢的分組維度（DISTINCT 以輸出欄位分組，無 GROUP BY 的聚合為空元組）"""
+    if plan.group_by:
+        return plan.group_by
+    if plan.distinct:
+        return tuple(item.columns[0] for item in plan.items)
+    return ()
+
+
+def _filters(condition: Optional[Tuple]) -> Dict[str, set]:
+    """
+    將 WHERE 條件轉為維度過濾（僅支援以 AND 連接的維度等值/IN 比對）
+
+    Raises:
+        UnsupportedQuery: 條件超出範圍
+    """
+    filters: Dict[str, set] = {}
+    if condition is None:
+        return filters
+    leaves = condition[1] if condition[0] == 'and' else [condition]
+    for leaf in leaves:
+        if leaf[0] != 'leaf' or leaf[1] not in CUBE_DIMENSIONS or leaf[2] not in ('=', 'in'):
+            raise UnsupportedQuery("cube 只支援維度等值條件")
+        values = {leaf[3]} if leaf[2] == '=' else set(leaf[3])
+        column = leaf[1]
+        filters[column] = filters[column] & values if column in filters else values
+    return filters
+
+
+def _item_metric(item: SelectItem, cell: _Cell, key: Dict[str, Any]) -> Any:
+    """SELECT 聚合項目的值"""
+    metric = _METRICS.get((item.aggregate, item.columns))
+    if metric is not None:
+        return cell.metric(metric)
+    # COUNT(維度)：該維度為 NULL 的資料列不計
+    return cell.count if key[item.columns[0]] is not None else 0
@@ -0,0 +1,384 @@
+"""
+自動完成模組
+以壓縮前綴樹（radix trie）索引成功執行過的問題（依次數排序）與目錄中的分類、品牌、型號
+（依品項數排序）。每個節點快取子樹中排名前 max_suggestions 的項目，查詢只需沿前綴走到節點；
+新增問題或目錄變更時只更新受影響路徑上的快取，完整重建在鎖外進行後再替換
+"""
+
+import threading
+import time
+import unicodedata
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Any, List, Tuple, Iterable
+
+from .config import AutocompleteConfig
+from .database import DatabaseClient
+from .utils.logger import get_logger
+
+
+# 建議種類（依此順序排列：歷史問題優先，其次為目錄詞）
+SUGGESTION_KINDS = ('question', 'category', 'brand', 'model')
+
+# 目錄詞來源欄位
+CATALOG_COLUMNS = ('category', 'brand', 'model')
+
+_KIND_ORDER = {kind: order for order, kind in enumerate(SUGGESTION_KINDS)}
+
+
+def normalize_text(text: Optional[str]) -> str:
+    """
+    正規化比對用文字（NFKC、小寫、合併空白）
+
+    Args:
+        text: 文字
+
+    Returns:
+        正規化後的文字
+    """
+    if not text:
+        return ''
+    return ' '.join(unicodedata.normalize('NFKC', text).lower().split())
+
+
+@dataclass(eq=False)
+class _Entry:
+    """建議項目（同一項目可由多個索引鍵到達，如型號的每個單字開頭）"""
+    kind: str
+    text: str
+    keys: Tuple[str, ...]
+    weight: int = 0
+    rank: Tuple[int, int, str] = field(init=False)
+
+    def __post_init__(self):
+        self.set_weight(self.weight)
+
+    def set_weight(self, weight: int) -> None:
+        """更新權重與排序鍵"""
+        self.weight = weight
+        self.rank = (_KIND_ORDER[self.kind], -weight, self.text)
+
+
+class _Node:
+    """前綴樹節點（children 以邊標籤的第一個字元為鍵）"""
+    __slots__ = ('children', 'entries', 'top')
+
+    def __init__(self):
+        self.children: Dict[str, Tuple[str, '_Node']] = {}
+        self.entries: List[_Entry] = []
+        self.top: List[_Entry] = []
+
+
+class _Trie:
+    """壓縮前綴樹與各節點的前幾名快取（呼叫端負責同步）"""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.root = _Node()
+        self.entries: Dict[Tuple[str, str], _Entry] = {}
+        self.questions = 0
+
+    def find(self, prefix: str) -> Optional[_Node]:
+        """以前綴開頭的子樹根節點（前綴可停在邊的中間）"""
+        node, index = self.root, 0
+        while index < len(prefix):
+            edge = node.children.get(prefix[index])
+            if edge is None:
+                return None
+            label, child = edge
+            if not label.startswith(prefix[index:index + len(label)]):
+                return None
+            node, index = child, index + len(label)
+        return node
+
+    def add_weight(self, kind: str, text: str, keys: Tuple[str, ...], delta: int) -> None:
+        """調整項目權重（不存在時新增，降為 0 時移除）"""
+        entry = self.entries.get((kind, normalize_text(text)))
+        if entry is None:
+            if delta <= 0:
+                return
+            entry = _Entry(kind=kind, text=text, keys=keys)
+            self.entries[(kind, normalize_text(text))] = entry
+            if kind == 'question':
+                self.questions += 1
+            for key in keys:
+                self._insert(key).entries.append(entry)
+        self._set_weight(entry, entry.weight + delta)
+
+    def evict_question(self) -> None:
+        """移除次數最少的問題（同次數時移除文字排序最後的）"""
+        victim = max(
+            (entry for entry in self.entries.values() if entry.kind == 'question'),
+            key=lambda entry: entry.rank
+        )
+        self._set_weight(victim, 0)
+
+    def count_nodes(self) -> int:
+        """節點數"""
+        nodes = 0
+        pending = [self.root]
+        while pending:
+            node = pending.pop()
+            nodes += 1
+            pending.extend(child for _, child in node.children.values())
+        return nodes
+
+    def _set_weight(self, entry: _Entry, weight: int) -> None:
+        """更新項目權重並修正路徑上各節點的快取（權重為 0 時移除項目）"""
+        improved = weight > entry.weight
+        entry.set_weight(weight)
+        if weight <= 0:
+            del self.entries[(entry.kind, normalize_text(entry.text))]
+            if entry.kind == 'question':
+                self.questions -= 1
+            for key in entry.keys:
+                self._path(key)[-1].entries.remove(entry)
+        for key in entry.keys:
+            if improved:
+                self._promote(self._path(key), entry)
+            else:
+                self._demote(self._path(key), entry)
+
+    def _promote(self, path: List[_Node], entry: _Entry) -> None:
+        """排名上升：加入或重排路徑上各節點的快取"""
+        for node in path:
+            top = node.top
+            if entry not in top:
+                if len(top) >= self.size and entry.rank >= top[-1].rank:
+                    continue
+                top.append(entry)
+            top.sort(key=lambda item: item.rank)
+            del top[self.size:]
+
+    def _demote(self, path: List[_Node], entry: _Entry) -> None:
+        """排名下降或移除：由下而上以子節點快取重新計算含此項目的節點"""
+        for node in reversed(path):
+            if entry not in node.top:
+                continue
+            candidates = {id(item): item for item in node.entries}
+            for _, child in node.children.values():
+                candidates.update((id(item), item) for item in child.top)
+            node.top = sorted(candidates.values(), key=lambda item: item.rank)[:self.size]
+
+    def _insert(self, key: str) -> _Node:
+        """取得索引鍵的節點（不存在時建立，必要時拆分邊）"""
+        node, index = self.root, 0
+        while index < len(key):
+            edge = node.children.get(key[index])
+            if edge is None:
+                child = _Node()
+                node.children[key[index]] = (key[index:], child)
+                return child
+            label, child = edge
+            common = _common_prefix(label, key, index)
+            if common < len(label):
+                middle = _Node()
+                middle.children[label[common]] = (label[common:], child)
+                middle.top = list(child.top)
+                node.children[key[index]] = (label[:common], middle)
+                child = middle
+            node, index = child, index + common
+        return node
+
+    def _path(self, key: str) -> List[_Node]:
+        """自根節點到索引鍵節點的路徑（索引鍵必須已插入）"""
+        node, index = self.root, 0
+        path = [node]
+        while index < len(key):
+            label, node = node.children[key[index]]
+            index += len(label)
+            path.append(node)
+        return path
+
+
+class AutocompleteIndex:
+    """歷史問題與目錄詞的自動完成索引"""
+
+    def __init__(self, db_client: Optional[DatabaseClient], config: AutocompleteConfig):
+        """
+        初始化自動完成索引（目錄詞由快照監聽或 load_catalog() 載入）
+
+        Args:
+            db_client: 資料庫客戶端（未由快照提供目錄時以 SQL 載入，可為 None）
+            config: 自動完成配置
+        """
+        self.db_client = db_client
+        self.config = config
+        self.logger = get_logger(__name__)
+        self._trie = _Trie(config.max_suggestions)
+        self._catalog_source: Optional[str] = None
+        self._catalog_attempted_at: Optional[float] = None
+        self._lookups = 0
+        self._lock = threading.Lock()
+
+    def suggest(self, prefix: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        取得前綴相符的建議（目錄尚未載入時先以 SQL 載入）
+
+        Args:
+            prefix: 使用者已輸入的文字
+            limit: 回傳筆數上限（不超過 max_suggestions）
+
+        Returns:
+            依種類與權重排序的建議（text、kind、weight）
+        """
+        if not self.config.enabled:
+            return []
+        self._ensure_catalog()
+
+        limit = self.config.max_suggestions if limit is None else min(limit, self.config.max_suggestions)
+        key = normalize_text(prefix)
+        with self._lock:
+            self._lookups += 1
+            node = self._trie.find(key)
+            top = node.top[:limit] if node is not None else []
+            return [{'text': entry.text, 'kind': entry.kind, 'weight': entry.weight} for entry in top]
+
+    def record_question(self, question: str) -> None:
+        """
+        記錄一次成功執行的問題（超過 max_questions 時移除次數最少的問題）
+
+        Args:
+            question: 使用者問題
+        """
+        if not self.config.enabled:
+            return
+        text = ' '.join(question.split())
+        key = normalize_text(text)
+        if not key or len(key) > self.config.max_question_length:
+            return
+
+        with self._lock:
+            trie = self._trie
+            if ('question', key) not in trie.entries and trie.questions >= self.config.max_questions:
+                trie.evict_question()
+            trie.add_weight('question', text, (key,), 1)
+
+    def reset(self, rows: Iterable[Dict[str, Any]]) -> None:
+        """
+        以所有資料列重建目錄詞（快照監聽）
+
+        Args:
+            rows: inventory 資料列
+        """
+        counts: Counter = Counter()
+        for row in rows:
+            for column in CATALOG_COLUMNS:
+                if row.get(column):
+                    counts[(column, row[column])] += 1
+        self._rebuild(counts, 'snapshot')
+
+    def update(self, old: Optional[Dict[str, Any]], new: Optional[Dict[str, Any]]) -> None:
+        """
+        增量套用單筆資料列變更（只更新變更欄位的品項數）
+
+        Args:
+            old: 變更前資料列（新增時為 None）
+            new: 變更後資料列（刪除時為 None）
+        """
+        if not self.config.enabled:
+            return
+        with self._lock:
+            for column in CATALOG_COLUMNS:
+                before = old.get(column) if old else None
+                after = new.get(column) if new else None
+                if before == after:
+                    continue
+                if before:
+                    self._trie.add_weight(column, before, _catalog_keys(before), -1)
+                if after:
+                    self._trie.add_weight(column, after, _catalog_keys(after), 1)
+
+    def load_catalog(self) -> int:
+        """
+        以 SQL 載入目錄詞（未啟用快照時使用）
+
+        Returns:
+            目錄詞數
+
+        Raises:
+            psycopg2.Error: 資料庫錯誤
+        """
+        self._catalog_attempted_at = time.monotonic()
+        rows = self.db_client.execute_query(
+            f"SELECT {', '.join(CATALOG_COLUMNS)}, COUNT(*) AS product_count "
+            f"FROM inventory GROUP BY {', '.join(CATALOG_COLUMNS)}"
+        )
+        counts: Counter = Counter()
+        for row in rows:
+            for column in CATALOG_COLUMNS:
+                if row.get(column):
+                    counts[(column, row[column])] += int(row['product_count'])
+        return self._rebuild(counts, 'database')
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        自動完成統計
+
+        Returns:
+            問題數、目錄詞數、節點數與查詢次數
+        """
+        with self._lock:
+            trie = self._trie
+            return {
+                'enabled': self.config.enabled,
+                'questions': trie.questions,
+                'catalog_entries': len(trie.entries) - trie.questions,
+                'catalog_source': self._catalog_source,
+                'nodes': trie.count_nodes(),
+                'lookups': self._lookups
+            }
+
+    def _ensure_catalog(self) -> None:
+        """目錄尚未載入時以 SQL 載入（失敗時每 catalog_retry_interval 秒重試）"""
+        if self._catalog_source is not None or self.db_client is None:
+            return
+        attempted = self._catalog_attempted_at
+        if attempted is not None and time.monotonic() - attempted < self.config.catalog_retry_interval:
+            return
+        try:
+            self.load_catalog()
+        except Exception as e:
+            self.logger.warning(f"載入自動完成目錄詞失敗: {str(e)}")
+
+    def _rebuild(self, counts: Counter, source: str) -> int:
+        """在鎖外以目錄詞品項數建立新前綴樹，再帶入歷史問題後替換"""
+        if not self.config.enabled:
+            return 0
+        trie = _Trie(self.config.max_suggestions)
+        for (kind, value), count in counts.items():
+            trie.add_weight(kind, value, _catalog_keys(value), count)
+        catalog_entries = len(trie.entries)
+
+        with self._lock:
+            for entry in self._trie.entries.values():
+                if entry.kind == 'question':
+                    trie.add_weight('question', entry.text, entry.keys, entry.weight)
+            self._trie = trie
+            self._catalog_source = source
+        self.logger.info(f"自動完成索引已重建 ({catalog_entries} 個目錄詞、{trie.questions} 個問題，來源: {source})")
+        return catalog_entries
+
+
+def _catalog_keys(value: str) -> Tuple[str, ...]:
+    """
+    目錄詞的索引鍵：完整文字與每個詞開頭起的後綴
+    （空白或符號之後、英數字與中文交界處，如 HeartStart FRx 可由 frx、AED除顫器 可由 除顫 找到）
+    """
+    key = normalize_text(value)
+    starts = [
+        index for index in range(len(key))
+        if key[index].isalnum() and (
+            index == 0 or not key[index - 1].isalnum() or key[index - 1].isascii() != key[index].isascii()
+        )
+    ]
+    return tuple(dict.fromkeys([key] + [key[index:] for index in starts]))
+
+
+def _common_prefix(label: str, key: str, start: int) -> int:
+    """邊標籤與 key[start:] 的共同前綴長度"""
+    length = min(len(label), len(key) - start)
+    for offset in range(length):
+        if label[offset] != key[start + offset]:
+            return offset
+    return length
@@ -0,0 +1,317 @@
+"""
+批次查詢模組
+以有界並行度執行多個問題，並對重複問題與重複 SQL 去重
+"""
+
+import contextvars
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Optional, Dict, Any, List
+
+from .autocomplete import normalize_text
+from .config import BatchConfig
+from .query_engine import QueryEngine
+from .cost_guard import QueryCostExceeded
+from .health import HealthMonitor
+from .metrics import record_stage
+from .query_log import collect_usage
+from .tracing import span
+from .utils.deadline import Deadline, QueryAborted, check_deadline
+from .utils.logger import get_logger
+from .utils.sql_lexer import analyze_sql
+
+
+def normalize_question(question: str) -> str:
+    """
+    正規化顯示用的問題（去除前後空白並合併連續空白；去重鍵另以 normalize_text 產生）
+
+    Args:
+        question: 原始問題
+
+    Returns:
+        正規化後的問題
+    """
+    return re.sub(r'\s+', ' ', question).strip()
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    正規化 SQL 作為去重鍵（關鍵字大寫、合併空白、去除結尾分號，常值保留）
+
+    Args:
+        sql: SQL 語句
+
+    Returns:
+        正規化後的 SQL
+    """
+    return analyze_sql(sql).canonical
+
+
+class BatchQueryRunner:
+    """批次查詢執行器"""
+
+    def __init__(self, engine: QueryEngine, config: BatchConfig, health_monitor: Optional[HealthMonitor] = None):
+        """
+        初始化批次查詢執行器
+
+        Args:
+            engine: 查詢引擎
+            config: 批次配置
+            health_monitor: 健康監控（可選，斷路器開啟時項目直接失敗）
+        """
+        self.engine = engine
+        self.config = config
+        self.health_monitor = health_monitor
+        self.logger = get_logger(__name__)
+
+    def run(
+        self,
+        questions: List[str],
+        use_llm_answer: bool = True,
+        model: Optional[str] = None,
+        max_concurrency: Optional[int] = None,
+        deadline: Optional[Deadline] = None
+    ) -> Dict[str, Any]:
+        """
+        執行批次查詢
+
+        每個項目走與單一查詢相同的流程（QueryEngine.run_pipeline）；
+        相同問題只執行一次，不同問題生成相同 SQL 時，SQL 只對資料庫執行一次
+
+        Args:
+            questions: 問題列表
+            use_llm_answer: 是否使用 LLM 生成回答
+            model: 使用的模型（可選）
+            max_concurrency: 並行度（可選，不超過配置上限）
+            deadline: 整個批次的時限（可選），超時或取消後未完成的項目中止
+
+        Returns:
+            {'items': 各問題結果列表, 'summary': 彙總計時資訊}
+        """
+        if len(questions) > self.config.max_questions:
+            raise ValueError(f"批次問題數超過上限 ({self.config.max_questions})")
+
+        concurrency = self.config.max_concurrency
+        if max_concurrency:
+            concurrency = max(1, min(max_concurrency, self.config.max_concurrency))
+
+        use_model = model if model else self.engine.ollama_client.config.model
+        mode = 'llm' if use_llm_answer else 'fast'
+
+        # 問題去重：記錄每個正規化問題第一次出現的位置（與快取、查詢日誌相同的正規化）
+        first_index: Dict[str, int] = {}
+        for index, question in enumerate(questions):
+            first_index.setdefault(normalize_text(question), index)
+
+        # 相同 SQL 只執行一次（第一個取得鍵的執行緒負責執行，其餘等待結果）
+        sql_futures: Dict[str, Future] = {}
+        sql_lock = threading.Lock()
+
+        def execute_once(sql: str, deadline: Optional[Deadline], item: Dict[str, Any]) -> Optional[list]:
+            key = normalize_sql(sql)
+            with sql_lock:
+                future = sql_futures.get(key)
+                owner = future is None
+                if owner:
+                    future = Future()
+                    sql_futures[key] = future
+            if owner:
+                try:
+                    future.set_result(self.engine.execute_query(sql, deadline=deadline))
+                except Exception as e:
+                    future.set_exception(e)
+            item['sql_shared'] = not owner
+            return future.result()
+
+        def run_one(index: int) -> Dict[str, Any]:
+            question = normalize_question(questions[index])
+            timing: Dict[str, float] = {}
+            item: Dict[str, Any] = {
+                'index': index,
+                'question': question,
+                'sql': None,
+                'answer': "",
+                'answer_formatted': None,
+                'answer_html': None,
+                'results': None,
+                'result_count': None,
+                'duplicate_of': None,
+                'sql_shared': False,
+                'llm_skip_reason': None,
+                'llm_skip_cause': None,
+                'timing': timing,
+                'success': False,
+                'error': None
+            }
+            events: Dict[str, Any] = {}
+            item_start = time.perf_counter()
+
+            try:
+                check_deadline(deadline, "batch_item")
+                # 斷路器在批次執行期間開啟時，其餘項目直接失敗
+                unavailable = self._unavailable_dependency()
+                if unavailable:
+                    item['error'] = unavailable
+                    return item
+
+                sql, answer, programmatic_answer, html_table, formatted_results, _ = self.engine.run_pipeline(
+                    question, use_llm_answer, use_model, mode,
+                    lambda stage, payload: events.update(payload),
+                    deadline, timing,
+                    execute=lambda sql, stage_deadline: execute_once(sql, stage_deadline, item)
+                )
+
+                if sql is None:
+                    self._record_health('ollama', False, "SQL generation returned no result")
+                    item['error'] = "SQL generation failed - Ollama may not be responding"
+                    return item
+                # 快取的 SQL 沒有呼叫 Ollama，不算是 Ollama 可用的證據
+                if not events.get('sql_cached'):
+                    self._record_health('ollama', True)
+
+                item['sql'] = sql
+                if formatted_results is None:
+                    item['error'] = "SQL execution failed"
+                    return item
+
+                item['answer'] = answer or ""
+                item['answer_formatted'] = programmatic_answer
+                item['answer_html'] = html_table
+                item['results'] = formatted_results
+                item['result_count'] = len(formatted_results)
+                item['llm_skip_reason'] = events.get('llm_skip_reason')
+                item['llm_skip_cause'] = events.get('llm_skip_cause')
+                item['success'] = True
+                return item
+
+            except QueryCostExceeded as e:
+                self.logger.warning(f"批次項目 {index} 成本過高: {str(e)}")
+                item['sql'] = e.sql
+                item['error'] = str(e)
+                return item
+
+            except QueryAborted as e:
+                self.logger.warning(f"批次項目 {index} 已中止: {str(e)}")
+                item['sql'] = events.get('sql')
+                item['error'] = str(e)
+                return item
+
+            except Exception as e:
+                self.logger.error(f"批次項目 {index} 失敗: {str(e)}")
+                item['sql'] = events.get('sql')
+                item['error'] = str(e)
+                return item
+
+            finally:
+                record_stage(timing, 'total', item_start, use_model, mode)
+
+        batch_start = time.perf_counter()
+        unique_indexes = sorted(first_index.values())
+
+        def traced_run_one(index: int) -> Dict[str, Any]:
+            with span('batch.item', index=index), collect_usage() as usage:
+                item = run_one(index)
+            self.engine.log_query(
+                item['question'], use_model, mode, item['timing'], item['timing'].get('total', 0.0), usage,
+                sql=item['sql'], error=item['error']
+            )
+            return item
+
+        # 每個項目在提交時複製 context，span 掛在批次請求的 trace 下（查詢日誌欄位也各自收集）
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch-query") as executor:
+            futures = [
+                executor.submit(contextvars.copy_context().run, traced_run_one, index)
+                for index in unique_indexes
+            ]
+            unique_items = {index: future.result() for index, future in zip(unique_indexes, futures)}
+
+        wall_time = round(time.perf_counter() - batch_start, 3)
+
+        # 依原始順序組合結果，重複問題引用第一次出現的結果
+        items: List[Dict[str, Any]] = []
+        for index, question in enumerate(questions):
+            source_index = first_index[normalize_text(question)]
+            if source_index == index:
+                items.append(unique_items[index])
+            else:
+                duplicate = dict(unique_items[source_index])
+                duplicate['index'] = index
+                duplicate['duplicate_of'] = source_index
+                items.append(duplicate)
+
+        summary = self._summarize(list(unique_items.values()), len(questions), len(sql_futures), wall_time, concurrency)
+        self.logger.info(
+            f"批次查詢完成: {len(questions)} 題, {summary['unique_questions']} 個不同問題, "
+            f"{summary['unique_sql']} 條不同 SQL, {wall_time}s"
+        )
+
+        return {'items': items, 'summary': summary}
+
+    def _unavailable_dependency(self) -> Optional[str]:
+        """
+        檢查依賴的斷路器狀態
+
+        Returns:
+            斷路器開啟時的錯誤訊息，未設定健康監控或全部可用時返回 None
+        """
+        if self.health_monitor is None:
+            return None
+        if not self.health_monitor.is_available('ollama'):
+            return "Ollama service is not available"
+        if not self.health_monitor.is_available('database'):
+            return "Database is not available"
+        return None
+
+    def _record_health(self, name: str, success: bool, error: str = "") -> None:
+        """回饋實際請求結果給斷路器（未設定健康監控時不做事）"""
+        if self.health_monitor is None:
+            return
+        if success:
+            self.health_monitor.record_success(name)
+        else:
+            self.health_monitor.record_failure(name, error)
+
+    @staticmethod
+    def _summarize(
+        unique_items: List[Dict[str, Any]],
+        total_items: int,
+        unique_sql: int,
+        wall_time: float,
+        concurrency: int
+    ) -> Dict[str, Any]:
+        """
+        彙總批次計時資訊
+
+        Args:
+            unique_items: 實際執行的項目結果
+            total_items: 原始問題總數
+            unique_sql: 實際執行的不同 SQL 數
+            wall_time: 批次總耗時（秒）
+            concurrency: 使用的並行度
+
+        Returns:
+            彙總資訊
+        """
+        stage_totals: Dict[str, float] = {}
+        for item in unique_items:
+            for stage, seconds in item['timing'].items():
+                if stage == 'total':
+                    continue
+                stage_totals[stage] = round(stage_totals.get(stage, 0.0) + seconds, 3)
+
+        item_totals = [item['timing'].get('total', 0.0) for item in unique_items]
+
+        return {
+            'total_items': total_items,
+            'unique_questions': len(unique_items),
+            'unique_sql': unique_sql,
+            'succeeded': sum(1 for item in unique_items if item['success']),
+            'failed': sum(1 for item in unique_items if not item['success']),
+            'concurrency': concurrency,
+            'wall_time': wall_time,
+            'sequential_time': round(sum(item_totals), 3),
+            'max_item_time': max(item_totals) if item_totals else 0.0,
+            'stage_totals': stage_totals
+        }
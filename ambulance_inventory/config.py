@@ -4,7 +4,7 @@
 """
 
 import os
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from dataclasses import dataclass
 
 
@@ -16,6 +16,8 @@ class DatabaseConfig:
     user: str
     password: str
     port: int
+    statement_timeout: int = 30000
+    work_mem: str = '16MB'
 
     @classmethod
     def from_env(cls) -> 'DatabaseConfig':
@@ -25,7 +27,9 @@ class DatabaseConfig:
             database=os.getenv('DB_NAME', 'ambulance_inventory'),
             user=os.getenv('DB_USER', 'postgres'),
             password=os.getenv('DB_PASSWORD', 'demo123'),
-            port=int(os.getenv('DB_PORT', '5432'))
+            port=int(os.getenv('DB_PORT', '5432')),
+            statement_timeout=int(os.getenv('DB_STATEMENT_TIMEOUT', '30000')),
+            work_mem=os.getenv('DB_WORK_MEM', '16MB')
         )
 
     def to_dict(self) -> Dict[str, Any]:
@@ -45,6 +49,9 @@ class OllamaConfig:
     host: str
     model: str
     timeout: int = 120
+    record_path: Optional[str] = None  # 錄製請求與回應的 JSONL 檔案
+    replay_path: Optional[str] = None  # 重播的錄製檔案（設定時不連線 Ollama）
+    replay_speed: float = 1.0  # 重播速度倍數（0 為立即返回）
 
     @classmethod
     def from_env(cls) -> 'OllamaConfig':
@@ -52,7 +59,372 @@ class OllamaConfig:
         return cls(
             host=os.getenv('OLLAMA_HOST', 'http://host.docker.internal:11434'),
             model=os.getenv('OLLAMA_MODEL', 'llama3:70b'),
-            timeout=int(os.getenv('OLLAMA_TIMEOUT', '120'))
+            timeout=int(os.getenv('OLLAMA_TIMEOUT', '120')),
+            record_path=os.getenv('OLLAMA_RECORD_PATH') or None,
+            replay_path=os.getenv('OLLAMA_REPLAY_PATH') or None,
+            replay_speed=float(os.getenv('OLLAMA_REPLAY_SPEED', '1.0'))
+        )
+
+
+@dataclass
+class QueryConfig:
+    """查詢請求配置"""
+    default_timeout: float = 300.0
+    max_timeout: float = 900.0
+
+    @classmethod
+    def from_env(cls) -> 'QueryConfig':
+        """從環境變數載入配置"""
+        return cls(
+            default_timeout=float(os.getenv('QUERY_DEFAULT_TIMEOUT', '300')),
+            max_timeout=float(os.getenv('QUERY_MAX_TIMEOUT', '900'))
+        )
+
+    def resolve_timeout(self, requested: Optional[float]) -> float:
+        """
+        決定請求的總時限（未指定時使用預設值，且不超過上限）
+
+        Args:
+            requested: 請求指定的時限（秒）
+
+        Returns:
+            實際使用的時限（秒）
+        """
+        timeout = requested if requested else self.default_timeout
+        return min(timeout, self.max_timeout)
+
+
+@dataclass
+class JobConfig:
+    """非同步查詢任務配置"""
+    max_workers: int = 4
+    max_pending: int = 100
+    ttl_seconds: int = 600
+
+    @classmethod
+    def from_env(cls) -> 'JobConfig':
+        """從環境變數載入配置"""
+        return cls(
+            max_workers=int(os.getenv('JOB_MAX_WORKERS', '4')),
+            max_pending=int(os.getenv('JOB_MAX_PENDING', '100')),
+            ttl_seconds=int(os.getenv('JOB_TTL_SECONDS', '600'))
+        )
+
+
+@dataclass
+class BatchConfig:
+    """批次查詢配置"""
+    max_concurrency: int = 4
+    max_questions: int = 100
+
+    @classmethod
+    def from_env(cls) -> 'BatchConfig':
+        """從環境變數載入配置"""
+        return cls(
+            max_concurrency=int(os.getenv('BATCH_MAX_CONCURRENCY', '4')),
+            max_questions=int(os.getenv('BATCH_MAX_QUESTIONS', '100'))
+        )
+
+
+@dataclass
+class AdaptiveConfig:
+    """LLM 回答自適應降級配置"""
+    enabled: bool = True
+    latency_slo: float = 30.0
+    queue_slo: int = 4
+    recovery_ratio: float = 0.7
+    ewma_alpha: float = 0.3
+    probe_interval: float = 15.0
+
+    @classmethod
+    def from_env(cls) -> 'AdaptiveConfig':
+        """從環境變數載入配置"""
+        return cls(
+            enabled=os.getenv('ADAPTIVE_LLM_ENABLED', 'true').lower() == 'true',
+            latency_slo=float(os.getenv('LLM_LATENCY_SLO', '30')),
+            queue_slo=int(os.getenv('LLM_QUEUE_SLO', '4')),
+            recovery_ratio=float(os.getenv('LLM_RECOVERY_RATIO', '0.7')),
+            ewma_alpha=float(os.getenv('LLM_LATENCY_EWMA_ALPHA', '0.3')),
+            probe_interval=float(os.getenv('LLM_PROBE_INTERVAL', '15'))
+        )
+
+
+@dataclass
+class HealthConfig:
+    """健康監控與斷路器配置"""
+    check_interval: float = 15.0
+    failure_threshold: int = 3
+    probe_base_backoff: float = 2.0
+    probe_max_backoff: float = 60.0
+    tick_interval: float = 1.0
+
+    @classmethod
+    def from_env(cls) -> 'HealthConfig':
+        """從環境變數載入配置"""
+        return cls(
+            check_interval=float(os.getenv('HEALTH_CHECK_INTERVAL', '15')),
+            failure_threshold=int(os.getenv('HEALTH_FAILURE_THRESHOLD', '3')),
+            probe_base_backoff=float(os.getenv('HEALTH_PROBE_BASE_BACKOFF', '2')),
+            probe_max_backoff=float(os.getenv('HEALTH_PROBE_MAX_BACKOFF', '60'))
+        )
+
+
+@dataclass
+class RewriteConfig:
+    """SQL 改寫配置"""
+    enabled: bool = True
+    max_rows: int = 50
+    inject_stock_filter: bool = True
+    explain: bool = False  # 以 EXPLAIN 記錄改寫前後成本（每次查詢多兩次往返，成本防護沿用改寫後的計畫）
+    value_ttl: float = 300.0
+
+    @classmethod
+    def from_env(cls) -> 'RewriteConfig':
+        """從環境變數載入配置"""
+        return cls(
+            enabled=os.getenv('SQL_REWRITE_ENABLED', 'true').lower() == 'true',
+            max_rows=int(os.getenv('SQL_REWRITE_MAX_ROWS', '50')),
+            inject_stock_filter=os.getenv('SQL_REWRITE_STOCK_FILTER', 'true').lower() == 'true',
+            explain=os.getenv('SQL_REWRITE_EXPLAIN', 'false').lower() == 'true',
+            value_ttl=float(os.getenv('SQL_REWRITE_VALUE_TTL', '300'))
+        )
+
+
+@dataclass
+class CostGuardConfig:
+    """查詢成本防護配置（以 EXPLAIN 估計值判斷）"""
+    enabled: bool = True
+    max_cost: float = 100000.0
+    max_rows: int = 10000
+    auto_limit: bool = True
+    llm_max_rows: int = 200
+
+    @classmethod
+    def from_env(cls) -> 'CostGuardConfig':
+        """從環境變數載入配置"""
+        return cls(
+            enabled=os.getenv('COST_GUARD_ENABLED', 'true').lower() == 'true',
+            max_cost=float(os.getenv('COST_GUARD_MAX_COST', '100000')),
+            max_rows=int(os.getenv('COST_GUARD_MAX_ROWS', '10000')),
+            auto_limit=os.getenv('COST_GUARD_AUTO_LIMIT', 'true').lower() == 'true',
+            llm_max_rows=int(os.getenv('COST_GUARD_LLM_MAX_ROWS', '200'))
+        )
+
+
+@dataclass
+class IndexAdvisorConfig:
+    """索引建議配置"""
+    enabled: bool = True
+    min_occurrences: int = 3
+
+    @classmethod
+    def from_env(cls) -> 'IndexAdvisorConfig':
+        """從環境變數載入配置"""
+        return cls(
+            enabled=os.getenv('INDEX_ADVISOR_ENABLED', 'true').lower() == 'true',
+            min_occurrences=int(os.getenv('INDEX_ADVISOR_MIN_OCCURRENCES', '3'))
+        )
+
+
+@dataclass
+class SnapshotConfig:
+    """行程內 inventory 快照配置（需要 numpy）"""
+    enabled: bool = False
+    refresh_interval: float = 30.0
+    full_reload_interval: float = 600.0
+    watermark_overlap: float = 60.0
+    plan_cache_size: int = 256
+
+    @classmethod
+    def from_env(cls) -> 'SnapshotConfig':
+        """從環境變數載入配置"""
+        return cls(
+            enabled=os.getenv('SNAPSHOT_ENABLED', 'false').lower() == 'true',
+            refresh_interval=float(os.getenv('SNAPSHOT_REFRESH_INTERVAL', '30')),
+            full_reload_interval=float(os.getenv('SNAPSHOT_FULL_RELOAD_INTERVAL', '600')),
+            watermark_overlap=float(os.getenv('SNAPSHOT_WATERMARK_OVERLAP', '60')),
+            plan_cache_size=int(os.getenv('SNAPSHOT_PLAN_CACHE_SIZE', '256'))
+        )
+
+
+@dataclass
+class MaterializedViewConfig:
+    """物化視圖刷新排程配置"""
+    enabled: bool = True
+    poll_interval: float = 5.0
+    min_refresh_interval: float = 10.0
+    max_staleness: float = 120.0
+
+    @classmethod
+    def from_env(cls) -> 'MaterializedViewConfig':
+        """從環境變數載入配置"""
+        return cls(
+            enabled=os.getenv('MATVIEW_ENABLED', 'true').lower() == 'true',
+            poll_interval=float(os.getenv('MATVIEW_POLL_INTERVAL', '5')),
+            min_refresh_interval=float(os.getenv('MATVIEW_MIN_REFRESH_INTERVAL', '10')),
+            max_staleness=float(os.getenv('MATVIEW_MAX_STALENESS', '120'))
+        )
+
+
+@dataclass
+class SearchConfig:
+    """產品關鍵字搜尋索引配置（需要 numpy，資料由 inventory 快照提供）"""
+    enabled: bool = True
+    merge_ratio: float = 0.05
+    max_results: int = 100
+
+    @classmethod
+    def from_env(cls) -> 'SearchConfig':
+        """從環境變數載入配置"""
+        return cls(
+            enabled=os.getenv('SEARCH_ENABLED', 'true').lower() == 'true',
+            merge_ratio=float(os.getenv('SEARCH_MERGE_RATIO', '0.05')),
+            max_results=int(os.getenv('SEARCH_MAX_RESULTS', '100'))
+        )
+
+
+@dataclass
+class AutocompleteConfig:
+    """自動完成配置（歷史問題與目錄詞的前綴索引）"""
+    enabled: bool = True
+    max_suggestions: int = 10
+    max_questions: int = 5000
+    max_question_length: int = 200
+    catalog_retry_interval: float = 60.0
+
+    @classmethod
+    def from_env(cls) -> 'AutocompleteConfig':
+        """從環境變數載入配置"""
+        return cls(
+            enabled=os.getenv('AUTOCOMPLETE_ENABLED', 'true').lower() == 'true',
+            max_suggestions=int(os.getenv('AUTOCOMPLETE_MAX_SUGGESTIONS', '10')),
+            max_questions=int(os.getenv('AUTOCOMPLETE_MAX_QUESTIONS', '5000')),
+            max_question_length=int(os.getenv('AUTOCOMPLETE_MAX_QUESTION_LENGTH', '200')),
+            catalog_retry_interval=float(os.getenv('AUTOCOMPLETE_CATALOG_RETRY_INTERVAL', '60'))
+        )
+
+
+@dataclass
+class ResponseCacheConfig:
+    """LLM 產生結果快取配置（SQL 與回答）"""
+    enabled: bool = True
+    cache_sql: bool = True
+    max_entries: int = 1000
+    ttl: float = 3600.0
+    path: Optional[str] = None
+
+    @classmethod
+    def from_env(cls) -> 'ResponseCacheConfig':
+        """從環境變數載入配置"""
+        return cls(
+            enabled=os.getenv('RESPONSE_CACHE_ENABLED', 'true').lower() == 'true',
+            cache_sql=os.getenv('RESPONSE_CACHE_SQL', 'true').lower() == 'true',
+            max_entries=int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '1000')),
+            ttl=float(os.getenv('RESPONSE_CACHE_TTL', '3600')),
+            path=os.getenv('RESPONSE_CACHE_PATH') or None
+        )
+
+
+@dataclass
+class TracingConfig:
+    """請求追蹤配置（span 取樣與匯出）"""
+    enabled: bool = True
+    sample_rate: float = 0.05
+    max_traces: int = 200
+    path: Optional[str] = None
+
+    @classmethod
+    def from_env(cls) -> 'TracingConfig':
+        """從環境變數載入配置"""
+        return cls(
+            enabled=os.getenv('TRACING_ENABLED', 'true').lower() == 'true',
+            sample_rate=float(os.getenv('TRACING_SAMPLE_RATE', '0.05')),
+            max_traces=int(os.getenv('TRACING_MAX_TRACES', '200')),
+            path=os.getenv('TRACING_PATH') or None
+        )
+
+
+@dataclass
+class LoggingConfig:
+    """日誌配置（背景執行緒輸出的結構化日誌）"""
+    level: str = 'INFO'
+    format: str = 'json'
+    queue_size: int = 10000
+    debug_sample_rate: float = 0.1
+
+    @classmethod
+    def from_env(cls) -> 'LoggingConfig':
+        """從環境變數載入配置"""
+        return cls(
+            level=os.getenv('LOG_LEVEL', 'INFO').upper(),
+            format=os.getenv('LOG_FORMAT', 'json').lower(),
+            queue_size=int(os.getenv('LOG_QUEUE_SIZE', '10000')),
+            debug_sample_rate=float(os.getenv('LOG_DEBUG_SAMPLE_RATE', '0.1'))
+        )
+
+
+@dataclass
+class ProfilingConfig:
+    """線上效能剖析配置（/debug/profile 與單一請求剖析，預設關閉）"""
+    enabled: bool = False
+    token: Optional[str] = None
+    max_duration: float = 60.0
+    sample_interval: float = 0.005
+
+    @classmethod
+    def from_env(cls) -> 'ProfilingConfig':
+        """從環境變數載入配置"""
+        return cls(
+            enabled=os.getenv('PROFILING_ENABLED', 'false').lower() == 'true',
+            token=os.getenv('PROFILING_TOKEN') or None,
+            max_duration=float(os.getenv('PROFILING_MAX_DURATION', '60')),
+            sample_interval=float(os.getenv('PROFILING_SAMPLE_INTERVAL', '0.005'))
+        )
+
+
+@dataclass
+class QueryLogConfig:
+    """查詢日誌配置（SQLite 附加式紀錄，背景批次寫入）"""
+    enabled: bool = True
+    path: str = 'query_log.db'
+    batch_size: int = 100
+    flush_interval: float = 1.0
+    queue_size: int = 10000
+    retention_days: float = 30.0
+
+    @classmethod
+    def from_env(cls) -> 'QueryLogConfig':
+        """從環境變數載入配置"""
+        return cls(
+            enabled=os.getenv('QUERY_LOG_ENABLED', 'true').lower() == 'true',
+            path=os.getenv('QUERY_LOG_PATH', 'query_log.db'),
+            batch_size=int(os.getenv('QUERY_LOG_BATCH_SIZE', '100')),
+            flush_interval=float(os.getenv('QUERY_LOG_FLUSH_INTERVAL', '1.0')),
+            queue_size=int(os.getenv('QUERY_LOG_QUEUE_SIZE', '10000')),
+            retention_days=float(os.getenv('QUERY_LOG_RETENTION_DAYS', '30'))
+        )
+
+
+@dataclass
+class StatementStatsConfig:
+    """SQL 指紋統計配置（仿 pg_stat_statements，慢查詢取樣擷取 EXPLAIN ANALYZE）"""
+    enabled: bool = True
+    max_fingerprints: int = 500
+    capture_threshold_ms: float = 500.0
+    capture_sample_rate: float = 0.1
+    capture_cooldown: float = 300.0
+    max_plans: int = 3
+
+    @classmethod
+    def from_env(cls) -> 'StatementStatsConfig':
+        """從環境變數載入配置"""
+        return cls(
+            enabled=os.getenv('STATEMENT_STATS_ENABLED', 'true').lower() == 'true',
+            max_fingerprints=int(os.getenv('STATEMENT_STATS_MAX_FINGERPRINTS', '500')),
+            capture_threshold_ms=float(os.getenv('STATEMENT_STATS_CAPTURE_THRESHOLD_MS', '500')),
+            capture_sample_rate=float(os.getenv('STATEMENT_STATS_CAPTURE_SAMPLE_RATE', '0.1')),
+            capture_cooldown=float(os.getenv('STATEMENT_STATS_CAPTURE_COOLDOWN', '300')),
+            max_plans=int(os.getenv('STATEMENT_STATS_MAX_PLANS', '3'))
         )
 
 
@@ -78,11 +450,38 @@ DATABASE_SCHEMA = """
 - 氧氣設備: Luxfer, Precision Medical 等
 - 監視器: Mindray, Masimo, GE 等
 
-視圖:
-- low_stock_alert: 顯示庫存少於10件的商品
+物化視圖（定期刷新，可能落後 inventory 數秒）:
+- low_stock_alert: 庫存少於10件的商品
+  欄位: product_id, product_name, category, brand, model, stock_quantity, unit_price, supplier
 - category_summary: 各分類的統計資訊
+  欄位: category, product_count, total_stock, avg_price, total_value
 """
 
+# inventory 資料表欄位（依資料表定義順序）
+INVENTORY_COLUMNS = (
+    'product_id', 'product_name', 'category', 'brand', 'model', 'specifications',
+    'stock_quantity', 'unit_price', 'supplier', 'last_updated'
+)
+
+# 低庫存門檻與物化視圖 low_stock_alert 的欄位
+LOW_STOCK_THRESHOLD = 10
+LOW_STOCK_COLUMNS = (
+    'product_id', 'product_name', 'category', 'brand', 'model',
+    'stock_quantity', 'unit_price', 'supplier'
+)
+
+# 由排程器刷新的物化視圖
+MATERIALIZED_VIEWS = ('low_stock_alert', 'category_summary')
+
+# SELECT * 改寫時預設投影的欄位（不含大型文字欄位 specifications）
+DISPLAY_COLUMNS = (
+    'product_id', 'product_name', 'category', 'brand', 'model',
+    'stock_quantity', 'unit_price', 'supplier'
+)
+
+# 值域有限、可由 ILIKE 改寫為等值比對的欄位（皆有索引）
+ENUM_COLUMNS = ('category', 'brand')
+
 # SQL 生成的系統提示詞
 SQL_GENERATION_PROMPT = f"""你是 PostgreSQL 專家。根據使用者問題產生單一 SQL 查詢。
 
@@ -92,9 +491,10 @@ SQL_GENERATION_PROMPT = f"""你是 PostgreSQL 專家。根據使用者問題產
 1. 只輸出 SQL，不能有解釋、Markdown、註解或多餘文字。
 2. 只能輸出一條查詢，不能含分號。
 3. 僅允許 SELECT，禁止任何寫入或 DDL 操作。
-4. 只能使用這個表與欄位:
+4. 只能使用以下資料表/視圖與欄位:
    - 表: inventory
    - 欄位: product_id, product_name, category, brand, model, specifications, stock_quantity, unit_price, supplier, last_updated
+   - 視圖: low_stock_alert、category_summary（欄位如上，查詢時需自行加 ORDER BY）
 5. 模糊比對請用 ILIKE '%關鍵字%'.
 6. 若問題涉及庫存，預設加上 stock_quantity > 0.
 7. 若問題涉及價格:
@@ -102,6 +502,8 @@ SQL_GENERATION_PROMPT = f"""你是 PostgreSQL 專家。根據使用者問題產
    - 「最貴/最高/較高」使用 ORDER BY unit_price DESC
 8. 若問題涉及庫存高低，使用 ORDER BY stock_quantity DESC.
 9. 除非問題明確要求全部結果，預設加 LIMIT 50.
+10. 問題為「低庫存/庫存不足/少於10件」時，從 low_stock_alert 查詢並 ORDER BY stock_quantity ASC.
+11. 問題為「各分類統計/分類總價值」時，從 category_summary 查詢.
 
 輸出格式:
 <單行 SQL 查詢>
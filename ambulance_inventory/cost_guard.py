@@ -0,0 +1,147 @@
+"""
+查詢成本防護模組
+執行前以 EXPLAIN 估計成本與回傳筆數，超過上限時自動加上 LIMIT 或拒絕執行
+"""
+
+from dataclasses import dataclass
+from typing import Optional, Dict, Any
+
+from .config import CostGuardConfig
+from .database import DatabaseClient
+from .sql_rewriter import limit_sql
+from .utils.deadline import Deadline, QueryAborted
+from .utils.logger import get_logger
+
+
+class QueryCostExceeded(Exception):
+    """查詢估計成本超過上限"""
+
+    def __init__(self, message: str, sql: str, estimate: 'CostEstimate'):
+        super().__init__(message)
+        self.sql = sql
+        self.estimate = estimate
+
+
+@dataclass
+class CostEstimate:
+    """查詢成本估計"""
+    sql: str
+    total_cost: float
+    plan_rows: int
+    limited: bool = False
+
+    @classmethod
+    def from_plan(cls, sql: str, plan: Dict[str, Any], limited: bool = False) -> 'CostEstimate':
+        """由 EXPLAIN 最上層計畫節點建立"""
+        return cls(
+            sql=sql,
+            total_cost=float(plan['Total Cost']),
+            plan_rows=int(plan['Plan Rows']),
+            limited=limited
+        )
+
+
+class QueryCostGuard:
+    """以 EXPLAIN 估計值防護高成本查詢"""
+
+    def __init__(self, db_client: DatabaseClient, config: CostGuardConfig):
+        """
+        初始化成本防護
+
+        Args:
+            db_client: 資料庫客戶端
+            config: 成本防護配置
+        """
+        self.db_client = db_client
+        self.config = config
+        self.logger = get_logger(__name__)
+
+    def check(
+        self,
+        sql: str,
+        deadline: Optional[Deadline] = None,
+        plan: Optional[Dict[str, Any]] = None
+    ) -> Optional[CostEstimate]:
+        """
+        檢查查詢成本（超過筆數或成本上限時嘗試加上 LIMIT）
+
+        Args:
+            sql: SQL 語句
+            deadline: 請求時限（可選）
+            plan: 已取得的執行計畫（可選，避免重複 EXPLAIN）
+
+        Returns:
+            成本估計（sql 可能已加上 LIMIT），停用或 EXPLAIN 失敗時返回 None
+
+        Raises:
+            QueryCostExceeded: 無法將成本降到上限內
+        """
+        if not self.config.enabled:
+            return None
+
+        if plan is None:
+            plan = self._explain(sql, deadline)
+            if plan is None:
+                return None
+
+        estimate = CostEstimate.from_plan(sql, plan)
+        if self._within_limits(estimate):
+            return estimate
+
+        self.logger.warning(
+            f"查詢估計超過上限: cost={estimate.total_cost:.0f}, rows={estimate.plan_rows}"
+        )
+
+        if self.config.auto_limit:
+            limited_sql = limit_sql(sql, self.config.max_rows)
+            if limited_sql is not None and limited_sql != sql:
+                limited_plan = self._explain(limited_sql, deadline)
+                if limited_plan is not None:
+                    limited = CostEstimate.from_plan(limited_sql, limited_plan, limited=True)
+                    if self._within_limits(limited):
+                        self.logger.info(
+                            f"已自動加上 LIMIT {self.config.max_rows}: "
+                            f"cost {estimate.total_cost:.0f} -> {limited.total_cost:.0f}"
+                        )
+                        return limited
+                    estimate = limited
+
+        raise QueryCostExceeded(
+            f"查詢估計成本過高（cost={estimate.total_cost:.0f}，上限 {self.config.max_cost:.0f}；"
+            f"rows={estimate.plan_rows}，上限 {self.config.max_rows}），請縮小查詢範圍",
+            sql,
+            estimate
+        )
+
+    def llm_skip_reason(self, estimate: Optional[CostEstimate]) -> str:
+        """
+        依預估筆數決定是否略過 LLM 回答
+
+        Args:
+            estimate: 成本估計
+
+        Returns:
+            略過原因，不需略過時為空字串
+        """
+        if estimate is None or estimate.plan_rows <= self.config.llm_max_rows:
+            return ""
+        return f"預估結果 {estimate.plan_rows} 筆，超過 LLM 回答上限 {self.config.llm_max_rows} 筆"
+
+    def _within_limits(self, estimate: CostEstimate) -> bool:
+        """估計值是否在成本與筆數上限內"""
+        return estimate.total_cost <= self.config.max_cost and estimate.plan_rows <= self.config.max_rows
+
+    def _explain(self, sql: str, deadline: Optional[Deadline]) -> Optional[Dict[str, Any]]:
+        """
+        取得執行計畫
+
+        Returns:
+            最上層計畫節點，失敗時返回 None（由實際執行回報錯誤）
+        """
+        try:
+            return self.db_client.explain(sql, deadline=deadline)
+        except QueryAborted:
+            raise
+        except Exception as e:
+            self.logger.warning(f"EXPLAIN 失敗，略過成本檢查: {str(e)}")
+            return None
@@ -8,28 +8,42 @@ from psycopg2.extras import RealDictCursor
 from typing import List, Dict, Any, Optional
 from decimal import Decimal
 import logging
+import time
 
-from .config import DatabaseConfig
+from contextlib import nullcontext
+
+from .config import DatabaseConfig, StatementStatsConfig
+from .metrics import DB_ERRORS_TOTAL, DB_CONNECTIONS_IN_USE
+from .statement_stats import StatementStats
+from .tracing import NOOP_SPAN, span
+from .utils.deadline import Deadline
 from .utils.logger import get_logger
+from .utils.sql_lexer import fingerprint_sql
 
 
 class DatabaseClient:
     """PostgreSQL 資料庫客戶端"""
 
-    def __init__(self, config: DatabaseConfig):
+    def __init__(self, config: DatabaseConfig, stats_config: Optional[StatementStatsConfig] = None):
         """
         初始化資料庫客戶端
 
         Args:
             config: 資料庫配置
+            stats_config: SQL 指紋統計配置（可選，未設定時不統計）
         """
         self.config = config
         self.logger = get_logger(__name__)
+        self.statement_stats: Optional[StatementStats] = None
+        if stats_config is not None:
+            self.statement_stats = StatementStats(stats_config, self.explain_analyze)
 
     def execute_query(
         self,
         sql: str,
-        params: Optional[tuple] = None
+        params: Optional[tuple] = None,
+        deadline: Optional[Deadline] = None,
+        record: bool = True
     ) -> List[Dict[str, Any]]:
         """
         執行 SQL 查詢
@@ -37,36 +51,72 @@ class DatabaseClient:
         Args:
             sql: SQL 查詢語句
             params: 查詢參數（可選）
+            deadline: 請求時限（可選，statement_timeout 不超過剩餘時間，取消時中斷查詢）
+            record: 是否計入指紋統計（EXPLAIN 等內部查詢不計入）
 
         Returns:
             查詢結果列表
 
         Raises:
-            psycopg2.Error: 資料庫錯誤
+            psycopg2.Error: 資料庫錯誤（超時或取消時為 QueryCanceledError）
+            QueryAborted: 執行前已超時或被取消
         """
         conn = None
         cursor = None
+        connected = None
 
         try:
-            # 建立連接
-            conn = psycopg2.connect(**self.config.to_dict())
-            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            with span('db.query') as trace_span:
+                if trace_span is not NOOP_SPAN:
+                    trace_span.set_attributes(sql_fingerprint=fingerprint_sql(sql))
+
+                # 建立連接
+                connect_args = self.config.to_dict()
+                remaining = None
+                if deadline is not None:
+                    deadline.check("database")
+                    remaining = deadline.remaining()
+                if remaining is not None:
+                    connect_args['connect_timeout'] = max(1, int(remaining))
 
-            # 執行查詢
-            if params:
-                cursor.execute(sql, params)
-            else:
-                cursor.execute(sql)
+                # 以連線參數設定 statement_timeout（不超過剩餘時間）與 work_mem，不需額外往返
+                connect_args['options'] = self._session_options(remaining)
 
-            # 獲取結果
-            results = cursor.fetchall()
+                start = time.perf_counter()
+                conn = psycopg2.connect(**connect_args)
+                DB_CONNECTIONS_IN_USE.inc()
+                cursor = conn.cursor(cursor_factory=RealDictCursor)
+                connected = time.perf_counter()
 
-            self.logger.info(f"查詢成功，返回 {len(results)} 筆結果")
+                # 取消時由另一執行緒中斷
+                cancel_scope = deadline.on_cancel(conn.cancel) if deadline is not None else nullcontext()
+                with cancel_scope:
+                    # 執行查詢
+                    if params:
+                        cursor.execute(sql, params)
+                    else:
+                        cursor.execute(sql)
 
-            return [dict(row) for row in results]
+                # 獲取結果
+                results = cursor.fetchall()
+
+                execute_ms = (time.perf_counter() - connected) * 1000
+                trace_span.set_attributes(
+                    connect_ms=round((connected - start) * 1000, 3),
+                    execute_ms=round(execute_ms, 3),
+                    row_count=len(results)
+                )
+                if self.statement_stats is not None and record:
+                    self.statement_stats.record(sql, execute_ms, len(results), params=params)
+                self.logger.info(f"查詢成功，返回 {len(results)} 筆結果")
+
+                return [dict(row) for row in results]
 
         except psycopg2.Error as e:
+            DB_ERRORS_TOTAL.inc(error=type(e).__name__)
             self.logger.error(f"資料庫錯誤: {str(e)}")
+            if self.statement_stats is not None and record and connected is not None:
+                self.statement_stats.record(sql, (time.perf_counter() - connected) * 1000, params=params, error=True)
             raise
 
         finally:
@@ -75,6 +125,101 @@ class DatabaseClient:
                 cursor.close()
             if conn:
                 conn.close()
+                DB_CONNECTIONS_IN_USE.dec()
+
+    def _session_options(self, remaining: Optional[float] = None) -> str:
+        """
+        產生連線的 session 參數
+
+        Args:
+            remaining: 請求剩餘時間（秒，可選）
+
+        Returns:
+            psycopg2 options 字串
+        """
+        timeout_ms = self.config.statement_timeout
+        if remaining is not None:
+            remaining_ms = max(1, int(remaining * 1000))
+            timeout_ms = min(timeout_ms, remaining_ms) if timeout_ms > 0 else remaining_ms
+
+        # SQL 驗證的詞法分析假設一般字串中的反斜線不是跳脫字元，不依賴伺服器設定
+        options = ["-c standard_conforming_strings=on"]
+        if timeout_ms > 0:
+            options.append(f"-c statement_timeout={timeout_ms}")
+        if self.config.work_mem:
+            options.append(f"-c work_mem={self.config.work_mem}")
+        return ' '.join(options)
+
+    def explain(self, sql: str, deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+        """
+        取得查詢的執行計畫（EXPLAIN，不實際執行查詢）
+
+        Args:
+            sql: SQL 查詢語句
+            deadline: 請求時限（可選）
+
+        Returns:
+            最上層計畫節點（含 'Total Cost'、'Plan Rows' 等欄位）
+
+        Raises:
+            psycopg2.Error: 資料庫錯誤
+        """
+        rows = self.execute_query(f"EXPLAIN (FORMAT JSON) {sql}", deadline=deadline, record=False)
+        return rows[0]['QUERY PLAN'][0]['Plan']
+
+    def explain_analyze(self, sql: str, params: Optional[tuple] = None) -> Dict[str, Any]:
+        """
+        實際執行查詢並取得執行計畫（EXPLAIN (ANALYZE, BUFFERS)，含各節點實際筆數、耗時與緩衝區讀取）
+
+        Args:
+            sql: SQL 查詢語句（只應傳入唯讀查詢）
+            params: 查詢參數（可選）
+
+        Returns:
+            計畫（含 'Plan'、'Planning Time'、'Execution Time'）
+
+        Raises:
+            psycopg2.Error: 資料庫錯誤
+        """
+        rows = self.execute_query(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}", params, record=False)
+        return rows[0]['QUERY PLAN'][0]
+
+    def execute_commands(self, statements: List[str]) -> None:
+        """
+        以 autocommit 依序執行 DDL/維護指令（如 CREATE INDEX CONCURRENTLY、ANALYZE）
+
+        不套用 statement_timeout，建立大型索引不會被中斷
+
+        Args:
+            statements: SQL 指令列表
+
+        Raises:
+            psycopg2.Error: 資料庫錯誤（已執行的指令不會回滾）
+        """
+        conn = None
+        cursor = None
+
+        try:
+            conn = psycopg2.connect(**self.config.to_dict())
+            DB_CONNECTIONS_IN_USE.inc()
+            conn.autocommit = True
+            cursor = conn.cursor()
+
+            for statement in statements:
+                self.logger.info(f"執行: {statement}")
+                cursor.execute(statement)
+
+        except psycopg2.Error as e:
+            DB_ERRORS_TOTAL.inc(error=type(e).__name__)
+            self.logger.error(f"資料庫錯誤: {str(e)}")
+            raise
+
+        finally:
+            if cursor:
+                cursor.close()
+            if conn:
+                conn.close()
+                DB_CONNECTIONS_IN_USE.dec()
 
     def test_connection(self) -> bool:
         """
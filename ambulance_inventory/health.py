@@ -0,0 +1,256 @@
+"""
+健康監控模組
+以背景執行緒探測資料庫與 Ollama，並以斷路器記錄各依賴的可用狀態
+"""
+
+import threading
+import time
+from enum import Enum
+from typing import Optional, Dict, Any, Callable
+
+from .config import HealthConfig
+from .utils.logger import get_logger
+
+
+class BreakerState(str, Enum):
+    """斷路器狀態"""
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    斷路器
+
+    - CLOSED: 正常，連續失敗達門檻後轉為 OPEN
+    - OPEN: 快速失敗，等待退避時間後轉為 HALF_OPEN 進行探測
+    - HALF_OPEN: 只放行一個試探請求（背景探測不受限），成功回到 CLOSED，
+      失敗則回到 OPEN 並加倍退避時間
+    """
+
+    def __init__(self, name: str, config: HealthConfig):
+        """
+        初始化斷路器
+
+        Args:
+            name: 依賴名稱
+            config: 健康監控配置
+        """
+        self.name = name
+        self.config = config
+        self.logger = get_logger(__name__)
+        self._lock = threading.Lock()
+        self._state = BreakerState.CLOSED
+        self._failures = 0
+        self._backoff = config.probe_base_backoff
+        self._opened_at: Optional[float] = None
+        self._next_probe_at = 0.0
+        self._last_check: Optional[float] = None
+        self._last_error: Optional[str] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> BreakerState:
+        """目前狀態（OPEN 且已到探測時間時轉為 HALF_OPEN）"""
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> BreakerState:
+        """目前狀態（呼叫端持有 _lock）"""
+        if self._state == BreakerState.OPEN and time.monotonic() >= self._next_probe_at:
+            self._state = BreakerState.HALF_OPEN
+            self._trial_in_flight = False
+        return self._state
+
+    def allow_request(self) -> bool:
+        """
+        是否允許請求通過（OPEN 時快速失敗，HALF_OPEN 時只放行一個試探請求）
+
+        試探請求的結果以 record_success() / record_failure() 回報；
+        未回報時由下一次背景探測決定斷路器狀態
+
+        Returns:
+            是否允許
+        """
+        with self._lock:
+            state = self._current_state()
+            if state == BreakerState.CLOSED:
+                return True
+            if state == BreakerState.OPEN or self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def probe_due(self) -> bool:
+        """
+        是否該進行探測
+
+        Returns:
+            CLOSED 時依固定間隔，OPEN/HALF_OPEN 時依退避時間
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._state == BreakerState.CLOSED:
+                return self._last_check is None or now - self._last_check >= self.config.check_interval
+            return now >= self._next_probe_at
+
+    def record_success(self) -> None:
+        """記錄成功"""
+        with self._lock:
+            self._last_check = time.monotonic()
+            if self._state != BreakerState.CLOSED:
+                self.logger.info(f"斷路器恢復: {self.name}")
+            self._state = BreakerState.CLOSED
+            self._failures = 0
+            self._backoff = self.config.probe_base_backoff
+            self._opened_at = None
+            self._last_error = None
+            self._trial_in_flight = False
+
+    def record_failure(self, error: str = "") -> None:
+        """
+        記錄失敗
+
+        Args:
+            error: 錯誤說明
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._last_check = now
+            self._last_error = error or None
+            self._failures += 1
+
+            if self._state == BreakerState.CLOSED:
+                if self._failures < self.config.failure_threshold:
+                    return
+                self._opened_at = now
+                self.logger.warning(f"斷路器開啟: {self.name} (連續失敗 {self._failures} 次) {error}")
+            else:
+                # 探測失敗：指數退避
+                self._backoff = min(self._backoff * 2, self.config.probe_max_backoff)
+
+            self._state = BreakerState.OPEN
+            self._next_probe_at = now + self._backoff
+            self._trial_in_flight = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        取得狀態快照
+
+        Returns:
+            狀態資訊
+        """
+        state = self.state
+        with self._lock:
+            now = time.monotonic()
+            return {
+                'state': state.value,
+                'available': state != BreakerState.OPEN,
+                'consecutive_failures': self._failures,
+                'last_error': self._last_error,
+                'seconds_since_check': round(now - self._last_check, 1) if self._last_check is not None else None,
+                'open_for': round(now - self._opened_at, 1) if self._opened_at is not None else None,
+                'next_probe_in': round(max(0.0, self._next_probe_at - now), 1) if state != BreakerState.CLOSED else None
+            }
+
+
+class HealthMonitor:
+    """背景健康監控"""
+
+    def __init__(self, checks: Dict[str, Callable[[], bool]], config: HealthConfig):
+        """
+        初始化健康監控
+
+        Args:
+            checks: 依賴名稱到探測函數的對應（探測函數返回是否健康）
+            config: 健康監控配置
+        """
+        self.checks = checks
+        self.config = config
+        self.logger = get_logger(__name__)
+        self.breakers = {name: CircuitBreaker(name, config) for name in checks}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """啟動背景探測執行緒"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="health-monitor", daemon=True)
+        self._thread.start()
+        self.logger.info(f"健康監控已啟動 (間隔 {self.config.check_interval}s)")
+
+    def stop(self) -> None:
+        """停止背景探測執行緒"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def is_available(self, name: str) -> bool:
+        """
+        依賴是否放行請求（斷路器未開啟；半開時只放行一個試探請求）
+
+        Args:
+            name: 依賴名稱
+
+        Returns:
+            是否可用
+        """
+        breaker = self.breakers.get(name)
+        return breaker.allow_request() if breaker else True
+
+    def record_success(self, name: str) -> None:
+        """
+        記錄實際請求成功（被動回饋）
+
+        Args:
+            name: 依賴名稱
+        """
+        if name in self.breakers:
+            self.breakers[name].record_success()
+
+    def record_failure(self, name: str, error: str = "") -> None:
+        """
+        記錄實際請求失敗（被動回饋）
+
+        Args:
+            name: 依賴名稱
+            error: 錯誤說明
+        """
+        if name in self.breakers:
+            self.breakers[name].record_failure(error)
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        """
+        取得所有依賴的狀態（純記憶體讀取）
+
+        Returns:
+            依賴名稱到狀態快照的對應
+        """
+        return {name: breaker.snapshot() for name, breaker in self.breakers.items()}
+
+    def check_now(self) -> None:
+        """立即探測所有到期的依賴"""
+        for name, check in self.checks.items():
+            breaker = self.breakers[name]
+            if not breaker.probe_due():
+                continue
+            try:
+                ok = check()
+                error = "" if ok else "health check returned false"
+            except Exception as e:
+                ok = False
+                error = str(e)
+
+            if ok:
+                breaker.record_success()
+            else:
+                breaker.record_failure(error)
+
+    def _run(self) -> None:
+        """背景探測迴圈"""
+        while not self._stop.is_set():
+            self.check_now()
+            self._stop.wait(self.config.tick_interval)
@@ -0,0 +1,381 @@
+"""
+索引建議模組
+從已執行的 SQL 統計 ILIKE/LIKE、lower() 比對與範圍條件使用的欄位，
+建議 pg_trgm GIN、運算式或 B-tree 索引，並可產生/套用遷移指令
+
+使用方式:
+    python -m ambulance_inventory.index_advisor --sql-file queries.sql [--apply]
+"""
+
+import argparse
+import re
+import sys
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from typing import Optional, Dict, Any, List, Iterable, Tuple
+
+from .config import IndexAdvisorConfig, DatabaseConfig
+from .database import DatabaseClient
+from .utils.logger import get_logger
+from .utils.sql_lexer import analyze_sql, TokenType
+
+
+class IndexKind:
+    """索引類型"""
+    TRIGRAM = "trigram"
+    EXPRESSION = "expression"
+    BTREE = "btree"
+
+
+_RANGE_OPERATORS = frozenset({'<', '>', '<=', '>='})
+_CASE_FUNCTIONS = frozenset({'lower', 'upper'})
+
+
+@dataclass
+class IndexRecommendation:
+    """索引建議"""
+    table: str
+    column: str
+    kind: str
+    occurrences: int
+    function: str = ""
+
+    @property
+    def name(self) -> str:
+        """索引名稱"""
+        if self.kind == IndexKind.TRIGRAM:
+            return f"idx_{self.table}_{self.column}_trgm"
+        if self.kind == IndexKind.EXPRESSION:
+            return f"idx_{self.table}_{self.function}_{self.column}"
+        return f"idx_{self.table}_{self.column}"
+
+    @property
+    def reason(self) -> str:
+        """建議原因"""
+        if self.kind == IndexKind.TRIGRAM:
+            return f"{self.column} 以 ILIKE/LIKE 萬用字元比對 {self.occurrences} 次（B-tree 無法使用）"
+        if self.kind == IndexKind.EXPRESSION:
+            return f"{self.function}({self.column}) 比對 {self.occurrences} 次"
+        return f"{self.column} 範圍條件 {self.occurrences} 次"
+
+    def ddl(self, concurrently: bool = True) -> str:
+        """
+        建立索引的 DDL
+
+        Args:
+            concurrently: 是否使用 CONCURRENTLY（不鎖定寫入）
+
+        Returns:
+            CREATE INDEX 指令
+        """
+        mode = "CONCURRENTLY " if concurrently else ""
+        if self.kind == IndexKind.TRIGRAM:
+            target = f"USING gin ({self.column} gin_trgm_ops)"
+        elif self.kind == IndexKind.EXPRESSION:
+            target = f"({self.function}({self.column}))"
+        else:
+            target = f"({self.column})"
+        return f"CREATE INDEX {mode}IF NOT EXISTS {self.name} ON {self.table} {target}"
+
+    def is_covered_by(self, indexdef: str) -> bool:
+        """
+        是否已有索引涵蓋此建議
+
+        Args:
+            indexdef: pg_indexes.indexdef
+
+        Returns:
+            是否涵蓋
+        """
+        definition = indexdef.lower()
+        column = re.escape(self.column)
+        if self.kind == IndexKind.TRIGRAM:
+            return 'using gin' in definition and re.search(rf'\(\s*{column}\s+gin_trgm_ops', definition) is not None
+        if self.kind == IndexKind.EXPRESSION:
+            return re.search(rf'{self.function}\(\(?{column}\)?(::\w+)?\)', definition) is not None
+        # B-tree：欄位為索引的第一個欄位
+        return 'using btree' in definition and re.search(rf'\(\s*{column}\s*[,)]', definition) is not None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """轉換為字典格式（用於 API 回應）"""
+        return {
+            'table': self.table,
+            'column': self.column,
+            'kind': self.kind,
+            'occurrences': self.occurrences,
+            'name': self.name,
+            'reason': self.reason,
+            'ddl': self.ddl()
+        }
+
+
+def extract_predicates(sql: str) -> List[Tuple[str, str, str, str]]:
+    """
+    從 SQL 擷取可用索引加速的條件
+
+    Args:
+        sql: SQL 語句
+
+    Returns:
+        (資料表, 欄位, 索引類型, 函數) 列表；多資料表查詢返回空列表
+    """
+    analysis = analyze_sql(sql)
+    if len(analysis.tables) != 1:
+        return []
+    table = next(iter(analysis.tables))
+    tokens = analysis.tokens
+    found = []
+
+    for index, token in enumerate(tokens):
+        if token.type is not TokenType.IDENTIFIER:
+            continue
+        column = token.value.lower()
+        following = tokens[index + 1] if index + 1 < len(tokens) else None
+        if following is None:
+            continue
+
+        # lower(col) = ... / lower(col) LIKE ...
+        if column in _CASE_FUNCTIONS and following.value == '(':
+            window = tokens[index + 2:index + 5]
+            if len(window) == 3 and window[0].type is TokenType.IDENTIFIER and window[1].value == ')' and \
+                    (window[2].value == '=' or window[2].upper == 'LIKE'):
+                found.append((table, window[0].value.lower(), IndexKind.EXPRESSION, column))
+            continue
+
+        if column not in analysis.columns:
+            continue
+
+        if following.type is TokenType.KEYWORD and following.upper in ('ILIKE', 'LIKE'):
+            literal = tokens[index + 2] if index + 2 < len(tokens) else None
+            if literal is not None and literal.type is TokenType.STRING and \
+                    (following.upper == 'ILIKE' or literal.value.lstrip("EeNn").startswith(("'%", "'_"))):
+                found.append((table, column, IndexKind.TRIGRAM, ""))
+        elif (following.type is TokenType.OPERATOR and following.value in _RANGE_OPERATORS) or \
+                (following.type is TokenType.KEYWORD and following.upper == 'BETWEEN'):
+            found.append((table, column, IndexKind.BTREE, ""))
+
+    return found
+
+
+class IndexAdvisor:
+    """依已執行 SQL 建議索引"""
+
+    def __init__(self, db_client: Optional[DatabaseClient], config: IndexAdvisorConfig):
+        """
+        初始化索引建議器
+
+        Args:
+            db_client: 資料庫客戶端（讀取現有索引與套用建議用，可為 None）
+            config: 索引建議配置
+        """
+        self.db_client = db_client
+        self.config = config
+        self.logger = get_logger(__name__)
+        self._counts: Counter = Counter()
+        self._statements = 0
+        self._non_ascii_patterns = False
+        self._lock = threading.Lock()
+
+    def observe(self, sql: str) -> None:
+        """
+        記錄一條已執行的 SQL
+
+        Args:
+            sql: SQL 語句
+        """
+        if not self.config.enabled:
+            return
+        predicates = extract_predicates(sql)
+        non_ascii = any(ord(char) > 127 for char in sql) and any(
+            kind == IndexKind.TRIGRAM for _, _, kind, _ in predicates
+        )
+        with self._lock:
+            self._statements += 1
+            self._counts.update(predicates)
+            self._non_ascii_patterns = self._non_ascii_patterns or non_ascii
+
+    def observe_many(self, statements: Iterable[str]) -> None:
+        """
+        記錄多條已執行的 SQL
+
+        Args:
+            statements: SQL 語句
+        """
+        for sql in statements:
+            self.observe(sql)
+
+    @property
+    def observed_statements(self) -> int:
+        """已記錄的 SQL 數"""
+        with self._lock:
+            return self._statements
+
+    def existing_indexes(self, table: str) -> List[str]:
+        """
+        取得資料表現有索引定義
+
+        Args:
+            table: 資料表名稱
+
+        Returns:
+            indexdef 列表（無資料庫或失敗時為空列表）
+        """
+        if self.db_client is None:
+            return []
+        try:
+            rows = self.db_client.execute_query(
+                "SELECT indexdef FROM pg_indexes WHERE tablename = %s", (table,)
+            )
+            return [row['indexdef'] for row in rows]
+        except Exception as e:
+            self.logger.warning(f"讀取現有索引失敗: {str(e)}")
+            return []
+
+    def recommend(self) -> List[IndexRecommendation]:
+        """
+        產生索引建議（排除已有索引涵蓋者，依使用次數排序）
+
+        Returns:
+            索引建議列表
+        """
+        with self._lock:
+            counts = list(self._counts.items())
+
+        recommendations = [
+            IndexRecommendation(table=table, column=column, kind=kind, occurrences=count, function=function)
+            for (table, column, kind, function), count in counts
+            if count >= self.config.min_occurrences
+        ]
+
+        existing: Dict[str, List[str]] = {}
+        result = []
+        for recommendation in recommendations:
+            if recommendation.table not in existing:
+                existing[recommendation.table] = self.existing_indexes(recommendation.table)
+            if any(recommendation.is_covered_by(indexdef) for indexdef in existing[recommendation.table]):
+                continue
+            result.append(recommendation)
+
+        return sorted(result, key=lambda item: (-item.occurrences, item.name))
+
+    def warnings(self, recommendations: List[IndexRecommendation]) -> List[str]:
+        """
+        套用建議前的注意事項
+
+        Args:
+            recommendations: 索引建議
+
+        Returns:
+            警告訊息列表
+        """
+        warnings = []
+        if not any(item.kind == IndexKind.TRIGRAM for item in recommendations):
+            return warnings
+
+        with self._lock:
+            non_ascii = self._non_ascii_patterns
+        if non_ascii and self.db_client is not None:
+            try:
+                ctype = self.db_client.execute_query("SHOW lc_ctype")[0]['lc_ctype']
+                if ctype.upper() in ('C', 'POSIX'):
+                    warnings.append(
+                        f"資料庫 lc_ctype={ctype}：pg_trgm 會忽略中文等非 ASCII 字元，"
+                        "中文關鍵字的 ILIKE 無法由 trigram 索引加速"
+                    )
+            except Exception as e:
+                self.logger.debug(f"讀取 lc_ctype 失敗: {str(e)}")
+        return warnings
+
+    def migration(self, recommendations: List[IndexRecommendation], concurrently: bool = True) -> List[str]:
+        """
+        產生遷移指令
+
+        Args:
+            recommendations: 索引建議
+            concurrently: 是否使用 CREATE INDEX CONCURRENTLY
+
+        Returns:
+            SQL 指令列表（含 pg_trgm 擴充與 ANALYZE）
+        """
+        statements = []
+        if any(item.kind == IndexKind.TRIGRAM for item in recommendations):
+            statements.append("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        statements.extend(item.ddl(concurrently) for item in recommendations)
+        for table in sorted({item.table for item in recommendations}):
+            statements.append(f"ANALYZE {table}")
+        return statements
+
+    def apply(self, recommendations: List[IndexRecommendation], concurrently: bool = True) -> List[str]:
+        """
+        套用索引建議
+
+        Args:
+            recommendations: 索引建議
+            concurrently: 是否使用 CREATE INDEX CONCURRENTLY
+
+        Returns:
+            已執行的 SQL 指令
+
+        Raises:
+            RuntimeError: 未設定資料庫客戶端
+        """
+        if self.db_client is None:
+            raise RuntimeError("Database client not configured")
+        statements = self.migration(recommendations, concurrently)
+        if statements:
+            self.db_client.execute_commands(statements)
+        return statements
+
+
+def read_sql_file(path: str) -> List[str]:
+    """
+    讀取 SQL 檔案（每行一條，或以分號分隔；-- 開頭的行略過）
+
+    Args:
+        path: 檔案路徑
+
+    Returns:
+        SQL 語句列表
+    """
+    with open(path, encoding='utf-8') as f:
+        text = '\n'.join(line for line in f if not line.lstrip().startswith('--'))
+    parts = text.split(';') if ';' in text else text.splitlines()
+    return [part.strip() for part in parts if part.strip()]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """索引建議命令列入口"""
+    parser = argparse.ArgumentParser(description="依已執行 SQL 建議並套用索引")
+    parser.add_argument('--sql-file', required=True, help="已執行 SQL 檔案（每行一條或以分號分隔）")
+    parser.add_argument('--min-occurrences', type=int, default=None, help="建議所需的最少出現次數")
+    parser.add_argument('--apply', action='store_true', help="套用建議（預設只輸出遷移指令）")
+    parser.add_argument('--no-concurrently', action='store_true', help="不使用 CREATE INDEX CONCURRENTLY")
+    args = parser.parse_args(argv)
+
+    config = IndexAdvisorConfig.from_env()
+    if args.min_occurrences is not None:
+        config.min_occurrences = args.min_occurrences
+
+    advisor = IndexAdvisor(DatabaseClient(DatabaseConfig.from_env()), config)
+    advisor.observe_many(read_sql_file(args.sql_file))
+
+    recommendations = advisor.recommend()
+    print(f"-- 已分析 {advisor.observed_statements} 條 SQL，建議 {len(recommendations)} 個索引")
+    for item in recommendations:
+        print(f"-- {item.name}: {item.reason}")
+    for warning in advisor.warnings(recommendations):
+        print(f"-- 警告: {warning}")
+
+    concurrently = not args.no_concurrently
+    if args.apply:
+        for statement in advisor.apply(recommendations, concurrently):
+            print(f"{statement};  -- 已套用")
+    else:
+        for statement in advisor.migration(recommendations, concurrently):
+            print(f"{statement};")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
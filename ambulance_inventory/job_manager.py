@@ -0,0 +1,272 @@
+"""
+非同步查詢任務模組
+以有界的工作執行緒池執行長時間的 LLM 查詢，並保存部分結果與最終結果
+"""
+
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Optional, Dict, Any, Callable, List
+
+from .config import JobConfig
+from .metrics import QUERIES_TOTAL
+from .query_engine import QueryEngine
+from .tracing import start_trace
+from .utils.deadline import Deadline
+from .utils.logger import get_logger, set_request_id
+
+
+class JobStatus(str, Enum):
+    """任務狀態"""
+    PENDING = "pending"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class JobQueueFullError(Exception):
+    """待處理任務已達上限"""
+
+
+@dataclass
+class QueryJob:
+    """查詢任務"""
+    job_id: str
+    question: str
+    use_llm_answer: bool
+    model: Optional[str]
+    timeout: Optional[float] = None
+    status: JobStatus = JobStatus.PENDING
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    partial: Dict[str, Any] = field(default_factory=dict)
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+    @property
+    def is_finished(self) -> bool:
+        """任務是否已結束（成功或失敗）"""
+        return self.status in (JobStatus.SUCCEEDED, JobStatus.FAILED)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """轉換為字典格式（工作執行緒會同時更新任務，呼叫端需持有 JobManager 的鎖，見 JobManager.job_dict）"""
+        return {
+            'job_id': self.job_id,
+            'status': self.status.value,
+            'question': self.question,
+            'model': self.model,
+            'use_llm_answer': self.use_llm_answer,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'partial': dict(self.partial),
+            'result': self.result,
+            'error': self.error
+        }
+
+
+class JobManager:
+    """非同步查詢任務管理器"""
+
+    def __init__(
+        self,
+        engine_provider: Callable[[], Optional[QueryEngine]],
+        config: JobConfig
+    ):
+        """
+        初始化任務管理器
+
+        Args:
+            engine_provider: 取得目前查詢引擎的函數（模型切換後引擎會重建）
+            config: 任務配置
+        """
+        self.engine_provider = engine_provider
+        self.config = config
+        self.logger = get_logger(__name__)
+        self._jobs: Dict[str, QueryJob] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=config.max_workers,
+            thread_name_prefix="query-job"
+        )
+
+    def submit(
+        self,
+        question: str,
+        use_llm_answer: bool = True,
+        model: Optional[str] = None,
+        timeout: Optional[float] = None
+    ) -> QueryJob:
+        """
+        提交查詢任務（立即返回）
+
+        Args:
+            question: 用戶問題
+            use_llm_answer: 是否使用 LLM 生成回答
+            model: 使用的模型（可選）
+            timeout: 執行時限（秒，自開始執行起算，None 表示不限時）
+
+        Returns:
+            新建立的任務
+
+        Raises:
+            JobQueueFullError: 待處理任務已達上限
+        """
+        self._expire_finished()
+
+        with self._lock:
+            pending = sum(1 for job in self._jobs.values() if not job.is_finished)
+            if pending >= self.config.max_pending:
+                raise JobQueueFullError(f"待處理任務已達上限 ({self.config.max_pending})")
+
+            job = QueryJob(
+                job_id=uuid.uuid4().hex,
+                question=question,
+                use_llm_answer=use_llm_answer,
+                model=model,
+                timeout=timeout
+            )
+            self._jobs[job.job_id] = job
+
+        self._executor.submit(self._run, job)
+        self.logger.info(f"任務已提交: {job.job_id} ({question})")
+
+        return job
+
+    def get(self, job_id: str) -> Optional[QueryJob]:
+        """
+        取得任務（已過期或不存在時返回 None）
+
+        Args:
+            job_id: 任務 ID
+
+        Returns:
+            任務物件
+        """
+        self._expire_finished()
+
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def job_dict(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        取得任務的字典格式（持有鎖時複製，不會讀到更新到一半的部分結果）
+
+        Args:
+            job_id: 任務 ID
+
+        Returns:
+            任務字典，已過期或不存在時返回 None
+        """
+        self._expire_finished()
+
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job.to_dict() if job is not None else None
+
+    def list_jobs(self) -> List[QueryJob]:
+        """
+        取得所有未過期的任務
+
+        Returns:
+            任務列表
+        """
+        self._expire_finished()
+
+        with self._lock:
+            return list(self._jobs.values())
+
+    def shutdown(self, wait: bool = False) -> None:
+        """
+        關閉工作執行緒池
+
+        Args:
+            wait: 是否等待執行中的任務完成
+        """
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _run(self, job: QueryJob) -> None:
+        """
+        在工作執行緒中執行任務
+
+        Args:
+            job: 要執行的任務
+        """
+        # 任務在工作執行緒中執行，日誌以任務 ID 作為請求 ID
+        set_request_id(job.job_id)
+
+        with self._lock:
+            job.status = JobStatus.RUNNING
+            job.started_at = time.time()
+        # 排隊時間不計入時限
+        deadline = Deadline(job.timeout)
+
+        def on_progress(stage: str, payload: Dict[str, Any]) -> None:
+            with self._lock:
+                job.partial.update(payload)
+                job.partial['stage'] = stage
+
+        try:
+            engine = self.engine_provider()
+            if engine is None:
+                raise RuntimeError("Query engine not initialized")
+
+            with start_trace('query_job', job_id=job.job_id, model=job.model, use_llm_answer=job.use_llm_answer):
+                sql, llm_answer, formatted_answer, html_table, raw_results, timing = engine.query_with_mode(
+                    job.question,
+                    use_llm_answer=job.use_llm_answer,
+                    model=job.model,
+                    on_progress=on_progress,
+                    deadline=deadline
+                )
+
+            if sql is None:
+                raise RuntimeError("Query failed - Ollama may not be responding")
+
+            result = {
+                'sql': sql,
+                'answer': llm_answer or "",
+                'answer_formatted': formatted_answer,
+                'answer_html': html_table,
+                'results': raw_results,
+                'result_count': len(raw_results) if raw_results else 0,
+                'timing': timing
+            }
+
+            with self._lock:
+                result['llm_skip_reason'] = job.partial.get('llm_skip_reason')
+                result['llm_skip_cause'] = job.partial.get('llm_skip_cause')
+                result['estimated_rows'] = job.partial.get('estimated_rows')
+                job.result = result
+                job.status = JobStatus.SUCCEEDED
+                job.finished_at = time.time()
+
+            QUERIES_TOTAL.inc(endpoint='/query/jobs', status='success')
+            self.logger.info(f"任務完成: {job.job_id}")
+
+        except Exception as e:
+            QUERIES_TOTAL.inc(endpoint='/query/jobs', status='failed')
+            self.logger.error(f"任務失敗: {job.job_id} - {str(e)}")
+            with self._lock:
+                job.error = str(e)
+                job.status = JobStatus.FAILED
+                job.finished_at = time.time()
+
+    def _expire_finished(self) -> None:
+        """移除超過 TTL 的已完成任務"""
+        cutoff = time.time() - self.config.ttl_seconds
+
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job.is_finished and job.finished_at is not None and job.finished_at < cutoff
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+        if expired:
+            self.logger.debug(f"已清除 {len(expired)} 個過期任務")
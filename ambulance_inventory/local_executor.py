@@ -0,0 +1,811 @@
+"""
+本地查詢執行模組
+以 NumPy 欄位陣列保存 inventory，並在行程內執行常見的單表 SELECT：
+等值/範圍/ILIKE 條件、ORDER BY、LIMIT/OFFSET、DISTINCT 與 GROUP BY 聚合
+（COUNT/SUM/AVG/MIN/MAX）。不支援的語法丟出 UnsupportedQuery，由呼叫端改送 PostgreSQL
+
+語意與 PostgreSQL 一致：NULL 三值邏輯、ASC 時 NULL 排最後、DESC 時排最前；
+文字以字碼順序比較（與 C locale 相同）。unit_price 與 AVG 以 float 回傳（資料庫為 Decimal）
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Optional, Dict, Any, List, Tuple, Callable
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:  # pragma: no cover - numpy 為選用依賴
+    np = None
+    HAS_NUMPY = False
+
+from .config import INVENTORY_COLUMNS
+from .sql_rewriter import like_to_regex
+from .utils.sql_lexer import tokenize, Token, TokenType
+
+
+TABLE_NAME = 'inventory'
+
+# 欄位儲存方式
+NUMERIC_COLUMNS = ('stock_quantity', 'unit_price')
+INTEGER_COLUMNS = frozenset({'stock_quantity'})
+DICTIONARY_COLUMNS = ('category', 'brand', 'supplier')
+TIMESTAMP_COLUMNS = frozenset({'last_updated'})
+
+_AGGREGATES = frozenset({'count', 'sum', 'avg', 'min', 'max'})
+_COMPARISONS = {
+    '=': lambda a, b: a == b,
+    '<>': lambda a, b: a != b,
+    '!=': lambda a, b: a != b,
+    '<': lambda a, b: a < b,
+    '>': lambda a, b: a > b,
+    '<=': lambda a, b: a <= b,
+    '>=': lambda a, b: a >= b,
+}
+
+
+class UnsupportedQuery(Exception):
+    """本地執行器不支援的查詢（交由 PostgreSQL 執行）"""
+
+
+class ColumnStore:
+    """
+    inventory 的欄位式儲存
+
+    - stock_quantity / unit_price: float64（NULL 為 NaN）
+    - category / brand / supplier: 字典編碼 int32（NULL 為 -1）
+    - 其餘文字與時間欄位: object 陣列
+    - live: 已刪除位置的遮罩（沒有刪除時為 None）
+
+    建立後視為不可變：增量變更由 patch() 產生新物件，未變更的欄位陣列共用
+    """
+
+    def __init__(self, rows: List[Dict[str, Any]], dictionaries: Optional[Dict[str, List[str]]] = None):
+        """
+        由資料列建立欄位陣列
+
+        Args:
+            rows: 資料列（含 INVENTORY_COLUMNS 所有欄位）
+            dictionaries: 沿用的字典（編碼保持穩定，新值附加在後）
+        """
+        self.row_count = len(rows)
+        self.numeric: Dict[str, Any] = {}
+        self.codes: Dict[str, Any] = {}
+        self.dictionaries: Dict[str, List[str]] = {}
+        self.objects: Dict[str, Any] = {}
+        self._decoders: Dict[str, Any] = {}
+        self._nulls: Dict[str, Any] = {}
+        self.live: Optional[Any] = None
+
+        for column in NUMERIC_COLUMNS:
+            self.numeric[column] = np.array(
+                [np.nan if row[column] is None else float(row[column]) for row in rows], dtype=np.float64
+            )
+
+        for column in DICTIONARY_COLUMNS:
+            values = list((dictionaries or {}).get(column, []))
+            index = {value: code for code, value in enumerate(values)}
+            codes = np.empty(self.row_count, dtype=np.int32)
+            for position, row in enumerate(rows):
+                value = row[column]
+                if value is None:
+                    codes[position] = -1
+                    continue
+                code = index.get(value)
+                if code is None:
+                    code = index[value] = len(values)
+                    values.append(value)
+                codes[position] = code
+            self.codes[column] = codes
+            self.dictionaries[column] = values
+            # 最後一格為 NULL，codes 為 -1 時直接索引到它
+            self._decoders[column] = np.array(values + [None], dtype=object)
+
+        for column in INVENTORY_COLUMNS:
+            if column in self.numeric or column in self.codes:
+                continue
+            array = np.empty(self.row_count, dtype=object)
+            array[:] = [row[column] for row in rows]
+            self.objects[column] = array
+
+    def patch(
+        self,
+        updates: List[Tuple[int, Dict[str, Any]]],
+        appended: List[Dict[str, Any]],
+        deleted: List[int]
+    ) -> 'ColumnStore':
+        """
+        套用增量變更產生新的欄位儲存（只複製有變更的欄位陣列，不重新編碼未變更的資料列）
+
+        Args:
+            updates: (位置, 新資料列) 列表
+            appended: 新增的資料列（附加在最後）
+            deleted: 刪除的位置（以 live 遮罩排除，下次完整重建時才移除）
+
+        Returns:
+            新的欄位儲存
+        """
+        store = object.__new__(ColumnStore)
+        store.row_count = self.row_count + len(appended)
+        store.numeric, store.codes, store.objects, store._nulls = {}, {}, {}, {}
+        store.dictionaries = dict(self.dictionaries)
+        store._decoders = dict(self._decoders)
+
+        def patched(column: str, current: Any, encode: Callable[[Any], Any]) -> Any:
+            """套用變更後的欄位陣列（欄位沒有變更時共用原陣列與 NULL 遮罩）"""
+            changed = []
+            for position, row in updates:
+                value = encode(row[column])
+                old = current[position]
+                # NaN（NULL）不等於自己，兩者皆為 NaN 時視為未變更
+                if not (value is old or value == old or (value != value and old != old)):
+                    changed.append((position, value))
+            if not changed and not appended:
+                if column in self._nulls:
+                    store._nulls[column] = self._nulls[column]
+                return current
+            array = np.empty(store.row_count, dtype=current.dtype)
+            array[:self.row_count] = current
+            if appended:
+                array[self.row_count:] = [encode(row[column]) for row in appended]
+            for position, value in changed:
+                array[position] = value
+            return array
+
+        for column in NUMERIC_COLUMNS:
+            store.numeric[column] = patched(
+                column, self.numeric[column], lambda value: np.nan if value is None else float(value)
+            )
+
+        for column in DICTIONARY_COLUMNS:
+            values = list(self.dictionaries[column])
+            index = {value: code for code, value in enumerate(values)}
+
+            def encode(value: Any, index: Dict[str, int] = index, values: List[str] = values) -> int:
+                if value is None:
+                    return -1
+                code = index.get(value)
+                if code is None:
+                    code = index[value] = len(values)
+                    values.append(value)
+                return code
+
+            store.codes[column] = patched(column, self.codes[column], encode)
+            if len(values) != len(self.dictionaries[column]):
+                store.dictionaries[column] = values
+                store._decoders[column] = np.array(values + [None], dtype=object)
+
+        for column, current in self.objects.items():
+            store.objects[column] = patched(column, current, lambda value: value)
+
+        store.live = self.live
+        if deleted or (appended and self.live is not None):
+            store.live = np.ones(store.row_count, dtype=bool)
+            if self.live is not None:
+                store.live[:self.row_count] = self.live
+            store.live[np.array(deleted, dtype=np.int64)] = False
+        return store
+
+    def kind(self, column: str) -> str:
+        """
+        欄位類型
+
+        Returns:
+            'numeric'、'text' 或 'timestamp'
+
+        Raises:
+            UnsupportedQuery: 非 inventory 欄位
+        """
+        if column in self.numeric:
+            return 'numeric'
+        if column in TIMESTAMP_COLUMNS:
+            return 'timestamp'
+        if column in self.codes or column in self.objects:
+            return 'text'
+        raise UnsupportedQuery(f"未知欄位: {column}")
+
+    def values(self, column: str):
+        """欄位值陣列（字典編碼欄位解碼為 object 陣列）"""
+        if column in self.numeric:
+            return self.numeric[column]
+        if column in self.codes:
+            return self._decoders[column][self.codes[column]]
+        return self.objects[column]
+
+    def null_mask(self, column: str):
+        """NULL 遮罩"""
+        mask = self._nulls.get(column)
+        if mask is None:
+            if column in self.numeric:
+                mask = np.isnan(self.numeric[column])
+            elif column in self.codes:
+                mask = self.codes[column] < 0
+            else:
+                mask = np.fromiter((value is None for value in self.objects[column]), bool, self.row_count)
+            self._nulls[column] = mask
+        return mask
+
+    def text_match(self, column: str, predicate: Callable[[str], bool]):
+        """
+        以 Python 判斷式比對文字欄位（字典編碼欄位每個不同值只判斷一次）
+
+        Returns:
+            布林遮罩（NULL 為 False）
+        """
+        if column in self.codes:
+            lookup = np.array([predicate(value) for value in self.dictionaries[column]] + [False], dtype=bool)
+            return lookup[self.codes[column]]
+        return np.fromiter(
+            (value is not None and predicate(value) for value in self.objects[column]), bool, self.row_count
+        )
+
+
+@dataclass(frozen=True)
+class SelectItem:
+    """SELECT 項目（aggregate 為 None 時為一般欄位或乘積）"""
+    name: str
+    columns: Tuple[str, ...] = ()
+    aggregate: Optional[str] = None
+
+    @property
+    def key(self) -> Tuple:
+        """不含輸出名稱的識別鍵（比對 ORDER BY 與 SELECT 項目）"""
+        return (self.columns, self.aggregate)
+
+
+@dataclass
+class LocalPlan:
+    """已編譯的本地查詢"""
+    items: List[SelectItem]
+    where: Optional[Tuple] = None
+    group_by: Tuple[str, ...] = ()
+    distinct: bool = False
+    order_by: Tuple[Tuple[Any, bool, bool], ...] = ()
+    limit: Optional[int] = None
+    offset: int = 0
+
+    @property
+    def grouped(self) -> bool:
+        """是否為分組/聚合查詢"""
+        return self.distinct or bool(self.group_by) or any(item.aggregate for item in self.items)
+
+
+def compile_sql(sql: str) -> LocalPlan:
+    """
+    將 SQL 編譯為本地查詢
+
+    Args:
+        sql: SQL 語句
+
+    Returns:
+        LocalPlan
+
+    Raises:
+        UnsupportedQuery: 超出支援範圍
+    """
+    return _Parser(tokenize(sql)).parse()
+
+
+class _Parser:
+    """支援子集的遞迴下降解析器"""
+
+    def __init__(self, tokens: List[Token]):
+        self.tokens = tokens
+        self.pos = 0
+        self.alias: Optional[str] = None
+
+    def peek(self, offset: int = 0) -> Optional[Token]:
+        index = self.pos + offset
+        return self.tokens[index] if index < len(self.tokens) else None
+
+    def next(self) -> Token:
+        token = self.peek()
+        if token is None:
+            raise UnsupportedQuery("語句不完整")
+        self.pos += 1
+        return token
+
+    def accept(self, *values: str) -> Optional[Token]:
+        """下一個 token 為指定關鍵字/符號時取出"""
+        token = self.peek()
+        if token is not None and token.type in (TokenType.KEYWORD, TokenType.OPERATOR, TokenType.PUNCTUATION) \
+                and token.upper in values:
+            self.pos += 1
+            return token
+        return None
+
+    def expect(self, *values: str) -> Token:
+        token = self.accept(*values)
+        if token is None:
+            raise UnsupportedQuery(f"預期 {'/'.join(values)}")
+        return token
+
+    def parse(self) -> LocalPlan:
+        if any(token.type in (TokenType.COMMENT, TokenType.QUOTED_IDENTIFIER, TokenType.UNTERMINATED)
+               for token in self.tokens):
+            raise UnsupportedQuery("含註解或引號識別字")
+
+        self.expect('SELECT')
+        distinct = self.accept('DISTINCT') is not None
+        # 先略過 SELECT 清單，解析 FROM 取得別名後再回頭解析
+        select_start = self.pos
+        depth = 0
+        while True:
+            token = self.next()
+            if token.value == '(':
+                depth += 1
+            elif token.value == ')':
+                depth -= 1
+            elif depth == 0 and token.type is TokenType.KEYWORD and token.upper == 'FROM':
+                break
+        from_pos = self.pos - 1
+        self._parse_from()
+        after_from = self.pos
+
+        self.pos = select_start
+        items = self._parse_select_list(from_pos)
+        self.pos = after_from
+
+        plan = LocalPlan(items=items, distinct=distinct)
+        if self.accept('WHERE'):
+            plan.where = self._parse_or()
+        if self.accept('GROUP'):
+            self.expect('BY')
+            group_by = [self._parse_column()]
+            while self.accept(','):
+                group_by.append(self._parse_column())
+            plan.group_by = tuple(group_by)
+        if self.accept('ORDER'):
+            self.expect('BY')
+            plan.order_by = tuple(self._parse_order_list(items))
+        while True:
+            if self.accept('LIMIT'):
+                plan.limit = None if self.accept('ALL') else self._parse_integer()
+            elif self.accept('OFFSET'):
+                plan.offset = self._parse_integer()
+            else:
+                break
+        self.accept(';')
+        if self.peek() is not None:
+            raise UnsupportedQuery(f"不支援的語法: {self.peek().value}")
+
+        self._check_grouping(plan)
+        return plan
+
+    def _parse_from(self) -> None:
+        table = self.next()
+        if table.type is not TokenType.IDENTIFIER or table.value.lower() != TABLE_NAME:
+            raise UnsupportedQuery("僅支援 inventory 單表查詢")
+        self.accept('AS')
+        token = self.peek()
+        if token is not None and token.type is TokenType.IDENTIFIER:
+            self.alias = self.next().value.lower()
+
+    def _parse_select_list(self, end: int) -> List[SelectItem]:
+        items: List[SelectItem] = []
+        while True:
+            if self.accept('*'):
+                items.extend(SelectItem(column, (column,)) for column in INVENTORY_COLUMNS)
+            else:
+                items.append(self._parse_item(allow_alias=True))
+            if not self.accept(','):
+                break
+        if self.pos != end:
+            raise UnsupportedQuery("不支援的 SELECT 項目")
+        return items
+
+    def _parse_item(self, allow_alias: bool) -> SelectItem:
+        """解析欄位、欄位乘積或聚合函數，可附別名"""
+        token = self.peek()
+        following = self.peek(1)
+        if token is not None and token.type is TokenType.IDENTIFIER and token.value.lower() in _AGGREGATES \
+                and following is not None and following.value == '(':
+            aggregate = self.next().value.lower()
+            self.expect('(')
+            if aggregate == 'count' and self.accept('*'):
+                columns: Tuple[str, ...] = ()
+            else:
+                columns = self._parse_value()
+            self.expect(')')
+            item = SelectItem(aggregate, columns, aggregate)
+        else:
+            columns = self._parse_value()
+            item = SelectItem(columns[0] if len(columns) == 1 else '?column?', columns)
+
+        if allow_alias:
+            explicit = self.accept('AS') is not None
+            token = self.peek()
+            if token is not None and token.type is TokenType.IDENTIFIER:
+                item = SelectItem(self.next().value.lower(), item.columns, item.aggregate)
+            elif explicit:
+                raise UnsupportedQuery("不支援的別名")
+        return item
+
+    def _parse_value(self) -> Tuple[str, ...]:
+        """欄位或數值欄位乘積（如 stock_quantity * unit_price）"""
+        columns = [self._parse_column()]
+        if self.accept('*'):
+            columns.append(self._parse_column())
+            if any(column not in NUMERIC_COLUMNS for column in columns):
+                raise UnsupportedQuery("乘積僅支援數值欄位")
+        return tuple(columns)
+
+    def _parse_column(self) -> str:
+        token = self.next()
+        if token.type is not TokenType.IDENTIFIER:
+            raise UnsupportedQuery(f"預期欄位: {token.value}")
+        name = token.value.lower()
+        if self.accept('.'):
+            if name not in (TABLE_NAME, self.alias):
+                raise UnsupportedQuery(f"未知資料表: {name}")
+            token = self.next()
+            if token.type is not TokenType.IDENTIFIER:
+                raise UnsupportedQuery(f"預期欄位: {token.value}")
+            name = token.value.lower()
+        if name not in INVENTORY_COLUMNS:
+            raise UnsupportedQuery(f"未知欄位: {name}")
+        return name
+
+    def _parse_integer(self) -> int:
+        token = self.next()
+        if token.type is not TokenType.NUMBER or not token.value.isdigit():
+            raise UnsupportedQuery("LIMIT/OFFSET 僅支援整數")
+        return int(token.value)
+
+    def _parse_order_list(self, items: List[SelectItem]) -> List[Tuple[Any, bool, bool]]:
+        order = []
+        while True:
+            token = self.peek()
+            if token is not None and token.type is TokenType.NUMBER and token.value.isdigit():
+                self.next()
+                position = int(token.value)
+                if not 1 <= position <= len(items):
+                    raise UnsupportedQuery("ORDER BY 位置超出範圍")
+                target: Any = position - 1
+            else:
+                target = self._resolve_order_item(items)
+            descending = self.accept('DESC') is not None
+            if not descending:
+                self.accept('ASC')
+            nulls_first = descending
+            if self.accept('NULLS'):
+                nulls_first = self.expect('FIRST', 'LAST').upper == 'FIRST'
+            order.append((target, descending, nulls_first))
+            if not self.accept(','):
+                return order
+
+    def _resolve_order_item(self, items: List[SelectItem]) -> Any:
+        """ORDER BY 項目：輸出欄位位置，或未選取的隱藏項目"""
+        token = self.peek()
+        if token is not None and token.type is TokenType.IDENTIFIER and \
+                (self.peek(1) is None or self.peek(1).value not in ('(', '.', '*')):
+            name = token.value.lower()
+            for position, item in enumerate(items):
+                if item.name == name:
+                    self.next()
+                    return position
+        hidden = self._parse_item(allow_alias=False)
+        for position, item in enumerate(items):
+            if item.key == hidden.key:
+                return position
+        return hidden
+
+    # WHERE 條件：('and'|'or', [子條件]) / ('not', 子條件) / ('leaf', 欄位, 判斷種類, 參數)
+    def _parse_or(self) -> Tuple:
+        terms = [self._parse_and()]
+        while self.accept('OR'):
+            terms.append(self._parse_and())
+        return terms[0] if len(terms) == 1 else ('or', terms)
+
+    def _parse_and(self) -> Tuple:
+        factors = [self._parse_not()]
+        while self.accept('AND'):
+            factors.append(self._parse_not())
+        return factors[0] if len(factors) == 1 else ('and', factors)
+
+    def _parse_not(self) -> Tuple:
+        if self.accept('NOT'):
+            return ('not', self._parse_not())
+        if self.accept('('):
+            condition = self._parse_or()
+            self.expect(')')
+            return condition
+        return self._parse_predicate()
+
+    def _parse_predicate(self) -> Tuple:
+        column = self._parse_column()
+
+        if self.accept('IS'):
+            negate = self.accept('NOT') is not None
+            self.expect('NULL')
+            return ('null', column, negate)
+
+        negate = self.accept('NOT') is not None
+        keyword = self.accept('ILIKE', 'LIKE', 'IN', 'BETWEEN')
+        if keyword is None:
+            if negate:
+                raise UnsupportedQuery("不支援的 NOT 條件")
+            operator = self.next()
+            if operator.type is not TokenType.OPERATOR or operator.value not in _COMPARISONS:
+                raise UnsupportedQuery(f"不支援的運算子: {operator.value}")
+            return ('leaf', column, operator.value, self._parse_literal(column))
+
+        if keyword.upper in ('ILIKE', 'LIKE'):
+            if self.store_kind(column) != 'text':
+                raise UnsupportedQuery("LIKE 僅支援文字欄位")
+            pattern = self._parse_literal(column)
+            regex = like_to_regex(pattern)
+            if keyword.upper == 'LIKE':
+                regex = re.compile(regex.pattern, re.DOTALL)
+            condition = ('leaf', column, 'like', regex)
+        elif keyword.upper == 'IN':
+            self.expect('(')
+            values = [self._parse_literal(column)]
+            while self.accept(','):
+                values.append(self._parse_literal(column))
+            self.expect(')')
+            condition = ('leaf', column, 'in', tuple(values))
+        else:
+            low = self._parse_literal(column)
+            self.expect('AND')
+            high = self._parse_literal(column)
+            condition = ('and', [('leaf', column, '>=', low), ('leaf', column, '<=', high)])
+        return ('not', condition) if negate else condition
+
+    @staticmethod
+    def store_kind(column: str) -> str:
+        if column in NUMERIC_COLUMNS:
+            return 'numeric'
+        if column in TIMESTAMP_COLUMNS:
+            return 'timestamp'
+        return 'text'
+
+    def _parse_literal(self, column: str) -> Any:
+        """解析與欄位型別相符的常值"""
+        kind = self.store_kind(column)
+        sign = 1
+        if kind == 'numeric' and self.accept('-'):
+            sign = -1
+        token = self.next()
+        if kind == 'numeric' and token.type is TokenType.NUMBER:
+            return sign * float(token.value)
+        if kind == 'text' and token.type is TokenType.STRING and token.value.startswith("'"):
+            return token.value[1:-1].replace("''", "'")
+        raise UnsupportedQuery(f"不支援的常值: {token.value}")
+
+    @staticmethod
+    def _check_grouping(plan: LocalPlan) -> None:
+        """分組查詢的非聚合項目必須是分組欄位（與 PostgreSQL 相同的限制）"""
+        if not plan.grouped:
+            return
+        if plan.distinct:
+            if plan.group_by or any(item.aggregate for item in plan.items):
+                raise UnsupportedQuery("DISTINCT 不可與聚合併用")
+            keys = {item.columns for item in plan.items}
+        else:
+            keys = {(column,) for column in plan.group_by}
+        hidden = [target for target, _, _ in plan.order_by if isinstance(target, SelectItem)]
+        for item in list(plan.items) + hidden:
+            if item.aggregate is None and item.columns not in keys:
+                raise UnsupportedQuery(f"{item.name} 不在分組欄位中")
+            if item.aggregate in ('sum', 'avg', 'min', 'max') and any(c not in NUMERIC_COLUMNS for c in item.columns):
+                raise UnsupportedQuery(f"{item.aggregate} 僅支援數值欄位")
+
+
+def execute_plan(plan: LocalPlan, store: ColumnStore) -> List[Dict[str, Any]]:
+    """
+    在欄位儲存上執行已編譯的查詢
+
+    Args:
+        plan: 已編譯的查詢
+        store: 欄位儲存
+
+    Returns:
+        查詢結果列表（與 RealDictCursor 相同的字典格式）
+    """
+    mask = store.live
+    if plan.where is not None:
+        matched = _evaluate(plan.where, store)[0]
+        mask = matched if mask is None else mask & matched
+    rows = np.arange(store.row_count) if mask is None else np.flatnonzero(mask)
+
+    hidden = [target for target, _, _ in plan.order_by if isinstance(target, SelectItem)]
+    if plan.grouped:
+        outputs = _aggregate(plan, store, rows, list(plan.items) + hidden)
+    else:
+        outputs = [_project(item, store, rows) for item in list(plan.items) + hidden]
+
+    count = len(outputs[0]) if outputs else 0
+    order = np.arange(count)
+    if plan.order_by and count > 1:
+        keys = []
+        for target, descending, nulls_first in plan.order_by:
+            values = outputs[target] if isinstance(target, int) else outputs[len(plan.items) + hidden.index(target)]
+            keys.append(_sort_key(values, descending, nulls_first))
+        # lexsort 以最後一個鍵為主要排序鍵
+        order = np.lexsort(keys[::-1])
+
+    end = None if plan.limit is None else plan.offset + plan.limit
+    order = order[plan.offset:end]
+
+    columns = [
+        (item.name, _to_python(outputs[position][order], _is_integer(item)))
+        for position, item in enumerate(plan.items)
+    ]
+    return [{name: values[index] for name, values in columns} for index in range(len(order))]
+
+
+def _evaluate(condition: Tuple, store: ColumnStore) -> Tuple[Any, Any]:
+    """
+    以三值邏輯計算條件
+
+    Returns:
+        (為真遮罩, 為假遮罩)；兩者皆否即為 NULL
+    """
+    kind = condition[0]
+    if kind == 'and':
+        results = [_evaluate(child, store) for child in condition[1]]
+        true, false = results[0]
+        for child_true, child_false in results[1:]:
+            true, false = true & child_true, false | child_false
+        return true, false
+    if kind == 'or':
+        results = [_evaluate(child, store) for child in condition[1]]
+        true, false = results[0]
+        for child_true, child_false in results[1:]:
+            true, false = true | child_true, false & child_false
+        return true, false
+    if kind == 'not':
+        true, false = _evaluate(condition[1], store)
+        return false, true
+    if kind == 'null':
+        _, column, negate = condition
+        nulls = store.null_mask(column)
+        return (~nulls, nulls) if negate else (nulls, ~nulls)
+
+    _, column, operator, argument = condition
+    nulls = store.null_mask(column)
+    if store.kind(column) == 'numeric':
+        values = store.numeric[column]
+        with np.errstate(invalid='ignore'):
+            if operator == 'in':
+                matched = np.isin(values, np.array(argument, dtype=np.float64))
+            else:
+                matched = _COMPARISONS[operator](values, argument)
+    elif store.kind(column) == 'text':
+        if operator == 'like':
+            matched = store.text_match(column, lambda value: argument.fullmatch(value) is not None)
+        elif operator == 'in':
+            matched = store.text_match(column, lambda value: value in argument)
+        else:
+            compare = _COMPARISONS[operator]
+            matched = store.text_match(column, lambda value: compare(value, argument))
+    else:
+        raise UnsupportedQuery(f"不支援 {column} 的條件")
+    return matched & ~nulls, ~matched & ~nulls
+
+
+def _project(item: SelectItem, store: ColumnStore, rows):
+    """非聚合項目的值"""
+    if len(item.columns) == 1:
+        return store.values(item.columns[0])[rows]
+    left, right = (store.numeric[column][rows] for column in item.columns)
+    return left * right
+
+
+def _aggregate(plan: LocalPlan, store: ColumnStore, rows, items: List[SelectItem]) -> List[Any]:
+    """分組聚合（DISTINCT 以所有輸出欄位分組）"""
+    key_columns = [item.columns for item in plan.items] if plan.distinct else [(c,) for c in plan.group_by]
+
+    if key_columns:
+        codes = [_group_codes(columns, store, rows) for columns in key_columns]
+        # 多個分組鍵合併為單一整數鍵（NULL 的 -1 位移為 0），避免較慢的 np.unique(axis=0)
+        widths = [int(column_codes.max()) + 2 if len(column_codes) else 1 for column_codes in codes]
+        if np.prod(widths, dtype=float) < 2 ** 62:
+            combined = codes[0].astype(np.int64) + 1
+            for column_codes, width in zip(codes[1:], widths[1:]):
+                combined = combined * width + column_codes + 1
+            _, first, groups = np.unique(combined, return_index=True, return_inverse=True)
+        else:
+            _, first, groups = np.unique(np.stack(codes, axis=1), axis=0, return_index=True, return_inverse=True)
+        groups = groups.reshape(-1)
+        group_count = len(first)
+    else:
+        # 無 GROUP BY 的聚合：整體一組（無資料時仍回傳一列）
+        groups = np.zeros(len(rows), dtype=np.intp)
+        first = np.zeros(0, dtype=np.intp)
+        group_count = 1
+
+    outputs = []
+    for item in items:
+        if item.aggregate is None:
+            outputs.append(_project(item, store, rows)[first])
+            continue
+
+        if not item.columns:
+            outputs.append(np.bincount(groups, minlength=group_count).astype(np.float64))
+            continue
+
+        values = _project(SelectItem('', item.columns), store, rows)
+        if values.dtype == object:
+            valid = np.fromiter((value is not None for value in values), bool, len(values))
+        else:
+            valid = ~np.isnan(values)
+        counts = np.bincount(groups[valid], minlength=group_count).astype(np.float64)
+
+        if item.aggregate == 'count':
+            outputs.append(counts)
+            continue
+
+        numbers = values.astype(np.float64)[valid]
+        if item.aggregate in ('sum', 'avg'):
+            result = np.bincount(groups[valid], weights=numbers, minlength=group_count)
+            if item.aggregate == 'avg':
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    result = result / counts
+        else:
+            initial = np.inf if item.aggregate == 'min' else -np.inf
+            result = np.full(group_count, initial)
+            (np.minimum if item.aggregate == 'min' else np.maximum).at(result, groups[valid], numbers)
+        # 組內無非 NULL 值時結果為 NULL
+        result = np.where(counts > 0, result, np.nan)
+        outputs.append(result)
+
+    return outputs
+
+
+def _group_codes(columns: Tuple[str, ...], store: ColumnStore, rows):
+    """分組鍵的整數編碼（字典編碼欄位直接使用編碼）"""
+    if len(columns) == 1 and columns[0] in store.codes:
+        return store.codes[columns[0]][rows]
+    return _factorize(_project(SelectItem('', columns), store, rows))
+
+
+def _factorize(values):
+    """將任意值陣列轉為整數編碼（NULL 自成一組）"""
+    if values.dtype != object:
+        nulls = np.isnan(values)
+        codes = np.full(len(values), -1, dtype=np.int64)
+        codes[~nulls] = np.unique(values[~nulls], return_inverse=True)[1].reshape(-1)
+        return codes
+    index: Dict[Any, int] = {}
+    return np.fromiter((index.setdefault(value, len(index)) for value in values), np.int64, len(values))
+
+
+def _sort_key(values, descending: bool, nulls_first: bool):
+    """將值轉為可由 lexsort 排序的整數排名"""
+    if values.dtype == object:
+        nulls = np.fromiter((value is None for value in values), bool, len(values))
+    else:
+        nulls = np.isnan(values)
+    rank = np.zeros(len(values), dtype=np.int64)
+    unique_count = 0
+    if (~nulls).any():
+        present = values[~nulls]
+        _, inverse = np.unique(present, return_inverse=True)
+        rank[~nulls] = inverse.reshape(-1)
+        unique_count = int(inverse.max()) + 1
+    if descending:
+        rank = -rank
+        rank[nulls] = 1 if not nulls_first else -unique_count
+    else:
+        rank[nulls] = -1 if nulls_first else unique_count
+    return rank
+
+
+def _is_integer(item: SelectItem) -> bool:
+    """結果是否為整數（COUNT、整數欄位及其 SUM/MIN/MAX）"""
+    if item.aggregate == 'count':
+        return True
+    if item.aggregate == 'avg' or len(item.columns) != 1:
+        return False
+    return item.columns[0] in INTEGER_COLUMNS
+
+
+def _to_python(values, integer: bool) -> List[Any]:
+    """NumPy 陣列轉為 Python 值（NaN 轉為 None）"""
+    if values.dtype == object:
+        return values.tolist()
+    if integer:
+        return [None if value != value else int(value) for value in values.tolist()]
+    return [None if value != value else value for value in values.tolist()]
@@ -0,0 +1,353 @@
+"""
+物化視圖模組
+low_stock_alert、category_summary 為物化視圖：本模組定期輪詢 inventory 的變更版本
+（pg_stat_user_tables 的資料列異動數加上 TRUNCATE 次數，寫入交易不需更新共用的資料列），
+與刷新時記錄的版本不同時以 REFRESH ... CONCURRENTLY 刷新（同一視圖至少間隔
+min_refresh_interval 秒），回報資料新舊程度，並在資料夠新時把低庫存查詢從 inventory 改讀 low_stock_alert
+"""
+
+import threading
+import time
+from typing import Optional, Dict, Any, List
+
+from .config import MaterializedViewConfig, MATERIALIZED_VIEWS, LOW_STOCK_COLUMNS, LOW_STOCK_THRESHOLD
+from .database import DatabaseClient
+from .local_executor import LocalPlan, SelectItem, UnsupportedQuery, compile_sql
+from .utils.logger import get_logger
+from .utils.sql_lexer import tokenize, TokenType
+
+
+LOW_STOCK_VIEW = 'low_stock_alert'
+
+# 異動統計在交易結束後才累加（含回滾的交易），只會造成多餘的刷新，不會漏掉已提交的變更
+_VERSION_EXPRESSION = "s.change_count + t.n_tup_ins + t.n_tup_upd + t.n_tup_del"
+_STATE_FROM = "materialized_view_state s, pg_stat_user_tables t WHERE t.relid = 'inventory'::regclass"
+
+
+class MaterializedViewManager:
+    """物化視圖刷新排程與新舊程度統計"""
+
+    def __init__(self, db_client: DatabaseClient, config: MaterializedViewConfig):
+        """
+        初始化物化視圖管理器（需呼叫 poll() 或 start() 後才有狀態）
+
+        Args:
+            db_client: 資料庫客戶端
+            config: 物化視圖配置
+        """
+        self.db_client = db_client
+        self.config = config
+        self.logger = get_logger(__name__)
+        self._state: Dict[str, Dict[str, Any]] = {}
+        self._polled_at: Optional[float] = None
+        self._pending_since: Dict[str, float] = {}
+        self._clean_at: Dict[str, float] = {}
+        self._last_refresh: Dict[str, float] = {}
+        self._refresh_ms: Dict[str, float] = {}
+        self._refresh_counts: Dict[str, int] = {view: 0 for view in MATERIALIZED_VIEWS}
+        self._refresh_errors: Dict[str, int] = {view: 0 for view in MATERIALIZED_VIEWS}
+        self._poll_errors = 0
+        self._routed = 0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def poll(self) -> Dict[str, Dict[str, Any]]:
+        """
+        讀取各視圖的刷新狀態
+
+        Returns:
+            視圖名稱到狀態（待刷新變更數、過期秒數、距上次刷新秒數）的對應
+
+        Raises:
+            psycopg2.Error: 資料庫錯誤（如尚未套用 migrations/002_materialized_views.sql）
+        """
+        rows = self.db_client.execute_query(
+            f"SELECT s.view_name, s.refreshed_count, {_VERSION_EXPRESSION} AS version, "
+            "EXTRACT(EPOCH FROM now() - s.refreshed_at) AS seconds_since_refresh "
+            f"FROM {_STATE_FROM}"
+        )
+        now = time.monotonic()
+        state = {}
+        with self._lock:
+            for row in rows:
+                view = row['view_name']
+                if view not in MATERIALIZED_VIEWS:
+                    continue
+                version, refreshed = int(row['version']), int(row['refreshed_count'])
+                # 統計被重設（pg_stat_reset）時版本會變小，視為有變更
+                pending = version - refreshed if version >= refreshed else max(version, 1)
+                seconds_since_refresh = float(row['seconds_since_refresh'])
+                if pending <= 0:
+                    self._pending_since.pop(view, None)
+                    self._clean_at[view] = now
+                elif view not in self._pending_since:
+                    # 變更發生在上次確認沒有變更之後（本行程尚未確認過時以上次刷新時間估計）
+                    self._pending_since[view] = self._clean_at.get(view, now - seconds_since_refresh)
+                state[view] = {
+                    'pending_changes': pending,
+                    'stale_seconds': now - self._pending_since[view] if pending > 0 else None,
+                    'seconds_since_refresh': seconds_since_refresh
+                }
+            self._state = state
+            self._polled_at = now
+        return state
+
+    def refresh(self, view: str) -> float:
+        """
+        刷新單一物化視圖（刷新期間讀取不受阻塞）
+
+        Args:
+            view: 視圖名稱
+
+        Returns:
+            刷新耗時（毫秒）
+
+        Raises:
+            ValueError: 不是受管理的物化視圖
+            psycopg2.Error: 資料庫錯誤
+        """
+        if view not in MATERIALIZED_VIEWS:
+            raise ValueError(f"不支援的物化視圖: {view}")
+
+        with self._refresh_lock:
+            # 先讀取變更版本再刷新：刷新期間提交的變更會使版本不同，留待下次刷新
+            checked_at = time.monotonic()
+            version = int(self.db_client.execute_query(
+                f"SELECT {_VERSION_EXPRESSION} AS version FROM {_STATE_FROM} AND s.view_name = %s", (view,)
+            )[0]['version'])
+            start = time.perf_counter()
+            try:
+                self.db_client.execute_commands([
+                    f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view}",
+                    "UPDATE materialized_view_state "
+                    f"SET refreshed_count = {version}, refreshed_at = now() "
+                    f"WHERE view_name = '{view}'"
+                ])
+            except Exception:
+                with self._lock:
+                    self._refresh_errors[view] += 1
+                raise
+            elapsed_ms = round((time.perf_counter() - start) * 1000, 1)
+
+        with self._lock:
+            self._last_refresh[view] = time.monotonic()
+            self._pending_since.pop(view, None)
+            self._clean_at[view] = checked_at
+            self._refresh_ms[view] = elapsed_ms
+            self._refresh_counts[view] += 1
+        self.logger.info(f"物化視圖 {view} 已刷新 ({elapsed_ms} ms)")
+        return elapsed_ms
+
+    def refresh_pending(self, force: bool = False) -> List[str]:
+        """
+        刷新有待處理變更的視圖
+
+        Args:
+            force: 是否忽略最小刷新間隔
+
+        Returns:
+            已刷新的視圖名稱列表
+
+        Raises:
+            psycopg2.Error: 讀取刷新狀態失敗
+        """
+        state = self.poll()
+        now = time.monotonic()
+        refreshed = []
+        for view in MATERIALIZED_VIEWS:
+            if view not in state or state[view]['pending_changes'] <= 0:
+                continue
+            last = self._last_refresh.get(view)
+            if not force and last is not None and now - last < self.config.min_refresh_interval:
+                continue
+            try:
+                self.refresh(view)
+                refreshed.append(view)
+            except Exception as e:
+                self.logger.warning(f"物化視圖 {view} 刷新失敗: {str(e)}")
+        if refreshed:
+            self.poll()
+        return refreshed
+
+    def staleness(self, view: str) -> Optional[float]:
+        """
+        目前的資料落後秒數（自第一筆未刷新的變更起算）
+
+        Args:
+            view: 視圖名稱
+
+        Returns:
+            落後秒數（無待刷新變更時為 0），尚未取得狀態時返回 None
+        """
+        with self._lock:
+            state = self._state.get(view)
+            if state is None or self._polled_at is None:
+                return None
+            if state['pending_changes'] <= 0:
+                return 0.0
+            return state['stale_seconds'] + time.monotonic() - self._polled_at
+
+    def is_fresh(self, view: str) -> bool:
+        """
+        視圖落後程度是否在 max_staleness 內（狀態過舊時視為不新鮮）
+
+        Args:
+            view: 視圖名稱
+
+        Returns:
+            是否可代替 inventory 查詢
+        """
+        if not self.config.enabled:
+            return False
+        with self._lock:
+            polled_at = self._polled_at
+        if polled_at is None or time.monotonic() - polled_at > self.config.max_staleness:
+            return False
+        staleness = self.staleness(view)
+        return staleness is not None and staleness <= self.config.max_staleness
+
+    def route(self, sql: str) -> Optional[str]:
+        """
+        將可由 low_stock_alert 回答的 inventory 查詢改讀物化視圖
+
+        Args:
+            sql: SQL 語句
+
+        Returns:
+            改寫後的 SQL，不適用或視圖過舊時返回 None
+        """
+        routed = route_low_stock(sql)
+        if routed is None or not self.is_fresh(LOW_STOCK_VIEW):
+            return None
+        with self._lock:
+            self._routed += 1
+        self.logger.info(f"低庫存查詢改讀物化視圖 {LOW_STOCK_VIEW}")
+        return routed
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        物化視圖統計
+
+        Returns:
+            各視圖的待刷新變更數、落後秒數、刷新次數與耗時
+        """
+        views = []
+        for view in MATERIALIZED_VIEWS:
+            staleness = self.staleness(view)
+            with self._lock:
+                state = self._state.get(view, {})
+                views.append({
+                    'view_name': view,
+                    'pending_changes': state.get('pending_changes'),
+                    'staleness_seconds': round(staleness, 1) if staleness is not None else None,
+                    'seconds_since_refresh': round(state['seconds_since_refresh'], 1) if state else None,
+                    'last_refresh_ms': self._refresh_ms.get(view),
+                    'refresh_count': self._refresh_counts[view],
+                    'refresh_errors': self._refresh_errors[view]
+                })
+        with self._lock:
+            return {
+                'enabled': self.config.enabled,
+                'routed_queries': self._routed,
+                'poll_errors': self._poll_errors,
+                'views': views
+            }
+
+    def start(self) -> None:
+        """啟動背景刷新執行緒"""
+        if not self.config.enabled or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="materialized-views", daemon=True)
+        self._thread.start()
+        self.logger.info(f"物化視圖排程已啟動 (輪詢間隔 {self.config.poll_interval}s)")
+
+    def stop(self) -> None:
+        """停止背景刷新執行緒"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def _run(self) -> None:
+        """背景輪詢迴圈"""
+        while not self._stop.is_set():
+            try:
+                self.refresh_pending()
+            except Exception as e:
+                with self._lock:
+                    self._poll_errors += 1
+                self.logger.warning(f"讀取物化視圖狀態失敗: {str(e)}")
+            self._stop.wait(self.config.poll_interval)
+
+
+def route_low_stock(sql: str) -> Optional[str]:
+    """
+    將條件已限定低庫存、且只用到 low_stock_alert 欄位的 inventory 查詢改寫為查詢該視圖
+
+    Args:
+        sql: SQL 語句
+
+    Returns:
+        改寫後的 SQL，不適用時返回 None
+    """
+    try:
+        plan = compile_sql(sql)
+    except UnsupportedQuery:
+        return None
+    if not _implies_low_stock(plan.where) or not _referenced_columns(plan) <= set(LOW_STOCK_COLUMNS):
+        return None
+
+    # 資料表名稱只能出現在 FROM（以 inventory.欄位 引用時不改寫）
+    tables = [
+        token for token in tokenize(sql)
+        if token.type is TokenType.IDENTIFIER and token.value.lower() == 'inventory'
+    ]
+    if len(tables) != 1:
+        return None
+    table = tables[0]
+    return sql[:table.start] + LOW_STOCK_VIEW + sql[table.start + len(table.value):]
+
+
+def _referenced_columns(plan: LocalPlan) -> set:
+    """查詢引用的所有欄位"""
+    columns = set(plan.group_by)
+    for item in plan.items:
+        columns.update(item.columns)
+    for target, _, _ in plan.order_by:
+        if isinstance(target, SelectItem):
+            columns.update(target.columns)
+
+    pending = [plan.where] if plan.where is not None else []
+    while pending:
+        condition = pending.pop()
+        if condition[0] in ('and', 'or'):
+            pending.extend(condition[1])
+        elif condition[0] == 'not':
+            pending.append(condition[1])
+        else:
+            columns.add(condition[1])
+    return columns
+
+
+def _implies_low_stock(condition: Optional[tuple]) -> bool:
+    """WHERE 條件是否保證 stock_quantity < LOW_STOCK_THRESHOLD"""
+    if condition is None:
+        return False
+    kind = condition[0]
+    if kind == 'and':
+        return any(_implies_low_stock(child) for child in condition[1])
+    if kind == 'or':
+        return all(_implies_low_stock(child) for child in condition[1])
+    if kind != 'leaf' or condition[1] != 'stock_quantity':
+        return False
+
+    operator, value = condition[2], condition[3]
+    if operator == '<':
+        return value <= LOW_STOCK_THRESHOLD
+    if operator in ('<=', '='):
+        return value < LOW_STOCK_THRESHOLD
+    if operator == 'in':
+        return all(item is not None and item < LOW_STOCK_THRESHOLD for item in value)
+    return False
@@ -0,0 +1,318 @@
+"""
+效能指標模組
+行程內的計數器、量表與直方圖（執行緒安全），以 Prometheus 文字格式輸出給 /metrics；
+不依賴 prometheus_client。各階段耗時以 time.perf_counter() 量測
+"""
+
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, List, Tuple, Iterator
+
+
+# 查詢階段耗時的直方圖分界（秒）：本地執行為毫秒級，LLM 生成可達數十秒
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+class _Metric:
+    """指標基底類別（依標籤值分開保存）"""
+    type_name = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        """標籤值組成的鍵（標籤必須與 labelnames 完全相符）"""
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} 需要標籤 {self.labelnames}，收到 {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _format_labels(self, key: Tuple[str, ...], extra: Optional[Tuple[str, str]] = None) -> str:
+        """Prometheus 標籤字串"""
+        pairs = list(zip(self.labelnames, key))
+        if extra is not None:
+            pairs.append(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+    def samples(self) -> List[str]:
+        """輸出的樣本行"""
+        raise NotImplementedError
+
+    def render(self) -> str:
+        """含 HELP/TYPE 的輸出區塊"""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self.samples())
+        return '\n'.join(lines)
+
+    def clear(self) -> None:
+        """清除所有值（測試用）"""
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    """只增不減的計數器"""
+    type_name = 'counter'
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        """
+        增加計數
+
+        Args:
+            amount: 增加量（不可為負）
+            **labels: 標籤值
+        """
+        if amount < 0:
+            raise ValueError("Counter 只能增加")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        """目前計數"""
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items()) or ([((), 0.0)] if not self.labelnames else [])
+        return [f"{self.name}{self._format_labels(key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(_Metric):
+    """可增可減的量表"""
+    type_name = 'gauge'
+
+    def set(self, value: float, **labels: Any) -> None:
+        """設定數值"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        """增加數值"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: Any) -> None:
+        """減少數值"""
+        self.inc(-amount, **labels)
+
+    def value(self, **labels: Any) -> float:
+        """目前數值"""
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    @contextmanager
+    def track_inprogress(self, **labels: Any) -> Iterator[None]:
+        """區塊執行期間數值加一（如進行中的請求數）"""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items()) or ([((), 0.0)] if not self.labelnames else [])
+        return [f"{self.name}{self._format_labels(key)} {_format_value(value)}" for key, value in items]
+
+
+class Histogram(_Metric):
+    """累積分界的直方圖"""
+    type_name = 'histogram'
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = STAGE_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels: Any) -> None:
+        """
+        記錄一個觀測值
+
+        Args:
+            value: 觀測值（秒）
+            **labels: 標籤值
+        """
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            counts = state[0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def count(self, **labels: Any) -> int:
+        """觀測次數"""
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return state[2] if state else 0
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        """記錄區塊執行時間"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(state[0]), state[1], state[2])) for key, state in self._values.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(
+                    f"{self.name}_bucket{self._format_labels(key, ('le', _format_value(bound)))} {cumulative}"
+                )
+            lines.append(f"{self.name}_bucket{self._format_labels(key, ('le', '+Inf'))} {count}")
+            lines.append(f"{self.name}_sum{self._format_labels(key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{self._format_labels(key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """指標登錄表"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        """
+        登錄指標
+
+        Args:
+            metric: 指標
+
+        Returns:
+            同一個指標（方便在模組層級定義）
+
+        Raises:
+            ValueError: 名稱重複
+        """
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"指標名稱重複: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """
+        以 Prometheus 文字格式（0.0.4）輸出所有指標
+
+        Returns:
+            輸出文字
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+QUERY_STAGE_SECONDS = REGISTRY.register(Histogram(
+    'inventory_query_stage_seconds', "查詢各階段耗時（秒）", ('stage', 'model', 'mode')
+))
+QUERIES_TOTAL = REGISTRY.register(Counter(
+    'inventory_queries_total', "查詢請求數（依結果）", ('endpoint', 'status')
+))
+CACHE_LOOKUPS_TOTAL = REGISTRY.register(Counter(
+    'inventory_cache_lookups_total', "快取查詢次數（sql/answer 為 LLM 快取，snapshot 為本地執行）", ('cache', 'result')
+))
+SQL_VALIDATION_FAILURES_TOTAL = REGISTRY.register(Counter(
+    'inventory_sql_validation_failures_total', "生成的 SQL 未通過驗證的次數"
+))
+OLLAMA_ERRORS_TOTAL = REGISTRY.register(Counter(
+    'inventory_ollama_errors_total', "Ollama 呼叫失敗次數（connection、timeout、incomplete、error）", ('reason',)
+))
+DB_ERRORS_TOTAL = REGISTRY.register(Counter(
+    'inventory_db_errors_total', "資料庫錯誤次數（依錯誤類別）", ('error',)
+))
+REQUESTS_IN_FLIGHT = REGISTRY.register(Gauge(
+    'inventory_requests_in_flight', "進行中的查詢請求數", ('endpoint',)
+))
+OLLAMA_IN_FLIGHT = REGISTRY.register(Gauge(
+    'inventory_ollama_generations_in_flight', "進行中的 Ollama 生成數"
+))
+DB_CONNECTIONS_IN_USE = REGISTRY.register(Gauge(
+    'inventory_db_connections_in_use', "使用中的資料庫連線數"
+))
+JOBS = REGISTRY.register(Gauge(
+    'inventory_jobs', "非同步查詢任務數（依狀態，於輸出時更新）", ('status',)
+))
+JOB_WORKERS = REGISTRY.register(Gauge(
+    'inventory_job_workers', "非同步查詢工作池大小"
+))
+
+
+def record_stage(timing: Dict[str, float], stage: str, start: float, model: str, mode: str) -> float:
+    """
+    記錄查詢階段耗時：寫入回應的 timing（秒，四捨五入到毫秒）並加入直方圖
+
+    Args:
+        timing: 計時資訊字典
+        stage: 階段名稱（如 sql_generation）
+        start: 階段開始時間（time.perf_counter()）
+        model: 使用的模型
+        mode: llm 或 fast
+
+    Returns:
+        耗時（秒，未四捨五入）
+    """
+    elapsed = time.perf_counter() - start
+    timing[stage] = round(elapsed, 3)
+    QUERY_STAGE_SECONDS.observe(elapsed, stage=stage, model=model, mode=mode)
+    return elapsed
+
+
+def server_timing(timing: Dict[str, float]) -> str:
+    """
+    將計時資訊轉為 Server-Timing 標頭（毫秒）
+
+    Args:
+        timing: 計時資訊字典（秒）
+
+    Returns:
+        標頭值，如 "sql_generation;dur=812.5, total;dur=905.1"
+    """
+    return ', '.join(
+        f"{stage};dur={round(seconds * 1000, 1)}"
+        for stage, seconds in timing.items() if seconds is not None
+    )
+
+
+def _format_value(value: float) -> str:
+    """數值格式（整數不帶小數點）"""
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    """標籤值跳脫"""
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
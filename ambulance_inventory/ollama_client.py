@@ -3,11 +3,20 @@ Ollama 客戶端模組
 處理與 Ollama API 的通信
 """
 
+import json
+import threading
+import time
 import requests
+from contextlib import nullcontext
 from typing import Optional
 import logging
 
 from .config import OllamaConfig
+from .metrics import OLLAMA_ERRORS_TOTAL, OLLAMA_IN_FLIGHT
+from .ollama_recording import OllamaRecorder, OllamaReplay
+from .query_log import add_tokens
+from .tracing import span
+from .utils.deadline import Deadline, QueryAborted
 from .utils.logger import get_logger
 
 
@@ -18,33 +27,49 @@ class OllamaClient:
         """
         初始化 Ollama 客戶端
 
+        設定 replay_path 時以錄製的回應取代 Ollama（不連線），設定 record_path 時錄製每次生成
+
         Args:
             config: Ollama 配置
+
+        Raises:
+            ValueError: 同時設定錄製與重播
+            FileNotFoundError: 重播的錄製檔案不存在
         """
+        if config.record_path and config.replay_path:
+            raise ValueError("OLLAMA_RECORD_PATH 與 OLLAMA_REPLAY_PATH 不可同時設定")
         self.config = config
         self.logger = get_logger(__name__)
         self.api_url = f"{config.host}/api/generate"
         self.tags_url = f"{config.host}/api/tags"
+        self.recorder = OllamaRecorder(config.record_path) if config.record_path else None
+        self.replay = OllamaReplay(config.replay_path, config.replay_speed) if config.replay_path else None
 
     def generate(
         self,
         prompt: str,
         system_prompt: str = "",
         temperature: float = 0.1,
-        model: Optional[str] = None
+        model: Optional[str] = None,
+        deadline: Optional[Deadline] = None
     ) -> Optional[str]:
         """
         調用 Ollama 生成文本
 
+        以串流模式接收回應，每個片段之間檢查請求時限；
+        請求被取消時關閉連線，Ollama 隨即停止生成
+
         Args:
             prompt: 用戶提示詞
             system_prompt: 系統提示詞
             temperature: 溫度參數 (0.0-1.0)
             model: 使用的模型（可選，不指定則使用預設模型）
+            deadline: 請求時限（可選，超時取剩餘時間與配置超時的較小者）
 
         Returns:
-            生成的文本，失敗時返回 None
+            生成的文本，失敗、超時或取消時返回 None
         """
+        OLLAMA_IN_FLIGHT.inc()
         try:
             # 使用傳入的模型，若無則使用預設模型
             use_model = model if model else self.config.model
@@ -54,50 +79,166 @@ class OllamaClient:
                 "prompt": prompt,
                 "system": system_prompt,
                 "temperature": temperature,
-                "stream": False
+                "stream": True
             }
 
-            self.logger.debug(f"調用 Ollama API: {self.api_url} (model: {use_model})")
-
-            response = requests.post(
-                self.api_url,
-                json=payload,
-                timeout=self.config.timeout
-            )
-            response.raise_for_status()
-
-            result = response.json()
-            generated_text = result.get('response', '').strip()
+            timeout = self.config.timeout
+            if deadline is not None:
+                timeout = deadline.timeout_for(self.config.timeout, "ollama")
+
+            if self.replay is not None:
+                return self._generate_replay(payload, deadline)
+
+            self.logger.debug(f"調用 Ollama API: {self.api_url} (model: {use_model}, timeout: {timeout:.1f}s)")
+
+            with span('ollama.generate', model=use_model, prompt_chars=len(prompt)) as trace_span:
+                start = time.perf_counter()
+                with requests.post(
+                    self.api_url,
+                    json=payload,
+                    timeout=timeout,
+                    stream=True
+                ) as response:
+                    response.raise_for_status()
+
+                    # 取消時關閉連線以中斷讀取；requests 的 timeout 只限制單次讀取，
+                    # 持續有片段的慢速串流另以計時器在總時限到時關閉連線
+                    cancel_scope = deadline.on_cancel(response.close) if deadline else nullcontext()
+                    timer = threading.Timer(timeout, response.close)
+                    timer.daemon = True
+                    timer.start()
+                    try:
+                        with cancel_scope:
+                            chunks = []
+                            recording = [] if self.recorder is not None else None
+                            first_chunk_ms = None
+                            completed = False
+                            for line in response.iter_lines():
+                                self._check_total_timeout(start, timeout, deadline)
+                                if not line:
+                                    continue
+                                offset_ms = round((time.perf_counter() - start) * 1000, 3)
+                                if first_chunk_ms is None:
+                                    first_chunk_ms = offset_ms
+                                data = json.loads(line)
+                                chunks.append(data.get('response', ''))
+                                if recording is not None:
+                                    recording.append([offset_ms, data.get('response', '')])
+                                if data.get('done'):
+                                    trace_span.set_attributes(first_chunk_ms=first_chunk_ms, **_generation_stats(data))
+                                    add_tokens(data.get('prompt_eval_count'), data.get('eval_count'))
+                                    if recording is not None:
+                                        self.recorder.record(payload, recording, data)
+                                    completed = True
+                                    break
+                    except (requests.exceptions.RequestException, OSError, ValueError, AttributeError):
+                        # 計時器關閉連線後讀取失敗，改報超時
+                        self._check_total_timeout(start, timeout, deadline)
+                        raise
+                    finally:
+                        timer.cancel()
+
+            if not completed:
+                # 連線中斷或 Ollama 異常結束：部分文字可能是截斷的 SQL，不可當作結果
+                OLLAMA_ERRORS_TOTAL.inc(reason='incomplete')
+                self.logger.error(f"Ollama 串流在 done 片段前結束（已收到 {len(chunks)} 個片段）")
+                return None
+
+            generated_text = ''.join(chunks).strip()
 
             self.logger.info(f"Ollama 生成成功 ({len(generated_text)} 字符)")
 
             return generated_text
 
+        except QueryAborted as e:
+            self.logger.warning(f"Ollama 生成已中止: {str(e)}")
+            return None
+
         except requests.exceptions.ConnectionError:
+            if deadline is not None and deadline.aborted:
+                self.logger.warning("Ollama 生成已中止（連線已關閉）")
+                return None
+            OLLAMA_ERRORS_TOTAL.inc(reason='connection')
             self.logger.error(f"無法連接到 Ollama ({self.config.host})")
-            print(f"❌ 無法連接到 Ollama ({self.config.host})")
-            print("\n請確認:")
-            print("  1. Ollama 正在運行（在 Windows 開啟 Ollama）")
-            print("  2. 允許外部訪問（設定 OLLAMA_HOST=0.0.0.0）")
+            self.logger.debug("請確認: 1. Ollama 正在運行（在 Windows 開啟 Ollama） 2. 允許外部訪問（設定 OLLAMA_HOST=0.0.0.0）")
             return None
 
         except requests.exceptions.Timeout:
+            OLLAMA_ERRORS_TOTAL.inc(reason='timeout')
             self.logger.error("Ollama 回應超時")
-            print("⏱️ Ollama 回應超時（模型可能正在載入）")
+            self.logger.debug("Ollama 回應超時，模型可能正在載入")
             return None
 
         except Exception as e:
+            if deadline is not None and deadline.aborted:
+                self.logger.warning(f"Ollama 生成已中止: {str(e)}")
+                return None
+            OLLAMA_ERRORS_TOTAL.inc(reason='error')
             self.logger.error(f"Ollama 錯誤: {str(e)}")
-            print(f"❌ Ollama 錯誤: {str(e)}")
+            self.logger.debug("Ollama 錯誤詳情", exc_info=True)
             return None
 
+        finally:
+            OLLAMA_IN_FLIGHT.dec()
+
+    @staticmethod
+    def _check_total_timeout(start: float, timeout: float, deadline: Optional[Deadline]) -> None:
+        """
+        檢查串流是否超過總時限
+
+        Args:
+            start: 開始時間（perf_counter）
+            timeout: 總時限（秒）
+            deadline: 請求時限（可選）
+
+        Raises:
+            QueryAborted: 請求已超時或被取消
+            requests.exceptions.Timeout: 生成超過 Ollama 配置的總時限
+        """
+        if deadline is not None:
+            deadline.check("ollama")
+        if time.perf_counter() - start >= timeout:
+            raise requests.exceptions.Timeout(f"Ollama 生成超過 {timeout:.1f}s")
+
+    def _generate_replay(self, payload: dict, deadline: Optional[Deadline]) -> Optional[str]:
+        """
+        以錄製的回應取代 Ollama 生成
+
+        Args:
+            payload: 請求內容
+            deadline: 請求時限
+
+        Returns:
+            錄製的文本，找不到錄製時返回 None（與 Ollama 失敗相同）
+
+        Raises:
+            QueryAborted: 重播期間超時或被取消
+        """
+        entry = self.replay.lookup(payload)
+        if entry is None:
+            self.logger.warning(f"找不到 Ollama 錄製 (model: {payload['model']}): {payload['prompt'][:50]}")
+            return None
+
+        with span('ollama.generate', model=payload['model'], prompt_chars=len(payload['prompt']), replay=True) as trace_span:
+            chunks = list(self.replay.stream(entry, deadline))
+            final = entry['final']
+            trace_span.set_attributes(**_generation_stats(final))
+            add_tokens(final.get('prompt_eval_count'), final.get('eval_count'))
+
+        generated_text = ''.join(chunks).strip()
+        self.logger.info(f"Ollama 重播成功 ({len(generated_text)} 字符)")
+        return generated_text
+
     def test_connection(self) -> bool:
         """
-        測試 Ollama 連接
+        測試 Ollama 連接（重播模式不連線，總是成功）
 
         Returns:
             連接是否成功
         """
+        if self.replay is not None:
+            return True
+
         try:
             response = requests.get(self.tags_url, timeout=5)
             response.raise_for_status()
@@ -114,8 +255,11 @@ class OllamaClient:
         獲取已安裝的模型列表
 
         Returns:
-            模型名稱列表
+            模型名稱列表（重播模式為錄製中出現的模型）
         """
+        if self.replay is not None:
+            return self.replay.models
+
         try:
             response = requests.get(self.tags_url, timeout=5)
             response.raise_for_status()
@@ -157,3 +301,27 @@ class OllamaClient:
         else:
             self.logger.error("Ollama 推理測試失敗")
             return False
+
+
+def _generation_stats(data: dict) -> dict:
+    """
+    Ollama 最後一個串流片段的 token 數與各階段耗時（奈秒轉毫秒）
+
+    Args:
+        data: done 為 true 的回應片段
+
+    Returns:
+        span 屬性：prompt/completion token 數與 load、prompt_eval、eval 耗時
+    """
+    def to_ms(key: str) -> Optional[float]:
+        value = data.get(key)
+        return round(value / 1e6, 3) if value is not None else None
+
+    return {
+        'prompt_tokens': data.get('prompt_eval_count'),
+        'completion_tokens': data.get('eval_count'),
+        'load_ms': to_ms('load_duration'),
+        'prompt_eval_ms': to_ms('prompt_eval_duration'),
+        'eval_ms': to_ms('eval_duration'),
+        'ollama_total_ms': to_ms('total_duration')
+    }
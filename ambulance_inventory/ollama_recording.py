@@ -0,0 +1,198 @@
+"""
+Ollama 錄製與重播模組
+錄製模式將每次生成的請求、串流片段（含相對時間）與最後一個片段的 token 數/耗時附加到 JSONL 檔案；
+重播模式在行程內依請求找出錄製的回應，以錄製時的速度（可縮放）或立即返回，
+讓快取、SQL 改寫與格式化的效能比較不受 LLM 延遲與輸出變動影響
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Iterator
+
+from .utils.deadline import Deadline
+from .utils.logger import get_logger
+
+
+# 等待片段間隔時檢查請求時限的最長間隔（秒）
+_SLEEP_SLICE = 0.05
+
+
+def recording_key(model: Optional[str], system: str, prompt: str, temperature: float) -> str:
+    """
+    請求的比對鍵
+
+    Args:
+        model: 模型名稱（None 為不分模型的比對鍵）
+        system: 系統提示詞
+        prompt: 用戶提示詞
+        temperature: 溫度參數
+
+    Returns:
+        SHA-256 十六進位字串
+    """
+    raw = json.dumps([model, system, prompt, temperature], ensure_ascii=False)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class OllamaRecorder:
+    """將 Ollama 生成的請求與回應附加到 JSONL 檔案"""
+
+    def __init__(self, path: str):
+        """
+        初始化錄製
+
+        Args:
+            path: 錄製檔案路徑（附加寫入）
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.logger = get_logger(__name__)
+        self._lock = threading.Lock()
+        self._recorded = 0
+
+    def record(self, payload: Dict[str, Any], chunks: List[List[Any]], final: Dict[str, Any]) -> None:
+        """
+        附加一筆錄製（寫入失敗只記錄，不影響生成）
+
+        Args:
+            payload: 送出的請求（model、prompt、system、temperature）
+            chunks: [距請求開始的毫秒數, 片段文字] 列表
+            final: 最後一個串流片段（token 數與耗時）
+        """
+        entry = {
+            'key': recording_key(payload['model'], payload['system'], payload['prompt'], payload['temperature']),
+            'recorded_at': time.time(),
+            'model': payload['model'],
+            'system': payload['system'],
+            'prompt': payload['prompt'],
+            'temperature': payload['temperature'],
+            'chunks': chunks,
+            'final': {key: value for key, value in final.items() if key not in ('response', 'context')}
+        }
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+        try:
+            with self._lock:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(line)
+                self._recorded += 1
+        except OSError as e:
+            self.logger.warning(f"Ollama 錄製寫入失敗: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        """錄製摘要"""
+        return {'mode': 'record', 'path': str(self.path), 'recorded': self._recorded}
+
+
+class OllamaReplay:
+    """依請求重播錄製的 Ollama 回應"""
+
+    def __init__(self, path: str, speed: float = 1.0):
+        """
+        載入錄製檔案
+
+        同一請求有多筆錄製時依序輪流返回；找不到相同模型的錄製時改用其他模型的錄製
+
+        Args:
+            path: 錄製檔案路徑
+            speed: 重播速度倍數（1.0 為錄製時的速度，0 為立即返回）
+
+        Raises:
+            FileNotFoundError: 錄製檔案不存在
+        """
+        self.path = Path(path)
+        self.speed = speed
+        self.logger = get_logger(__name__)
+        self._by_key: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self._by_prompt: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self._next: Dict[str, int] = defaultdict(int)
+        self._models: List[str] = []
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                self._by_key[entry['key']].append(entry)
+                self._by_prompt[recording_key(None, entry['system'], entry['prompt'], entry['temperature'])].append(entry)
+                if entry['model'] not in self._models:
+                    self._models.append(entry['model'])
+
+        self.logger.info(f"已載入 Ollama 錄製: {self.path} ({sum(map(len, self._by_key.values()))} 筆)")
+
+    @property
+    def models(self) -> List[str]:
+        """錄製中出現的模型"""
+        return list(self._models)
+
+    def lookup(self, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        找出請求對應的錄製
+
+        Args:
+            payload: 請求（model、prompt、system、temperature）
+
+        Returns:
+            錄製內容，找不到時返回 None
+        """
+        system, prompt, temperature = payload['system'], payload['prompt'], payload['temperature']
+        key = recording_key(payload['model'], system, prompt, temperature)
+        with self._lock:
+            entries = self._by_key.get(key)
+            if not entries:
+                key = recording_key(None, system, prompt, temperature)
+                entries = self._by_prompt.get(key)
+            if not entries:
+                self._misses += 1
+                return None
+            self._hits += 1
+            index = self._next[key]
+            self._next[key] = index + 1
+            return entries[index % len(entries)]
+
+    def stream(self, entry: Dict[str, Any], deadline: Optional[Deadline] = None) -> Iterator[str]:
+        """
+        依錄製的相對時間逐一產生片段
+
+        Args:
+            entry: 錄製內容
+            deadline: 請求時限（等待期間檢查）
+
+        Yields:
+            片段文字
+
+        Raises:
+            QueryAborted: 請求已超時或被取消
+        """
+        start = time.perf_counter()
+        for offset_ms, text in entry['chunks']:
+            if self.speed > 0:
+                due = start + offset_ms / 1000 / self.speed
+                while True:
+                    if deadline is not None:
+                        deadline.check("ollama")
+                    wait = due - time.perf_counter()
+                    if wait <= 0:
+                        break
+                    time.sleep(min(wait, _SLEEP_SLICE))
+            elif deadline is not None:
+                deadline.check("ollama")
+            yield text
+
+    def stats(self) -> Dict[str, Any]:
+        """重播摘要（命中與未命中次數）"""
+        with self._lock:
+            return {
+                'mode': 'replay',
+                'path': str(self.path),
+                'speed': self.speed,
+                'recordings': sum(map(len, self._by_key.values())),
+                'hits': self._hits,
+                'misses': self._misses
+            }
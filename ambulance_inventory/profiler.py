@@ -0,0 +1,269 @@
+"""
+線上效能剖析模組
+- CPU：背景執行緒定期讀取所有執行緒的堆疊（sys._current_frames），涵蓋執行緒池中進行中的請求，
+  輸出 collapsed stacks（可直接產生火焰圖）或依函數彙總的取樣數
+- 記憶體：tracemalloc 在一段時間前後的快照差異
+- 單一請求：以 cProfile 或 tracemalloc 包住一次查詢
+同一時間只允許一個剖析（tracemalloc 為全域狀態）
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, List, Tuple, Callable, Iterator
+
+from .config import ProfilingConfig
+from .utils.logger import get_logger
+
+
+PROFILE_MODES = ('cpu', 'memory')
+CPU_OUTPUTS = ('collapsed', 'top')
+
+# 等待中的執行緒停在這些函數（閒置的工作執行緒、事件迴圈、背景排程），預設不計入
+_IDLE_FRAMES = {
+    ('threading.py', 'wait'),
+    ('threading.py', '_wait_for_tstate_lock'),
+    ('queue.py', 'get'),
+    ('selectors.py', 'select'),
+    ('thread.py', '_worker'),
+}
+
+# 記憶體差異只顯示應用程式、JSON 序列化與 Pydantic 的配置位置
+_MEMORY_SCOPES = (
+    str(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) + os.sep + '*',
+    '*' + os.sep + 'json' + os.sep + '*',
+    '*' + os.sep + 'pydantic*',
+)
+
+
+class ProfilerBusy(Exception):
+    """已有剖析正在進行"""
+
+
+class Profiler:
+    """CPU 取樣與記憶體剖析"""
+
+    def __init__(self, config: ProfilingConfig):
+        """
+        初始化剖析器
+
+        Args:
+            config: 剖析配置
+        """
+        self.config = config
+        self.logger = get_logger(__name__)
+        self._lock = threading.Lock()
+
+    def sample_cpu(
+        self,
+        seconds: float,
+        output: str = 'collapsed',
+        include_idle: bool = False,
+        limit: int = 50
+    ) -> str:
+        """
+        取樣所有執行緒的堆疊 seconds 秒
+
+        Args:
+            seconds: 取樣時間（不超過 max_duration）
+            output: collapsed（每行「執行緒;外層;...;內層 次數」）或 top（依函數的自身/累計取樣數）
+            include_idle: 是否包含等待中的執行緒
+            limit: top 輸出的函數數
+
+        Returns:
+            剖析結果文字
+
+        Raises:
+            ValueError: 輸出格式不支援
+            ProfilerBusy: 已有剖析正在進行
+        """
+        if output not in CPU_OUTPUTS:
+            raise ValueError(f"不支援的輸出格式: {output}（可用: {', '.join(CPU_OUTPUTS)}）")
+        seconds = min(seconds, self.config.max_duration)
+
+        with self._exclusive():
+            self.logger.info(f"開始 CPU 取樣 {seconds}s")
+            stacks, samples = self._sample(seconds, include_idle)
+
+        if output == 'collapsed':
+            return ''.join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+        return _format_top(stacks, samples, seconds, limit)
+
+    def memory_diff(self, seconds: float, limit: int = 30, app_only: bool = True) -> str:
+        """
+        比較 seconds 秒前後的 tracemalloc 快照
+
+        Args:
+            seconds: 間隔時間（不超過 max_duration）
+            limit: 顯示的配置位置數
+            app_only: 只顯示應用程式、json 與 pydantic 的配置位置
+
+        Returns:
+            依配置增量排序的文字
+
+        Raises:
+            ProfilerBusy: 已有剖析正在進行
+        """
+        seconds = min(seconds, self.config.max_duration)
+
+        with self._exclusive(), _tracing_memory():
+            self.logger.info(f"開始記憶體剖析 {seconds}s")
+            before = tracemalloc.take_snapshot()
+            time.sleep(seconds)
+            after = tracemalloc.take_snapshot()
+
+        stats = _scoped(after, app_only).compare_to(_scoped(before, app_only), 'lineno')
+        lines = [f"# tracemalloc 差異 {seconds}s（依配置增量排序，前 {limit} 個位置）"]
+        lines.extend(str(stat) for stat in stats[:limit])
+        return '\n'.join(lines) + '\n'
+
+    def profile_call(self, mode: str, func: Callable, *args, **kwargs) -> Tuple[Any, str]:
+        """
+        剖析單一函數呼叫（在呼叫端執行緒執行）
+
+        cpu 以 cProfile 記錄（依累計時間排序）；memory 在函數返回、結果仍存活時取 tracemalloc 快照，
+        顯示結果資料（格式化結果、HTML 表格、JSON）的配置位置與峰值
+
+        Args:
+            mode: cpu 或 memory
+            func: 要剖析的函數
+            *args: 函數位置參數
+            **kwargs: 函數關鍵字參數
+
+        Returns:
+            (函數返回值, 剖析結果文字) 元組
+
+        Raises:
+            ValueError: 模式不支援
+            ProfilerBusy: 已有剖析正在進行
+        """
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"不支援的剖析模式: {mode}（可用: {', '.join(PROFILE_MODES)}）")
+
+        with self._exclusive():
+            if mode == 'cpu':
+                profile = cProfile.Profile()
+                result = profile.runcall(func, *args, **kwargs)
+                text = io.StringIO()
+                pstats.Stats(profile, stream=text).sort_stats('cumulative').print_stats(40)
+                return result, text.getvalue()
+
+            with _tracing_memory():
+                result = func(*args, **kwargs)
+                snapshot = tracemalloc.take_snapshot()
+                _, peak = tracemalloc.get_traced_memory()
+            lines = [f"# tracemalloc 峰值 {peak / 1024:.1f} KiB，結果存活時的配置位置"]
+            lines.extend(str(stat) for stat in _scoped(snapshot, True).statistics('lineno')[:30])
+            return result, '\n'.join(lines) + '\n'
+
+    @contextmanager
+    def _exclusive(self) -> Iterator[None]:
+        """取得剖析鎖（已被佔用時拋出 ProfilerBusy）"""
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy("已有剖析正在進行")
+        try:
+            yield
+        finally:
+            self._lock.release()
+
+    def _sample(self, seconds: float, include_idle: bool) -> Tuple[Counter, int]:
+        """定期讀取其他執行緒的堆疊"""
+        me = threading.get_ident()
+        names: Dict[int, str] = {}
+        stacks: Counter = Counter()
+        samples = 0
+        deadline = time.perf_counter() + seconds
+
+        while time.perf_counter() < deadline:
+            frames = sys._current_frames()
+            if len(names) != len(frames):
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in frames.items():
+                if ident == me:
+                    continue
+                stack = _collapse(frame, include_idle)
+                if stack:
+                    stacks[f"{names.get(ident, ident)};{stack}"] += 1
+            samples += 1
+            time.sleep(self.config.sample_interval)
+
+        return stacks, samples
+
+
+@contextmanager
+def _tracing_memory() -> Iterator[None]:
+    """區塊內啟用 tracemalloc（已啟用時沿用，不在結束時停止）"""
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start(10)
+    try:
+        yield
+    finally:
+        if started:
+            tracemalloc.stop()
+
+
+def _collapse(frame, include_idle: bool) -> Optional[str]:
+    """
+    將堆疊轉為「外層;...;內層」（每層為 模組:函數）
+
+    Returns:
+        堆疊字串，閒置且不包含閒置執行緒時返回 None
+    """
+    code = frame.f_code
+    if not include_idle and (os.path.basename(code.co_filename), code.co_name) in _IDLE_FRAMES:
+        return None
+
+    parts: List[str] = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f"{_module_name(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    parts.reverse()
+    return ';'.join(parts)
+
+
+def _module_name(filename: str) -> str:
+    """檔案路徑轉為簡短名稱（套件內為相對路徑，其餘為檔名）"""
+    for marker in ('ambulance_inventory' + os.sep, 'server' + os.sep, 'site-packages' + os.sep):
+        index = filename.rfind(marker)
+        if index >= 0:
+            start = index + len(marker) if marker.startswith('site-packages') else index
+            return filename[start:].replace(os.sep, '/')
+    return os.path.basename(filename)
+
+
+def _format_top(stacks: Counter, samples: int, seconds: float, limit: int) -> str:
+    """依函數彙總自身（最內層）與累計（出現在堆疊中）的取樣數"""
+    own: Counter = Counter()
+    total: Counter = Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(';')[1:]
+        own[frames[-1]] += count
+        for name in set(frames):
+            total[name] += count
+
+    busy = sum(stacks.values()) or 1
+    lines = [
+        f"# {samples} 次取樣 / {seconds}s，非閒置執行緒樣本 {busy} 個",
+        f"{'self':>8} {'self%':>7} {'total':>8} {'total%':>7}  function"
+    ]
+    for name, count in own.most_common(limit):
+        lines.append(
+            f"{count:>8} {count * 100 / busy:>6.1f}% {total[name]:>8} {total[name] * 100 / busy:>6.1f}%  {name}"
+        )
+    return '\n'.join(lines) + '\n'
+
+
+def _scoped(snapshot: tracemalloc.Snapshot, app_only: bool) -> tracemalloc.Snapshot:
+    """只保留應用程式相關的配置位置"""
+    if not app_only:
+        return snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+    return snapshot.filter_traces([tracemalloc.Filter(True, pattern) for pattern in _MEMORY_SCOPES])
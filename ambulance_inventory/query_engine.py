@@ -5,82 +5,272 @@
 
 import json
 import time
-from typing import Optional, Tuple, Dict
+from typing import Optional, Tuple, Dict, Any, Callable
 import logging
 
 from .config import SQL_GENERATION_PROMPT, RESPONSE_GENERATION_PROMPT
 from .database import DatabaseClient
 from .ollama_client import OllamaClient
-from .utils.validators import clean_sql, validate_sql
+from .adaptive_policy import AdaptiveLLMPolicy
+from .sql_rewriter import SqlRewriter, RewriteResult
+from .cost_guard import QueryCostGuard, CostEstimate
+from .index_advisor import IndexAdvisor
+from .aggregate_cube import AggregateCube
+from .materialized_views import MaterializedViewManager
+from .metrics import SQL_VALIDATION_FAILURES_TOTAL, record_stage
+from .snapshot import InventorySnapshot
+from .response_cache import ResponseCache, digest
+from .query_log import QueryLog, QueryLogEntry, USAGE_FIELDS, collect_usage, note_usage
+from .tracing import NOOP_SPAN, current_span, span
+from .autocomplete import normalize_text
+from .utils.validators import inspect_sql, validate_analysis
+from .utils.sql_lexer import fingerprint_sql
+from .utils.deadline import Deadline, QueryAborted, check_deadline
 from .utils.logger import get_logger
 
 
+# 提示詞版本（修改提示詞後舊的快取項目不再命中）
+SQL_PROMPT_VERSION = digest(SQL_GENERATION_PROMPT)
+RESPONSE_PROMPT_VERSION = digest(RESPONSE_GENERATION_PROMPT)
+
 class QueryEngine:
     """自然語言查詢引擎"""
 
-    def __init__(self, db_client: DatabaseClient, ollama_client: OllamaClient):
+    def __init__(
+        self,
+        db_client: DatabaseClient,
+        ollama_client: OllamaClient,
+        llm_policy: Optional[AdaptiveLLMPolicy] = None,
+        rewriter: Optional[SqlRewriter] = None,
+        cost_guard: Optional[QueryCostGuard] = None,
+        index_advisor: Optional[IndexAdvisor] = None,
+        snapshot: Optional[InventorySnapshot] = None,
+        cube: Optional[AggregateCube] = None,
+        materialized_views: Optional[MaterializedViewManager] = None,
+        response_cache: Optional[ResponseCache] = None,
+        query_log: Optional[QueryLog] = None
+    ):
         """
         初始化查詢引擎
 
         Args:
             db_client: 資料庫客戶端
             ollama_client: Ollama 客戶端
+            llm_policy: LLM 回答自適應降級策略（可選）
+            rewriter: 執行前的 SQL 改寫器（可選）
+            cost_guard: 執行前的 EXPLAIN 成本防護（可選）
+            index_advisor: 記錄已執行 SQL 的索引建議器（可選）
+            snapshot: 行程內 inventory 快照，支援的 SQL 不經過資料庫（可選）
+            cube: 聚合 cube，維度內的 GROUP BY 查詢直接由 cube 回答（可選）
+            materialized_views: 物化視圖管理器，低庫存查詢在資料夠新時改讀物化視圖（可選）
+            response_cache: LLM 產生結果快取，重複問題不再呼叫 LLM（可選）
+            query_log: 查詢日誌，記錄每次查詢的階段耗時、token 數與快取結果（可選）
         """
         self.db_client = db_client
         self.ollama_client = ollama_client
+        self.llm_policy = llm_policy
+        self.rewriter = rewriter
+        self.cost_guard = cost_guard
+        self.index_advisor = index_advisor
+        self.snapshot = snapshot
+        self.cube = cube
+        self.materialized_views = materialized_views
+        self.response_cache = response_cache
+        self.query_log = query_log
         self.logger = get_logger(__name__)
 
-    def generate_sql(self, question: str, model: Optional[str] = None) -> Optional[str]:
+    def cached_sql(self, question: str, model: Optional[str] = None) -> Optional[str]:
+        """
+        查詢 SQL 快取（不呼叫 Ollama）
+
+        Args:
+            question: 用戶問題
+            model: 使用的模型（可選）
+
+        Returns:
+            快取的 SQL，未啟用或未命中時返回 None
+        """
+        cache_key = self._sql_cache_key(question, model)
+        if cache_key is None:
+            return None
+        cached_sql = self.response_cache.get('sql', cache_key)
+        current_span().set_attributes(cache_hit=cached_sql is not None)
+        if cached_sql is not None:
+            self.logger.info(f"SQL 快取命中: {question} (model: {cache_key[1]})")
+        return cached_sql
+
+    def _sql_cache_key(self, question: str, model: Optional[str]) -> Optional[tuple]:
+        """SQL 快取鍵（未啟用 SQL 快取時為 None）"""
+        if self.response_cache is None or not self.response_cache.config.cache_sql:
+            return None
+        return (normalize_text(question), model or self.ollama_client.config.model, SQL_PROMPT_VERSION)
+
+    def generate_sql(
+        self,
+        question: str,
+        model: Optional[str] = None,
+        deadline: Optional[Deadline] = None,
+        check_cache: bool = True
+    ) -> Optional[str]:
         """
         根據自然語言問題生成 SQL
 
         Args:
             question: 用戶問題
             model: 使用的模型（可選）
+            deadline: 請求時限（可選）
+            check_cache: 是否先查詢 SQL 快取（呼叫端已查詢過時為 False）
 
         Returns:
             生成的 SQL，失敗時返回 None
         """
-        self.logger.info(f"生成 SQL: {question} (model: {model or self.ollama_client.config.model})")
+        use_model = model or self.ollama_client.config.model
+        if check_cache:
+            cached_sql = self.cached_sql(question, use_model)
+            if cached_sql is not None:
+                return cached_sql
+        cache_key = self._sql_cache_key(question, use_model)
+
+        self.logger.info(f"生成 SQL: {question} (model: {use_model})")
 
         # 調用 Ollama 生成 SQL
         raw_sql = self.ollama_client.generate(
             prompt=question,
             system_prompt=SQL_GENERATION_PROMPT,
             temperature=0.1,
-            model=model
+            model=model,
+            deadline=deadline
         )
 
         if not raw_sql:
             return None
 
-        # 清理 SQL
-        cleaned_sql = clean_sql(raw_sql)
+        # 清理並分析 SQL（共用同一次詞法分析）
+        cleaned_sql, analysis = inspect_sql(raw_sql)
 
         # 驗證 SQL
-        is_valid, error_msg = validate_sql(cleaned_sql)
+        is_valid, error_msg = validate_analysis(analysis)
 
         if not is_valid:
+            SQL_VALIDATION_FAILURES_TOTAL.inc()
             self.logger.warning(f"SQL 驗證失敗: {error_msg}")
-            print(f"⚠️ SQL 驗證警告: {error_msg}")
-            print(f"   生成的 SQL: {cleaned_sql[:100]}...")
+            self.logger.debug(f"驗證失敗的 SQL: {cleaned_sql[:100]}...")
             # 即使驗證失敗，仍然返回 SQL（讓用戶決定是否使用）
             # 但不執行危險操作
+        elif cache_key is not None:
+            self.response_cache.put('sql', cache_key, cleaned_sql)
 
         return cleaned_sql
 
-    def execute_query(self, sql: str) -> Optional[list]:
+    def rewrite_sql(self, sql: str, deadline: Optional[Deadline] = None, explain: bool = True) -> RewriteResult:
         """
-        執行 SQL 查詢
+        執行前改寫 SQL（限制筆數、投影欄位、ILIKE 改等值比對、預設庫存條件）
+
+        Args:
+            sql: 生成的 SQL
+            deadline: 請求時限（可選）
+            explain: 是否以 EXPLAIN 記錄改寫前後成本
+
+        Returns:
+            改寫結果（未設定改寫器或改寫失敗時 sql 為原 SQL）
+        """
+        if self.rewriter is None:
+            return RewriteResult(sql=sql, original_sql=sql)
+        try:
+            return self.rewriter.rewrite(sql, deadline=deadline, explain=explain)
+        except QueryAborted:
+            raise
+        except Exception as e:
+            self.logger.error(f"SQL 改寫失敗，使用原始 SQL: {str(e)}")
+            return RewriteResult(sql=sql, original_sql=sql)
+
+    def route_to_materialized_view(self, sql: str) -> Optional[str]:
+        """
+        將低庫存查詢改讀物化視圖 low_stock_alert
 
         Args:
             sql: SQL 語句
 
+        Returns:
+            改寫後的 SQL，不適用、視圖過舊或未設定管理器時返回 None
+        """
+        if self.materialized_views is None:
+            return None
+        try:
+            return self.materialized_views.route(sql)
+        except Exception as e:
+            self.logger.warning(f"物化視圖路由失敗，使用原始 SQL: {str(e)}")
+            return None
+
+    def check_cost(
+        self,
+        sql: str,
+        deadline: Optional[Deadline] = None,
+        plan: Optional[Dict[str, Any]] = None
+    ) -> Optional[CostEstimate]:
+        """
+        執行前檢查查詢成本（超過上限時自動加上 LIMIT 或拒絕）
+
+        Args:
+            sql: SQL 語句
+            deadline: 請求時限（可選）
+            plan: 已取得的執行計畫（可選）
+
+        Returns:
+            成本估計（未設定成本防護時返回 None）
+
+        Raises:
+            QueryCostExceeded: 查詢估計成本過高
+        """
+        if self.cost_guard is None:
+            return None
+        return self.cost_guard.check(sql, deadline=deadline, plan=plan)
+
+    def runs_locally(self, sql: str) -> bool:
+        """
+        SQL 是否可由聚合 cube 或 inventory 快照在本地執行（不需 EXPLAIN 與成本防護）
+
+        Args:
+            sql: SQL 語句
+
+        Returns:
+            是否本地執行
+        """
+        if self.cube is not None and self.cube.can_answer(sql):
+            return True
+        return self.snapshot is not None and self.snapshot.can_execute(sql)
+
+    def execute_query(self, sql: str, deadline: Optional[Deadline] = None) -> Optional[list]:
+        """
+        執行 SQL 查詢（依序嘗試聚合 cube、快照，都不支援時送往資料庫）
+
+        Args:
+            sql: SQL 語句
+            deadline: 請求時限（可選）
+
         Returns:
             查詢結果列表，失敗時返回 None
         """
+        if self.cube is not None:
+            results = self.cube.execute(sql)
+            if results is not None:
+                current_span().set_attributes(source='cube')
+                note_usage(source='cube', row_count=len(results))
+                return results
+
+        if self.snapshot is not None:
+            results = self.snapshot.execute(sql)
+            if results is not None:
+                current_span().set_attributes(source='snapshot')
+                note_usage(source='snapshot', row_count=len(results))
+                return results
+
+        current_span().set_attributes(source='database')
         try:
-            results = self.db_client.execute_query(sql)
+            results = self.db_client.execute_query(sql, deadline=deadline)
+            note_usage(source='database', row_count=len(results))
+            if self.index_advisor is not None:
+                self.index_advisor.observe(sql)
             return results
         except Exception as e:
             self.logger.error(f"查詢執行失敗: {str(e)}")
@@ -90,15 +280,21 @@ class QueryEngine:
         self,
         question: str,
         results: list,
-        model: Optional[str] = None
+        model: Optional[str] = None,
+        deadline: Optional[Deadline] = None,
+        check_cache: bool = True,
+        fallback: bool = True
     ) -> Optional[str]:
         """
-        根據查詢結果生成友善的回應
+        根據查詢結果生成友善的回應（LLM 成功回答時寫入快取）
 
         Args:
             question: 原始問題
             results: 查詢結果
             model: 使用的模型（可選）
+            deadline: 請求時限（可選）
+            check_cache: 是否先查詢回答快取（呼叫端已查詢過時為 False）
+            fallback: LLM 失敗時是否改用簡單格式化（False 時返回 None）
 
         Returns:
             生成的回應文本
@@ -113,14 +309,19 @@ class QueryEngine:
 
         # 轉換為 JSON 字串
         try:
-            results_json = json.dumps(
-                formatted_results,
-                ensure_ascii=False,
-                indent=2
-            )
+            results_json = self._results_json(formatted_results)
         except Exception as e:
             self.logger.error(f"結果序列化失敗: {str(e)}")
-            return self._generate_simple_response(results)
+            return self._generate_simple_response(results) if fallback else None
+
+        # 相同問題、模型與查詢結果直接使用快取的回答
+        cache_key = self._answer_cache_key(question, results_json, model)
+        if self.response_cache is not None and check_cache:
+            cached = self.response_cache.get('answer', cache_key)
+            current_span().set_attributes(cache_hit=cached is not None)
+            if cached is not None:
+                self.logger.info("回應快取命中")
+                return cached
 
         # 構建提示詞
         prompt = f"""使用者問題: {question}
@@ -135,15 +336,95 @@ class QueryEngine:
             prompt=prompt,
             system_prompt=RESPONSE_GENERATION_PROMPT,
             temperature=0.1,
-            model=model
+            model=model,
+            deadline=deadline
         )
 
         if not response:
             # 如果 Ollama 失敗，使用簡單格式化
-            return self._generate_simple_response(formatted_results)
+            return self._generate_simple_response(formatted_results) if fallback else None
 
+        if self.response_cache is not None:
+            self.response_cache.put('answer', cache_key, response)
         return response
 
+    def cached_response(self, question: str, results: list, model: Optional[str] = None) -> Optional[str]:
+        """
+        查詢已快取的 LLM 回答（不呼叫 LLM）
+
+        Args:
+            question: 原始問題
+            results: 查詢結果
+            model: 使用的模型（可選）
+
+        Returns:
+            快取的回答，未命中或未啟用快取時返回 None
+        """
+        if self.response_cache is None or not results:
+            return None
+        try:
+            results_json = self._results_json(self.db_client.format_results(results, limit=20))
+        except Exception:
+            return None
+        return self.response_cache.get('answer', self._answer_cache_key(question, results_json, model))
+
+    def _answer_cache_key(self, question: str, results_json: str, model: Optional[str]) -> tuple:
+        """回答快取鍵：(正規化問題, 模型, 結果雜湊, 提示詞版本)"""
+        use_model = model or self.ollama_client.config.model
+        return (normalize_text(question), use_model, digest(results_json, length=32), RESPONSE_PROMPT_VERSION)
+
+    @staticmethod
+    def _results_json(formatted_results: list) -> str:
+        """回應提示詞中的查詢結果 JSON（也作為回答快取鍵的雜湊來源）"""
+        return json.dumps(formatted_results, ensure_ascii=False, indent=2)
+
+    def generate_response_adaptive(
+        self,
+        question: str,
+        results: list,
+        model: Optional[str] = None,
+        deadline: Optional[Deadline] = None
+    ) -> Tuple[Optional[str], str]:
+        """
+        依自適應降級策略生成回應（負載過高時略過，只保留程式化結果）
+
+        Args:
+            question: 原始問題
+            results: 查詢結果
+            model: 使用的模型（可選）
+            deadline: 請求時限（可選）
+
+        Returns:
+            (回應文本, 略過原因) 元組，未略過時原因為空字串
+        """
+        if self.llm_policy is None:
+            return self.generate_response(question, results, model=model, deadline=deadline), ""
+
+        # 快取命中不佔用 LLM 容量，降級時也可回答
+        cached = self.cached_response(question, results, model=model)
+        current_span().set_attributes(cache_hit=cached is not None)
+        if cached is not None:
+            return cached, ""
+
+        admitted, skip_reason = self.llm_policy.admit()
+        if not admitted:
+            self.logger.warning(f"略過 LLM 回答（降級模式）: {skip_reason}")
+            return None, skip_reason
+
+        # 只有成功的回答計入延遲：快速失敗（如 Ollama 無法連線）或中止不應拉低延遲估計
+        start = time.monotonic()
+        response = None
+        try:
+            response = self.generate_response(
+                question, results, model=model, deadline=deadline, check_cache=False, fallback=False
+            )
+        finally:
+            self.llm_policy.release(time.monotonic() - start if response is not None else None)
+
+        if response is None:
+            return self._generate_simple_response(self.db_client.format_results(results, limit=20)), ""
+        return response, ""
+
     def query(self, question: str) -> Tuple[Optional[str], Optional[str]]:
         """
         完整的查詢流程：問題 -> SQL -> 執行 -> 生成回應
@@ -155,29 +436,27 @@ class QueryEngine:
             (SQL, 回應文本) 元組
         """
         # 步驟 1: 生成 SQL
-        print("🤖 正在請求 Ollama 生成 SQL...")
-        print(f"   模型: {self.ollama_client.config.model}")
+        self.logger.debug(f"正在請求 Ollama 生成 SQL (model: {self.ollama_client.config.model})")
 
         sql = self.generate_sql(question)
 
         if not sql:
             return None, None
 
-        print(f"\n📝 生成的 SQL:")
-        print(f"{sql}\n")
+        self.logger.debug(f"生成的 SQL: {sql}")
 
         # 步驟 2: 執行查詢
         results = self.execute_query(sql)
 
         if results is None:
-            print(f"❌ SQL 執行錯誤")
+            self.logger.debug("SQL 執行錯誤")
             return sql, None
 
-        print(f"✅ 查詢成功，找到 {len(results)} 筆結果\n")
+        self.logger.debug(f"查詢成功，找到 {len(results)} 筆結果")
 
         # 步驟 3: 生成回應
         if results:
-            print("🤖 正在請求 Ollama 生成回應...")
+            self.logger.debug("正在請求 Ollama 生成回應")
             answer = self.generate_response(question, results)
         else:
             answer = "抱歉，沒有找到相關資料。"
@@ -390,11 +669,54 @@ class QueryEngine:
 
         return '\n'.join(html)
 
+    def format_for_display(self, results: list) -> Tuple[list, str, str]:
+        """
+        將查詢結果轉換為顯示用的格式
+
+        Args:
+            results: 原始查詢結果
+
+        Returns:
+            (格式化結果, 程式化回答, HTML表格) 元組
+        """
+        formatted_results = self.db_client.format_results(results, limit=50)
+
+        # 程式化格式（總是生成，快速）
+        programmatic_answer = self.format_results_programmatic(formatted_results)
+
+        # HTML 表格格式（總是生成，完美對齊）
+        html_table = self.format_results_html_table(formatted_results)
+
+        return formatted_results, programmatic_answer, html_table
+
+    def _notify_progress(
+        self,
+        on_progress: Optional[Callable[[str, Dict[str, Any]], None]],
+        stage: str,
+        payload: Dict[str, Any]
+    ) -> None:
+        """
+        通知階段進度（回呼失敗不影響查詢流程）
+
+        Args:
+            on_progress: 進度回呼
+            stage: 階段名稱
+            payload: 該階段的部分結果
+        """
+        if on_progress is None:
+            return
+        try:
+            on_progress(stage, payload)
+        except Exception as e:
+            self.logger.warning(f"進度回呼失敗 ({stage}): {str(e)}")
+
     def query_with_mode(
         self,
         question: str,
         use_llm_answer: bool = True,
-        model: Optional[str] = None
+        model: Optional[str] = None,
+        on_progress: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+        deadline: Optional[Deadline] = None
     ) -> Tuple[Optional[str], Optional[str], Optional[str], Optional[str], Optional[list], Dict[str, float]]:
         """
         支援雙模式的查詢流程
@@ -403,59 +725,223 @@ class QueryEngine:
             question: 用戶問題
             use_llm_answer: 是否使用 LLM 生成回答
             model: 使用的模型（可選，不指定則使用預設模型）
+            on_progress: 階段完成回呼（可選），參數為 (階段名稱, 部分結果)
+            deadline: 請求時限（可選），每個階段只使用剩餘的時間預算
 
         Returns:
             (SQL, LLM回答, 程式化回答, HTML表格, 原始結果, 計時資訊) 元組
+
+        Raises:
+            QueryAborted: 請求超過時限或被取消
+            QueryCostExceeded: 查詢估計成本過高
         """
         # 計時資訊
         timing: Dict[str, float] = {}
 
         # 使用傳入的模型，若無則使用預設模型
         use_model = model if model else self.ollama_client.config.model
+        mode = 'llm' if use_llm_answer else 'fast'
+
+        if self.query_log is None or not self.query_log.active:
+            return self.run_pipeline(question, use_llm_answer, use_model, mode, on_progress, deadline, timing)
+
+        # 記錄查詢日誌（包含失敗與中止的查詢）
+        start = time.perf_counter()
+        sql = None
+        error = None
+        with collect_usage() as usage:
+            try:
+                outcome = self.run_pipeline(question, use_llm_answer, use_model, mode, on_progress, deadline, timing)
+                sql = outcome[0]
+                if sql is None:
+                    error = "SQL generation failed"
+                elif outcome[4] is None:
+                    error = "SQL execution failed"
+                return outcome
+            except Exception as e:
+                sql = getattr(e, 'sql', None)
+                error = f"{type(e).__name__}: {str(e)}"
+                raise
+            finally:
+                self.log_query(question, use_model, mode, timing, time.perf_counter() - start, usage, sql=sql, error=error)
+
+    def log_query(
+        self,
+        question: str,
+        model: str,
+        mode: str,
+        timing: Dict[str, float],
+        total_seconds: float,
+        usage: Dict[str, Any],
+        sql: Optional[str] = None,
+        error: Optional[str] = None
+    ) -> None:
+        """
+        寫入查詢日誌（未設定查詢日誌時不做事）
 
-        # 步驟 1: 生成 SQL
-        print("🤖 正在請求 Ollama 生成 SQL...")
-        print(f"   模型: {use_model}")
+        Args:
+            question: 用戶問題
+            model: 使用的模型
+            mode: llm 或 fast
+            timing: 各階段耗時（秒，total 另以 total_seconds 記錄）
+            total_seconds: 總耗時（秒）
+            usage: collect_usage 收集的筆數、token 數、快取結果與資料來源
+            sql: 執行的 SQL（可選）
+            error: 錯誤訊息（可選）
+        """
+        if self.query_log is None:
+            return
+        self.query_log.record(QueryLogEntry(
+            question=question,
+            question_key=normalize_text(question),
+            model=model,
+            mode=mode,
+            sql_fingerprint=fingerprint_sql(sql) if sql else None,
+            total_seconds=round(total_seconds, 3),
+            timing={stage: seconds for stage, seconds in timing.items() if stage != 'total'},
+            error=error,
+            **{key: usage[key] for key in USAGE_FIELDS if key in usage}
+        ))
+
+    def run_pipeline(
+        self,
+        question: str,
+        use_llm_answer: bool,
+        use_model: str,
+        mode: str,
+        on_progress: Optional[Callable[[str, Dict[str, Any]], None]],
+        deadline: Optional[Deadline],
+        timing: Dict[str, float],
+        execute: Optional[Callable[[str, Optional[Deadline]], Optional[list]]] = None
+    ) -> Tuple[Optional[str], Optional[str], Optional[str], Optional[str], Optional[list], Dict[str, float]]:
+        """
+        執行查詢的各階段（不寫入查詢日誌，計時寫入 timing）
+
+        query_with_mode 以它執行單一查詢；批次查詢自行記錄日誌，
+        並以 execute 替換執行 SQL 的步驟（對相同 SQL 去重），預設為 execute_query
 
-        t0 = time.time()
-        sql = self.generate_sql(question, model=use_model)
-        timing['sql_generation'] = round(time.time() - t0, 2)
+        Args:
+            question: 用戶問題
+            use_llm_answer: 是否使用 LLM 生成回答
+            use_model: 使用的模型
+            mode: llm 或 fast（計時指標的標籤）
+            on_progress: 階段完成回呼（可選），參數為 (階段名稱, 部分結果)
+            deadline: 請求時限（可選）
+            timing: 寫入各階段耗時的字典
+            execute: 執行 SQL 的函數（可選），參數為 (SQL, 請求時限)
+
+        Returns:
+            (SQL, LLM回答, 程式化回答, HTML表格, 原始結果, 計時資訊) 元組
+
+        Raises:
+            QueryAborted: 請求超過時限或被取消
+            QueryCostExceeded: 查詢估計成本過高
+        """
+        # 步驟 1: 生成 SQL
+        self.logger.debug(f"正在請求 Ollama 生成 SQL (model: {use_model})")
+
+        t0 = time.perf_counter()
+        with span('sql_generation', model=use_model):
+            # 區分快取命中與實際呼叫 Ollama（呼叫端據此回饋斷路器）
+            sql = self.cached_sql(question, use_model)
+            sql_cached = sql is not None
+            if not sql_cached:
+                sql = self.generate_sql(question, model=use_model, deadline=deadline, check_cache=False)
+        record_stage(timing, 'sql_generation', t0, use_model, mode)
+        check_deadline(deadline, "sql_generation")
 
         if not sql:
             return None, None, None, None, None, timing
 
-        print(f"\n📝 生成的 SQL:")
-        print(f"{sql}\n")
+        # 快照可執行的查詢不需要 EXPLAIN（改寫只產生仍在本地範圍內的 SQL）
+        local = self.runs_locally(sql)
+        plan = None
+        if self.rewriter is not None:
+            t0 = time.perf_counter()
+            with span('sql_rewrite', explain=not local) as stage_span:
+                rewrite = self.rewrite_sql(sql, deadline=deadline, explain=not local)
+                stage_span.set_attributes(rewrites=rewrite.rewrites)
+            sql, plan = rewrite.sql, rewrite.plan
+            record_stage(timing, 'sql_rewrite', t0, use_model, mode)
+            check_deadline(deadline, "sql_rewrite")
+            local = local and self.runs_locally(sql)
+
+        # 低庫存查詢改讀物化視圖（改寫前的執行計畫不再適用）
+        if not local:
+            routed = self.route_to_materialized_view(sql)
+            if routed is not None:
+                sql, plan = routed, None
+
+        # 成本防護：預估筆數同時決定是否產生 LLM 回答
+        llm_skip_reason = ""
+        if self.cost_guard is not None and not local:
+            t0 = time.perf_counter()
+            with span('cost_check', cached_plan=plan is not None) as stage_span:
+                estimate = self.check_cost(sql, deadline=deadline, plan=plan)
+                if estimate is not None:
+                    stage_span.set_attributes(estimated_rows=estimate.plan_rows, estimated_cost=estimate.total_cost)
+            record_stage(timing, 'cost_check', t0, use_model, mode)
+            check_deadline(deadline, "cost_check")
+            if estimate is not None:
+                sql = estimate.sql
+                llm_skip_reason = self.cost_guard.llm_skip_reason(estimate)
+                self._notify_progress(on_progress, 'cost_estimated', {
+                    'estimated_rows': estimate.plan_rows,
+                    'estimated_cost': estimate.total_cost
+                })
+
+        self.logger.debug(f"生成的 SQL: {sql}")
+        self._notify_progress(on_progress, 'sql_generated', {'sql': sql, 'sql_cached': sql_cached})
 
         # 步驟 2: 執行查詢
-        t0 = time.time()
-        results = self.execute_query(sql)
-        timing['query_execution'] = round(time.time() - t0, 2)
+        t0 = time.perf_counter()
+        with span('query_execution') as stage_span:
+            if stage_span is not NOOP_SPAN:
+                stage_span.set_attributes(sql_fingerprint=fingerprint_sql(sql))
+            results = (execute or self.execute_query)(sql, deadline)
+            stage_span.set_attributes(row_count=len(results) if results is not None else None)
+        record_stage(timing, 'query_execution', t0, use_model, mode)
+        check_deadline(deadline, "query_execution")
 
         if results is None:
-            print(f"❌ SQL 執行錯誤")
+            self.logger.debug("SQL 執行錯誤")
             return sql, None, None, None, None, timing
 
-        print(f"✅ 查詢成功，找到 {len(results)} 筆結果\n")
+        self.logger.debug(f"查詢成功，找到 {len(results)} 筆結果")
 
         # 步驟 3: 格式化結果
-        t0 = time.time()
-        formatted_results = self.db_client.format_results(results, limit=50)
-
-        # 程式化格式（總是生成，快速）
-        programmatic_answer = self.format_results_programmatic(formatted_results)
-
-        # HTML 表格格式（總是生成，完美對齊）
-        html_table = self.format_results_html_table(formatted_results)
-        timing['formatting'] = round(time.time() - t0, 2)
+        t0 = time.perf_counter()
+        with span('formatting', row_count=len(results)):
+            formatted_results, programmatic_answer, html_table = self.format_for_display(results)
+        record_stage(timing, 'formatting', t0, use_model, mode)
+        self._notify_progress(on_progress, 'results_formatted', {
+            'answer_formatted': programmatic_answer,
+            'answer_html': html_table,
+            'results': formatted_results,
+            'result_count': len(formatted_results)
+        })
 
         # LLM 回答（可選）
         llm_answer = None
-        if use_llm_answer and results:
-            print("🤖 正在請求 Ollama 生成回應...")
-            t0 = time.time()
-            llm_answer = self.generate_response(question, results, model=use_model)
-            timing['llm_response'] = round(time.time() - t0, 2)
+        if use_llm_answer and results and llm_skip_reason:
+            self.logger.info(f"略過 LLM 回答: {llm_skip_reason}")
+            self._notify_progress(on_progress, 'llm_skipped', {
+                'llm_skip_reason': llm_skip_reason, 'llm_skip_cause': 'result_size'
+            })
+        elif use_llm_answer and results:
+            self.logger.debug("正在請求 Ollama 生成回應")
+            t0 = time.perf_counter()
+            with span('llm_response', model=use_model) as stage_span:
+                llm_answer, skip_reason = self.generate_response_adaptive(
+                    question, results, model=use_model, deadline=deadline
+                )
+                stage_span.set_attributes(skip_reason=skip_reason or None)
+            check_deadline(deadline, "llm_response")
+
+            if skip_reason:
+                self._notify_progress(on_progress, 'llm_skipped', {'llm_skip_reason': skip_reason, 'llm_skip_cause': 'load'})
+            else:
+                record_stage(timing, 'llm_response', t0, use_model, mode)
         elif not results:
             llm_answer = "抱歉，沒有找到相關資料。"
 
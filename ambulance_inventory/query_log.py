@@ -0,0 +1,410 @@
+"""
+查詢日誌模組
+每次查詢附加一筆紀錄到 SQLite：問題、正規化鍵、模型、SQL 指紋、筆數、各階段耗時、token 數、快取結果與錯誤。
+查詢執行緒只放入佇列（已滿時丟棄並計數），背景執行緒批次寫入；
+分析查詢提供最慢的問題、最常見的 SQL 指紋與各階段/模型的 p50/p95/p99，
+用來判斷哪些問題值得加入快取或規則路徑
+"""
+
+import json
+import math
+import queue
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field, asdict
+from typing import Optional, Dict, Any, List, Iterator
+
+from .config import QueryLogConfig
+from .utils.logger import get_logger
+
+
+PERCENTILES = (50, 95, 99)
+
+# 由查詢過程中各元件填入的欄位（筆數、token 數、快取結果、資料來源）
+USAGE_FIELDS = ('row_count', 'prompt_tokens', 'completion_tokens', 'sql_cache', 'answer_cache', 'source')
+
+_usage: ContextVar[Optional[Dict[str, Any]]] = ContextVar('query_usage', default=None)
+
+_STOP = object()
+
+
+@dataclass
+class QueryLogEntry:
+    """一筆查詢紀錄"""
+    question: str
+    question_key: str
+    model: str
+    mode: str
+    sql_fingerprint: Optional[str] = None
+    row_count: Optional[int] = None
+    total_seconds: Optional[float] = None
+    timing: Dict[str, float] = field(default_factory=dict)
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    sql_cache: Optional[str] = None
+    answer_cache: Optional[str] = None
+    source: Optional[str] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+
+
+@contextmanager
+def collect_usage() -> Iterator[Dict[str, Any]]:
+    """
+    收集區塊內的筆數、token 數、快取結果與資料來源（同一執行緒或以 copy_context 執行的工作）
+
+    Yields:
+        收集到的欄位（鍵為 USAGE_FIELDS）
+    """
+    usage: Dict[str, Any] = {}
+    token = _usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _usage.reset(token)
+
+
+def note_usage(**fields: Any) -> None:
+    """記錄目前查詢的欄位（不在 collect_usage 中時不做事）"""
+    usage = _usage.get()
+    if usage is not None:
+        usage.update(fields)
+
+
+def add_tokens(prompt_tokens: Optional[int], completion_tokens: Optional[int]) -> None:
+    """累加目前查詢的 token 數（一次查詢可能呼叫 LLM 兩次）"""
+    usage = _usage.get()
+    if usage is None:
+        return
+    for key, value in (('prompt_tokens', prompt_tokens), ('completion_tokens', completion_tokens)):
+        if value is not None:
+            usage[key] = usage.get(key, 0) + value
+
+
+class QueryLog:
+    """附加式查詢日誌（SQLite，背景批次寫入）"""
+
+    def __init__(self, config: QueryLogConfig):
+        """
+        初始化查詢日誌（啟用時開啟檔案並啟動寫入執行緒）
+
+        Args:
+            config: 查詢日誌配置
+        """
+        self.config = config
+        self.logger = get_logger(__name__)
+        self._queue: queue.Queue = queue.Queue(maxsize=max(1, config.queue_size))
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._thread: Optional[threading.Thread] = None
+        self._written = 0
+        self._dropped = 0
+        self._write_errors = 0
+        if config.enabled:
+            self._open(config.path)
+        if self._db is not None:
+            self._thread = threading.Thread(target=self._run, name="query-log-writer", daemon=True)
+            self._thread.start()
+
+    @property
+    def active(self) -> bool:
+        """是否正在記錄"""
+        return self._thread is not None
+
+    def record(self, entry: QueryLogEntry) -> None:
+        """
+        放入寫入佇列（不阻塞，佇列已滿時丟棄）
+
+        Args:
+            entry: 查詢紀錄
+        """
+        if not self.active:
+            return
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            with self._lock:
+                self._dropped += 1
+
+    def flush(self) -> None:
+        """等待佇列中的紀錄寫入完成"""
+        if self.active:
+            self._queue.join()
+
+    def close(self) -> None:
+        """寫出剩餘紀錄、停止寫入執行緒並關閉檔案"""
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join(timeout=10.0)
+            self._thread = None
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def slowest_questions(self, limit: int = 20, hours: float = 24.0) -> List[Dict[str, Any]]:
+        """
+        平均總耗時最長的問題（依正規化鍵合併）
+
+        Args:
+            limit: 筆數上限
+            hours: 統計最近幾小時
+
+        Returns:
+            問題列表（範例問題、次數、平均/最長耗時、錯誤數），由慢到快
+        """
+        rows = self._select(
+            "SELECT question_key, MAX(question), COUNT(*), AVG(total_seconds), MAX(total_seconds), "
+            "SUM(error IS NOT NULL), AVG(prompt_tokens + completion_tokens) "
+            "FROM query_log WHERE created_at >= ? AND total_seconds IS NOT NULL "
+            "GROUP BY question_key ORDER BY AVG(total_seconds) DESC LIMIT ?",
+            (_since(hours), limit)
+        )
+        return [
+            {
+                'question_key': key,
+                'question': question,
+                'count': count,
+                'avg_seconds': round(avg_seconds, 3),
+                'max_seconds': round(max_seconds, 3),
+                'errors': errors,
+                'avg_tokens': round(avg_tokens, 1) if avg_tokens is not None else None
+            }
+            for key, question, count, avg_seconds, max_seconds, errors, avg_tokens in rows
+        ]
+
+    def top_fingerprints(self, limit: int = 20, hours: float = 24.0) -> List[Dict[str, Any]]:
+        """
+        最常執行的 SQL 指紋
+
+        不同問題產生相同指紋時適合以規則路徑直接產生 SQL；SQL 快取命中率低的指紋適合調整快取鍵
+
+        Args:
+            limit: 筆數上限
+            hours: 統計最近幾小時
+
+        Returns:
+            指紋列表（次數、不同問題數、平均執行/總耗時、SQL 快取命中數、資料來源、錯誤數），由多到少
+        """
+        rows = self._select(
+            "SELECT sql_fingerprint, question_key, question, timing, total_seconds, sql_cache, source, error "
+            "FROM query_log WHERE created_at >= ? AND sql_fingerprint IS NOT NULL",
+            (_since(hours),)
+        )
+        groups: Dict[str, Dict[str, Any]] = {}
+        for fingerprint, key, question, timing, total_seconds, sql_cache, source, error in rows:
+            group = groups.setdefault(fingerprint, {
+                'fingerprint': fingerprint,
+                'count': 0,
+                'questions': set(),
+                'example_question': question,
+                'execution': [],
+                'total': [],
+                'sql_cache_hits': 0,
+                'sources': defaultdict(int),
+                'errors': 0
+            })
+            group['count'] += 1
+            group['questions'].add(key)
+            execution = json.loads(timing).get('query_execution')
+            if execution is not None:
+                group['execution'].append(execution)
+            if total_seconds is not None:
+                group['total'].append(total_seconds)
+            group['sql_cache_hits'] += sql_cache == 'hit'
+            if source:
+                group['sources'][source] += 1
+            group['errors'] += error is not None
+
+        ranked = sorted(groups.values(), key=lambda group: group['count'], reverse=True)[:limit]
+        return [
+            {
+                'fingerprint': group['fingerprint'],
+                'count': group['count'],
+                'distinct_questions': len(group['questions']),
+                'example_question': group['example_question'],
+                'avg_execution_seconds': _mean(group['execution']),
+                'avg_total_seconds': _mean(group['total']),
+                'sql_cache_hits': group['sql_cache_hits'],
+                'sources': dict(group['sources']),
+                'errors': group['errors']
+            }
+            for group in ranked
+        ]
+
+    def stage_percentiles(self, hours: float = 24.0) -> List[Dict[str, Any]]:
+        """
+        各模型、各階段耗時的 p50/p95/p99（total 為整個查詢）
+
+        Args:
+            hours: 統計最近幾小時
+
+        Returns:
+            列表（模型、階段、樣本數與各百分位數秒數），依模型與階段排序
+        """
+        rows = self._select(
+            "SELECT model, timing, total_seconds FROM query_log WHERE created_at >= ?",
+            (_since(hours),)
+        )
+        samples: Dict[tuple, List[float]] = defaultdict(list)
+        for model, timing, total_seconds in rows:
+            for stage, seconds in json.loads(timing).items():
+                samples[(model, stage)].append(seconds)
+            if total_seconds is not None:
+                samples[(model, 'total')].append(total_seconds)
+
+        results = []
+        for (model, stage), values in sorted(samples.items()):
+            values.sort()
+            result = {'model': model, 'stage': stage, 'count': len(values)}
+            for percentile in PERCENTILES:
+                result[f"p{percentile}"] = _percentile(values, percentile)
+            results.append(result)
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        寫入統計
+
+        Returns:
+            啟用狀態、檔案路徑、已寫入/丟棄/待寫入筆數、寫入錯誤數與檔案中的紀錄數
+        """
+        rows = self._select("SELECT COUNT(*) FROM query_log", ())
+        with self._lock:
+            return {
+                'enabled': self.config.enabled,
+                'active': self.active,
+                'path': self.config.path,
+                'written': self._written,
+                'dropped': self._dropped,
+                'pending': self._queue.qsize(),
+                'write_errors': self._write_errors,
+                'entries': rows[0][0] if rows else 0
+            }
+
+    def _open(self, path: str) -> None:
+        """開啟 SQLite 檔案並刪除超過保留天數的紀錄（失敗時停用）"""
+        try:
+            db = sqlite3.connect(path, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS query_log ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, created_at REAL NOT NULL, "
+                "question TEXT NOT NULL, question_key TEXT NOT NULL, model TEXT NOT NULL, mode TEXT NOT NULL, "
+                "sql_fingerprint TEXT, row_count INTEGER, total_seconds REAL, timing TEXT NOT NULL, "
+                "prompt_tokens INTEGER, completion_tokens INTEGER, sql_cache TEXT, answer_cache TEXT, "
+                "source TEXT, error TEXT)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS idx_query_log_created_at ON query_log (created_at)")
+            if self.config.retention_days > 0:
+                db.execute(
+                    "DELETE FROM query_log WHERE created_at < ?",
+                    (time.time() - self.config.retention_days * 86400,)
+                )
+            db.commit()
+        except sqlite3.Error as e:
+            self.logger.warning(f"無法開啟查詢日誌檔案 {path}，停用查詢日誌: {str(e)}")
+            return
+        self._db = db
+        self.logger.info(f"查詢日誌已開啟 ({path})")
+
+    def _run(self) -> None:
+        """寫入執行緒：累積到 batch_size 筆或等待 flush_interval 秒後一次寫入"""
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            batch: List[QueryLogEntry] = []
+            if item is _STOP:
+                stopping = True
+            else:
+                batch.append(item)
+                deadline = time.monotonic() + self.config.flush_interval
+                while len(batch) < self.config.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = self._queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    batch.append(item)
+            # 停止時寫出佇列中剩餘的紀錄
+            if stopping:
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is not _STOP:
+                        batch.append(item)
+                    else:
+                        self._queue.task_done()
+
+            if batch:
+                self._write(batch)
+            for _ in range(len(batch) + stopping):
+                self._queue.task_done()
+
+    def _write(self, batch: List[QueryLogEntry]) -> None:
+        """以單一交易寫入一批紀錄（失敗只記錄）"""
+        rows = []
+        for entry in batch:
+            values = asdict(entry)
+            values['timing'] = json.dumps(entry.timing)
+            rows.append(values)
+        with self._lock:
+            if self._db is None:
+                return
+            try:
+                self._db.executemany(
+                    "INSERT INTO query_log (created_at, question, question_key, model, mode, sql_fingerprint, "
+                    "row_count, total_seconds, timing, prompt_tokens, completion_tokens, sql_cache, answer_cache, "
+                    "source, error) VALUES (:created_at, :question, :question_key, :model, :mode, :sql_fingerprint, "
+                    ":row_count, :total_seconds, :timing, :prompt_tokens, :completion_tokens, :sql_cache, "
+                    ":answer_cache, :source, :error)",
+                    rows
+                )
+                self._db.commit()
+                self._written += len(rows)
+            except sqlite3.Error as e:
+                self._write_errors += 1
+                self.logger.warning(f"查詢日誌寫入失敗 ({len(rows)} 筆): {str(e)}")
+
+    def _select(self, sql: str, params: tuple) -> List[tuple]:
+        """執行分析查詢（未開啟檔案時返回空列表）"""
+        with self._lock:
+            if self._db is None:
+                return []
+            return self._db.execute(sql, params).fetchall()
+
+
+def _since(hours: float) -> float:
+    """統計區間的起始時間戳"""
+    return time.time() - hours * 3600
+
+
+def _mean(values: List[float]) -> Optional[float]:
+    """平均值（秒，四捨五入到毫秒）"""
+    return round(sum(values) / len(values), 3) if values else None
+
+
+def _percentile(values: List[float], percentile: float) -> float:
+    """
+    最近排名法百分位數
+
+    Args:
+        values: 已排序的數值（非空）
+        percentile: 百分位（0-100）
+
+    Returns:
+        百分位數（四捨五入到毫秒）
+    """
+    rank = max(1, math.ceil(percentile / 100 * len(values)))
+    return round(values[rank - 1], 3)
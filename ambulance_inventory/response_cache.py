@@ -0,0 +1,214 @@
+"""
+LLM 產生結果快取模組
+快取 LLM 產生的 SQL 與回答：
+- SQL 以 (正規化問題, 模型, 提示詞版本) 為鍵
+- 回答以 (正規化問題, 模型, 格式化結果的雜湊, 提示詞版本) 為鍵，庫存變動時結果雜湊改變，舊項目自然失效
+以 TTL 與 LRU 淘汰；設定 path 時同步寫入 SQLite，重新啟動後載入未過期的項目
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple
+
+from .config import ResponseCacheConfig
+from .metrics import CACHE_LOOKUPS_TOTAL
+from .query_log import note_usage
+from .utils.logger import get_logger
+
+
+# 快取命名空間
+NAMESPACES = ('sql', 'answer')
+
+
+def digest(text: str, length: int = 16) -> str:
+    """
+    文字的 SHA-256 摘要（十六進位前 length 個字元）
+
+    Args:
+        text: 文字（如提示詞或格式化後的查詢結果）
+        length: 摘要長度
+
+    Returns:
+        摘要字串
+    """
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:length]
+
+
+class ResponseCache:
+    """LLM 產生結果的 TTL/LRU 快取"""
+
+    def __init__(self, config: ResponseCacheConfig):
+        """
+        初始化快取（設定 path 時載入持久化的項目）
+
+        Args:
+            config: 快取配置
+        """
+        self.config = config
+        self.logger = get_logger(__name__)
+        self._entries: 'OrderedDict[Tuple[str, str], Tuple[str, float]]' = OrderedDict()
+        self._hits = {namespace: 0 for namespace in NAMESPACES}
+        self._misses = {namespace: 0 for namespace in NAMESPACES}
+        self._evictions = 0
+        self._persist_errors = 0
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if config.enabled and config.path:
+            self._open(config.path)
+
+    def get(self, namespace: str, parts: Tuple[Any, ...]) -> Optional[str]:
+        """
+        讀取快取（過期項目視為未命中並移除）
+
+        Args:
+            namespace: 命名空間（sql 或 answer）
+            parts: 組成快取鍵的值
+
+        Returns:
+            快取內容，未命中時返回 None
+        """
+        if not self.config.enabled:
+            return None
+        key = (namespace, _make_key(parts))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= time.time():
+                self._remove_locked(key)
+                entry = None
+            if entry is None:
+                self._misses[namespace] += 1
+                CACHE_LOOKUPS_TOTAL.inc(cache=namespace, result='miss')
+                note_usage(**{f"{namespace}_cache": 'miss'})
+                return None
+            self._entries.move_to_end(key)
+            self._hits[namespace] += 1
+            CACHE_LOOKUPS_TOTAL.inc(cache=namespace, result='hit')
+            note_usage(**{f"{namespace}_cache": 'hit'})
+            return entry[0]
+
+    def put(self, namespace: str, parts: Tuple[Any, ...], value: str) -> None:
+        """
+        寫入快取（超過 max_entries 時淘汰最久未使用的項目）
+
+        Args:
+            namespace: 命名空間（sql 或 answer）
+            parts: 組成快取鍵的值
+            value: 快取內容
+        """
+        if not self.config.enabled or not value:
+            return
+        key = (namespace, _make_key(parts))
+        expires_at = time.time() + self.config.ttl
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            self._persist_locked(
+                "INSERT OR REPLACE INTO response_cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (namespace, key[1], value, expires_at)
+            )
+            while len(self._entries) > self.config.max_entries:
+                self._remove_locked(next(iter(self._entries)))
+                self._evictions += 1
+
+    def clear(self) -> int:
+        """
+        清除所有項目
+
+        Returns:
+            清除的項目數
+        """
+        with self._lock:
+            count = len(self._entries)
+            self._entries.clear()
+            self._persist_locked("DELETE FROM response_cache", ())
+        self.logger.info(f"LLM 快取已清除 ({count} 筆)")
+        return count
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        快取統計
+
+        Returns:
+            各命名空間的項目數、命中/未命中次數與命中率
+        """
+        with self._lock:
+            sizes = {namespace: 0 for namespace in NAMESPACES}
+            for namespace, _ in self._entries:
+                sizes[namespace] += 1
+            namespaces = {}
+            for namespace in NAMESPACES:
+                lookups = self._hits[namespace] + self._misses[namespace]
+                namespaces[namespace] = {
+                    'entries': sizes[namespace],
+                    'hits': self._hits[namespace],
+                    'misses': self._misses[namespace],
+                    'hit_rate': round(self._hits[namespace] / lookups, 3) if lookups else None
+                }
+            return {
+                'enabled': self.config.enabled,
+                'persistent': self._db is not None,
+                'max_entries': self.config.max_entries,
+                'ttl': self.config.ttl,
+                'evictions': self._evictions,
+                'persist_errors': self._persist_errors,
+                'namespaces': namespaces
+            }
+
+    def close(self) -> None:
+        """關閉持久化檔案"""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _open(self, path: str) -> None:
+        """開啟 SQLite 檔案並載入未過期的項目（失敗時只使用記憶體）"""
+        try:
+            db = sqlite3.connect(path, check_same_thread=False)
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache ("
+                "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, expires_at REAL NOT NULL, "
+                "PRIMARY KEY (namespace, key))"
+            )
+            now = time.time()
+            db.execute("DELETE FROM response_cache WHERE expires_at <= ?", (now,))
+            rows = db.execute(
+                "SELECT namespace, key, value, expires_at FROM response_cache ORDER BY expires_at DESC LIMIT ?",
+                (self.config.max_entries,)
+            ).fetchall()
+            db.commit()
+        except sqlite3.Error as e:
+            self.logger.warning(f"無法開啟 LLM 快取檔案 {path}，只使用記憶體: {str(e)}")
+            return
+
+        # 越晚寫入的項目越晚過期，依過期時間由舊到新放入 LRU
+        for namespace, key, value, expires_at in reversed(rows):
+            if namespace in NAMESPACES:
+                self._entries[(namespace, key)] = (value, expires_at)
+        self._db = db
+        self.logger.info(f"LLM 快取已載入 {len(self._entries)} 筆 ({path})")
+
+    def _remove_locked(self, key: Tuple[str, str]) -> None:
+        """移除項目（呼叫端持有 _lock）"""
+        self._entries.pop(key, None)
+        self._persist_locked("DELETE FROM response_cache WHERE namespace = ? AND key = ?", key)
+
+    def _persist_locked(self, sql: str, params: Tuple[Any, ...]) -> None:
+        """同步寫入持久化檔案（失敗只記錄，不影響記憶體快取）"""
+        if self._db is None:
+            return
+        try:
+            self._db.execute(sql, params)
+            self._db.commit()
+        except sqlite3.Error as e:
+            self._persist_errors += 1
+            self.logger.warning(f"LLM 快取寫入失敗: {str(e)}")
+
+
+def _make_key(parts: Tuple[Any, ...]) -> str:
+    """快取鍵（組成值的 JSON 摘要）"""
+    return digest(json.dumps(parts, ensure_ascii=False, default=str), length=32)
@@ -0,0 +1,554 @@
+"""
+產品關鍵字搜尋模組
+在記憶體中對 product_name、brand、model、specifications、supplier 建立倒排索引：
+中日韓文字切成字元二元組（bigram），英數字以單字為單位，以 BM25 排序。
+索引註冊為快照監聽者（未啟用快照本地執行時也會載入），增量變更先寫入小型差異區段，累積到一定比例再合併重建；
+索引尚未載入時改以 ILIKE 查詢資料庫
+"""
+
+import math
+import re
+import threading
+import time
+import unicodedata
+from array import array
+from collections import Counter
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional, Dict, Any, List, Tuple, Iterable
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:  # pragma: no cover - numpy 為選用依賴
+    np = None
+    HAS_NUMPY = False
+
+from .config import SearchConfig
+from .database import DatabaseClient
+from .utils.logger import get_logger
+
+
+# 欄位權重（BM25F 簡化版：詞頻依欄位加權後再計算）
+FIELD_WEIGHTS = (
+    ('product_name', 3),
+    ('brand', 2),
+    ('model', 2),
+    ('specifications', 1),
+    ('supplier', 1),
+)
+
+# 搜尋結果回傳的欄位
+RESULT_COLUMNS = (
+    'product_id', 'product_name', 'category', 'brand', 'model',
+    'stock_quantity', 'unit_price', 'supplier'
+)
+
+# BM25 參數
+_K1 = 1.2
+_B = 0.75
+
+# 單詞分數 tf*(k1+1)/(tf+k1*norm) 介於 0 與 k1+1 之間，量化為 1~255 的 uint8
+_IMPACT_SCALE = 255 / (_K1 + 1)
+
+# 出現在超過此比例文件中的詞另存密集陣列（依文件序號直接取分數，交集只需 O(候選數)）
+_DENSE_RATIO = 1 / 32
+_MAX_DENSE_TERMS = 64
+
+# 文件數最少的詞超過此值時，改為依分數由高到低逐批取前幾名
+_SCAN_LIMIT = 65536
+
+# 候選數超過此值時，少見詞的交集改用暫時的密集陣列而不是二分搜尋
+_SEARCHSORTED_LIMIT = 4096
+_CHUNK = 2048
+
+_CJK = '\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff'
+_TOKEN_PATTERN = re.compile(f'[a-z0-9]+|[{_CJK}]+')
+
+
+def tokenize_text(text: Optional[str]) -> List[str]:
+    """
+    切分搜尋詞（NFKC 正規化、小寫；中日韓文字為 bigram，單字元時保留單字元）
+
+    Args:
+        text: 文字
+
+    Returns:
+        詞列表（含重複）
+    """
+    if not text:
+        return []
+    return list(_tokenize_cached(text))
+
+
+@lru_cache(maxsize=65536)
+def _tokenize_cached(text: str) -> Tuple[str, ...]:
+    """切分詞（品牌、供應商與規格常重複出現，快取結果加速建立索引）"""
+    tokens = []
+    for run in _TOKEN_PATTERN.findall(unicodedata.normalize('NFKC', text).lower()):
+        if run[0].isascii() or len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[index:index + 2] for index in range(len(run) - 1))
+    return tuple(tokens)
+
+
+def document_terms(row: Dict[str, Any]) -> Dict[str, int]:
+    """
+    資料列的加權詞頻
+
+    Args:
+        row: inventory 資料列
+
+    Returns:
+        詞到加權詞頻的對應
+    """
+    terms: Dict[str, int] = {}
+    for column, weight in FIELD_WEIGHTS:
+        value = row.get(column)
+        if value:
+            for token in _tokenize_cached(value):
+                terms[token] = terms.get(token, 0) + weight
+    return terms
+
+
+def quantize_impact(frequencies: Any, lengths: Any, average_length: float) -> Any:
+    """
+    BM25 單詞分數（不含 idf）量化為 uint8
+
+    Args:
+        frequencies: 加權詞頻
+        lengths: 文件長度
+        average_length: 平均文件長度
+
+    Returns:
+        1~255 的量化分數
+    """
+    norm = _K1 * (1 - _B + _B * np.asarray(lengths, dtype=np.float32) / average_length)
+    frequencies = np.asarray(frequencies, dtype=np.float32)
+    impact = frequencies * (_K1 + 1) / (frequencies + norm)
+    return np.clip(np.ceil(impact * _IMPACT_SCALE), 1, 255).astype(np.uint8)
+
+
+@dataclass
+class SearchResult:
+    """搜尋結果"""
+    results: List[Dict[str, Any]]
+    total: int
+    source: str
+    total_estimated: bool = False
+    matched_all_terms: bool = True
+
+
+class _Segment:
+    """
+    不可變的主區段
+
+    - 每個詞的 posting 依文件序號排序，存放在連續陣列（文件序號 int32、量化分數 uint8）
+    - 常見詞另有長度為文件數的密集分數陣列（0 表示不含該詞）與依分數排序的文件序號
+    """
+
+    def __init__(self, rows: List[Dict[str, Any]]):
+        self.rows = rows
+        self.ordinals = {row['product_id']: ordinal for ordinal, row in enumerate(rows)}
+        self.alive = np.ones(len(rows), dtype=bool)
+
+        vocabulary: Dict[str, int] = {}
+        term_ids = array('i')
+        frequencies = array('f')
+        term_counts = array('i')
+        lengths = array('f')
+        for row in rows:
+            terms = document_terms(row)
+            term_ids.extend([vocabulary.setdefault(term, len(vocabulary)) for term in terms])
+            frequencies.extend(terms.values())
+            term_counts.append(len(terms))
+            lengths.append(sum(terms.values()))
+
+        self.terms = vocabulary
+        self.lengths = np.frombuffer(lengths, dtype=np.float32)
+        self.average_length = float(self.lengths.mean()) if len(rows) else 1.0
+        doc_ids = np.repeat(np.arange(len(rows), dtype=np.int32), np.frombuffer(term_counts, dtype=np.int32))
+        impacts = quantize_impact(np.frombuffer(frequencies, dtype=np.float32), self.lengths[doc_ids], self.average_length)
+
+        # 穩定排序：同一詞內維持文件序號遞增
+        terms_array = np.frombuffer(term_ids, dtype=np.int32)
+        order = np.argsort(terms_array, kind='stable')
+        self.docs = doc_ids[order]
+        self.impacts = impacts[order]
+        self.df = np.bincount(terms_array, minlength=len(vocabulary))
+        self.offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(self.df, out=self.offsets[1:])
+        self.max_impacts = (
+            np.maximum.reduceat(self.impacts, self.offsets[:-1]) if len(vocabulary) else np.zeros(0, dtype=np.uint8)
+        )
+
+        self.dense: Dict[int, Any] = {}
+        self.by_impact: Dict[int, Any] = {}
+        threshold = max(int(len(rows) * _DENSE_RATIO), 1024)
+        for term_id in np.argsort(-self.df, kind='stable')[:_MAX_DENSE_TERMS].tolist():
+            if self.df[term_id] < threshold:
+                break
+            docs, impacts = self.postings(term_id)
+            dense = np.zeros(len(rows), dtype=np.uint8)
+            dense[docs] = impacts
+            self.dense[term_id] = dense
+            self.by_impact[term_id] = docs[np.argsort(-impacts.astype(np.int16), kind='stable')]
+
+    def postings(self, term_id: int) -> Tuple[Any, Any]:
+        """詞的 (文件序號, 量化分數) 陣列"""
+        start, end = self.offsets[term_id], self.offsets[term_id + 1]
+        return self.docs[start:end], self.impacts[start:end]
+
+
+class SearchIndex:
+    """產品關鍵字倒排索引"""
+
+    def __init__(self, db_client: Optional[DatabaseClient], config: SearchConfig):
+        """
+        初始化搜尋索引（由 reset() 或快照監聽載入資料）
+
+        Args:
+            db_client: 資料庫客戶端（索引尚未載入時回退查詢用，可為 None）
+            config: 搜尋配置
+        """
+        self.db_client = db_client
+        self.config = config
+        self.logger = get_logger(__name__)
+        self.available = config.enabled and HAS_NUMPY
+        if config.enabled and not HAS_NUMPY:
+            self.logger.warning("未安裝 numpy，/search 改以資料庫 ILIKE 查詢")
+
+        self._segment: Optional[_Segment] = None
+        # 差異區段：主區段之後新增或變更的資料列（product_id -> (資料列, 詞頻, 長度)）
+        self._delta: Dict[str, Tuple[Dict[str, Any], Dict[str, int], float]] = {}
+        self._delta_df: Counter = Counter()
+        self._removed = 0
+        self._lock = threading.Lock()
+        self._built_at: Optional[float] = None
+        self._build_seconds: Optional[float] = None
+        self._merges = 0
+
+    @property
+    def ready(self) -> bool:
+        """索引是否已載入"""
+        return self.available and self._segment is not None
+
+    def reset(self, rows: Iterable[Dict[str, Any]]) -> None:
+        """
+        以所有資料列重建索引
+
+        Args:
+            rows: inventory 資料列
+        """
+        if not self.available:
+            return
+        start = time.perf_counter()
+        segment = _Segment(list(rows))
+        with self._lock:
+            self._segment = segment
+            self._delta = {}
+            self._delta_df = Counter()
+            self._removed = 0
+            self._built_at = time.monotonic()
+            self._build_seconds = round(time.perf_counter() - start, 2)
+        self.logger.info(
+            f"搜尋索引已重建 ({len(segment.rows)} 筆、{len(segment.terms)} 個詞，{self._build_seconds}s)"
+        )
+
+    def update(self, old: Optional[Dict[str, Any]], new: Optional[Dict[str, Any]]) -> None:
+        """
+        增量套用單筆資料列變更（差異區段超過 merge_ratio 時合併重建）
+
+        Args:
+            old: 變更前資料列（新增時為 None）
+            new: 變更後資料列（刪除時為 None）
+        """
+        if not self.available or self._segment is None:
+            return
+
+        with self._lock:
+            segment = self._segment
+            product_id = (new or old)['product_id']
+            self._remove_locked(product_id)
+            if new is not None:
+                terms = document_terms(new)
+                self._delta[product_id] = (new, terms, float(sum(terms.values())))
+                self._delta_df.update(terms.keys())
+            needs_merge = len(self._delta) + self._removed > self.config.merge_ratio * max(len(segment.rows), 1)
+
+        if needs_merge:
+            self._merge()
+
+    def _remove_locked(self, product_id: str) -> None:
+        """自主區段與差異區段移除文件（呼叫端持有 _lock）"""
+        previous = self._delta.pop(product_id, None)
+        if previous is not None:
+            self._delta_df.subtract(previous[1].keys())
+            return
+        ordinal = self._segment.ordinals.get(product_id)
+        if ordinal is not None and self._segment.alive[ordinal]:
+            self._segment.alive[ordinal] = False
+            self._removed += 1
+
+    def _merge(self) -> None:
+        """將差異區段併入主區段（重建）"""
+        with self._lock:
+            segment = self._segment
+            rows = [row for ordinal, row in enumerate(segment.rows) if segment.alive[ordinal]]
+            rows.extend(entry[0] for entry in self._delta.values())
+        self.reset(rows)
+        with self._lock:
+            self._merges += 1
+
+    def search(self, query: str, limit: int = 20) -> SearchResult:
+        """
+        搜尋產品（所有詞都需符合；無結果時改為符合任一詞）
+
+        Args:
+            query: 關鍵字
+            limit: 回傳筆數上限
+
+        Returns:
+            SearchResult 依分數排序的結果
+
+        Raises:
+            RuntimeError: 索引未載入且未設定資料庫客戶端
+        """
+        if not self.ready:
+            if self.db_client is None:
+                raise RuntimeError("Search index not loaded")
+            results = self._search_database(query, limit)
+            return SearchResult(results=results, total=len(results), source='database')
+
+        terms = list(dict.fromkeys(tokenize_text(query)))
+        if not terms or limit <= 0:
+            return SearchResult(results=[], total=0, source='index')
+
+        with self._lock:
+            segment = self._segment
+            delta = list(self._delta.values())
+            delta_df = {term: self._delta_df[term] for term in terms}
+            removed = self._removed
+
+        scorer = _Scorer(segment, terms, delta_df, len(segment.rows) - removed + len(delta))
+        matched_all = True
+        candidates, total, estimated = scorer.match_all(limit)
+        extra = scorer.delta_matches(delta, require_all=True)
+        if not total and not extra:
+            matched_all = False
+            candidates, total = scorer.match_any(limit)
+            extra = scorer.delta_matches(delta, require_all=False)
+
+        ranked = [(score, segment.rows[ordinal]) for ordinal, score in candidates] + extra
+        ranked.sort(key=lambda item: (-item[0], item[1]['product_id']))
+
+        results = []
+        for score, row in ranked[:limit]:
+            result = {column: row.get(column) for column in RESULT_COLUMNS}
+            result['score'] = round(score, 4)
+            results.append(result)
+        return SearchResult(
+            results=results,
+            total=total + len(extra),
+            source='index',
+            total_estimated=estimated,
+            matched_all_terms=matched_all
+        )
+
+    def _search_database(self, query: str, limit: int) -> List[Dict[str, Any]]:
+        """以 ILIKE 查詢資料庫（每個關鍵字需出現在任一欄位）"""
+        keywords = query.split()
+        if not keywords:
+            return []
+        columns = [column for column, _ in FIELD_WEIGHTS]
+        clause = '(' + ' OR '.join(f"{column} ILIKE %s" for column in columns) + ')'
+        params: List[Any] = []
+        for keyword in keywords:
+            pattern = '%' + keyword.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            params.extend([pattern] * len(columns))
+        sql = (
+            f"SELECT {', '.join(RESULT_COLUMNS)} FROM inventory "
+            f"WHERE {' AND '.join([clause] * len(keywords))} ORDER BY product_id LIMIT %s"
+        )
+        params.append(limit)
+        rows = self.db_client.execute_query(sql, tuple(params))
+        return DatabaseClient.format_results(rows, limit=limit)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        索引統計
+
+        Returns:
+            文件數、詞數、差異區段大小與重建資訊
+        """
+        with self._lock:
+            segment = self._segment
+            return {
+                'enabled': self.available,
+                'ready': segment is not None,
+                'document_count': len(segment.rows) - self._removed + len(self._delta) if segment else 0,
+                'term_count': len(segment.terms) if segment else 0,
+                'delta_documents': len(self._delta),
+                'removed_documents': self._removed,
+                'merges': self._merges,
+                'build_seconds': self._build_seconds,
+                'seconds_since_build': round(time.monotonic() - self._built_at, 1) if self._built_at else None
+            }
+
+
+class _Scorer:
+    """單次查詢的 BM25 計分（分數為 idf 乘以量化後的單詞分數）"""
+
+    def __init__(self, segment: _Segment, terms: List[str], delta_df: Dict[str, int], document_count: int):
+        self.segment = segment
+        self.terms = terms
+        self.term_ids = {term: segment.terms.get(term) for term in terms}
+        self.idf = {}
+        for term in terms:
+            term_id = self.term_ids[term]
+            df = (int(segment.df[term_id]) if term_id is not None else 0) + delta_df.get(term, 0)
+            self.idf[term] = math.log(1 + (document_count - df + 0.5) / (df + 0.5)) / _IMPACT_SCALE
+
+    def match_all(self, limit: int) -> Tuple[List[Tuple[int, float]], int, bool]:
+        """
+        所有詞都符合的主區段文件（以文件數最少的詞為主，其他詞以二分搜尋或密集陣列求交集）
+
+        Returns:
+            (前 limit 名的 (文件序號, 分數), 符合筆數, 符合筆數是否為估計值)
+        """
+        if any(term_id is None for term_id in self.term_ids.values()):
+            return [], 0, False
+        segment = self.segment
+        ordered = sorted(self.terms, key=lambda term: segment.df[self.term_ids[term]])
+        lead, others = ordered[0], ordered[1:]
+        docs, impacts = segment.postings(self.term_ids[lead])
+        if len(docs) > _SCAN_LIMIT and self.term_ids[lead] in segment.dense:
+            # 最少的詞也非常常見時，其他詞必然都是常見詞
+            return self._match_by_impact(lead, others, limit)
+
+        scores = impacts * np.float32(self.idf[lead])
+        for term in others:
+            if not len(docs):
+                break
+            term_id = self.term_ids[term]
+            if term_id in segment.dense:
+                term_impacts = segment.dense[term_id][docs]
+                hit = term_impacts > 0
+                docs = docs[hit]
+                scores = scores[hit] + term_impacts[hit] * np.float32(self.idf[term])
+                continue
+            term_docs, term_impacts = segment.postings(term_id)
+            if len(docs) > _SEARCHSORTED_LIMIT:
+                # 候選很多時二分搜尋較慢，改為展開成暫時的密集陣列
+                values = np.zeros(len(segment.rows), dtype=np.uint8)
+                values[term_docs] = term_impacts
+                term_impacts = values[docs]
+                hit = term_impacts > 0
+                docs = docs[hit]
+                scores = scores[hit] + term_impacts[hit] * np.float32(self.idf[term])
+                continue
+            positions = np.searchsorted(term_docs, docs)
+            np.minimum(positions, len(term_docs) - 1, out=positions)
+            hit = term_docs[positions] == docs
+            docs = docs[hit]
+            scores = scores[hit] + term_impacts[positions[hit]] * np.float32(self.idf[term])
+
+        alive = segment.alive[docs]
+        docs, scores = docs[alive], scores[alive]
+        return _top(docs, scores, limit), len(docs), False
+
+    def _match_by_impact(self, lead: str, others: List[str], limit: int) -> Tuple[List[Tuple[int, float]], int, bool]:
+        """
+        主詞非常常見時：依主詞分數由高到低逐批計算，剩餘文件的分數上限不超過目前第 limit 名時
+        提前結束（同分時依載入順序）；提前結束時符合筆數以各詞文件比例相乘估計（假設各詞獨立）
+
+        Returns:
+            (前 limit 名的 (文件序號, 分數), 符合筆數, 是否為估計值)
+        """
+        segment = self.segment
+        dense = [(segment.dense[self.term_ids[term]], np.float32(self.idf[term])) for term in others]
+        lead_values, lead_idf = segment.dense[self.term_ids[lead]], np.float32(self.idf[lead])
+        order = segment.by_impact[self.term_ids[lead]]
+        rest_bound = sum(float(segment.max_impacts[self.term_ids[term]]) * self.idf[term] for term in others)
+
+        top_docs = np.zeros(0, dtype=np.int32)
+        top_scores = np.zeros(0, dtype=np.float32)
+        matched = 0
+        scanned = len(order)
+        for start in range(0, len(order), _CHUNK):
+            chunk = order[start:start + _CHUNK]
+            keep = segment.alive[chunk]
+            for values, _ in dense:
+                keep &= values[chunk] > 0
+            chunk = chunk[keep]
+            matched += len(chunk)
+            scores = lead_values[chunk] * lead_idf
+            for values, idf in dense:
+                scores += values[chunk] * idf
+            top_docs = np.concatenate([top_docs, chunk])
+            top_scores = np.concatenate([top_scores, scores])
+            if len(top_docs) > limit:
+                best = np.argpartition(-top_scores, limit - 1)[:limit]
+                top_docs, top_scores = top_docs[best], top_scores[best]
+            if len(top_docs) >= limit and start + _CHUNK < len(order):
+                bound = float(lead_values[order[start + _CHUNK]]) * lead_idf + rest_bound
+                if float(top_scores.min()) >= bound:
+                    scanned = start + _CHUNK
+                    break
+
+        if scanned == len(order):
+            return _top(top_docs, top_scores, limit), matched, False
+        estimate = float(len(order))
+        for term in others:
+            estimate *= segment.df[self.term_ids[term]] / len(segment.rows)
+        return _top(top_docs, top_scores, limit), max(round(estimate), len(top_docs)), True
+
+    def match_any(self, limit: int) -> Tuple[List[Tuple[int, float]], int]:
+        """
+        符合任一詞的主區段文件
+
+        Returns:
+            (前 limit 名的 (文件序號, 分數), 符合筆數)
+        """
+        parts = [
+            (self.segment.postings(term_id), self.idf[term])
+            for term, term_id in self.term_ids.items() if term_id is not None
+        ]
+        if not parts:
+            return [], 0
+        all_docs = np.concatenate([docs for (docs, _), _ in parts])
+        all_scores = np.concatenate([impacts * np.float32(idf) for (_, impacts), idf in parts])
+        docs, inverse = np.unique(all_docs, return_inverse=True)
+        scores = np.bincount(inverse, weights=all_scores)
+        alive = self.segment.alive[docs]
+        docs, scores = docs[alive], scores[alive]
+        return _top(docs, scores, limit), len(docs)
+
+    def delta_matches(
+        self,
+        delta: List[Tuple[Dict[str, Any], Dict[str, int], float]],
+        require_all: bool
+    ) -> List[Tuple[float, Dict[str, Any]]]:
+        """差異區段的符合文件與分數（沿用主區段的平均文件長度）"""
+        matches = []
+        for row, frequencies, length in delta:
+            present = [term for term in self.terms if term in frequencies]
+            if not present or (require_all and len(present) != len(self.terms)):
+                continue
+            norm = _K1 * (1 - _B + _B * length / self.segment.average_length)
+            score = 0.0
+            for term in present:
+                frequency = frequencies[term]
+                impact = min(max(math.ceil(frequency * (_K1 + 1) / (frequency + norm) * _IMPACT_SCALE), 1), 255)
+                score += impact * self.idf[term]
+            matches.append((score, row))
+        return matches
+
+
+def _top(docs: Any, scores: Any, limit: int) -> List[Tuple[int, float]]:
+    """分數前 limit 名的 (文件序號, 分數)"""
+    if len(docs) > limit:
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        docs, scores = docs[top], scores[top]
+    return list(zip(docs.tolist(), scores.tolist()))
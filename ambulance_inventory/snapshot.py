@@ -0,0 +1,342 @@
+"""
+庫存快照模組
+將 inventory 載入行程內的欄位式儲存，支援範圍內的 SQL 直接在本地執行，
+其餘查詢回退到 PostgreSQL；以 last_updated 增量刷新並統計本地命中率。
+變更的資料列也會通知已註冊的監聽者（如聚合 cube、搜尋索引）；
+未啟用本地執行時，只要有監聽者仍會載入與刷新資料列（不建立欄位陣列）
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Optional, Dict, Any, List, Tuple, Protocol
+
+from .config import SnapshotConfig, INVENTORY_COLUMNS
+from .database import DatabaseClient
+from .local_executor import HAS_NUMPY, ColumnStore, LocalPlan, UnsupportedQuery, compile_sql, execute_plan
+from .metrics import CACHE_LOOKUPS_TOTAL
+from .utils.logger import get_logger
+
+
+_SELECT_COLUMNS = ', '.join(INVENTORY_COLUMNS)
+
+# 筆數與 product_id 校驗和（md5 前 15 個十六進位數字的加總）：先刪除再新增其他資料列時
+# 筆數不變，但校驗和會改變；本地以 _id_checksum() 維護相同的值
+_STATUS_SQL = (
+    "SELECT COUNT(*) AS count, "
+    "COALESCE(SUM(('x' || substr(md5(product_id), 1, 15))::bit(60)::bigint), 0) AS checksum "
+    "FROM inventory"
+)
+
+
+def _id_checksum(product_id: str) -> int:
+    """與 _STATUS_SQL 相同的單筆 product_id 校驗值"""
+    return int(hashlib.md5(str(product_id).encode('utf-8')).hexdigest()[:15], 16)
+
+
+class SnapshotListener(Protocol):
+    """快照資料變更的監聽者"""
+
+    def reset(self, rows: List[Dict[str, Any]]) -> None:
+        """完整載入後以所有資料列重建"""
+
+    def update(self, old: Optional[Dict[str, Any]], new: Optional[Dict[str, Any]]) -> None:
+        """單筆資料列變更（old 為 None 表示新增）"""
+
+
+class InventorySnapshot:
+    """inventory 行程內快照"""
+
+    def __init__(self, db_client: DatabaseClient, config: SnapshotConfig):
+        """
+        初始化快照（需呼叫 load() 或 start() 後才可使用）
+
+        Args:
+            db_client: 資料庫客戶端
+            config: 快照配置
+        """
+        self.db_client = db_client
+        self.config = config
+        self.logger = get_logger(__name__)
+        self.available = config.enabled
+        if config.enabled and not HAS_NUMPY:
+            self.logger.warning("未安裝 numpy，inventory 快照只通知監聽者，不在本地執行 SQL")
+
+        self._store: Optional[ColumnStore] = None
+        self._rows: Dict[str, Dict[str, Any]] = {}
+        self._positions: Dict[str, int] = {}
+        self._slots = 0
+        self._checksum = 0
+        self._watermark = None
+        self._loaded_at: Optional[float] = None
+        self._refreshed_at: Optional[float] = None
+        self._listeners: List[SnapshotListener] = []
+        self._refresh_lock = threading.Lock()
+        self._plans: 'OrderedDict[str, Optional[LocalPlan]]' = OrderedDict()
+        self._stats_lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._refresh_errors = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def ready(self) -> bool:
+        """快照是否已載入且可在本地執行 SQL"""
+        return self.available and self._store is not None
+
+    def add_listener(self, listener: SnapshotListener) -> None:
+        """
+        註冊資料變更監聽者（已載入時立即以目前資料重建）
+
+        Args:
+            listener: 監聽者
+        """
+        with self._refresh_lock:
+            self._listeners.append(listener)
+            if self._loaded_at is not None:
+                listener.reset(list(self._rows.values()))
+
+    def load(self) -> int:
+        """
+        完整載入 inventory
+
+        Returns:
+            載入筆數
+
+        Raises:
+            psycopg2.Error: 資料庫錯誤
+        """
+        rows = self.db_client.execute_query(f"SELECT {_SELECT_COLUMNS} FROM inventory")
+        with self._refresh_lock:
+            self._rows = {row['product_id']: row for row in rows}
+            self._checksum = sum(_id_checksum(product_id) for product_id in self._rows)
+            self._rebuild()
+            self._loaded_at = self._refreshed_at = time.monotonic()
+            for listener in self._listeners:
+                listener.reset(rows)
+        self.logger.info(f"inventory 快照已載入 {len(rows)} 筆")
+        return len(rows)
+
+    def refresh(self) -> int:
+        """
+        以 last_updated 增量刷新，只修補變更的位置
+
+        以筆數與 product_id 校驗和偵測刪除，不符時只查詢 product_id 找出刪除的資料列；
+        仍不符（刷新期間又有寫入）時改為完整載入
+
+        Returns:
+            變更筆數（含刪除）
+
+        Raises:
+            psycopg2.Error: 資料庫錯誤
+        """
+        if self._loaded_at is None or \
+                time.monotonic() - self._loaded_at >= self.config.full_reload_interval:
+            return self.load()
+
+        changed = []
+        if self._watermark is not None:
+            # last_updated 由觸發器設為交易開始時間，較晚提交的交易可能帶有早於水位的時間戳，
+            # 因此往回重疊 watermark_overlap 秒；未變更的資料列在比較後忽略
+            rows = self.db_client.execute_query(
+                f"SELECT {_SELECT_COLUMNS} FROM inventory WHERE last_updated >= %s",
+                (self._watermark - timedelta(seconds=self.config.watermark_overlap),)
+            )
+            changed = [row for row in rows if self._rows.get(row['product_id']) != row]
+        status = self.db_client.execute_query(_STATUS_SQL)[0]
+        expected = (status['count'], int(status['checksum']))
+
+        # 只有刷新執行緒會修改 _rows，在鎖外讀取不會看到修改到一半的狀態
+        ids = set(self._rows) | {row['product_id'] for row in changed}
+        checksum = self._checksum + sum(
+            _id_checksum(row['product_id']) for row in changed if row['product_id'] not in self._rows
+        )
+        deleted: List[str] = []
+        if (len(ids), checksum) != expected:
+            present = {
+                row['product_id'] for row in self.db_client.execute_query("SELECT product_id FROM inventory")
+            }
+            deleted = [product_id for product_id in ids if product_id not in present]
+            checksum -= sum(_id_checksum(product_id) for product_id in deleted)
+            if (len(ids) - len(deleted), checksum) != expected:
+                return self.load()
+
+        with self._refresh_lock:
+            updates, appended = [], []
+            for row in changed:
+                product_id = row['product_id']
+                old = self._rows.get(product_id)
+                self._rows[product_id] = row
+                for listener in self._listeners:
+                    listener.update(old, row)
+                position = self._positions.get(product_id)
+                if position is None:
+                    self._positions[product_id] = self._slots
+                    self._slots += 1
+                    appended.append(row)
+                else:
+                    updates.append((position, row))
+            removed = []
+            for product_id in deleted:
+                old = self._rows.pop(product_id)
+                for listener in self._listeners:
+                    listener.update(old, None)
+                removed.append(self._positions.pop(product_id))
+            self._checksum = checksum
+            if changed or removed:
+                self._patch(changed, updates, appended, removed)
+            self._refreshed_at = time.monotonic()
+
+        if changed or deleted:
+            self.logger.info(f"inventory 快照增量更新 {len(changed)} 筆、刪除 {len(deleted)} 筆")
+        return len(changed) + len(deleted)
+
+    def _rebuild(self) -> None:
+        """重建欄位陣列（沿用字典編碼；呼叫端持有 _refresh_lock）"""
+        previous = self._store.dictionaries if self._store is not None else None
+        rows = list(self._rows.values())
+        self._positions = {product_id: position for position, product_id in enumerate(self._rows)}
+        self._slots = len(rows)
+        timestamps = [row['last_updated'] for row in rows if row.get('last_updated') is not None]
+        self._watermark = max(timestamps) if timestamps else None
+        # 整個物件替換，讀取端不需加鎖
+        if self.available and HAS_NUMPY:
+            self._store = ColumnStore(rows, previous)
+
+    def _patch(
+        self,
+        changed: List[Dict[str, Any]],
+        updates: List[Tuple[int, Dict[str, Any]]],
+        appended: List[Dict[str, Any]],
+        removed: List[int]
+    ) -> None:
+        """增量修補欄位陣列與水位（呼叫端持有 _refresh_lock）"""
+        timestamps = [row['last_updated'] for row in changed if row.get('last_updated') is not None]
+        if timestamps:
+            self._watermark = max(timestamps + ([self._watermark] if self._watermark is not None else []))
+        # 產生新物件後整個替換，讀取端不需加鎖
+        if self._store is not None:
+            self._store = self._store.patch(updates, appended, removed)
+
+    def compile(self, sql: str) -> Optional[LocalPlan]:
+        """
+        編譯 SQL（結果快取，不支援的 SQL 也會快取）
+
+        Args:
+            sql: SQL 語句
+
+        Returns:
+            LocalPlan，超出本地執行範圍時返回 None
+        """
+        with self._stats_lock:
+            if sql in self._plans:
+                self._plans.move_to_end(sql)
+                return self._plans[sql]
+
+        try:
+            plan: Optional[LocalPlan] = compile_sql(sql)
+        except UnsupportedQuery as e:
+            self.logger.debug(f"本地執行不支援，回退資料庫: {str(e)}")
+            plan = None
+
+        with self._stats_lock:
+            self._plans[sql] = plan
+            while len(self._plans) > self.config.plan_cache_size:
+                self._plans.popitem(last=False)
+        return plan
+
+    def can_execute(self, sql: str) -> bool:
+        """
+        SQL 是否可在本地執行
+
+        Args:
+            sql: SQL 語句
+
+        Returns:
+            快照已載入且 SQL 在支援範圍內
+        """
+        return self.ready and self.compile(sql) is not None
+
+    def execute(self, sql: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        在快照上執行 SQL
+
+        Args:
+            sql: SQL 語句
+
+        Returns:
+            查詢結果列表，不支援或快照未載入時返回 None（由呼叫端改送資料庫）
+        """
+        if not self.available:
+            return None
+
+        store = self._store
+        plan = self.compile(sql) if store is not None else None
+        results = None
+        if plan is not None:
+            try:
+                results = execute_plan(plan, store)
+            except UnsupportedQuery as e:
+                self.logger.debug(f"本地執行不支援，回退資料庫: {str(e)}")
+            except Exception as e:
+                self.logger.warning(f"本地執行失敗，回退資料庫: {str(e)}")
+
+        with self._stats_lock:
+            if results is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+        CACHE_LOOKUPS_TOTAL.inc(cache='snapshot', result='miss' if results is None else 'hit')
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        快照統計
+
+        Returns:
+            筆數、命中率與資料新舊程度
+        """
+        now = time.monotonic()
+        with self._stats_lock:
+            total = self._hits + self._misses
+            return {
+                'enabled': self.available,
+                'ready': self.ready,
+                'row_count': len(self._rows),
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': round(self._hits / total, 4) if total else None,
+                'refresh_errors': self._refresh_errors,
+                'seconds_since_refresh': round(now - self._refreshed_at, 1) if self._refreshed_at is not None else None,
+                'seconds_since_full_load': round(now - self._loaded_at, 1) if self._loaded_at is not None else None
+            }
+
+    def start(self) -> None:
+        """啟動背景刷新執行緒（首次載入也在背景進行；未啟用本地執行且沒有監聽者時不啟動）"""
+        if not (self.available or self._listeners) or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="inventory-snapshot", daemon=True)
+        self._thread.start()
+        mode = "本地執行與監聽者" if self.available else "僅通知監聽者"
+        self.logger.info(f"inventory 快照已啟動 ({mode}，刷新間隔 {self.config.refresh_interval}s)")
+
+    def stop(self) -> None:
+        """停止背景刷新執行緒"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def _run(self) -> None:
+        """背景刷新迴圈"""
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                with self._stats_lock:
+                    self._refresh_errors += 1
+                self.logger.warning(f"inventory 快照刷新失敗: {str(e)}")
+            self._stop.wait(self.config.refresh_interval)
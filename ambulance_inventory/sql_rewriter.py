@@ -0,0 +1,539 @@
+"""
+SQL 改寫模組
+在執行前依成本考量改寫 LLM 生成的 SQL：限制回傳筆數、投影必要欄位、
+將有限值域欄位的 ILIKE 改為等值比對（可使用索引），並補上預設的庫存條件。
+欄位值域依 value_ttl 快取，註冊為快照監聽者時隨資料變更補上新值
+"""
+
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Any, List, Tuple
+
+from .config import RewriteConfig, INVENTORY_COLUMNS, DISPLAY_COLUMNS, ENUM_COLUMNS
+from .database import DatabaseClient
+from .utils.deadline import Deadline, QueryAborted
+from .utils.logger import get_logger
+from .utils.sql_lexer import analyze_sql, SqlAnalysis, Token, TokenType
+from .utils.validators import validate_analysis
+
+
+# 結束 WHERE 條件的子句關鍵字
+_AFTER_WHERE = frozenset({'GROUP', 'HAVING', 'WINDOW', 'ORDER', 'LIMIT', 'OFFSET', 'FETCH'})
+
+# 出現在最上層時不做結構改寫的關鍵字
+_COMPLEX_KEYWORDS = frozenset({'UNION', 'INTERSECT', 'EXCEPT', 'WITH', 'JOIN', 'FETCH', 'INTO'})
+
+# 條件的前後邊界（ILIKE 兩側只有欄位與常值時才改寫）
+_CONDITION_BEFORE = frozenset({'WHERE', 'AND', 'OR', 'NOT', 'ON', 'HAVING', 'WHEN'})
+_CONDITION_AFTER = frozenset({'AND', 'OR', 'THEN', 'UNION', 'INTERSECT', 'EXCEPT'}) | _AFTER_WHERE
+
+# 單一 ILIKE 改寫為 IN 清單的最大值數
+_MAX_IN_VALUES = 20
+
+_STOCK_COLUMN = 'stock_quantity'
+
+# 聚合函數（無 GROUP BY 時只回傳一列，不需限制筆數）
+_AGGREGATES = frozenset({'count', 'sum', 'avg', 'min', 'max'})
+
+
+@dataclass
+class RewriteResult:
+    """SQL 改寫結果"""
+    sql: str
+    original_sql: str
+    rewrites: List[str] = field(default_factory=list)
+    cost_before: Optional[float] = None
+    cost_after: Optional[float] = None
+    plan: Optional[Dict[str, Any]] = None
+
+    @property
+    def changed(self) -> bool:
+        """是否有改寫"""
+        return bool(self.rewrites)
+
+
+def like_to_regex(pattern: str) -> re.Pattern:
+    """
+    將 LIKE 樣式轉換為正則（% 任意字串、_ 單一字元、反斜線跳脫）
+
+    Args:
+        pattern: LIKE 樣式
+
+    Returns:
+        不分大小寫的正則（以 fullmatch 比對）
+    """
+    parts = []
+    escaped = False
+    for char in pattern:
+        if escaped:
+            parts.append(re.escape(char))
+            escaped = False
+        elif char == '\\':
+            escaped = True
+        elif char == '%':
+            parts.append('.*')
+        elif char == '_':
+            parts.append('.')
+        else:
+            parts.append(re.escape(char))
+    return re.compile(''.join(parts), re.IGNORECASE | re.DOTALL)
+
+
+def quote_literal(value: str) -> str:
+    """產生 SQL 字串常值"""
+    return "'" + value.replace("'", "''") + "'"
+
+
+class SqlRewriter:
+    """成本導向的 SQL 改寫器"""
+
+    def __init__(self, db_client: Optional[DatabaseClient], config: RewriteConfig):
+        """
+        初始化 SQL 改寫器
+
+        Args:
+            db_client: 資料庫客戶端（載入欄位值域與 EXPLAIN 用，可為 None）
+            config: SQL 改寫配置
+        """
+        self.db_client = db_client
+        self.config = config
+        self.logger = get_logger(__name__)
+        self._values: Optional[Dict[str, List[str]]] = None
+        self._values_loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def known_values(self) -> Dict[str, List[str]]:
+        """
+        取得有限值域欄位的現有值（依 value_ttl 快取）
+
+        Returns:
+            欄位名稱到值列表的對應，載入失敗時為空字典
+        """
+        with self._lock:
+            if self._values is not None and time.monotonic() - self._values_loaded_at < self.config.value_ttl:
+                return self._values
+
+            values: Dict[str, List[str]] = {}
+            if self.db_client is not None:
+                try:
+                    for column in ENUM_COLUMNS:
+                        rows = self.db_client.execute_query(
+                            f"SELECT DISTINCT {column} AS value FROM inventory WHERE {column} IS NOT NULL"
+                        )
+                        values[column] = [row['value'] for row in rows]
+                except Exception as e:
+                    self.logger.warning(f"載入欄位值域失敗: {str(e)}")
+                    values = {}
+
+            self._values = values
+            self._values_loaded_at = time.monotonic()
+            return values
+
+    def reset(self, rows: List[Dict[str, Any]]) -> None:
+        """
+        快照完整載入後以資料列重建欄位值域（快照監聽者介面）
+
+        Args:
+            rows: inventory 資料列
+        """
+        values = {
+            column: sorted({row[column] for row in rows if row.get(column) is not None})
+            for column in ENUM_COLUMNS
+        }
+        with self._lock:
+            self._values = values
+            self._values_loaded_at = time.monotonic()
+
+    def update(self, old: Optional[Dict[str, Any]], new: Optional[Dict[str, Any]]) -> None:
+        """
+        單筆資料列變更時補上新出現的值（快照監聽者介面）
+
+        值域缺少新值時 ILIKE 改寫成的等值或 IN 條件會漏掉新資料列；
+        多出已不存在的值則不影響結果，因此只需補上新值
+
+        Args:
+            old: 變更前的資料列（新增時為 None）
+            new: 變更後的資料列（刪除時為 None）
+        """
+        if new is None:
+            return
+        with self._lock:
+            if self._values is None:
+                return
+            for column in ENUM_COLUMNS:
+                value = new.get(column)
+                known = self._values.get(column)
+                if value is not None and known is not None and value not in known:
+                    self._values = {**self._values, column: known + [value]}
+
+    def rewrite(self, sql: str, deadline: Optional[Deadline] = None, explain: bool = True) -> RewriteResult:
+        """
+        改寫 SQL（未通過驗證的 SQL 不改寫）
+
+        Args:
+            sql: 已清理的 SQL
+            deadline: 請求時限（可選，用於 EXPLAIN）
+            explain: 是否以 EXPLAIN 記錄改寫前後成本（本地執行的查詢不需要）
+
+        Returns:
+            RewriteResult 改寫結果
+        """
+        result = RewriteResult(sql=sql, original_sql=sql)
+        if not self.config.enabled or not sql:
+            return result
+
+        analysis = analyze_sql(sql)
+        if not validate_analysis(analysis)[0] or analysis.statement_count != 1:
+            return result
+
+        edits: List[Tuple[int, int, str]] = []
+        self._rewrite_enum_ilike(analysis.tokens, edits, result.rewrites)
+
+        shape = _QueryShape(analysis)
+        if shape.simple:
+            self._project_columns(shape, analysis, edits, result.rewrites)
+            if self.config.inject_stock_filter:
+                self._inject_stock_filter(sql, shape, edits, result.rewrites)
+            self._cap_rows(sql, shape, edits, result.rewrites)
+
+        if not edits:
+            return result
+
+        result.sql = _apply_edits(sql, edits)
+        for rewrite in result.rewrites:
+            self.logger.info(f"SQL 改寫: {rewrite}")
+
+        if explain and self.config.explain and self.db_client is not None:
+            plan_before = self._explain(sql, deadline)
+            result.plan = self._explain(result.sql, deadline)
+            if plan_before is not None and result.plan is not None:
+                result.cost_before = float(plan_before['Total Cost'])
+                result.cost_after = float(result.plan['Total Cost'])
+                self.logger.info(
+                    f"SQL 改寫 EXPLAIN 成本: {result.cost_before:.2f} -> {result.cost_after:.2f}"
+                )
+
+        return result
+
+    def _explain(self, sql: str, deadline: Optional[Deadline]) -> Optional[Dict[str, Any]]:
+        """
+        取得執行計畫
+
+        Returns:
+            最上層計畫節點，失敗時返回 None
+        """
+        try:
+            return self.db_client.explain(sql, deadline=deadline)
+        except QueryAborted:
+            raise
+        except Exception as e:
+            self.logger.debug(f"EXPLAIN 失敗: {str(e)}")
+            return None
+
+    def _rewrite_enum_ilike(
+        self,
+        tokens: List[Token],
+        edits: List[Tuple[int, int, str]],
+        rewrites: List[str]
+    ) -> None:
+        """將 category/brand 的 ILIKE 改寫為等值比對或 IN 清單（值域已知時）"""
+        values = None
+        for index in range(1, len(tokens) - 1):
+            token = tokens[index]
+            if token.type is not TokenType.KEYWORD or token.upper != 'ILIKE':
+                continue
+
+            column, literal = tokens[index - 1], tokens[index + 1]
+            if column.type is not TokenType.IDENTIFIER or column.value.lower() not in ENUM_COLUMNS:
+                continue
+            if literal.type is not TokenType.STRING or not literal.value.startswith("'"):
+                continue
+            # 兩側都必須是條件邊界（如 '%' || 'AED' || '%'、ESCAPE、'x' || category 不改寫）
+            if not _condition_starts_at(tokens, index - 1) or not _condition_ends_at(tokens, index + 2):
+                continue
+
+            if values is None:
+                values = self.known_values()
+            name = column.value.lower()
+            pattern = like_to_regex(literal.value[1:-1].replace("''", "'"))
+            matches = [value for value in values.get(name, []) if pattern.fullmatch(value)]
+            if not matches or len(matches) > _MAX_IN_VALUES:
+                continue
+
+            if len(matches) == 1:
+                replacement = f"= {quote_literal(matches[0])}"
+            else:
+                replacement = f"IN ({', '.join(quote_literal(value) for value in sorted(matches))})"
+            edits.append((token.start, literal.start + len(literal.value), replacement))
+            rewrites.append(f"{name} ILIKE {literal.value} -> {name} {replacement}")
+
+    def _project_columns(
+        self,
+        shape: '_QueryShape',
+        analysis: SqlAnalysis,
+        edits: List[Tuple[int, int, str]],
+        rewrites: List[str]
+    ) -> None:
+        """將 SELECT * 改為投影顯示所需欄位（加上查詢其他部分引用的欄位）"""
+        select_list = shape.select_list
+        if len(select_list) != 1 or select_list[0].value != '*':
+            return
+        if shape.has('GROUP'):
+            return
+
+        columns = [
+            column for column in INVENTORY_COLUMNS
+            if column in DISPLAY_COLUMNS or column in analysis.columns
+        ]
+        star = select_list[0]
+        edits.append((star.start, star.start + 1, ', '.join(columns)))
+        rewrites.append(f"SELECT * -> SELECT {', '.join(columns)}")
+
+    def _inject_stock_filter(
+        self,
+        sql: str,
+        shape: '_QueryShape',
+        edits: List[Tuple[int, int, str]],
+        rewrites: List[str]
+    ) -> None:
+        """選取庫存數量、且未對庫存設條件或排序時，補上 stock_quantity > 0"""
+        if shape.has('GROUP') or shape.has('HAVING'):
+            return
+
+        def references_stock(tokens: List[Token]) -> bool:
+            return any(token.type is TokenType.IDENTIFIER and token.value.lower() == _STOCK_COLUMN for token in tokens)
+
+        # 依庫存排序（如庫存最少的品項）或已設庫存條件時，零庫存的資料列可能正是要找的結果
+        where = shape.where
+        if not references_stock(shape.select_list) or references_stock(where) or references_stock(shape.order_by):
+            return
+
+        condition = f"{_STOCK_COLUMN} > 0"
+        if where:
+            if shape.where_has_top_level_or():
+                edits.append((where[0].start, where[0].start, '('))
+                edits.append((_token_end(where[-1]), _token_end(where[-1]), f') AND {condition}'))
+            else:
+                edits.append((_token_end(where[-1]), _token_end(where[-1]), f' AND {condition}'))
+        else:
+            position = shape.clause_start('WHERE', sql)
+            edits.append((position, position, f' WHERE {condition}'))
+        rewrites.append(f"加上預設條件 {condition}")
+
+    def _cap_rows(
+        self,
+        sql: str,
+        shape: '_QueryShape',
+        edits: List[Tuple[int, int, str]],
+        rewrites: List[str]
+    ) -> None:
+        """未指定 LIMIT 或 LIMIT 超過上限時，限制回傳筆數"""
+        cap_edit = _row_cap_edit(sql, shape, self.config.max_rows)
+        if cap_edit is not None:
+            edits.append(cap_edit[0])
+            rewrites.append(cap_edit[1])
+
+
+def limit_sql(sql: str, max_rows: int) -> Optional[str]:
+    """
+    限制查詢回傳筆數（補上 LIMIT 或降低超過上限的 LIMIT）
+
+    Args:
+        sql: SQL 語句
+        max_rows: 筆數上限
+
+    Returns:
+        加上限制後的 SQL；已在上限內時返回原 SQL；無法安全加上 LIMIT 時返回 None
+    """
+    analysis = analyze_sql(sql)
+    shape = _QueryShape(analysis)
+    if analysis.statement_count != 1 or not shape.simple:
+        return None
+
+    cap_edit = _row_cap_edit(sql, shape, max_rows)
+    if cap_edit is None:
+        limit_index = shape.top_level.get('LIMIT')
+        return sql if limit_index is not None else None
+    return _apply_edits(sql, [cap_edit[0]])
+
+
+def _row_cap_edit(
+    sql: str,
+    shape: '_QueryShape',
+    cap: int
+) -> Optional[Tuple[Tuple[int, int, str], str]]:
+    """
+    計算限制筆數的編輯
+
+    Returns:
+        (編輯, 說明)，不需或無法限制時返回 None
+    """
+    if cap <= 0:
+        return None
+
+    limit_index = shape.top_level.get('LIMIT')
+    if limit_index is None:
+        # 無 GROUP BY 的聚合查詢只回傳一列（視窗函式 count(*) OVER (...) 每列都回傳，不在此列）
+        select_list = shape.select_list
+        windowed = any(
+            token.upper == 'OVER' and previous.value == ')'
+            for previous, token in zip(select_list, select_list[1:])
+        )
+        if not shape.has('GROUP') and not windowed and any(
+            token.type is TokenType.IDENTIFIER and token.value.lower() in _AGGREGATES
+            for token in select_list
+        ):
+            return None
+        position = shape.statement_end(sql)
+        return (position, position, f' LIMIT {cap}'), f"加上 LIMIT {cap}"
+
+    value = shape.tokens[limit_index + 1] if limit_index + 1 < len(shape.tokens) else None
+    if value is None:
+        return None
+    if value.type is TokenType.NUMBER and value.value.isdigit() and int(value.value) > cap:
+        return (value.start, _token_end(value), str(cap)), f"LIMIT {value.value} -> LIMIT {cap}"
+    if value.type is TokenType.KEYWORD and value.upper == 'ALL':
+        return (value.start, _token_end(value), str(cap)), f"LIMIT ALL -> LIMIT {cap}"
+    return None
+
+
+class _QueryShape:
+    """最上層子句位置（僅適用單一資料表的簡單 SELECT）"""
+
+    def __init__(self, analysis: SqlAnalysis):
+        self.tokens = analysis.tokens
+        self.top_level: Dict[str, int] = {}
+        self.depths: List[int] = []
+
+        depth = 0
+        complex_query = False
+        for index, token in enumerate(self.tokens):
+            if token.value == ')':
+                depth -= 1
+            self.depths.append(depth)
+            if token.value == '(':
+                depth += 1
+            if depth == 0 and token.type is TokenType.KEYWORD:
+                upper = token.upper
+                if upper in _COMPLEX_KEYWORDS:
+                    complex_query = True
+                self.top_level.setdefault(upper, index)
+
+        self.simple = (
+            not complex_query and
+            analysis.tables == {'inventory'} and
+            self.top_level.get('SELECT') == 0 and
+            'FROM' in self.top_level
+        )
+
+    def has(self, keyword: str) -> bool:
+        """最上層是否有該關鍵字"""
+        return keyword in self.top_level
+
+    def _range(self, start_keyword: str, stop_keywords) -> Tuple[int, int]:
+        """子句 token 範圍（不含子句關鍵字本身）"""
+        start = self.top_level.get(start_keyword)
+        if start is None:
+            return 0, 0
+        stops = [index for keyword, index in self.top_level.items() if keyword in stop_keywords and index > start]
+        end = min(stops) if stops else len(self.tokens)
+        if end > start and self.tokens[end - 1].value == ';':
+            end -= 1
+        return start + 1, end
+
+    @property
+    def select_list(self) -> List[Token]:
+        """SELECT 與 FROM 之間的最上層 token"""
+        start, end = self._range('SELECT', {'FROM'})
+        return [token for index, token in enumerate(self.tokens[start:end], start) if self.depths[index] == 0]
+
+    @property
+    def where(self) -> List[Token]:
+        """WHERE 條件的所有 token"""
+        start, end = self._range('WHERE', _AFTER_WHERE)
+        return self.tokens[start:end]
+
+    def where_has_top_level_or(self) -> bool:
+        """WHERE 條件最上層是否有 OR（附加條件時需加括號）"""
+        start, end = self._range('WHERE', _AFTER_WHERE)
+        return any(
+            self.depths[index] == 0 and self.tokens[index].type is TokenType.KEYWORD and
+            self.tokens[index].upper == 'OR'
+            for index in range(start, end)
+        )
+
+    @property
+    def order_by(self) -> List[Token]:
+        """ORDER BY 的 token"""
+        start, end = self._range('ORDER', {'LIMIT', 'OFFSET', 'FETCH'})
+        return self.tokens[start:end]
+
+    def clause_start(self, keyword: str, sql: str) -> int:
+        """
+        新增子句的插入位置（插在順序在其後的第一個子句之前）
+
+        Args:
+            keyword: 要新增的子句
+            sql: 原始 SQL
+
+        Returns:
+            字元位置
+        """
+        following = _AFTER_WHERE if keyword == 'WHERE' else set()
+        indexes = [index for name, index in self.top_level.items() if name in following]
+        if not indexes:
+            return self.statement_end(sql)
+        previous = self.tokens[min(indexes) - 1]
+        return _token_end(previous)
+
+    def statement_end(self, sql: str) -> int:
+        """語句結尾位置（結尾分號之前）"""
+        last = self.tokens[-1]
+        if last.value == ';' and len(self.tokens) > 1:
+            return _token_end(self.tokens[-2])
+        return _token_end(last)
+
+
+def _condition_starts_at(tokens: List[Token], index: int) -> bool:
+    """tokens[index] 是否為條件的第一個 token（前一個 token 為條件邊界）"""
+    if index == 0:
+        return False
+    previous = tokens[index - 1]
+    if previous.type is TokenType.KEYWORD:
+        return previous.upper in _CONDITION_BEFORE
+    return previous.value == '('
+
+
+def _condition_ends_at(tokens: List[Token], index: int) -> bool:
+    """條件是否在 tokens[index] 之前結束（語句結尾、右括號、分號或子句關鍵字）"""
+    if index >= len(tokens):
+        return True
+    following = tokens[index]
+    if following.type is TokenType.KEYWORD:
+        return following.upper in _CONDITION_AFTER
+    return following.value in (')', ';')
+
+
+def _token_end(token: Token) -> int:
+    """token 結束位置"""
+    return token.start + len(token.value)
+
+
+def _apply_edits(sql: str, edits: List[Tuple[int, int, str]]) -> str:
+    """
+    依位置套用文字編輯（由後往前，位置不互相影響）
+
+    Args:
+        sql: 原始 SQL
+        edits: (起點, 終點, 取代文字) 列表
+
+    Returns:
+        編輯後的 SQL
+    """
+    # 同一位置的多個插入依加入順序排列（後加入的先套用，最後位於較後方）
+    ordered = sorted(enumerate(edits), key=lambda item: (item[1][0], item[1][1], item[0]), reverse=True)
+    for _, (start, end, text) in ordered:
+        sql = sql[:start] + text + sql[end:]
+    return sql
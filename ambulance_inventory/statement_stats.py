@@ -0,0 +1,233 @@
+"""
+SQL 指紋統計模組
+仿 pg_stat_statements，在記憶體中依 SQL 指紋累計呼叫次數、錯誤數、總/平均/最長耗時與筆數，
+超過最大指紋數時淘汰最久未執行的指紋。
+執行時間超過門檻的 SELECT 依取樣率在背景重新以 EXPLAIN (ANALYZE, BUFFERS) 執行並保存計畫，
+不需 DBA 權限即可找出缺少索引的查詢與不良的 LLM 查詢模式
+"""
+
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Optional, Dict, Any, List, Callable
+
+from .config import StatementStatsConfig
+from .utils.logger import get_logger
+from .utils.sql_lexer import analyze_sql
+
+
+ORDERS = ('total', 'mean', 'max', 'calls')
+
+
+class _Statement:
+    """單一指紋的累計統計"""
+
+    __slots__ = ('fingerprint', 'example_sql', 'calls', 'errors', 'rows', 'total_ms', 'min_ms', 'max_ms',
+                 'last_called', 'last_capture', 'plans')
+
+    def __init__(self, fingerprint: str, example_sql: str, max_plans: int):
+        self.fingerprint = fingerprint
+        self.example_sql = example_sql
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.total_ms = 0.0
+        self.min_ms: Optional[float] = None
+        self.max_ms = 0.0
+        self.last_called = 0.0
+        self.last_capture = 0.0
+        self.plans: deque = deque(maxlen=max(1, max_plans))
+
+    def to_dict(self, include_plans: bool) -> Dict[str, Any]:
+        succeeded = self.calls - self.errors
+        result = {
+            'fingerprint': self.fingerprint,
+            'example_sql': self.example_sql,
+            'calls': self.calls,
+            'errors': self.errors,
+            'rows': self.rows,
+            'total_ms': round(self.total_ms, 3),
+            'mean_ms': round(self.total_ms / self.calls, 3) if self.calls else 0.0,
+            'min_ms': round(self.min_ms, 3) if self.min_ms is not None else None,
+            'max_ms': round(self.max_ms, 3),
+            'mean_rows': round(self.rows / succeeded, 1) if succeeded else None,
+            'last_called': self.last_called,
+            'plan_count': len(self.plans)
+        }
+        if include_plans:
+            result['plans'] = list(self.plans)
+        return result
+
+
+class StatementStats:
+    """依 SQL 指紋累計執行統計並取樣擷取 EXPLAIN ANALYZE"""
+
+    def __init__(self, config: StatementStatsConfig, explain_analyze: Callable[[str, Optional[tuple]], Dict[str, Any]]):
+        """
+        初始化統計
+
+        Args:
+            config: 指紋統計配置
+            explain_analyze: 以 EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) 執行 SQL 並返回計畫的函數
+        """
+        self.config = config
+        self.explain_analyze = explain_analyze
+        self.logger = get_logger(__name__)
+        self._statements: 'OrderedDict[str, _Statement]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._capturing = False
+        self._evictions = 0
+        self._captures = 0
+        self._capture_errors = 0
+        self._reset_at = time.time()
+
+    def record(
+        self,
+        sql: str,
+        duration_ms: float,
+        row_count: Optional[int] = None,
+        params: Optional[tuple] = None,
+        error: bool = False
+    ) -> None:
+        """
+        記錄一次執行（超過門檻時依取樣率在背景擷取執行計畫）
+
+        Args:
+            sql: 執行的 SQL
+            duration_ms: 執行與取回結果的耗時（毫秒，不含連線）
+            row_count: 返回筆數（失敗時為 None）
+            params: 查詢參數（擷取計畫時沿用）
+            error: 是否執行失敗
+        """
+        if not self.config.enabled:
+            return
+        analysis = analyze_sql(sql)
+        fingerprint = analysis.fingerprint
+        now = time.time()
+        capture = False
+
+        with self._lock:
+            statement = self._statements.get(fingerprint)
+            if statement is None:
+                statement = _Statement(fingerprint, sql, self.config.max_plans)
+                self._statements[fingerprint] = statement
+                while len(self._statements) > self.config.max_fingerprints:
+                    self._statements.popitem(last=False)
+                    self._evictions += 1
+            else:
+                self._statements.move_to_end(fingerprint)
+
+            statement.calls += 1
+            statement.last_called = now
+            statement.total_ms += duration_ms
+            statement.max_ms = max(statement.max_ms, duration_ms)
+            statement.min_ms = duration_ms if statement.min_ms is None else min(statement.min_ms, duration_ms)
+            if error:
+                statement.errors += 1
+            else:
+                statement.rows += row_count or 0
+
+            # 只擷取唯讀查詢（EXPLAIN ANALYZE 會實際執行），同一時間只擷取一個，同一指紋有冷卻時間
+            if (not error
+                    and duration_ms >= self.config.capture_threshold_ms
+                    and analysis.first_keyword in ('SELECT', 'WITH')
+                    and not analysis.danger()[0]
+                    and not self._capturing
+                    and now - statement.last_capture >= self.config.capture_cooldown
+                    and random.random() < self.config.capture_sample_rate):
+                self._capturing = True
+                statement.last_capture = now
+                capture = True
+
+        if capture:
+            threading.Thread(
+                target=self._capture,
+                args=(fingerprint, sql, params, duration_ms),
+                name="statement-plan-capture",
+                daemon=True
+            ).start()
+
+    def top(self, order: str = 'total', limit: int = 20, include_plans: bool = True) -> List[Dict[str, Any]]:
+        """
+        依指定欄位排序的指紋統計
+
+        Args:
+            order: total（總耗時）、mean（平均耗時）、max（最長耗時）或 calls（呼叫次數）
+            limit: 筆數上限
+            include_plans: 是否包含擷取的執行計畫
+
+        Returns:
+            指紋統計列表（由大到小）
+
+        Raises:
+            ValueError: 排序欄位不支援
+        """
+        if order not in ORDERS:
+            raise ValueError(f"不支援的排序欄位: {order}（可用: {', '.join(ORDERS)}）")
+        with self._lock:
+            statements = [statement.to_dict(include_plans) for statement in self._statements.values()]
+        key = 'calls' if order == 'calls' else f"{order}_ms"
+        statements.sort(key=lambda statement: statement[key], reverse=True)
+        return statements[:limit]
+
+    def reset(self) -> int:
+        """
+        清除所有統計（如建立索引後重新觀察）
+
+        Returns:
+            清除的指紋數
+        """
+        with self._lock:
+            count = len(self._statements)
+            self._statements.clear()
+            self._reset_at = time.time()
+        self.logger.info(f"SQL 指紋統計已清除 ({count} 個)")
+        return count
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        統計摘要
+
+        Returns:
+            啟用狀態、擷取設定、指紋數、淘汰數與擷取次數
+        """
+        with self._lock:
+            return {
+                'enabled': self.config.enabled,
+                'fingerprints': len(self._statements),
+                'max_fingerprints': self.config.max_fingerprints,
+                'evictions': self._evictions,
+                'capture_threshold_ms': self.config.capture_threshold_ms,
+                'capture_sample_rate': self.config.capture_sample_rate,
+                'captures': self._captures,
+                'capture_errors': self._capture_errors,
+                'reset_at': self._reset_at
+            }
+
+    def _capture(self, fingerprint: str, sql: str, params: Optional[tuple], duration_ms: float) -> None:
+        """背景執行 EXPLAIN ANALYZE 並保存計畫（失敗只記錄）"""
+        try:
+            plan = self.explain_analyze(sql, params)
+        except Exception as e:
+            with self._lock:
+                self._capture_errors += 1
+                self._capturing = False
+            self.logger.warning(f"執行計畫擷取失敗: {str(e)}")
+            return
+
+        captured = {
+            'captured_at': time.time(),
+            'sql': sql,
+            'duration_ms': round(duration_ms, 3),
+            'execution_ms': plan.get('Execution Time'),
+            'planning_ms': plan.get('Planning Time'),
+            'plan': plan.get('Plan')
+        }
+        with self._lock:
+            self._captures += 1
+            self._capturing = False
+            statement = self._statements.get(fingerprint)
+            if statement is not None:
+                statement.plans.append(captured)
+        self.logger.info(f"已擷取執行計畫 ({duration_ms:.1f}ms): {fingerprint[:100]}")
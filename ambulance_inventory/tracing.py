@@ -0,0 +1,325 @@
+"""
+請求追蹤模組
+每個取樣的請求產生 trace ID 與巢狀 span（模型、SQL 指紋、筆數、token 數等屬性），
+完成後放入記憶體環形緩衝區（/debug/traces），設定 path 時同時附加到 JSONL 檔案。
+目前 span 以 contextvars 傳遞，未取樣的請求只需一次 ContextVar 讀取
+"""
+
+import json
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional, Dict, Any, List, Iterator
+
+from .config import TracingConfig
+from .utils.logger import get_logger
+
+
+class Span:
+    """追蹤區段"""
+
+    __slots__ = ('trace', 'span_id', 'parent_id', 'name', 'attributes', 'status', 'error', '_start', 'duration_ms')
+
+    def __init__(self, trace: 'Trace', name: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.trace = trace
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        self.status = 'ok'
+        self.error: Optional[str] = None
+        self._start = time.perf_counter()
+        self.duration_ms: Optional[float] = None
+
+    @property
+    def trace_id(self) -> str:
+        return self.trace.trace_id
+
+    def set_attributes(self, **attributes: Any) -> None:
+        """設定屬性"""
+        self.attributes.update(attributes)
+
+    def fail(self, error: BaseException) -> None:
+        """標記為失敗"""
+        self.status = 'error'
+        self.error = f"{type(error).__name__}: {error}"
+
+    def end(self) -> None:
+        """結束 span 並加入所屬 trace"""
+        self.duration_ms = round((time.perf_counter() - self._start) * 1000, 3)
+        self.trace.add(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start_ms': round((self._start - self.trace.start) * 1000, 3),
+            'duration_ms': self.duration_ms,
+            'status': self.status,
+            'error': self.error,
+            'attributes': self.attributes
+        }
+
+
+class _NoopSpan:
+    """未取樣時的 span（所有操作都不做事）"""
+
+    trace_id = None
+
+    def set_attributes(self, **attributes: Any) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+_current_span: ContextVar[Optional[Span]] = ContextVar('current_span', default=None)
+
+
+class Trace:
+    """一個請求的所有 span"""
+
+    def __init__(self, name: str):
+        self.trace_id = uuid.uuid4().hex
+        self.name = name
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.spans: List[Span] = []
+        self.finished = False
+        self._lock = threading.Lock()
+
+    def add(self, span: Span) -> None:
+        """加入已結束的 span（trace 完成後結束的 span，如斷線後仍在執行的查詢，不再記錄）"""
+        with self._lock:
+            if not self.finished:
+                self.spans.append(span)
+
+    def finish(self, root: Span) -> Dict[str, Any]:
+        """
+        完成 trace
+
+        Args:
+            root: 根 span（已結束）
+
+        Returns:
+            匯出用的字典（span 依開始時間排序）
+        """
+        with self._lock:
+            self.finished = True
+            spans = sorted(self.spans, key=lambda span: span._start)
+        return {
+            'trace_id': self.trace_id,
+            'name': self.name,
+            'started_at': self.started_at,
+            'duration_ms': root.duration_ms,
+            'status': root.status,
+            'attributes': root.attributes,
+            'spans': [span.to_dict() for span in spans]
+        }
+
+
+class Tracer:
+    """trace 取樣、保存與匯出"""
+
+    def __init__(self, config: TracingConfig):
+        """
+        初始化追蹤器
+
+        Args:
+            config: 追蹤配置
+        """
+        self.config = config
+        self.logger = get_logger(__name__)
+        self._traces: deque = deque(maxlen=max(1, config.max_traces))
+        self._lock = threading.Lock()
+        self._started = 0
+        self._sampled = 0
+        self._export_errors = 0
+
+    @contextmanager
+    def trace(self, name: str, force: bool = False, **attributes: Any) -> Iterator[Any]:
+        """
+        開始一個 trace（依取樣率決定是否記錄）
+
+        Args:
+            name: 根 span 名稱（如 POST /query）
+            force: 忽略取樣率一定記錄（仍需啟用追蹤）
+            **attributes: 根 span 屬性
+
+        Yields:
+            根 span，未取樣時為 NOOP_SPAN
+        """
+        sampled = self.config.enabled and (force or random.random() < self.config.sample_rate)
+        with self._lock:
+            self._started += 1
+            if sampled:
+                self._sampled += 1
+        if not sampled:
+            yield NOOP_SPAN
+            return
+
+        trace = Trace(name)
+        root = Span(trace, name, None, attributes)
+        token = _current_span.set(root)
+        try:
+            yield root
+        except BaseException as e:
+            root.fail(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            root.end()
+            self._export(trace.finish(root))
+
+    def recent(self, limit: int = 20, min_duration_ms: float = 0.0) -> List[Dict[str, Any]]:
+        """
+        最近的 trace 摘要（新到舊）
+
+        Args:
+            limit: 筆數上限
+            min_duration_ms: 只回傳總耗時不低於此值的 trace
+
+        Returns:
+            摘要列表（不含 span 明細）
+        """
+        with self._lock:
+            traces = list(self._traces)
+        summaries = []
+        for trace in reversed(traces):
+            if (trace['duration_ms'] or 0.0) < min_duration_ms:
+                continue
+            summaries.append({key: value for key, value in trace.items() if key != 'spans'})
+            summaries[-1]['span_count'] = len(trace['spans'])
+            if len(summaries) >= limit:
+                break
+        return summaries
+
+    def get(self, trace_id: str) -> Optional[Dict[str, Any]]:
+        """
+        取得完整 trace
+
+        Args:
+            trace_id: trace ID
+
+        Returns:
+            含所有 span 的 trace，已被淘汰或不存在時返回 None
+        """
+        with self._lock:
+            for trace in self._traces:
+                if trace['trace_id'] == trace_id:
+                    return trace
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        追蹤統計
+
+        Returns:
+            啟用狀態、取樣率與已記錄的 trace 數
+        """
+        with self._lock:
+            return {
+                'enabled': self.config.enabled,
+                'sample_rate': self.config.sample_rate,
+                'path': self.config.path,
+                'started': self._started,
+                'sampled': self._sampled,
+                'buffered': len(self._traces),
+                'export_errors': self._export_errors
+            }
+
+    def _export(self, trace: Dict[str, Any]) -> None:
+        """放入環形緩衝區並附加到 JSONL 檔案（寫入失敗只記錄）"""
+        line = json.dumps(trace, ensure_ascii=False, default=str) if self.config.path else None
+        with self._lock:
+            self._traces.append(trace)
+            if line is None:
+                return
+            try:
+                with open(self.config.path, 'a', encoding='utf-8') as f:
+                    f.write(line + '\n')
+            except OSError as e:
+                self._export_errors += 1
+                self.logger.warning(f"trace 寫入失敗: {str(e)}")
+
+
+_tracer = Tracer(TracingConfig(enabled=False))
+
+
+def configure(config: TracingConfig) -> Tracer:
+    """
+    設定全域追蹤器（伺服器啟動時呼叫）
+
+    Args:
+        config: 追蹤配置
+
+    Returns:
+        新的追蹤器
+    """
+    global _tracer
+    _tracer = Tracer(config)
+    return _tracer
+
+
+def get_tracer() -> Tracer:
+    """取得全域追蹤器"""
+    return _tracer
+
+
+def start_trace(name: str, force: bool = False, **attributes: Any):
+    """
+    以全域追蹤器開始一個 trace
+
+    Args:
+        name: 根 span 名稱
+        force: 忽略取樣率一定記錄
+        **attributes: 根 span 屬性
+
+    Returns:
+        context manager，產生根 span 或 NOOP_SPAN
+    """
+    return _tracer.trace(name, force=force, **attributes)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Any]:
+    """
+    在目前的 trace 中建立子 span（不在取樣的 trace 中時不做事）
+
+    Args:
+        name: span 名稱（如 db.query）
+        **attributes: span 屬性
+
+    Yields:
+        子 span 或 NOOP_SPAN
+    """
+    parent = _current_span.get()
+    if parent is None:
+        yield NOOP_SPAN
+        return
+
+    child = Span(parent.trace, name, parent.span_id, attributes)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.fail(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        child.end()
+
+
+def current_span() -> Any:
+    """目前的 span（不在取樣的 trace 中時為 NOOP_SPAN）"""
+    return _current_span.get() or NOOP_SPAN
+
+
+def current_trace_id() -> Optional[str]:
+    """目前的 trace ID（未取樣時為 None）"""
+    active = _current_span.get()
+    return active.trace_id if active is not None else None
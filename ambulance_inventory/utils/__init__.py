@@ -1,6 +1,10 @@
 """工具函數模組"""
 
-from .logger import setup_logger, get_logger
+from .logger import setup_logger, get_logger, setup_logging, shutdown_logging
 from .validators import validate_sql, is_dangerous_sql
+from .sql_lexer import analyze_sql, fingerprint_sql, tokenize
 
-__all__ = ['setup_logger', 'get_logger', 'validate_sql', 'is_dangerous_sql']
+__all__ = [
+    'setup_logger', 'get_logger', 'setup_logging', 'shutdown_logging', 'validate_sql', 'is_dangerous_sql',
+    'analyze_sql', 'fingerprint_sql', 'tokenize'
+]
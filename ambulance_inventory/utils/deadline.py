@@ -0,0 +1,170 @@
+"""
+請求時限模組
+提供跨階段傳遞的剩餘時間預算與取消機制
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional, Callable, Dict, Iterator
+
+
+class QueryAborted(Exception):
+    """查詢已中止（超時或取消）"""
+
+
+class DeadlineExceeded(QueryAborted):
+    """查詢超過時限"""
+
+
+class QueryCancelled(QueryAborted):
+    """查詢已被取消（例如客戶端斷線）"""
+
+
+class Deadline:
+    """
+    請求時限
+
+    每個階段以 timeout_for() 取得剩餘預算作為自身的超時，
+    並以 on_cancel() 註冊取消時要執行的動作（中斷 HTTP 連線、取消資料庫查詢）
+    """
+
+    def __init__(self, timeout: Optional[float] = None):
+        """
+        初始化請求時限
+
+        Args:
+            timeout: 總時限（秒），None 表示不限時
+        """
+        self.timeout = timeout
+        self._expires_at = time.monotonic() + timeout if timeout else None
+        self._cancelled = threading.Event()
+        self._reason = ""
+        self._callbacks: Dict[int, Callable[[], None]] = {}
+        self._next_handle = 0
+        self._lock = threading.Lock()
+
+    def remaining(self) -> Optional[float]:
+        """
+        取得剩餘時間
+
+        Returns:
+            剩餘秒數（不小於 0），不限時返回 None
+        """
+        if self._expires_at is None:
+            return None
+        return max(0.0, self._expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        """是否已超過時限"""
+        return self._expires_at is not None and time.monotonic() >= self._expires_at
+
+    @property
+    def cancelled(self) -> bool:
+        """是否已被取消"""
+        return self._cancelled.is_set()
+
+    @property
+    def aborted(self) -> bool:
+        """是否已超時或被取消"""
+        return self.cancelled or self.expired
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        """
+        取消請求並執行所有已註冊的取消動作
+
+        Args:
+            reason: 取消原因
+        """
+        with self._lock:
+            if self._cancelled.is_set():
+                return
+            self._reason = reason
+            self._cancelled.set()
+            callbacks = list(self._callbacks.values())
+
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                # 取消動作失敗不影響其他動作
+                pass
+
+    def check(self, stage: str = "") -> None:
+        """
+        檢查是否仍可繼續執行
+
+        Args:
+            stage: 目前階段名稱（用於錯誤訊息）
+
+        Raises:
+            QueryCancelled: 請求已被取消
+            DeadlineExceeded: 請求已超過時限
+        """
+        where = f" ({stage})" if stage else ""
+        if self.cancelled:
+            raise QueryCancelled(f"查詢已取消{where}: {self._reason}")
+        if self.expired:
+            raise DeadlineExceeded(f"查詢超過時限 {self.timeout}s{where}")
+
+    def timeout_for(self, default: float, stage: str = "") -> float:
+        """
+        取得單一階段可用的超時（階段預設值與剩餘時間取小者）
+
+        Args:
+            default: 階段預設超時（秒）
+            stage: 目前階段名稱
+
+        Returns:
+            可用的超時秒數
+
+        Raises:
+            QueryAborted: 已無剩餘時間或已被取消
+        """
+        self.check(stage)
+        remaining = self.remaining()
+        if remaining is None:
+            return default
+        return min(default, remaining)
+
+    @contextmanager
+    def on_cancel(self, callback: Callable[[], None]) -> Iterator[None]:
+        """
+        在區塊執行期間註冊取消動作（已取消時立即執行）
+
+        Args:
+            callback: 取消時要執行的動作
+        """
+        with self._lock:
+            handle = self._next_handle
+            self._next_handle += 1
+            self._callbacks[handle] = callback
+            already_cancelled = self._cancelled.is_set()
+
+        if already_cancelled:
+            try:
+                callback()
+            except Exception:
+                pass
+
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._callbacks.pop(handle, None)
+
+
+def check_deadline(deadline: Optional[Deadline], stage: str = "") -> None:
+    """
+    檢查可選的請求時限
+
+    Args:
+        deadline: 請求時限（None 表示不檢查）
+        stage: 目前階段名稱
+
+    Raises:
+        QueryAborted: 請求已超時或被取消
+    """
+    if deadline is not None:
+        deadline.check(stage)
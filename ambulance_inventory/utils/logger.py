@@ -1,11 +1,35 @@
 """
 日誌管理模組
-提供統一的日誌系統
+提供統一的日誌系統；伺服器以 setup_logging() 將日誌放入佇列，
+由背景執行緒格式化為 JSON 並輸出，請求執行緒不做主控台 I/O
 """
 
+import copy
+import json
 import logging
+import logging.handlers
+import queue
+import random
 import sys
-from typing import Optional
+import zlib
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, TextIO
+
+from ..config import LoggingConfig
+
+
+# 目前請求的 ID（由 API 中介層設定，隨 contextvars 傳遞到執行緒池）
+_request_id: ContextVar[Optional[str]] = ContextVar('request_id', default=None)
+
+# LogRecord 的標準屬性（其餘屬性視為 extra 欄位輸出）
+_STANDARD_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'request_id'}
+
+# 停止時等待背景執行緒消化佇列的最長秒數
+_STOP_TIMEOUT = 5.0
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_handler: Optional['AsyncLogHandler'] = None
 
 
 def setup_logger(
@@ -58,3 +82,152 @@ def get_logger(name: str) -> logging.Logger:
         Logger 實例
     """
     return logging.getLogger(name)
+
+
+def set_request_id(request_id: Optional[str]):
+    """
+    設定目前請求的 ID
+
+    Args:
+        request_id: 請求 ID
+
+    Returns:
+        用於 reset_request_id 的 token
+    """
+    return _request_id.set(request_id)
+
+
+def reset_request_id(token) -> None:
+    """還原 set_request_id 之前的請求 ID"""
+    _request_id.reset(token)
+
+
+def get_request_id() -> Optional[str]:
+    """目前請求的 ID（不在請求中時為 None）"""
+    return _request_id.get()
+
+
+class JsonFormatter(logging.Formatter):
+    """將日誌格式化為單行 JSON（含請求 ID 與 extra 欄位）"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'request_id': getattr(record, 'request_id', None),
+            'thread': record.threadName
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _DrainingQueueListener(logging.handlers.QueueListener):
+    """停止時等待佇列有空位再放入結束標記（預設的 put_nowait 在佇列已滿時拋出 queue.Full）"""
+
+    def enqueue_sentinel(self) -> None:
+        self.queue.put(self._sentinel, timeout=_STOP_TIMEOUT)
+
+
+class AsyncLogHandler(logging.handlers.QueueHandler):
+    """
+    非阻塞的佇列 handler
+
+    在呼叫端執行緒只記錄請求 ID、組合訊息並放入佇列；佇列已滿時丟棄並計數。
+    DEBUG 訊息依請求取樣（同一請求的詳細訊息全部保留或全部略過）
+    """
+
+    def __init__(self, log_queue: queue.Queue, debug_sample_rate: float = 1.0):
+        super().__init__(log_queue)
+        self.debug_sample_rate = debug_sample_rate
+        self.dropped = 0
+        self.sampled_out = 0
+
+    def emit(self, record: logging.LogRecord) -> None:
+        request_id = _request_id.get()
+        if record.levelno < logging.INFO and not self._keep_verbose(request_id):
+            self.sampled_out += 1
+            return
+        try:
+            self.enqueue(self.prepare(record, request_id))
+        except queue.Full:
+            self.dropped += 1
+        except Exception:
+            self.handleError(record)
+
+    def prepare(self, record: logging.LogRecord, request_id: Optional[str] = None) -> logging.LogRecord:
+        """複製紀錄並固定訊息、請求 ID 與例外文字（格式化留給背景執行緒）"""
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        record.request_id = request_id
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        self.queue.put_nowait(record)
+
+    def _keep_verbose(self, request_id: Optional[str]) -> bool:
+        """是否保留 DEBUG 訊息"""
+        if self.debug_sample_rate >= 1.0:
+            return True
+        if request_id is None:
+            return random.random() < self.debug_sample_rate
+        return (zlib.crc32(request_id.encode('utf-8')) & 0xFFFFFFFF) / 2 ** 32 < self.debug_sample_rate
+
+
+def setup_logging(config: LoggingConfig, stream: Optional[TextIO] = None) -> AsyncLogHandler:
+    """
+    設定根 logger：日誌放入佇列，由背景執行緒格式化並寫入 stdout
+
+    重複呼叫時先停止前一次的背景執行緒
+
+    Args:
+        config: 日誌配置
+        stream: 輸出串流（預設 sys.stdout）
+
+    Returns:
+        佇列 handler（可讀取 dropped、sampled_out 計數）
+    """
+    global _listener, _handler
+    shutdown_logging()
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    if config.format == 'json':
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s'))
+
+    log_queue: queue.Queue = queue.Queue(maxsize=config.queue_size)
+    _handler = AsyncLogHandler(log_queue, config.debug_sample_rate)
+    _listener = _DrainingQueueListener(log_queue, output, respect_handler_level=False)
+    _listener.start()
+
+    root = logging.getLogger()
+    root.addHandler(_handler)
+    root.setLevel(getattr(logging, config.level, logging.INFO))
+    return _handler
+
+
+def shutdown_logging() -> None:
+    """停止背景執行緒（先輸出佇列中剩餘的日誌）並移除佇列 handler"""
+    global _listener, _handler
+    if _handler is not None:
+        logging.getLogger().removeHandler(_handler)
+        _handler = None
+    if _listener is not None:
+        try:
+            _listener.stop()
+        except queue.Full:
+            # 輸出卡住、佇列一直是滿的：放棄剩餘日誌（背景執行緒為 daemon，不阻擋結束）
+            pass
+        _listener = None
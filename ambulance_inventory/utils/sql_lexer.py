@@ -0,0 +1,351 @@
+"""
+SQL 詞法分析模組
+單次掃描產生 token 串流，辨識字串常值、識別字與註解，
+並由同一串流得出安全判定、正規化指紋與引用的資料表/欄位
+"""
+
+import hashlib
+import re
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import List, NamedTuple, Optional, Set, Tuple
+
+
+class TokenType(str, Enum):
+    """Token 類型"""
+    KEYWORD = "keyword"
+    IDENTIFIER = "identifier"
+    QUOTED_IDENTIFIER = "quoted_identifier"
+    STRING = "string"
+    NUMBER = "number"
+    OPERATOR = "operator"
+    PUNCTUATION = "punctuation"
+    COMMENT = "comment"
+    UNTERMINATED = "unterminated"
+    WHITESPACE = "whitespace"
+    OTHER = "other"
+
+
+class Token(NamedTuple):
+    """詞法單元（NamedTuple 建構成本低，適合大量產生）"""
+    type: TokenType
+    value: str
+    start: int
+
+    @property
+    def upper(self) -> str:
+        """大寫值（僅關鍵字與識別字有意義）"""
+        return self.value.upper()
+
+
+# 單一正則以交替分支一次比對所有 token 類型（由 C 層的 regex 引擎完成掃描）
+# 分支依出現頻率排序；字串須在單字之前（E'...'），註解須在運算子之前（-- 與 /*）
+# E'...' 以反斜線跳脫（E'\'' 是完整的常值），未結束時整段視為未結束的字串
+_TOKEN_RE = re.compile(r"""
+    (?P<ws>\s+)
+  | (?P<estring>[Ee]'(?:[^'\\]|\\.|'')*')
+  | (?P<unterminated_estring>[Ee]'.*)
+  | (?P<string>[Nn]?'(?:[^']|'')*')
+  | (?P<word>[^\W\d]\w*)
+  | (?P<number>\d+(?:\.\d*)?(?:[eE][+-]?\d+)?|\.\d+)
+  | (?P<punct>[(),;.\[\]])
+  | (?P<line_comment>--[^\n]*)
+  | (?P<block_comment>/\*.*?\*/)
+  | (?P<qident>"(?:[^"]|"")*")
+  | (?P<dollar>\$(?P<tag>[A-Za-z_]*)\$.*?\$(?P=tag)\$)
+  | (?P<unterminated>/\*.*|'.*|".*|\$[A-Za-z_]*\$.*)
+  | (?P<op><>|<=|>=|!=|::|\|\||[-+*/%<>=~!@\#^&|])
+  | (?P<other>.)
+""", re.VERBOSE | re.DOTALL)
+
+_GROUP_TYPES = {
+    'line_comment': TokenType.COMMENT,
+    'block_comment': TokenType.COMMENT,
+    'string': TokenType.STRING,
+    'estring': TokenType.STRING,
+    'dollar': TokenType.STRING,
+    'unterminated_estring': TokenType.UNTERMINATED,
+    'qident': TokenType.QUOTED_IDENTIFIER,
+    'unterminated': TokenType.UNTERMINATED,
+    'number': TokenType.NUMBER,
+    'op': TokenType.OPERATOR,
+    'punct': TokenType.PUNCTUATION,
+    'other': TokenType.OTHER,
+}
+
+# SQL 關鍵字（其餘單字視為識別字）
+KEYWORDS = frozenset({
+    'SELECT', 'FROM', 'WHERE', 'AND', 'OR', 'NOT', 'IN', 'IS', 'NULL', 'LIKE', 'ILIKE',
+    'BETWEEN', 'ORDER', 'BY', 'GROUP', 'HAVING', 'LIMIT', 'OFFSET', 'AS', 'ON', 'USING',
+    'JOIN', 'LEFT', 'RIGHT', 'INNER', 'OUTER', 'FULL', 'CROSS', 'NATURAL', 'UNION',
+    'INTERSECT', 'EXCEPT', 'ALL', 'DISTINCT', 'CASE', 'WHEN', 'THEN', 'ELSE', 'END',
+    'ASC', 'DESC', 'NULLS', 'FIRST', 'LAST', 'WITH', 'TRUE', 'FALSE', 'EXISTS', 'ANY',
+    'SOME', 'SIMILAR', 'FETCH', 'ROWS', 'ONLY', 'INTO', 'VALUES', 'SET', 'TABLE',
+    'DROP', 'DELETE', 'TRUNCATE', 'ALTER', 'CREATE', 'INSERT', 'UPDATE', 'GRANT',
+    'REVOKE', 'EXECUTE', 'EXEC', 'COPY', 'CALL', 'DO',
+    'CURRENT_DATE', 'CURRENT_TIMESTAMP', 'INTERVAL',
+})
+
+# 危險關鍵字
+DANGEROUS_KEYWORDS = (
+    'DROP', 'DELETE', 'TRUNCATE', 'ALTER',
+    'CREATE', 'INSERT', 'UPDATE', 'GRANT',
+    'REVOKE', 'EXECUTE', 'EXEC'
+)
+_DANGEROUS_SET = frozenset(DANGEROUS_KEYWORDS)
+
+# 結束 FROM 清單的子句關鍵字
+_CLAUSE_KEYWORDS = frozenset({
+    'WHERE', 'GROUP', 'ORDER', 'HAVING', 'LIMIT', 'OFFSET', 'UNION', 'INTERSECT',
+    'EXCEPT', 'ON', 'USING', 'JOIN', 'LEFT', 'RIGHT', 'INNER', 'OUTER', 'FULL',
+    'CROSS', 'NATURAL', 'FETCH', 'WINDOW',
+})
+
+
+# 分析迴圈中以 is 比較 token 類型
+KEYWORD = TokenType.KEYWORD
+IDENTIFIER = TokenType.IDENTIFIER
+QUOTED_IDENTIFIER = TokenType.QUOTED_IDENTIFIER
+STRING = TokenType.STRING
+NUMBER = TokenType.NUMBER
+COMMENT = TokenType.COMMENT
+UNTERMINATED = TokenType.UNTERMINATED
+
+
+def tokenize(sql: str, skip_whitespace: bool = True) -> List[Token]:
+    """
+    單次掃描將 SQL 切分為 token
+
+    Args:
+        sql: SQL 字串
+        skip_whitespace: 是否略過空白
+
+    Returns:
+        Token 列表（空白略過時不含空白 token）
+    """
+    tokens: List[Token] = []
+    append = tokens.append
+
+    for match in _TOKEN_RE.finditer(sql):
+        kind = match.lastgroup
+        if kind == 'ws':
+            if not skip_whitespace:
+                append(Token(TokenType.WHITESPACE, match.group(), match.start()))
+            continue
+
+        value = match.group()
+        if kind == 'word':
+            token_type = KEYWORD if value.upper() in KEYWORDS else IDENTIFIER
+        else:
+            token_type = _GROUP_TYPES[kind]
+        append(Token(token_type, value, match.start()))
+
+    return tokens
+
+
+@dataclass
+class SqlAnalysis:
+    """SQL 分析結果（由單一 token 串流得出）"""
+    tokens: List[Token]
+    first_keyword: Optional[str] = None
+    has_from: bool = False
+    parens_balanced: bool = True
+    statement_count: int = 0
+    has_comment: bool = False
+    has_unterminated: bool = False
+    has_dollar_quote: bool = False
+    dangerous_keyword: Optional[str] = None
+    fingerprint: str = ""
+    canonical: str = ""
+    tables: Set[str] = field(default_factory=set)
+    columns: Set[str] = field(default_factory=set)
+
+    @property
+    def fingerprint_id(self) -> str:
+        """指紋的短雜湊（用於快取鍵與統計）"""
+        return hashlib.sha1(self.fingerprint.encode('utf-8')).hexdigest()[:16]
+
+    def danger(self) -> Tuple[bool, str]:
+        """
+        安全判定
+
+        Returns:
+            (是否危險, 原因說明)
+        """
+        if self.dangerous_keyword:
+            return True, f"包含危險操作: {self.dangerous_keyword}"
+        if self.statement_count > 1:
+            return True, "包含多個 SQL 語句"
+        if self.has_comment:
+            return True, "包含 SQL 註解符號"
+        if self.has_unterminated:
+            return True, "包含未結束的字串或註解"
+        if self.has_dollar_quote:
+            # $$ 引號內容不做跳脫分析，無法可靠判定，一律拒絕
+            return True, "包含不支援的 $ 引號字串"
+        return False, ""
+
+
+def _identifier_name(token: Token) -> str:
+    """取得識別字名稱（引號識別字去除引號，一般識別字轉小寫）"""
+    if token.type == TokenType.QUOTED_IDENTIFIER:
+        return token.value[1:-1].replace('""', '"')
+    return token.value.lower()
+
+
+def analyze_sql(sql: str) -> SqlAnalysis:
+    """
+    分析 SQL（單次 token 掃描）
+
+    Args:
+        sql: SQL 字串
+
+    Returns:
+        SqlAnalysis 分析結果
+    """
+    return analyze_tokens(tokenize(sql))
+
+
+def analyze_tokens(tokens: List[Token]) -> SqlAnalysis:
+    """
+    分析已切分的 token 串流（供已做過詞法分析的呼叫端重用）
+
+    Args:
+        tokens: 不含空白的 token 列表
+
+    Returns:
+        SqlAnalysis 分析結果
+    """
+    analysis = SqlAnalysis(tokens=tokens)
+
+    depth = 0
+    statements = 0
+    in_statement = False
+    select_depths: List[int] = []
+    aliases: Set[str] = set()
+    fingerprint_parts: List[str] = []
+    canonical_parts: List[str] = []
+    expect_table = False
+    alias_next = False
+    previous: Optional[Token] = None
+
+    for index, token in enumerate(tokens):
+        token_type = token.type
+
+        if token_type is COMMENT:
+            analysis.has_comment = True
+            continue
+
+        if not in_statement and token.value != ';':
+            in_statement = True
+            statements += 1
+
+        if token_type is KEYWORD:
+            upper = token.value.upper()
+            if analysis.first_keyword is None:
+                analysis.first_keyword = upper
+            if analysis.dangerous_keyword is None and upper in _DANGEROUS_SET:
+                analysis.dangerous_keyword = upper
+
+            if upper == 'SELECT':
+                select_depths.append(depth)
+                expect_table = False
+            elif upper == 'FROM':
+                analysis.has_from = True
+                # 只有與 SELECT 同層的 FROM 才接資料表（排除 EXTRACT(... FROM ...)）
+                expect_table = bool(select_depths) and select_depths[-1] == depth
+            elif upper == 'JOIN':
+                expect_table = True
+            elif upper in _CLAUSE_KEYWORDS:
+                expect_table = False
+            alias_next = upper == 'AS'
+
+            fingerprint_parts.append(upper)
+            canonical_parts.append(upper)
+
+        elif token_type is IDENTIFIER or token_type is QUOTED_IDENTIFIER:
+            if analysis.first_keyword is None:
+                analysis.first_keyword = token.upper
+            name = _identifier_name(token)
+            following = tokens[index + 1].value if index + 1 < len(tokens) else ""
+            follows_identifier = previous is not None and (
+                previous.type is IDENTIFIER or previous.type is QUOTED_IDENTIFIER
+            )
+
+            if alias_next or follows_identifier:
+                # AS 別名或省略 AS 的別名
+                aliases.add(name)
+            elif following in ('(', '.'):
+                # 函數名稱或資料表限定詞
+                pass
+            elif expect_table:
+                analysis.tables.add(name)
+            else:
+                analysis.columns.add(name)
+            alias_next = False
+
+            fingerprint_parts.append(name)
+            canonical_parts.append(token.value if token_type is QUOTED_IDENTIFIER else name)
+
+        elif token_type is STRING or token_type is NUMBER or token_type is UNTERMINATED:
+            if token_type is UNTERMINATED:
+                analysis.has_unterminated = True
+                if token.value.startswith('/*'):
+                    analysis.has_comment = True
+            elif token.value.startswith('$'):
+                analysis.has_dollar_quote = True
+            # 常值在指紋中以 ? 取代，常值清單 (?, ?, ?) 合併為單一 ?
+            if len(fingerprint_parts) >= 2 and fingerprint_parts[-1] == ',' and fingerprint_parts[-2] == '?':
+                fingerprint_parts.pop()
+            else:
+                fingerprint_parts.append('?')
+            canonical_parts.append(token.value)
+
+        else:
+            value = token.value
+            if value == '(':
+                depth += 1
+            elif value == ')':
+                depth -= 1
+                if depth < 0:
+                    analysis.parens_balanced = False
+                while select_depths and select_depths[-1] > depth:
+                    select_depths.pop()
+            elif value == ';':
+                in_statement = False
+                select_depths.clear()
+                expect_table = False
+            fingerprint_parts.append(value)
+            canonical_parts.append(value)
+
+        previous = token
+
+    if depth != 0:
+        analysis.parens_balanced = False
+
+    analysis.statement_count = statements
+    analysis.columns -= analysis.tables | aliases
+    analysis.fingerprint = _join_parts(fingerprint_parts)
+    analysis.canonical = _join_parts(canonical_parts)
+
+    return analysis
+
+
+def _join_parts(parts: List[str]) -> str:
+    """以單一空白連接 token，標點前後不加空白"""
+    text = ' '.join(parts)
+    text = text.replace(' , ', ', ').replace('( ', '(').replace(' )', ')').replace(' . ', '.')
+    return text.rstrip(' ;').rstrip()
+
+
+def fingerprint_sql(sql: str) -> str:
+    """
+    產生 SQL 正規化指紋（常值以 ? 取代、關鍵字大寫、空白正規化）
+
+    Args:
+        sql: SQL 字串
+
+    Returns:
+        指紋字串
+    """
+    return analyze_sql(sql).fingerprint
@@ -4,43 +4,38 @@
 """
 
 import re
-from typing import Tuple
+from typing import List, Tuple
+
+from .sql_lexer import analyze_sql, analyze_tokens, tokenize, SqlAnalysis, Token, TokenType
+
+
+# 清理時視為 SQL 的行首關鍵字
+_CLAUSE_STARTERS = frozenset({
+    'SELECT', 'FROM', 'WHERE', 'ORDER', 'GROUP', 'LIMIT', 'AND', 'OR', 'WITH',
+    'HAVING', 'OFFSET', 'UNION', 'LEFT', 'RIGHT', 'INNER', 'FULL', 'CROSS', 'JOIN', 'ON',
+})
+
+# 行尾出現時表示下一行為延續的 token
+_CONTINUATION_PUNCTUATION = frozenset({',', '(', '.'})
+_CONTINUATION_KEYWORDS = frozenset({
+    'SELECT', 'FROM', 'WHERE', 'AND', 'OR', 'NOT', 'IN', 'BY', 'ON', 'AS', 'JOIN',
+    'LIKE', 'ILIKE', 'BETWEEN', 'DISTINCT', 'CASE', 'WHEN', 'THEN', 'ELSE', 'IS',
+})
 
 
 def is_dangerous_sql(sql: str) -> Tuple[bool, str]:
     """
     檢查 SQL 是否包含危險操作
 
+    以詞法分析判斷，字串常值與識別字中的關鍵字不會誤判
+
     Args:
         sql: SQL 查詢字串
 
     Returns:
         (是否危險, 原因說明)
     """
-    sql_upper = sql.upper()
-
-    # 危險關鍵字列表
-    dangerous_keywords = [
-        'DROP', 'DELETE', 'TRUNCATE', 'ALTER',
-        'CREATE', 'INSERT', 'UPDATE', 'GRANT',
-        'REVOKE', 'EXECUTE', 'EXEC'
-    ]
-
-    for keyword in dangerous_keywords:
-        # 使用正則確保是獨立的關鍵字（不是部分匹配）
-        pattern = r'\b' + keyword + r'\b'
-        if re.search(pattern, sql_upper):
-            return True, f"包含危險操作: {keyword}"
-
-    # 檢查是否有分號（可能是 SQL 注入）
-    if sql.count(';') > 1:
-        return True, "包含多個 SQL 語句"
-
-    # 檢查註解符號（可能試圖繞過驗證）
-    if '--' in sql or '/*' in sql:
-        return True, "包含 SQL 註解符號"
-
-    return False, ""
+    return analyze_sql(sql).danger()
 
 
 def validate_sql(sql: str) -> Tuple[bool, str]:
@@ -56,23 +51,37 @@ def validate_sql(sql: str) -> Tuple[bool, str]:
     if not sql or not sql.strip():
         return False, "SQL 為空"
 
-    sql_stripped = sql.strip()
+    return validate_analysis(analyze_sql(sql))
+
+
+def validate_analysis(analysis: SqlAnalysis) -> Tuple[bool, str]:
+    """
+    依詞法分析結果驗證 SQL 的基本格式和安全性
+
+    Args:
+        analysis: SQL 分析結果
+
+    Returns:
+        (是否有效, 錯誤訊息)
+    """
+    if not analysis.tokens:
+        return False, "SQL 為空"
 
     # 檢查是否以 SELECT 開頭（只允許查詢）
-    if not sql_stripped.upper().startswith('SELECT'):
+    if analysis.first_keyword != 'SELECT':
         return False, "只允許 SELECT 查詢"
 
     # 檢查危險操作
-    is_dangerous, reason = is_dangerous_sql(sql_stripped)
+    is_dangerous, reason = analysis.danger()
     if is_dangerous:
         return False, f"安全檢查失敗: {reason}"
 
     # 檢查基本語法
-    if 'FROM' not in sql_stripped.upper():
+    if not analysis.has_from:
         return False, "缺少 FROM 子句"
 
-    # 檢查括號匹配
-    if sql_stripped.count('(') != sql_stripped.count(')'):
+    # 檢查括號匹配（字串常值中的括號不計入）
+    if not analysis.parens_balanced:
         return False, "括號不匹配"
 
     return True, ""
@@ -89,6 +98,33 @@ def clean_sql(sql: str) -> str:
     Returns:
         清理後的 SQL
     """
+    return _clean_tokens(sql)[0]
+
+
+def inspect_sql(raw_sql: str) -> Tuple[str, SqlAnalysis]:
+    """
+    清理並分析模型輸出的 SQL（清理與分析共用同一次詞法分析）
+
+    Args:
+        raw_sql: 原始 SQL 字串
+
+    Returns:
+        (清理後的 SQL, 分析結果)
+    """
+    cleaned_sql, tokens = _clean_tokens(raw_sql)
+    return cleaned_sql, analyze_tokens(tokens)
+
+
+def _clean_tokens(sql: str) -> Tuple[str, List[Token]]:
+    """
+    清理 SQL 字串並保留清理後的 token
+
+    Args:
+        sql: 原始 SQL 字串
+
+    Returns:
+        (清理後的 SQL, 清理後 SQL 的 token)
+    """
     # 移除 Markdown 標記
     sql = sql.replace('```sql', '').replace('```', '').strip()
 
@@ -111,24 +147,69 @@ def clean_sql(sql: str) -> str:
     sql = sql.strip()
 
     # 移除可能的解釋文字（只保留 SQL）
-    lines = sql.split('\n')
+    # 整段只做一次詞法分析再依換行分組；SQL 子句開頭、含括號或 JOIN 的行保留，
+    # 上一行以逗號/運算子/連接詞結尾時，下一行視為延續（例如換行的欄位清單）
     sql_lines = []
-
-    for line in lines:
-        line = line.strip()
-        if line and (
-            line.upper().startswith('SELECT') or
-            line.upper().startswith('FROM') or
-            line.upper().startswith('WHERE') or
-            line.upper().startswith('ORDER') or
-            line.upper().startswith('GROUP') or
-            line.upper().startswith('LIMIT') or
-            line.upper().startswith('AND') or
-            line.upper().startswith('OR') or
-            line.upper().startswith('WITH') or
-            'JOIN' in line.upper() or
-            ')' in line or '(' in line
-        ):
+    sql_tokens: List[Token] = []
+    continues = False
+    lines = _split_lines(sql)
+
+    for line, tokens in lines:
+        first = tokens[0]
+        keep = continues or (
+            first.type is TokenType.KEYWORD and first.upper in _CLAUSE_STARTERS
+        )
+        if not keep:
+            for token in tokens:
+                if (token.type is TokenType.PUNCTUATION and token.value in '()') or \
+                        (token.type is TokenType.KEYWORD and token.upper == 'JOIN'):
+                    keep = True
+                    break
+
+        if keep:
             sql_lines.append(line)
+            sql_tokens.extend(tokens)
+            last = tokens[-1]
+            continues = (
+                last.value in _CONTINUATION_PUNCTUATION or
+                last.type is TokenType.OPERATOR or
+                (last.type is TokenType.KEYWORD and last.upper in _CONTINUATION_KEYWORDS)
+            )
+        else:
+            continues = False
+
+    if not sql_lines:
+        return sql, [token for _, tokens in lines for token in tokens]
+
+    return ' '.join(sql_lines), sql_tokens
+
+
+def _split_lines(sql: str) -> List[Tuple[str, List[Token]]]:
+    """
+    單次詞法分析後依換行分組（跨行的字串常值或註解屬於同一行）
+
+    Args:
+        sql: SQL 字串
 
-    return ' '.join(sql_lines) if sql_lines else sql
+    Returns:
+        (行文字, 該行 token) 列表，空行略過
+    """
+    lines = []
+    current: List[Token] = []
+    previous_end = 0
+
+    for token in tokenize(sql):
+        # 與上一個 token 之間的空白含換行即為新的一行
+        if current and sql.find('\n', previous_end, token.start) != -1:
+            lines.append(current)
+            current = []
+        current.append(token)
+        previous_end = token.start + len(token.value)
+
+    if current:
+        lines.append(current)
+
+    return [
+        (sql[tokens[0].start:tokens[-1].start + len(tokens[-1].value)], tokens)
+        for tokens in lines
+    ]
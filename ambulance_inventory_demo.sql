@@ -19,25 +19,21 @@ CREATE TABLE IF NOT EXISTS inventory (
 CREATE INDEX idx_category ON inventory(category);
 CREATE INDEX idx_brand ON inventory(brand);
 CREATE INDEX idx_stock_quantity ON inventory(stock_quantity);
+CREATE INDEX idx_last_updated ON inventory(last_updated);
 
--- 創建視圖：低庫存警示
-CREATE OR REPLACE VIEW low_stock_alert AS
-SELECT product_id, product_name, category, brand, stock_quantity, unit_price
-FROM inventory
-WHERE stock_quantity < 10
-ORDER BY stock_quantity ASC;
+-- 寫入時自動更新 last_updated（行程內快照以它增量刷新）
+CREATE OR REPLACE FUNCTION touch_inventory_last_updated() RETURNS trigger AS $$
+BEGIN
+    NEW.last_updated = now();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
 
--- 創建視圖：分類統計
-CREATE OR REPLACE VIEW category_summary AS
-SELECT
-    category,
-    COUNT(*) as product_count,
-    SUM(stock_quantity) as total_stock,
-    AVG(unit_price) as avg_price,
-    SUM(stock_quantity * unit_price) as total_value
-FROM inventory
-GROUP BY category
-ORDER BY total_value DESC;
+CREATE TRIGGER inventory_touch_last_updated
+BEFORE INSERT OR UPDATE ON inventory
+FOR EACH ROW EXECUTE FUNCTION touch_inventory_last_updated();
+
+-- low_stock_alert、category_summary 為物化視圖，於資料載入後建立（見檔案末段）
 
 -- ============================================
 -- 插入示例數據
@@ -129,6 +125,62 @@ INSERT INTO inventory VALUES
 -- 更新時間戳記
 UPDATE inventory SET last_updated = NOW();
 
+-- ============================================
+-- 物化視圖與刷新狀態
+-- ============================================
+
+-- 物化視圖：低庫存警示（唯一索引為 REFRESH ... CONCURRENTLY 所需）
+CREATE MATERIALIZED VIEW IF NOT EXISTS low_stock_alert AS
+SELECT product_id, product_name, category, brand, model, stock_quantity, unit_price, supplier
+FROM inventory
+WHERE stock_quantity < 10
+ORDER BY stock_quantity ASC;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_low_stock_alert_product_id ON low_stock_alert (product_id);
+CREATE INDEX IF NOT EXISTS idx_low_stock_alert_stock_quantity ON low_stock_alert (stock_quantity);
+
+-- 物化視圖：分類統計
+CREATE MATERIALIZED VIEW IF NOT EXISTS category_summary AS
+SELECT
+    category,
+    COUNT(*) as product_count,
+    SUM(stock_quantity) as total_stock,
+    AVG(unit_price) as avg_price,
+    SUM(stock_quantity * unit_price) as total_value
+FROM inventory
+GROUP BY category
+ORDER BY total_value DESC;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_category_summary_category ON category_summary (category);
+
+-- 刷新狀態：變更版本為 pg_stat_user_tables 的 n_tup_ins + n_tup_upd + n_tup_del 加上 TRUNCATE 次數
+-- （change_count），刷新後記錄刷新前讀到的版本（refreshed_count）。
+-- 寫入交易不更新共用的資料列，並行寫入不會互相等待
+CREATE TABLE IF NOT EXISTS materialized_view_state (
+    view_name VARCHAR(63) PRIMARY KEY,
+    change_count BIGINT NOT NULL DEFAULT 0,
+    refreshed_count BIGINT NOT NULL DEFAULT 0,
+    refreshed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+ALTER TABLE materialized_view_state DROP COLUMN IF EXISTS pending_since;
+
+INSERT INTO materialized_view_state (view_name)
+VALUES ('low_stock_alert'), ('category_summary')
+ON CONFLICT (view_name) DO NOTHING;
+
+-- TRUNCATE 不計入 n_tup_del，另以觸發器計數（TRUNCATE 本身已持有資料表的排他鎖）
+CREATE OR REPLACE FUNCTION mark_inventory_views_stale() RETURNS trigger AS $$
+BEGIN
+    UPDATE materialized_view_state SET change_count = change_count + 1;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS inventory_views_stale ON inventory;
+CREATE TRIGGER inventory_views_stale
+AFTER TRUNCATE ON inventory
+FOR EACH STATEMENT EXECUTE FUNCTION mark_inventory_views_stale();
+
 -- 顯示統計
 DO $$
 BEGIN
@@ -0,0 +1,93 @@
+"""
+自動完成效能基準
+在合成目錄與大量歷史問題上量測建立索引耗時、逐字輸入時每個按鍵的查詢延遲（p50/p99）
+與記錄問題、目錄增量更新的耗時；不需要資料庫
+
+使用方式:
+    python benchmarks/bench_autocomplete.py [--rows 100000] [--questions 5000]
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from ambulance_inventory.autocomplete import AutocompleteIndex
+from ambulance_inventory.config import AutocompleteConfig
+from benchmarks.synthetic_catalog import generate_rows, CATALOG_COLUMNS, CATEGORIES, BRANDS
+
+TEMPLATES = [
+    "請列出所有{brand}品牌的{category}，包含型號和庫存數量",
+    "請列出庫存數量低於{number}件的{category}",
+    "{brand}的{category}單價是多少",
+    "請統計{category}各品牌的庫存總價值",
+    "請列出單價低於{number}元的{category}，依價格排序",
+]
+
+# 逐字輸入的文字（每個前綴量測一次）
+TYPED = [
+    "請列出所有Philips品牌的AED除顫器，包含型號和庫存數量",
+    "請統計監視器各品牌的庫存總價值",
+    "Mindray",
+    "ZO-45",
+    "除顫器",
+    "不存在的問題",
+]
+
+
+def percentile(samples: List[float], ratio: float) -> float:
+    """百分位數（已排序樣本）"""
+    return samples[min(len(samples) - 1, int(len(samples) * ratio))]
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="自動完成逐字查詢延遲量測")
+    parser.add_argument('--rows', type=int, default=100000, help="合成目錄筆數")
+    parser.add_argument('--questions', type=int, default=5000, help="歷史問題數")
+    parser.add_argument('--repeat', type=int, default=200, help="每個前綴量測次數")
+    args = parser.parse_args(argv)
+
+    rows = [dict(zip(CATALOG_COLUMNS, row)) for row in generate_rows(args.rows)]
+    index = AutocompleteIndex(None, AutocompleteConfig(max_questions=args.questions))
+    start = time.perf_counter()
+    index.reset(rows)
+    print(f"建立目錄詞 {time.perf_counter() - start:.2f}s（{args.rows} 筆資料）")
+
+    rng = random.Random(7)
+    start = time.perf_counter()
+    for _ in range(args.questions * 3):
+        template = rng.choice(TEMPLATES)
+        index.record_question(template.format(
+            brand=rng.choice(BRANDS), category=rng.choice(CATEGORIES)[0], number=rng.randint(1, 200) * 10
+        ))
+    elapsed = time.perf_counter() - start
+    stats = index.stats()
+    print(f"記錄問題 {args.questions * 3} 次 {elapsed * 1000 / (args.questions * 3):.3f}ms/次"
+          f"（{stats['questions']} 個不同問題、{stats['catalog_entries']} 個目錄詞、{stats['nodes']} 個節點）")
+
+    samples = []
+    for text in TYPED:
+        for length in range(1, len(text) + 1):
+            prefix = text[:length]
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                index.suggest(prefix)
+                samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    print(f"逐字查詢 {len(samples)} 次：p50 {percentile(samples, 0.5):.4f}ms、"
+          f"p99 {percentile(samples, 0.99):.4f}ms、最大 {samples[-1]:.3f}ms")
+
+    count = min(10000, len(rows))
+    start = time.perf_counter()
+    for row in rows[:count]:
+        index.update(row, dict(row, brand=row['brand'] + ' Pro'))
+    print(f"目錄增量更新 {count} 筆 {(time.perf_counter() - start) * 1000 / count:.3f}ms/筆")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,282 @@
+"""
+熱路徑微基準
+量測每個請求都會執行的純 Python 路徑：clean_sql、validate_sql、format_results、
+format_results_programmatic、format_results_html_table 與 /query 回應序列化，
+輸入為較長的中文品名、50 到 1 萬筆結果與帶雜訊的 LLM 輸出
+
+結果保存在 --results 檔案：第一次執行（或加上 --update）時作為基準，
+之後每次與基準比較，任一項目變慢超過 --threshold 時以結束碼 1 結束，
+讓這些路徑的優化可以被驗證並保持；每次執行也會附加到歷史紀錄
+
+使用方式:
+    python benchmarks/bench_hot_paths.py [--threshold 0.25] [--filter format] [--update]
+"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from ambulance_inventory.database import DatabaseClient
+from ambulance_inventory.query_engine import QueryEngine
+from ambulance_inventory.utils.validators import clean_sql, validate_sql
+from benchmarks.synthetic_catalog import CATALOG_COLUMNS, generate_rows
+
+
+DEFAULT_RESULTS = Path(__file__).parent / 'results' / 'hot_paths.json'
+
+HISTORY_LIMIT = 50
+
+ROW_COUNTS = (50, 1000, 10000)
+
+# 附加在品名後的較長中文描述（實際品名常含規格與用途說明）
+NAME_SUFFIXES = [
+    '（含攜行袋與備用電池，適用救護車與院前緊急救護）',
+    '專業型 成人／兒童兩用 附中文語音提示',
+    '高耐用度醫療級 符合衛福部醫療器材許可',
+    '',
+]
+
+# 模擬 LLM 輸出（Markdown、標籤包裹、前後說明文字、換行欄位清單與中文常值）
+NOISY_OUTPUTS = [
+    "SELECT product_name, stock_quantity FROM inventory WHERE category = 'AED除顫器' AND stock_quantity > 0",
+    "```sql\nSELECT product_name, brand, model, unit_price\nFROM inventory\nWHERE brand ILIKE '%Philips%'\n"
+    "ORDER BY unit_price DESC\nLIMIT 20;\n```",
+    "<sql>SELECT category, COUNT(*) AS product_count, SUM(stock_quantity) AS total_stock "
+    "FROM inventory GROUP BY category ORDER BY total_stock DESC</sql>",
+    "好的，以下是查詢庫存低於 10 的產品的 SQL：\n```sql\nSELECT product_name, category, stock_quantity\n"
+    "FROM inventory\nWHERE stock_quantity < 10\nORDER BY stock_quantity ASC;\n```\n"
+    "這個查詢會列出所有庫存不足的產品，依庫存數量由少到多排序。",
+    "SELECT\n  product_name,\n  brand,\n  model,\n  specifications,\n  unit_price\nFROM inventory\n"
+    "WHERE specifications ILIKE '%語音指導%'\n  AND specifications ILIKE '%IP55防護%'\n"
+    "  AND unit_price BETWEEN 30000 AND 120000\nORDER BY unit_price\nLIMIT 50",
+    "<query>\nSELECT supplier, SUM(stock_quantity * unit_price) AS total_value\nFROM inventory\n"
+    "WHERE category IN ('監視器', '氧氣設備', '呼吸設備')\nGROUP BY supplier\n"
+    "HAVING SUM(stock_quantity * unit_price) > 100000\n</query>",
+    "Here is the query:\nSELECT product_name, stock_quantity FROM inventory "
+    "WHERE product_name ILIKE '%半自動體外除顫器（含攜行袋與備用電池）%'\nThis lists matching items.",
+    "SELECT * FROM inventory; DROP TABLE inventory",
+]
+
+
+def make_results(count: int, seed: int = 42) -> List[Dict[str, Any]]:
+    """
+    產生與 RealDictCursor 相同型態的查詢結果（unit_price 為 Decimal，last_updated 為 datetime）
+
+    Args:
+        count: 筆數
+        seed: 亂數種子
+
+    Returns:
+        查詢結果列表
+    """
+    rng = random.Random(seed)
+    updated = datetime(2026, 1, 1, 8, 0, 0)
+    results = []
+    for row in generate_rows(count, seed):
+        record = dict(zip(CATALOG_COLUMNS, row))
+        record['product_name'] += rng.choice(NAME_SUFFIXES)
+        record['unit_price'] = Decimal(f"{record['unit_price']:.2f}")
+        record['last_updated'] = updated + timedelta(minutes=rng.randint(0, 100000))
+        results.append(record)
+    return results
+
+
+def build_cases() -> List[Tuple[str, Callable[[], object]]]:
+    """
+    建立基準項目
+
+    Returns:
+        (項目名稱, 無參數函數) 列表
+    """
+    cases: List[Tuple[str, Callable[[], object]]] = [
+        ('clean_sql', lambda: [clean_sql(raw) for raw in NOISY_OUTPUTS]),
+    ]
+    cleaned = [clean_sql(raw) for raw in NOISY_OUTPUTS]
+    cases.append(('validate_sql', lambda: [validate_sql(sql) for sql in cleaned]))
+
+    for count in ROW_COUNTS:
+        results = make_results(count)
+        # 與 format_for_display 相同：format_results 截取 50 筆後再產生文字與 HTML 表格
+        formatted = DatabaseClient.format_results(results, limit=50)
+        cases.extend([
+            (f'format_results[{count}]', lambda results=results: DatabaseClient.format_results(results, limit=50)),
+            (f'format_results_programmatic[{count}]',
+             lambda formatted=formatted: QueryEngine.format_results_programmatic(formatted)),
+            (f'format_results_html_table[{count}]',
+             lambda formatted=formatted: QueryEngine.format_results_html_table(formatted)),
+        ])
+
+    cases.append(('query_response_serialization', build_serialization_case()))
+    return cases
+
+
+def build_serialization_case() -> Callable[[], object]:
+    """
+    建立 /query 回應序列化項目（與 FastAPI 相同：驗證 response_model、序列化為 JSON 模式後由 JSONResponse 編碼）
+
+    Returns:
+        無參數函數
+    """
+    from fastapi.responses import JSONResponse
+    from server.api_server import app, QueryResponse, TimingInfo
+
+    route = next(route for route in app.routes if getattr(route, 'path', None) == '/query')
+    field = route.secure_cloned_response_field
+    formatted = DatabaseClient.format_results(make_results(1000), limit=50)
+    question = "列出所有庫存低於 10 的 AED 除顫器與生理監視器，並依單價排序"
+    sql = clean_sql(NOISY_OUTPUTS[3])
+    answer_formatted = QueryEngine.format_results_programmatic(formatted)
+    answer_html = QueryEngine.format_results_html_table(formatted)
+
+    def serialize() -> bytes:
+        response = QueryResponse(
+            question=question,
+            sql=sql,
+            answer="根據查詢結果，共有 50 項產品庫存不足，建議優先補充 AED 除顫器。",
+            answer_formatted=answer_formatted,
+            answer_html=answer_html,
+            results=formatted,
+            result_count=1000,
+            model_used="qwen3:8b",
+            use_llm_answer=True,
+            elapsed_time=3.21,
+            timing=TimingInfo(sql_generation=1.8, query_execution=0.02, formatting=0.004, llm_response=1.3, total=3.21),
+            success=True
+        )
+        value, _ = field.validate(response, {}, loc=('response',))
+        return JSONResponse(field.serialize(value, by_alias=True)).body
+
+    return serialize
+
+
+def measure(func: Callable[[], object], repeat: int, min_time: float) -> float:
+    """
+    量測單次呼叫耗時（每輪至少執行 min_time 秒，取 repeat 輪中最快的一輪以降低雜訊）
+
+    Args:
+        func: 無參數函數
+        repeat: 輪數
+        min_time: 每輪最短時間（秒）
+
+    Returns:
+        每次呼叫的微秒數
+    """
+    func()
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        number *= 2 if elapsed <= 0 else max(2, min(10, int(min_time / elapsed) + 1))
+
+    best = elapsed / number
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best * 1e6
+
+
+def environment() -> Dict[str, str]:
+    """執行環境（基準與本次環境不同時提示，數值不可直接比較）"""
+    return {'python': platform.python_version(), 'machine': platform.machine(), 'node': platform.node()}
+
+
+def load_results(path: Path) -> Dict[str, Any]:
+    """讀取結果檔案（不存在時返回空結構）"""
+    if not path.exists():
+        return {'baseline': None, 'history': []}
+    return json.loads(path.read_text(encoding='utf-8'))
+
+
+def compare(baseline: Dict[str, float], current: Dict[str, float], threshold: float) -> List[str]:
+    """
+    與基準比較並輸出結果表
+
+    Args:
+        baseline: 基準（項目名稱 → 微秒）
+        current: 本次結果
+        threshold: 允許的變慢比例（0.25 為 25%）
+
+    Returns:
+        超過門檻的項目名稱
+    """
+    regressions = []
+    print(f"{'case':<40} {'baseline(µs)':>13} {'current(µs)':>12} {'change':>8}")
+    for name, value in current.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"{name:<40} {'-':>13} {value:>12.2f} {'new':>8}")
+            continue
+        change = value / base - 1
+        flag = ''
+        if change > threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f"{name:<40} {base:>13.2f} {value:>12.2f} {change:>+8.1%}{flag}")
+    return regressions
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="熱路徑微基準（與保存的基準比較）")
+    parser.add_argument('--results', default=str(DEFAULT_RESULTS), help="結果檔案（基準與歷史紀錄）")
+    parser.add_argument('--threshold', type=float, default=0.25, help="允許的變慢比例，超過時結束碼為 1")
+    parser.add_argument('--repeat', type=int, default=5, help="每個項目的量測輪數（取最快）")
+    parser.add_argument('--min-time', type=float, default=0.05, help="每輪最短時間（秒）")
+    parser.add_argument('--filter', help="只執行名稱包含此字串的項目")
+    parser.add_argument('--update', action='store_true', help="以本次結果取代基準（確認優化或接受變慢後使用）")
+    args = parser.parse_args(argv)
+
+    path = Path(args.results)
+    saved = load_results(path)
+    cases = [(name, func) for name, func in build_cases() if not args.filter or args.filter in name]
+
+    current = {}
+    for name, func in cases:
+        current[name] = round(measure(func, args.repeat, args.min_time), 3)
+
+    run = {'created_at': datetime.now().isoformat(timespec='seconds'), 'environment': environment(), 'cases': current}
+    baseline = saved.get('baseline')
+    regressions: List[str] = []
+    if baseline is None or args.update:
+        print(f"{'case':<40} {'current(µs)':>12}")
+        for name, value in current.items():
+            print(f"{name:<40} {value:>12.2f}")
+        if baseline is not None:
+            # 只更新本次執行的項目，--filter 時保留其他項目的基準
+            run = dict(run, cases=dict(baseline['cases'], **current))
+        saved['baseline'] = run
+        print(f"\n已保存基準: {path}")
+    else:
+        if baseline.get('environment') != run['environment']:
+            print(f"注意: 基準的執行環境不同 ({baseline.get('environment')})，數值可能無法直接比較")
+        print(f"基準: {baseline['created_at']}，門檻 +{args.threshold:.0%}\n")
+        regressions = compare(baseline['cases'], current, args.threshold)
+
+    saved['history'] = (saved.get('history') or [])[-(HISTORY_LIMIT - 1):] + [
+        {'created_at': run['created_at'], 'cases': current}
+    ]
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(saved, ensure_ascii=False, indent=2), encoding='utf-8')
+
+    if regressions:
+        print(f"\n{len(regressions)} 個項目變慢超過 {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,228 @@
+"""
+/query 負載測試
+以不同並行度對 API 伺服器送出查詢，回報每秒請求數、錯誤數，以及用戶端延遲與各階段耗時（回應的 timing）的 p50/p95/p99
+
+搭配 fake_ollama.py 與 synthetic_catalog.py 可完全離線執行（需要本地 PostgreSQL，使用 DB_* 環境變數）：
+    python benchmarks/synthetic_catalog.py --rows 1000000 --replace
+    python benchmarks/bench_load.py --spawn --concurrency 1,4,16,64
+
+--spawn 在行程內啟動 Ollama 替身，並以子行程啟動指向替身的 API 伺服器；
+不加 --spawn 時對 --url 指定的既有伺服器測試
+
+使用方式:
+    python benchmarks/bench_load.py [--url http://localhost:8000] [--concurrency 1,4,16] [--requests 200]
+                                    [--fast] [--unique] [--spawn] [--latency 0.5] [--chunk-delay 0.01]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import requests
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from ambulance_inventory.config import DEMO_QUESTIONS
+from benchmarks.fake_ollama import FakeOllamaConfig, start_fake_ollama
+
+
+STAGES = ('sql_generation', 'sql_rewrite', 'cost_check', 'query_execution', 'formatting', 'llm_response', 'total')
+
+
+def percentile(samples: List[float], ratio: float) -> float:
+    """百分位數（已排序樣本）"""
+    return samples[min(len(samples) - 1, int(len(samples) * ratio))]
+
+
+def run_level(
+    url: str,
+    questions: List[str],
+    concurrency: int,
+    total: int,
+    use_llm_answer: bool,
+    unique: bool,
+    model: Optional[str],
+    offset: int = 0
+) -> Dict[str, object]:
+    """
+    以固定並行度送出 total 個請求
+
+    Args:
+        url: 伺服器位址
+        questions: 問題列表（依序循環）
+        concurrency: 並行請求數
+        total: 請求數
+        use_llm_answer: 是否產生 LLM 回答
+        unique: 是否在問題後加上序號（避開 LLM 快取）
+        model: 指定模型（可選）
+        offset: 序號起點（不同並行度之間不重複）
+
+    Returns:
+        牆鐘時間、成功/失敗數、用戶端延遲與各階段耗時樣本（秒）
+    """
+    local = threading.local()
+    stages: Dict[str, List[float]] = defaultdict(list)
+    latencies: List[float] = []
+    errors: Dict[str, int] = defaultdict(int)
+    lock = threading.Lock()
+
+    def send(index: int) -> None:
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        question = questions[index % len(questions)]
+        if unique:
+            question = f"{question} #{offset + index}"
+        payload = {'question': question, 'use_llm_answer': use_llm_answer}
+        if model:
+            payload['model'] = model
+
+        start = time.perf_counter()
+        try:
+            response = session.post(f"{url}/query", json=payload, timeout=300)
+            elapsed = time.perf_counter() - start
+            body = response.json() if response.ok else {}
+        except requests.RequestException as e:
+            with lock:
+                errors[type(e).__name__] += 1
+            return
+
+        with lock:
+            if not response.ok:
+                errors[f"HTTP {response.status_code}"] += 1
+                return
+            if not body.get('success'):
+                errors[(body.get('error') or 'failed')[:60]] += 1
+                return
+            latencies.append(elapsed)
+            for stage, seconds in (body.get('timing') or {}).items():
+                if seconds is not None:
+                    stages[stage].append(seconds)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="load") as executor:
+        list(executor.map(send, range(total)))
+    wall_time = time.perf_counter() - start
+
+    return {'wall_time': wall_time, 'latencies': latencies, 'stages': stages, 'errors': dict(errors)}
+
+
+def print_level(concurrency: int, total: int, result: Dict[str, object]) -> None:
+    """輸出單一並行度的結果"""
+    latencies = sorted(result['latencies'])
+    errors = result['errors']
+    rps = len(latencies) / result['wall_time'] if result['wall_time'] > 0 else 0.0
+    print(f"\n並行 {concurrency}: {total} 個請求, 成功 {len(latencies)}, 失敗 {sum(errors.values())}, "
+          f"{rps:.1f} req/s, 牆鐘 {result['wall_time']:.1f}s")
+    for error, count in sorted(errors.items(), key=lambda item: -item[1]):
+        print(f"  錯誤 {count:>5}  {error}")
+    if not latencies:
+        return
+
+    print(f"  {'stage':<16} {'count':>6} {'p50(ms)':>9} {'p95(ms)':>9} {'p99(ms)':>9}")
+    rows = [('client', latencies)]
+    stages = result['stages']
+    rows.extend((stage, sorted(stages[stage])) for stage in STAGES if stages.get(stage))
+    rows.extend((stage, sorted(samples)) for stage, samples in stages.items() if stage not in STAGES and samples)
+    for stage, samples in rows:
+        print(f"  {stage:<16} {len(samples):>6} {percentile(samples, 0.5) * 1000:>9.1f} "
+              f"{percentile(samples, 0.95) * 1000:>9.1f} {percentile(samples, 0.99) * 1000:>9.1f}")
+
+
+def spawn_server(port: int, ollama_port: int, model: str) -> subprocess.Popen:
+    """
+    以子行程啟動指向 Ollama 替身的 API 伺服器並等待就緒
+
+    Args:
+        port: API 伺服器連接埠
+        ollama_port: Ollama 替身連接埠
+        model: 預設模型
+
+    Returns:
+        伺服器子行程
+    """
+    env = dict(os.environ, OLLAMA_HOST=f"http://127.0.0.1:{ollama_port}", OLLAMA_MODEL=model)
+    env.setdefault('QUERY_LOG_ENABLED', 'false')
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'server.api_server:app', '--port', str(port), '--log-level', 'warning'],
+        cwd=str(Path(__file__).parent.parent),
+        env=env
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"API 伺服器啟動失敗（結束碼 {process.returncode}）")
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/health", timeout=1).ok:
+                return process
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError("API 伺服器啟動逾時")
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="/query 負載測試（每秒請求數與各階段 p50/p95/p99）")
+    parser.add_argument('--url', default='http://localhost:8000', help="API 伺服器位址（--spawn 時忽略）")
+    parser.add_argument('--concurrency', default='1,4,16', help="並行度，以逗號分隔")
+    parser.add_argument('--requests', type=int, default=200, help="每個並行度的請求數")
+    parser.add_argument('--warmup', type=int, default=5, help="開始量測前的暖機請求數")
+    parser.add_argument('--questions-file', help="問題檔案（每行一題，預設為 DEMO_QUESTIONS）")
+    parser.add_argument('--fast', action='store_true', help="不產生 LLM 回答（use_llm_answer=false）")
+    parser.add_argument('--unique', action='store_true', help="問題後加上序號，避開 LLM 快取")
+    parser.add_argument('--model', help="指定模型")
+    parser.add_argument('--spawn', action='store_true', help="啟動 Ollama 替身與 API 伺服器子行程")
+    parser.add_argument('--port', type=int, default=8765, help="--spawn 時 API 伺服器的連接埠")
+    parser.add_argument('--latency', type=float, default=0.5, help="--spawn 時 Ollama 替身首個片段前的等待（秒）")
+    parser.add_argument('--chunk-delay', type=float, default=0.01, help="--spawn 時 Ollama 替身片段間隔（秒）")
+    args = parser.parse_args(argv)
+
+    questions = list(DEMO_QUESTIONS)
+    if args.questions_file:
+        questions = [line.strip() for line in Path(args.questions_file).read_text(encoding='utf-8').splitlines()
+                     if line.strip()]
+    levels = [int(level) for level in args.concurrency.split(',') if level.strip()]
+    use_llm_answer = not args.fast
+
+    fake = None
+    server = None
+    url = args.url.rstrip('/')
+    try:
+        if args.spawn:
+            fake_config = FakeOllamaConfig(latency=args.latency, chunk_delay=args.chunk_delay)
+            fake = start_fake_ollama(0, fake_config)
+            server = spawn_server(args.port, fake.server_address[1], args.model or fake_config.models[0])
+            url = f"http://127.0.0.1:{args.port}"
+            print(f"Ollama 替身 port {fake.server_address[1]}（latency={args.latency}s），API 伺服器 {url}")
+
+        print(f"{len(questions)} 個問題, 模式 {'llm' if use_llm_answer else 'fast'}, "
+              f"{'不' if args.unique else ''}重複使用問題（LLM 快取{'不' if args.unique else '可'}命中）")
+        if args.warmup:
+            run_level(url, questions, 1, args.warmup, use_llm_answer, args.unique, args.model, offset=-args.warmup)
+
+        offset = 0
+        for concurrency in levels:
+            result = run_level(url, questions, concurrency, args.requests, use_llm_answer, args.unique,
+                               args.model, offset=offset)
+            offset += args.requests
+            print_level(concurrency, args.requests, result)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+        if fake is not None:
+            fake.shutdown()
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+"""
+產品搜尋索引效能基準
+在合成大型目錄上量測建立索引耗時、各類關鍵字的查詢延遲（p50/p99）與增量更新速度
+
+合成目錄的詞彙量很小（10 個品牌、6 個分類），品牌/分類詞各出現在約 10% 的文件中，
+比實際目錄更不利於倒排索引；不需要資料庫
+
+使用方式:
+    python benchmarks/bench_search_index.py [--rows 1000000] [--repeat 200]
+"""
+
+import argparse
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from ambulance_inventory.config import SearchConfig
+from ambulance_inventory.search_index import SearchIndex
+from benchmarks.synthetic_catalog import generate_rows, CATALOG_COLUMNS
+
+
+# (說明, 關鍵字)
+QUERIES = [
+    ("型號", "ZO-4821"),
+    ("品牌+品名", "Ferno 擔架"),
+    ("品名+品牌", "血氧監測儀 Mindray"),
+    ("多詞", "Philips 半自動 除顫器 語音指導"),
+    ("單一常見詞", "藍牙"),
+    ("分類詞", "除顫器"),
+    ("不存在的品牌（退回任一詞）", "Masimo 血氧"),
+]
+
+
+def percentile(samples: List[float], ratio: float) -> float:
+    """百分位數（已排序樣本）"""
+    return samples[min(len(samples) - 1, int(len(samples) * ratio))]
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="產品搜尋倒排索引延遲量測")
+    parser.add_argument('--rows', type=int, default=1000000, help="合成資料筆數")
+    parser.add_argument('--repeat', type=int, default=200, help="每個關鍵字量測次數")
+    parser.add_argument('--updates', type=int, default=10000, help="增量更新筆數")
+    args = parser.parse_args(argv)
+
+    print(f"產生 {args.rows} 筆合成資料 ...")
+    rows = [
+        dict(zip(CATALOG_COLUMNS, row), last_updated=datetime(2026, 1, 1))
+        for row in generate_rows(args.rows)
+    ]
+
+    index = SearchIndex(None, SearchConfig())
+    start = time.perf_counter()
+    index.reset(rows)
+    stats = index.stats()
+    print(f"建立索引 {time.perf_counter() - start:.1f}s（{stats['term_count']} 個詞）\n")
+
+    print(f"{'p50(ms)':>8} {'p99(ms)':>8} {'符合筆數':>10}  關鍵字")
+    for label, query in QUERIES:
+        index.search(query)
+        samples = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            result = index.search(query)
+            samples.append((time.perf_counter() - start) * 1000)
+        samples.sort()
+        total = f"~{result.total}" if result.total_estimated else str(result.total)
+        print(f"{percentile(samples, 0.5):>8.3f} {percentile(samples, 0.99):>8.3f} {total:>10}  {query}（{label}）")
+
+    # 增量更新：先寫入差異區段，超過 merge_ratio 時合併重建（計入總耗時）
+    count = min(args.updates, len(rows))
+    start = time.perf_counter()
+    for row in rows[:count]:
+        index.update(row, dict(row, product_name=row['product_name'] + " 新款"))
+    elapsed = time.perf_counter() - start
+    stats = index.stats()
+    print(f"\n增量更新 {count} 筆 {elapsed:.2f}s（合併 {stats['merges']} 次，差異區段 {stats['delta_documents']} 筆）")
+
+    start = time.perf_counter()
+    result = index.search("新款 Ferno")
+    print(f"更新後查詢 {(time.perf_counter() - start) * 1000:.3f}ms，符合 {result.total} 筆")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+"""
+SQL 詞法分析效能基準
+比較舊版正則掃描（多次 upper() 與 11 個關鍵字正則）與單次詞法分析，
+並列出兩者判定不一致的語料
+
+使用方式:
+    python benchmarks/bench_sql_lexer.py [--iterations 2000]
+"""
+
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from ambulance_inventory.utils.validators import (
+    clean_sql, validate_sql, inspect_sql, validate_analysis
+)
+
+
+# 模擬 LLM 輸出的語料（含 Markdown、標籤包裹、解釋文字與換行欄位清單）
+CORPUS = [
+    "SELECT * FROM inventory WHERE category = 'AED' AND stock_quantity > 0 LIMIT 50",
+    "```sql\nSELECT product_name, brand, price\nFROM inventory\nWHERE brand ILIKE '%Philips%'\nORDER BY price DESC\nLIMIT 20;\n```",
+    "<sql>SELECT category, COUNT(*) AS cnt FROM inventory GROUP BY category ORDER BY cnt DESC</sql>",
+    "Here is the query:\nSELECT product_name, stock_quantity\nFROM inventory\nWHERE stock_quantity < 5\nThis lists low stock items.",
+    "SELECT\n  product_name,\n  brand,\n  model,\n  price\nFROM inventory\nWHERE product_name ILIKE '%drop%'\nLIMIT 10",
+    "SELECT * FROM inventory WHERE notes = 'update pending; check -- later'",
+    "SELECT brand, AVG(price) FROM inventory WHERE category IN ('AED', '擔架', '氧氣') GROUP BY brand HAVING AVG(price) > 1000",
+    "SELECT * FROM inventory; DROP TABLE inventory",
+    "SELECT EXTRACT(YEAR FROM last_updated) AS y, COUNT(*) FROM inventory GROUP BY y",
+    "<query>\nSELECT i.product_name, i.price FROM inventory i\nLEFT JOIN suppliers s ON s.id = i.supplier_id\nWHERE i.price BETWEEN 100 AND 5000\n</query>",
+    "SELECT * FROM inventory WHERE product_name = 'Monitor (12-lead'",
+    "SELECT product_name FROM inventory /* hidden */ WHERE 1=1",
+]
+
+
+def legacy_is_dangerous_sql(sql: str) -> Tuple[bool, str]:
+    """舊版危險檢查（逐一關鍵字正則）"""
+    sql_upper = sql.upper()
+    for keyword in ['DROP', 'DELETE', 'TRUNCATE', 'ALTER', 'CREATE', 'INSERT',
+                    'UPDATE', 'GRANT', 'REVOKE', 'EXECUTE', 'EXEC']:
+        if re.search(r'\b' + keyword + r'\b', sql_upper):
+            return True, f"包含危險操作: {keyword}"
+    if sql.count(';') > 1:
+        return True, "包含多個 SQL 語句"
+    if '--' in sql or '/*' in sql:
+        return True, "包含 SQL 註解符號"
+    return False, ""
+
+
+def legacy_validate_sql(sql: str) -> Tuple[bool, str]:
+    """舊版 SQL 驗證"""
+    if not sql or not sql.strip():
+        return False, "SQL 為空"
+    sql_stripped = sql.strip()
+    if not sql_stripped.upper().startswith('SELECT'):
+        return False, "只允許 SELECT 查詢"
+    is_dangerous, reason = legacy_is_dangerous_sql(sql_stripped)
+    if is_dangerous:
+        return False, f"安全檢查失敗: {reason}"
+    if 'FROM' not in sql_stripped.upper():
+        return False, "缺少 FROM 子句"
+    if sql_stripped.count('(') != sql_stripped.count(')'):
+        return False, "括號不匹配"
+    return True, ""
+
+
+def legacy_clean_sql(sql: str) -> str:
+    """舊版 SQL 清理（每行重複 upper()）"""
+    sql = sql.replace('```sql', '').replace('```', '').strip()
+    sql = re.sub(r'^<sql>\s*', '', sql, flags=re.IGNORECASE)
+    sql = re.sub(r'\s*</sql>$', '', sql, flags=re.IGNORECASE)
+    sql = re.sub(r'^<query>\s*', '', sql, flags=re.IGNORECASE)
+    sql = re.sub(r'\s*</query>$', '', sql, flags=re.IGNORECASE)
+    sql = re.sub(r'^<\s*', '', sql)
+    sql = re.sub(r'\s*>$', '', sql)
+    if sql.startswith('"') and sql.endswith('"'):
+        sql = sql[1:-1]
+    if sql.startswith("'") and sql.endswith("'"):
+        sql = sql[1:-1]
+    sql = sql.strip()
+
+    sql_lines = []
+    for line in sql.split('\n'):
+        line = line.strip()
+        if line and (
+            line.upper().startswith('SELECT') or line.upper().startswith('FROM') or
+            line.upper().startswith('WHERE') or line.upper().startswith('ORDER') or
+            line.upper().startswith('GROUP') or line.upper().startswith('LIMIT') or
+            line.upper().startswith('AND') or line.upper().startswith('OR') or
+            line.upper().startswith('WITH') or 'JOIN' in line.upper() or
+            ')' in line or '(' in line
+        ):
+            sql_lines.append(line)
+    return ' '.join(sql_lines) if sql_lines else sql
+
+
+def legacy_pipeline(raw: str):
+    """舊版：清理後驗證"""
+    return legacy_validate_sql(legacy_clean_sql(raw))
+
+
+def lexer_pipeline(raw: str):
+    """新版：單次詞法分析取得清理結果、驗證、指紋與資料表"""
+    sql, analysis = inspect_sql(raw)
+    return validate_analysis(analysis), analysis.fingerprint_id, analysis.tables
+
+
+def measure(func: Callable[[str], object], corpus: List[str], iterations: int) -> float:
+    """
+    量測每筆語料的平均處理時間
+
+    Returns:
+        每筆平均微秒數
+    """
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for raw in corpus:
+            func(raw)
+    elapsed = time.perf_counter() - start
+    return elapsed / (iterations * len(corpus)) * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="SQL 詞法分析效能基準")
+    parser.add_argument('--iterations', type=int, default=2000, help="每筆語料重複次數")
+    args = parser.parse_args()
+
+    legacy_us = measure(legacy_pipeline, CORPUS, args.iterations)
+    lexer_us = measure(lexer_pipeline, CORPUS, args.iterations)
+
+    print(f"語料筆數: {len(CORPUS)}，重複 {args.iterations} 次")
+    print(f"舊版（正則掃描）:   {legacy_us:8.2f} µs/筆")
+    print(f"新版（單次詞法）:   {lexer_us:8.2f} µs/筆（含指紋與資料表）")
+    print(f"比值: {lexer_us / legacy_us:.2f}x")
+
+    print("\n判定差異:")
+    differences = 0
+    for raw in CORPUS:
+        old_sql = legacy_clean_sql(raw)
+        new_sql = clean_sql(raw)
+        old_verdict = legacy_validate_sql(old_sql)
+        new_verdict = validate_sql(new_sql)
+        if old_verdict != new_verdict or old_sql != new_sql:
+            differences += 1
+            print(f"- {raw[:60]!r}")
+            print(f"    舊版: {old_verdict} {old_sql!r}")
+            print(f"    新版: {new_verdict} {new_sql!r}")
+    if not differences:
+        print("（無）")
+
+
+if __name__ == "__main__":
+    main()
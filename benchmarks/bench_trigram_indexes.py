@@ -0,0 +1,93 @@
+"""
+索引建議效能基準
+在合成大型目錄上量測 ILIKE 與範圍查詢延遲，套用 IndexAdvisor 的建議後再量測一次
+
+需要可連線的 PostgreSQL（使用 DB_* 環境變數），會建立 inventory_synthetic 資料表
+
+使用方式:
+    python benchmarks/bench_trigram_indexes.py [--rows 200000] [--repeat 7] [--keep]
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from ambulance_inventory.config import DatabaseConfig, IndexAdvisorConfig
+from ambulance_inventory.database import DatabaseClient
+from ambulance_inventory.index_advisor import IndexAdvisor
+from benchmarks.synthetic_catalog import load_catalog
+
+
+TABLE = "inventory_synthetic"
+
+# 模擬 LLM 產生的查詢（英文關鍵字可由 trigram 加速；中文關鍵字在 C locale 下不行）
+QUERIES = [
+    f"SELECT product_name, brand, stock_quantity FROM {TABLE} WHERE product_name ILIKE '%ZOLL%' LIMIT 50",
+    f"SELECT product_name, model FROM {TABLE} WHERE model ILIKE '%MI-42%' LIMIT 50",
+    f"SELECT product_name, unit_price FROM {TABLE} WHERE unit_price BETWEEN 40000 AND 41000 LIMIT 50",
+    f"SELECT product_name FROM {TABLE} WHERE lower(brand) = 'stryker' LIMIT 50",
+    f"SELECT product_name, specifications FROM {TABLE} WHERE specifications ILIKE '%藍牙%' LIMIT 50",
+]
+
+
+def measure(db_client: DatabaseClient, sql: str, repeat: int) -> float:
+    """量測查詢延遲中位數（毫秒，先執行一次暖機）"""
+    db_client.execute_query(sql)
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        db_client.execute_query(sql)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def measure_all(db_client: DatabaseClient, repeat: int) -> Dict[str, float]:
+    """量測所有查詢"""
+    return {sql: measure(db_client, sql, repeat) for sql in QUERIES}
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="trigram/運算式索引套用前後延遲比較")
+    parser.add_argument('--rows', type=int, default=200000, help="合成資料筆數")
+    parser.add_argument('--repeat', type=int, default=7, help="每條查詢量測次數")
+    parser.add_argument('--keep', action='store_true', help="保留合成資料表")
+    args = parser.parse_args(argv)
+
+    db_client = DatabaseClient(DatabaseConfig.from_env())
+    print(f"載入 {args.rows} 筆合成資料到 {TABLE} ...")
+    load_catalog(db_client, TABLE, args.rows)
+
+    try:
+        before = measure_all(db_client, args.repeat)
+
+        advisor = IndexAdvisor(db_client, IndexAdvisorConfig(min_occurrences=1))
+        advisor.observe_many(QUERIES)
+        recommendations = advisor.recommend()
+        for warning in advisor.warnings(recommendations):
+            print(f"警告: {warning}")
+
+        start = time.perf_counter()
+        for statement in advisor.apply(recommendations, concurrently=False):
+            print(f"  {statement}")
+        print(f"建立索引耗時 {time.perf_counter() - start:.1f}s")
+
+        after = measure_all(db_client, args.repeat)
+
+        print(f"\n{'before(ms)':>11} {'after(ms)':>10} {'speedup':>8}  query")
+        for sql in QUERIES:
+            speedup = before[sql] / after[sql] if after[sql] > 0 else float('inf')
+            print(f"{before[sql]:>11.2f} {after[sql]:>10.2f} {speedup:>7.1f}x  {sql}")
+    finally:
+        if not args.keep:
+            db_client.execute_commands([f"DROP TABLE IF EXISTS {TABLE}"])
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,260 @@
+"""
+模型評估
+對每個已安裝的模型執行問題集（預設 eval_questions.json，以 DEMO_QUESTIONS 為起點並附參考 SQL），
+量測 SQL 生成延遲、token 數、validate_sql 通過率，以及執行結果與參考 SQL 結果是否一致，
+依問題類別輸出比較表，並建議達到正確率門檻的最快模型
+
+結果比對不要求欄位名稱、欄位順序或列順序相同：參考結果的每一列都要對應到生成結果的一列，
+且該列包含參考列的所有值（數值四捨五入到小數第 2 位），兩者筆數相同；
+問題可以 expected 欄位直接指定預期結果，否則執行 reference_sql 取得
+
+需要可連線的 PostgreSQL（DB_* 環境變數）與 Ollama（OLLAMA_* 環境變數，可使用 OLLAMA_REPLAY_PATH 重播）
+
+使用方式:
+    python benchmarks/eval_models.py [--models qwen3:8b,llama3:70b] [--repeat 3] [--min-accuracy 0.8]
+                                     [--questions-file benchmarks/eval_questions.json] [--output report.json]
+"""
+
+import argparse
+import json
+import sys
+import time
+from collections import Counter, defaultdict
+from decimal import Decimal
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from ambulance_inventory.config import DatabaseConfig, OllamaConfig
+from ambulance_inventory.database import DatabaseClient
+from ambulance_inventory.ollama_client import OllamaClient
+from ambulance_inventory.query_engine import QueryEngine
+from ambulance_inventory.query_log import collect_usage
+from ambulance_inventory.utils.validators import validate_sql
+
+
+DEFAULT_QUESTIONS = Path(__file__).parent / 'eval_questions.json'
+
+
+def normalize_value(value: Any) -> Any:
+    """比對用的值（數值統一為四捨五入的 float，字串去除前後空白）"""
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, (int, float, Decimal)):
+        return round(float(value), 2)
+    return str(value).strip()
+
+
+def results_match(expected: List[Dict[str, Any]], actual: List[Dict[str, Any]]) -> bool:
+    """
+    比對生成 SQL 的結果與預期結果
+
+    Args:
+        expected: 預期結果
+        actual: 生成 SQL 的執行結果
+
+    Returns:
+        筆數相同，且每一列預期結果都對應到一列包含其所有值的生成結果
+    """
+    if len(expected) != len(actual):
+        return False
+
+    remaining = [Counter(normalize_value(value) for value in row.values()) for row in actual]
+    for row in expected:
+        wanted = Counter(normalize_value(value) for value in row.values())
+        for index, candidate in enumerate(remaining):
+            if not wanted - candidate:
+                del remaining[index]
+                break
+        else:
+            return False
+    return True
+
+
+def percentile(samples: List[float], ratio: float) -> Optional[float]:
+    """百分位數（最近排名法）"""
+    if not samples:
+        return None
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * ratio))]
+
+
+def evaluate_question(
+    engine: QueryEngine,
+    db_client: DatabaseClient,
+    item: Dict[str, Any],
+    expected: List[Dict[str, Any]],
+    model: str,
+    repeat: int
+) -> Dict[str, Any]:
+    """
+    以單一模型評估一個問題
+
+    每次生成都計入延遲、token 數與驗證結果；正確性以每次生成的 SQL 執行結果判定
+
+    Args:
+        engine: 查詢引擎（不使用快取）
+        db_client: 資料庫客戶端
+        item: 問題（class、question）
+        expected: 預期結果
+        model: 模型名稱
+        repeat: 生成次數
+
+    Returns:
+        各次生成的紀錄
+    """
+    attempts = []
+    for _ in range(repeat):
+        with collect_usage() as usage:
+            start = time.perf_counter()
+            sql = engine.generate_sql(item['question'], model=model)
+            latency = time.perf_counter() - start
+
+        attempt = {
+            'sql': sql,
+            'latency': latency,
+            'prompt_tokens': usage.get('prompt_tokens'),
+            'completion_tokens': usage.get('completion_tokens'),
+            'generated': bool(sql),
+            'valid': False,
+            'correct': False,
+            'error': None
+        }
+        if not sql:
+            attempt['error'] = "生成失敗"
+        else:
+            attempt['valid'], error = validate_sql(sql)
+            attempt['error'] = error or None
+        if attempt['valid']:
+            try:
+                attempt['correct'] = results_match(expected, db_client.execute_query(sql))
+            except Exception as e:
+                attempt['error'] = f"執行失敗: {str(e).strip()[:200]}"
+        attempts.append(attempt)
+    return {'class': item['class'], 'question': item['question'], 'model': model, 'attempts': attempts}
+
+
+def summarize(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    彙總一組評估紀錄
+
+    Args:
+        records: evaluate_question 的結果
+
+    Returns:
+        生成次數、驗證通過率、正確率、延遲 p50/p95 與平均 token 數
+    """
+    attempts = [attempt for record in records for attempt in record['attempts']]
+    count = len(attempts)
+    latencies = [attempt['latency'] for attempt in attempts if attempt['generated']]
+    prompt_tokens = [attempt['prompt_tokens'] for attempt in attempts if attempt['prompt_tokens'] is not None]
+    completion_tokens = [attempt['completion_tokens'] for attempt in attempts if attempt['completion_tokens'] is not None]
+    return {
+        'attempts': count,
+        'valid_rate': sum(attempt['valid'] for attempt in attempts) / count if count else 0.0,
+        'accuracy': sum(attempt['correct'] for attempt in attempts) / count if count else 0.0,
+        'p50_latency': percentile(latencies, 0.5),
+        'p95_latency': percentile(latencies, 0.95),
+        'avg_prompt_tokens': sum(prompt_tokens) / len(prompt_tokens) if prompt_tokens else None,
+        'avg_completion_tokens': sum(completion_tokens) / len(completion_tokens) if completion_tokens else None
+    }
+
+
+def build_report(records: List[Dict[str, Any]], models: List[str], min_accuracy: float) -> Dict[str, Any]:
+    """
+    依問題類別與模型彙總，並為每個類別建議模型
+
+    Args:
+        records: 所有評估紀錄
+        models: 評估的模型
+        min_accuracy: 正確率門檻
+
+    Returns:
+        classes（類別 → 模型 → 彙總）與 recommendations（類別 → 模型或 None）；類別 all 為全部問題
+    """
+    grouped: Dict[str, Dict[str, List[Dict[str, Any]]]] = defaultdict(lambda: defaultdict(list))
+    for record in records:
+        grouped[record['class']][record['model']].append(record)
+        grouped['all'][record['model']].append(record)
+
+    classes = {}
+    recommendations = {}
+    for name in sorted(grouped, key=lambda name: (name == 'all', name)):
+        summaries = {model: summarize(grouped[name][model]) for model in models if grouped[name][model]}
+        classes[name] = summaries
+        qualified = [
+            (summary['p50_latency'], model) for model, summary in summaries.items()
+            if summary['accuracy'] >= min_accuracy and summary['p50_latency'] is not None
+        ]
+        recommendations[name] = min(qualified)[1] if qualified else None
+    return {'min_accuracy': min_accuracy, 'classes': classes, 'recommendations': recommendations}
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    """輸出比較表與建議"""
+    def fmt(value: Optional[float], pattern: str) -> str:
+        return pattern.format(value) if value is not None else '-'
+
+    for name, summaries in report['classes'].items():
+        print(f"\n[{name}]")
+        print(f"  {'model':<24} {'n':>4} {'valid':>7} {'correct':>8} {'p50(s)':>8} {'p95(s)':>8} "
+              f"{'prompt_tok':>11} {'output_tok':>11}")
+        for model, summary in sorted(summaries.items(), key=lambda item: (-item[1]['accuracy'], item[0])):
+            print(f"  {model:<24} {summary['attempts']:>4} {summary['valid_rate']:>7.0%} {summary['accuracy']:>8.0%} "
+                  f"{fmt(summary['p50_latency'], '{:.2f}'):>8} {fmt(summary['p95_latency'], '{:.2f}'):>8} "
+                  f"{fmt(summary['avg_prompt_tokens'], '{:.0f}'):>11} {fmt(summary['avg_completion_tokens'], '{:.0f}'):>11}")
+
+    print(f"\n建議（正確率 >= {report['min_accuracy']:.0%} 中 p50 延遲最短）:")
+    for name, model in report['recommendations'].items():
+        print(f"  {name:<20} {model or '（沒有模型達到門檻）'}")
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="各模型 SQL 生成延遲與正確率評估")
+    parser.add_argument('--questions-file', default=str(DEFAULT_QUESTIONS), help="問題集 JSON（class、question、reference_sql 或 expected）")
+    parser.add_argument('--models', help="評估的模型，以逗號分隔（預設為所有已安裝的模型）")
+    parser.add_argument('--repeat', type=int, default=3, help="每個問題的生成次數")
+    parser.add_argument('--min-accuracy', type=float, default=0.8, help="建議模型的正確率門檻")
+    parser.add_argument('--no-warmup', action='store_true', help="不先載入模型（第一次生成會包含載入時間）")
+    parser.add_argument('--output', help="將完整報告（含每次生成的 SQL）寫入 JSON 檔案")
+    args = parser.parse_args(argv)
+
+    questions = json.loads(Path(args.questions_file).read_text(encoding='utf-8'))
+    db_client = DatabaseClient(DatabaseConfig.from_env())
+    ollama_client = OllamaClient(OllamaConfig.from_env())
+    # 不使用快取、改寫或快照：只評估模型生成的 SQL
+    engine = QueryEngine(db_client, ollama_client)
+
+    models = args.models.split(',') if args.models else ollama_client.get_available_models()
+    if not models:
+        print("找不到可評估的模型")
+        return 1
+
+    expected = [item['expected'] if 'expected' in item else db_client.execute_query(item['reference_sql'])
+                for item in questions]
+    print(f"{len(questions)} 個問題 × {len(models)} 個模型 × {args.repeat} 次")
+
+    records = []
+    for model in models:
+        if not args.no_warmup:
+            ollama_client.generate("SELECT 1", "", model=model)
+        for item, rows in zip(questions, expected):
+            record = evaluate_question(engine, db_client, item, rows, model, args.repeat)
+            correct = sum(attempt['correct'] for attempt in record['attempts'])
+            print(f"  {model:<24} {correct}/{args.repeat}  {item['question']}")
+            records.append(record)
+
+    report = build_report(records, models, args.min_accuracy)
+    print_report(report)
+
+    if args.output:
+        Path(args.output).write_text(
+            json.dumps(dict(report, records=records), ensure_ascii=False, indent=2, default=str), encoding='utf-8'
+        )
+        print(f"\n報告已寫入 {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+"""
+本地 Ollama 替身
+實作 /api/generate（串流 NDJSON）與 /api/tags，以固定的 SQL 與回答模擬 LLM，
+延遲（首個片段前的等待、片段間隔）可調整，讓負載測試不需 GPU 或網路
+
+SQL 生成請求（system 為 SQL_GENERATION_PROMPT）依問題中的關鍵字回傳對應的 SQL，
+其他請求回傳固定的回答；最後一個片段帶有與 Ollama 相同欄位的 token 數與耗時
+
+使用方式:
+    python benchmarks/fake_ollama.py [--port 11435] [--latency 0.8] [--chunk-delay 0.02]
+    OLLAMA_HOST=http://localhost:11435 uvicorn server.api_server:app
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from ambulance_inventory.config import SQL_GENERATION_PROMPT
+
+
+# (問題關鍵字, SQL)，依序比對，第一個符合的關鍵字決定 SQL
+CANNED_SQL: List[Tuple[str, str]] = [
+    ("AED", "SELECT product_name, brand, model, stock_quantity FROM inventory "
+            "WHERE category = 'AED除顫器' AND stock_quantity > 0"),
+    ("擔架", "SELECT product_name, brand, model, stock_quantity FROM inventory WHERE category = '擔架設備'"),
+    ("監視器", "SELECT product_name, brand, model, unit_price FROM inventory "
+              "WHERE category = '監視器' AND unit_price < 50000"),
+    ("低於10", "SELECT product_name, category, stock_quantity FROM inventory "
+              "WHERE stock_quantity < 10 ORDER BY stock_quantity"),
+    ("Philips", "SELECT product_name, model, unit_price FROM inventory WHERE brand = 'Philips'"),
+    ("分類", "SELECT category, COUNT(*) AS product_count, SUM(stock_quantity) AS total_stock "
+            "FROM inventory GROUP BY category ORDER BY category"),
+    ("價值", "SELECT SUM(stock_quantity * unit_price) AS total_value FROM inventory"),
+]
+
+DEFAULT_SQL = "SELECT product_name, category, stock_quantity FROM inventory ORDER BY product_id LIMIT 20"
+
+DEFAULT_ANSWER = "根據查詢結果，目前共有多項符合條件的產品，庫存數量如上表所示，建議優先補充庫存較低的品項。"
+
+
+@dataclass
+class FakeOllamaConfig:
+    """Ollama 替身配置"""
+    latency: float = 0.5
+    chunk_delay: float = 0.01
+    chunk_chars: int = 8
+    models: List[str] = field(default_factory=lambda: ['qwen3:8b', 'llama3:70b'])
+    canned_sql: List[Tuple[str, str]] = field(default_factory=lambda: list(CANNED_SQL))
+    answer: str = DEFAULT_ANSWER
+
+
+def choose_sql(prompt: str, canned_sql: List[Tuple[str, str]]) -> str:
+    """
+    依問題關鍵字選擇 SQL
+
+    Args:
+        prompt: 問題
+        canned_sql: (關鍵字, SQL) 列表
+
+    Returns:
+        第一個關鍵字出現在問題中的 SQL，都不符合時為 DEFAULT_SQL
+    """
+    for keyword, sql in canned_sql:
+        if keyword in prompt:
+            return sql
+    return DEFAULT_SQL
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """HTTP 請求處理（server.config 為 FakeOllamaConfig）"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        if self.path != '/api/tags':
+            self.send_error(404)
+            return
+        body = json.dumps({'models': [{'name': name} for name in self.server.config.models]}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self) -> None:
+        if self.path != '/api/generate':
+            self.send_error(404)
+            return
+        config: FakeOllamaConfig = self.server.config
+        length = int(self.headers.get('Content-Length', 0))
+        payload = json.loads(self.rfile.read(length) or b'{}')
+        prompt = payload.get('prompt', '')
+        if payload.get('system') == SQL_GENERATION_PROMPT:
+            text = choose_sql(prompt, config.canned_sql)
+        else:
+            text = config.answer
+
+        start = time.perf_counter_ns()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        time.sleep(config.latency)
+        prompt_done = time.perf_counter_ns()
+        chunks = [text[index:index + config.chunk_chars] for index in range(0, len(text), config.chunk_chars)]
+        for chunk in chunks:
+            self._write_chunk({'model': payload.get('model'), 'response': chunk, 'done': False})
+            time.sleep(config.chunk_delay)
+        end = time.perf_counter_ns()
+        self._write_chunk({
+            'model': payload.get('model'),
+            'response': '',
+            'done': True,
+            'prompt_eval_count': len(payload.get('system') or '') // 2 + len(prompt) // 2,
+            'eval_count': len(chunks),
+            'load_duration': 0,
+            'prompt_eval_duration': prompt_done - start,
+            'eval_duration': end - prompt_done,
+            'total_duration': end - start
+        })
+        self.wfile.write(b'0\r\n\r\n')
+
+    def _write_chunk(self, data: dict) -> None:
+        """寫出一行 NDJSON（HTTP chunked 編碼）"""
+        line = json.dumps(data, ensure_ascii=False).encode('utf-8') + b'\n'
+        self.wfile.write(f"{len(line):x}\r\n".encode('ascii') + line + b'\r\n')
+        self.wfile.flush()
+
+
+def start_fake_ollama(
+    port: int = 0,
+    config: Optional[FakeOllamaConfig] = None,
+    host: str = '127.0.0.1'
+) -> ThreadingHTTPServer:
+    """
+    在背景執行緒啟動 Ollama 替身
+
+    Args:
+        port: 連接埠（0 為自動選擇）
+        config: 替身配置（可選）
+        host: 監聽位址
+
+    Returns:
+        HTTP 伺服器（server_address 為實際位址，結束時呼叫 shutdown()）
+    """
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    server.config = config or FakeOllamaConfig()
+    threading.Thread(target=server.serve_forever, name="fake-ollama", daemon=True).start()
+    return server
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="本地 Ollama 替身（固定 SQL 與回答，可調延遲）")
+    parser.add_argument('--host', default='0.0.0.0', help="監聽位址")
+    parser.add_argument('--port', type=int, default=11435, help="連接埠")
+    parser.add_argument('--latency', type=float, default=0.5, help="首個片段前的等待（秒，模擬 prompt eval）")
+    parser.add_argument('--chunk-delay', type=float, default=0.01, help="片段間隔（秒，模擬生成速度）")
+    parser.add_argument('--chunk-chars', type=int, default=8, help="每個片段的字元數")
+    parser.add_argument('--sql-file', help="JSON 檔案，內容為 [[關鍵字, SQL], ...]，取代內建的 SQL")
+    args = parser.parse_args(argv)
+
+    config = FakeOllamaConfig(latency=args.latency, chunk_delay=args.chunk_delay, chunk_chars=args.chunk_chars)
+    if args.sql_file:
+        config.canned_sql = [tuple(item) for item in json.loads(Path(args.sql_file).read_text(encoding='utf-8'))]
+
+    server = start_fake_ollama(args.port, config, host=args.host)
+    print(f"Ollama 替身已啟動: http://{args.host}:{server.server_address[1]} "
+          f"(latency={args.latency}s, chunk_delay={args.chunk_delay}s)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,180 @@
+"""
+合成庫存目錄
+以固定亂數種子產生與 inventory 相同結構、涵蓋現有分類的大量資料，供索引與效能基準使用
+
+使用方式:
+    from benchmarks.synthetic_catalog import generate_rows, load_catalog, fill_inventory
+    python benchmarks/synthetic_catalog.py --rows 1000000 [--replace]   # 以合成資料填入 inventory
+"""
+
+import argparse
+import io
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Iterator, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from ambulance_inventory.config import DatabaseConfig, MATERIALIZED_VIEWS
+from ambulance_inventory.database import DatabaseClient
+
+
+# (分類, 代碼前綴, 品名字根)，分類與代碼前綴與 ambulance_inventory_demo.sql 相同
+CATEGORIES = [
+    ('AED除顫器', 'AED', ['半自動體外除顫器', '自動體外心臟除顫器', 'AED 訓練機']),
+    ('擔架設備', 'STR', ['電動擔架', '鋁合金擔架', '鏟式擔架', '折疊式樓梯椅']),
+    ('氧氣設備', 'OXY', ['氧氣鋼瓶', '氧氣調節器', '非再呼吸面罩', '鼻導管']),
+    ('監視器', 'MON', ['生理監視器', '12導程心電圖機', '血氧監測儀']),
+    ('抽吸設備', 'SUC', ['攜帶式抽吸機', '手動抽吸器', '車載抽吸機']),
+    ('呼吸設備', 'RES', ['喉頭鏡', '甦醒球', '氣管內管', '聲門上呼吸道']),
+    ('固定器材', 'IMM', ['頸圈', '夾板組', '長背板', '脊椎固定裝置']),
+    ('急救包', 'KIT', ['止血帶', '紗布包', '創傷急救包', '燒燙傷急救包']),
+    ('車內設備', 'VEH', ['醫療冷藏箱', '車內照明燈組', '設備固定架', '電源逆變器']),
+    ('防護用品', 'PPE', ['N95 防護口罩', '隔離衣', '丁腈手套', '護目鏡']),
+    ('通訊設備', 'COM', ['數位無線電', '頻道掃描器', '行動網路路由器']),
+]
+
+BRANDS = ['Philips', 'ZOLL', 'Mindray', 'Ferno', 'Stryker', 'Spencer', 'Laerdal', 'Nihon Kohden', 'Drager', 'Weinmann']
+FEATURES = ['IP55防護', '語音指導', '可折疊', '輕量化', '雙相波技術', 'CPR即時回饋', '長效電池', '藍牙傳輸', 'X光穿透']
+
+CATALOG_COLUMNS = (
+    'product_id', 'product_name', 'category', 'brand', 'model',
+    'specifications', 'stock_quantity', 'unit_price', 'supplier'
+)
+
+CatalogRow = Tuple[str, str, str, str, str, str, int, float, str]
+
+
+def generate_rows(count: int, seed: int = 42) -> Iterator[CatalogRow]:
+    """
+    產生合成庫存資料（同一種子結果固定）
+
+    Args:
+        count: 筆數
+        seed: 亂數種子
+
+    Yields:
+        依 CATALOG_COLUMNS 排列的資料列
+    """
+    rng = random.Random(seed)
+    for index in range(count):
+        category, prefix, stems = rng.choice(CATEGORIES)
+        brand = rng.choice(BRANDS)
+        model = f"{brand[:2].upper()}-{rng.randint(100, 9999)}"
+        name = f"{brand} {model} {rng.choice(stems)}"
+        specifications = '、'.join(rng.sample(FEATURES, 3))
+        yield (
+            f"{prefix}-{index:07d}",
+            name,
+            category,
+            brand,
+            model,
+            specifications,
+            rng.randint(0, 60),
+            float(rng.randrange(500, 150000, 50)),
+            f"{brand}台灣"
+        )
+
+
+def load_catalog(db_client: DatabaseClient, table: str, count: int, seed: int = 42, batch_size: int = 5000) -> None:
+    """
+    建立並載入合成資料表（已存在時先刪除）
+
+    Args:
+        db_client: 資料庫客戶端
+        table: 資料表名稱
+        count: 筆數
+        seed: 亂數種子
+        batch_size: 每批寫入筆數
+    """
+    import psycopg2
+    from psycopg2.extras import execute_values
+
+    db_client.execute_commands([
+        f"DROP TABLE IF EXISTS {table}",
+        f"CREATE TABLE {table} (LIKE inventory INCLUDING DEFAULTS)",
+    ])
+
+    conn = psycopg2.connect(**db_client.config.to_dict())
+    try:
+        with conn, conn.cursor() as cursor:
+            rows = generate_rows(count, seed)
+            while True:
+                batch = [row for _, row in zip(range(batch_size), rows)]
+                if not batch:
+                    break
+                execute_values(
+                    cursor,
+                    f"INSERT INTO {table} ({', '.join(CATALOG_COLUMNS)}) VALUES %s",
+                    batch
+                )
+    finally:
+        conn.close()
+
+    db_client.execute_commands([f"ALTER TABLE {table} ADD PRIMARY KEY (product_id)", f"ANALYZE {table}"])
+
+
+def fill_inventory(db_client: DatabaseClient, count: int, seed: int = 42, batch_size: int = 100000) -> None:
+    """
+    以合成資料取代 inventory 的內容（TRUNCATE 後以 COPY 分批寫入），完成後刷新物化視圖並 ANALYZE
+
+    保留資料表、索引與觸發器，伺服器不需重新設定即可對大量資料進行負載測試
+
+    Args:
+        db_client: 資料庫客戶端
+        count: 筆數（1 千萬筆約需數 GB 磁碟空間）
+        seed: 亂數種子
+        batch_size: 每次 COPY 的筆數
+    """
+    import psycopg2
+
+    conn = psycopg2.connect(**db_client.config.to_dict())
+    try:
+        with conn, conn.cursor() as cursor:
+            cursor.execute("TRUNCATE inventory")
+            rows = generate_rows(count, seed)
+            while True:
+                buffer = io.StringIO()
+                written = 0
+                for row in rows:
+                    buffer.write('\t'.join(str(value) for value in row))
+                    buffer.write('\n')
+                    written += 1
+                    if written >= batch_size:
+                        break
+                if not written:
+                    break
+                buffer.seek(0)
+                cursor.copy_expert(f"COPY inventory ({', '.join(CATALOG_COLUMNS)}) FROM STDIN", buffer)
+    finally:
+        conn.close()
+
+    db_client.execute_commands(
+        [f"REFRESH MATERIALIZED VIEW {view}" for view in MATERIALIZED_VIEWS] + ["ANALYZE inventory"]
+    )
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="以合成資料填入 inventory（負載測試用）")
+    parser.add_argument('--rows', type=int, default=100000, help="筆數（建議 1 萬到 1 千萬）")
+    parser.add_argument('--seed', type=int, default=42, help="亂數種子")
+    parser.add_argument('--replace', action='store_true', help="inventory 已有資料時仍然取代")
+    args = parser.parse_args(argv)
+
+    db_client = DatabaseClient(DatabaseConfig.from_env())
+    existing = db_client.execute_query("SELECT COUNT(*) AS count FROM inventory")[0]['count']
+    if existing and not args.replace:
+        print(f"inventory 已有 {existing} 筆資料，加上 --replace 以合成資料取代")
+        return 1
+
+    print(f"寫入 {args.rows} 筆合成資料到 inventory ...")
+    start = time.perf_counter()
+    fill_inventory(db_client, args.rows, seed=args.seed)
+    print(f"完成 {time.perf_counter() - start:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
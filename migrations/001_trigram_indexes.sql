@@ -0,0 +1,29 @@
+-- 遷移 001：ILIKE 模糊比對用的 pg_trgm GIN 索引
+-- ============================================
+-- 產生的 SQL 大多以 ILIKE '%關鍵字%' 比對名稱、型號與規格，B-tree 索引無法使用，
+-- 大型目錄下會退化為全表掃描。trigram GIN 索引可讓前後萬用字元的比對走 Bitmap Index Scan。
+--
+-- 注意：資料庫以 C locale 初始化時，pg_trgm 只擷取英數字元，中文關鍵字無法由索引加速
+-- （英文品牌/型號如 '%ZOLL%'、'%HS1%' 仍有效）。
+--
+-- 套用方式（CONCURRENTLY 不可在交易內執行，請勿以 -1 / --single-transaction 執行）:
+--     psql -d ambulance_inventory -f migrations/001_trigram_indexes.sql
+-- 或依實際查詢記錄產生建議:
+--     python -m ambulance_inventory.index_advisor --sql-file queries.sql --apply
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_inventory_product_name_trgm
+    ON inventory USING gin (product_name gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_inventory_model_trgm
+    ON inventory USING gin (model gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_inventory_specifications_trgm
+    ON inventory USING gin (specifications gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_inventory_brand_trgm
+    ON inventory USING gin (brand gin_trgm_ops);
+
+-- 價格範圍查詢（unit_price BETWEEN ...）
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_inventory_unit_price
+    ON inventory (unit_price);
+
+ANALYZE inventory;
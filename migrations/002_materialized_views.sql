@@ -0,0 +1,79 @@
+-- 遷移 002：低庫存與分類統計改為物化視圖
+-- ============================================
+-- low_stock_alert、category_summary 原為一般視圖，每次讀取都重新掃描 inventory；
+-- 低庫存儀表板是最頻繁的查詢。改為物化視圖後讀取只掃描結果，
+-- API 服務的排程器由 inventory 的資料列異動統計判斷是否過期，以 REFRESH ... CONCURRENTLY 刷新
+-- （刷新期間讀取不受阻塞）。
+--
+-- low_stock_alert 另外加入 model、supplier 欄位（原有欄位不變）。
+-- 物化視圖的 ORDER BY 只在刷新當下有效，查詢時請自行指定排序。
+--
+-- 套用方式:
+--     psql -d ambulance_inventory -f migrations/002_materialized_views.sql
+
+BEGIN;
+
+-- 只移除一般視圖（重複執行時已是物化視圖，DROP VIEW 會失敗）
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_views WHERE schemaname = current_schema() AND viewname = 'low_stock_alert') THEN
+        DROP VIEW low_stock_alert;
+    END IF;
+    IF EXISTS (SELECT 1 FROM pg_views WHERE schemaname = current_schema() AND viewname = 'category_summary') THEN
+        DROP VIEW category_summary;
+    END IF;
+END $$;
+
+-- 物化視圖：低庫存警示（唯一索引為 REFRESH ... CONCURRENTLY 所需）
+CREATE MATERIALIZED VIEW IF NOT EXISTS low_stock_alert AS
+SELECT product_id, product_name, category, brand, model, stock_quantity, unit_price, supplier
+FROM inventory
+WHERE stock_quantity < 10
+ORDER BY stock_quantity ASC;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_low_stock_alert_product_id ON low_stock_alert (product_id);
+CREATE INDEX IF NOT EXISTS idx_low_stock_alert_stock_quantity ON low_stock_alert (stock_quantity);
+
+-- 物化視圖：分類統計
+CREATE MATERIALIZED VIEW IF NOT EXISTS category_summary AS
+SELECT
+    category,
+    COUNT(*) as product_count,
+    SUM(stock_quantity) as total_stock,
+    AVG(unit_price) as avg_price,
+    SUM(stock_quantity * unit_price) as total_value
+FROM inventory
+GROUP BY category
+ORDER BY total_value DESC;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_category_summary_category ON category_summary (category);
+
+-- 刷新狀態：變更版本為 pg_stat_user_tables 的 n_tup_ins + n_tup_upd + n_tup_del 加上 TRUNCATE 次數
+-- （change_count），刷新後記錄刷新前讀到的版本（refreshed_count）。
+-- 寫入交易不更新共用的資料列，並行寫入不會互相等待
+CREATE TABLE IF NOT EXISTS materialized_view_state (
+    view_name VARCHAR(63) PRIMARY KEY,
+    change_count BIGINT NOT NULL DEFAULT 0,
+    refreshed_count BIGINT NOT NULL DEFAULT 0,
+    refreshed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+ALTER TABLE materialized_view_state DROP COLUMN IF EXISTS pending_since;
+
+INSERT INTO materialized_view_state (view_name)
+VALUES ('low_stock_alert'), ('category_summary')
+ON CONFLICT (view_name) DO NOTHING;
+
+-- TRUNCATE 不計入 n_tup_del，另以觸發器計數（TRUNCATE 本身已持有資料表的排他鎖）
+CREATE OR REPLACE FUNCTION mark_inventory_views_stale() RETURNS trigger AS $$
+BEGIN
+    UPDATE materialized_view_state SET change_count = change_count + 1;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS inventory_views_stale ON inventory;
+CREATE TRIGGER inventory_views_stale
+AFTER TRUNCATE ON inventory
+FOR EACH STATEMENT EXECUTE FUNCTION mark_inventory_views_stale();
+
+COMMIT;
@@ -0,0 +1,27 @@
+-- 遷移 003：寫入 inventory 時自動更新 last_updated
+-- ============================================
+-- 行程內快照以 last_updated 增量刷新；原本只有 DEFAULT 與初始化時的批次 UPDATE 會設定它，
+-- 一般的庫存 UPDATE 不會改變 last_updated，快照（與聚合 cube、搜尋索引、自動完成）
+-- 要等到下次完整載入才會反映。改由資料列層級觸發器在每次寫入時設定。
+--
+-- 套用方式:
+--     psql -d ambulance_inventory -f migrations/003_last_updated_trigger.sql
+
+BEGIN;
+
+CREATE OR REPLACE FUNCTION touch_inventory_last_updated() RETURNS trigger AS $$
+BEGIN
+    NEW.last_updated = now();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS inventory_touch_last_updated ON inventory;
+CREATE TRIGGER inventory_touch_last_updated
+BEFORE INSERT OR UPDATE ON inventory
+FOR EACH ROW EXECUTE FUNCTION touch_inventory_last_updated();
+
+-- 快照以 last_updated 範圍查詢變更
+CREATE INDEX IF NOT EXISTS idx_last_updated ON inventory (last_updated);
+
+COMMIT;
@@ -9,25 +9,57 @@ FastAPI Server for Remote Ambulance Inventory Queries
     http://SPARK_IP:8000/docs
 """
 
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, RedirectResponse
+from fastapi.responses import FileResponse, RedirectResponse, PlainTextResponse
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Literal
 import sys
 import os
 import time
+import asyncio
+import functools
+import hmac
+import uuid
 from pathlib import Path
 
 # Add parent directory to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from ambulance_inventory.config import DatabaseConfig, OllamaConfig
+from ambulance_inventory.config import (
+    DatabaseConfig, OllamaConfig, QueryConfig, JobConfig, BatchConfig, AdaptiveConfig, HealthConfig,
+    RewriteConfig, CostGuardConfig, IndexAdvisorConfig, SnapshotConfig, MaterializedViewConfig,
+    SearchConfig, AutocompleteConfig, ResponseCacheConfig, TracingConfig, LoggingConfig, ProfilingConfig,
+    QueryLogConfig, StatementStatsConfig
+)
 from ambulance_inventory.database import DatabaseClient
 from ambulance_inventory.ollama_client import OllamaClient
 from ambulance_inventory.query_engine import QueryEngine
-from ambulance_inventory.utils.logger import get_logger
+from ambulance_inventory.adaptive_policy import AdaptiveLLMPolicy
+from ambulance_inventory.sql_rewriter import SqlRewriter
+from ambulance_inventory.cost_guard import QueryCostGuard, QueryCostExceeded
+from ambulance_inventory.index_advisor import IndexAdvisor
+from ambulance_inventory.snapshot import InventorySnapshot
+from ambulance_inventory.aggregate_cube import AggregateCube, CUBE_DIMENSIONS
+from ambulance_inventory.materialized_views import MaterializedViewManager
+from ambulance_inventory.search_index import SearchIndex
+from ambulance_inventory.autocomplete import AutocompleteIndex
+from ambulance_inventory.response_cache import ResponseCache
+from ambulance_inventory.query_log import QueryLog
+from ambulance_inventory.health import HealthMonitor
+from ambulance_inventory.job_manager import JobManager, JobQueueFullError, JobStatus
+from ambulance_inventory.batch import BatchQueryRunner
+from ambulance_inventory.metrics import (
+    REGISTRY, QUERY_STAGE_SECONDS, QUERIES_TOTAL, REQUESTS_IN_FLIGHT, JOBS, JOB_WORKERS, server_timing
+)
+from ambulance_inventory.profiler import Profiler, ProfilerBusy
+from ambulance_inventory.tracing import Tracer, configure as configure_tracing, start_trace
+from ambulance_inventory.utils.deadline import Deadline, QueryAborted
+from ambulance_inventory.utils.logger import (
+    get_logger, setup_logging, shutdown_logging, set_request_id, reset_request_id
+)
 
 logger = get_logger(__name__)
 
@@ -49,6 +81,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.middleware("http")
+async def request_context(request: Request, call_next):
+    """為每個請求設定請求 ID（沿用 X-Request-Id 標頭），日誌紀錄帶上此 ID 並於回應標頭回傳"""
+    request_id = request.headers.get('x-request-id') or uuid.uuid4().hex[:16]
+    token = set_request_id(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        reset_request_id(token)
+    response.headers['X-Request-Id'] = request_id
+    return response
+
 # Static files for web UI
 web_dir = Path(__file__).parent.parent / "web"
 if web_dir.exists():
@@ -58,6 +103,23 @@ if web_dir.exists():
 db_client: Optional[DatabaseClient] = None
 ollama_client: Optional[OllamaClient] = None
 query_engine: Optional[QueryEngine] = None
+llm_policy: Optional[AdaptiveLLMPolicy] = None
+sql_rewriter: Optional[SqlRewriter] = None
+cost_guard: Optional[QueryCostGuard] = None
+index_advisor: Optional[IndexAdvisor] = None
+inventory_snapshot: Optional[InventorySnapshot] = None
+aggregate_cube: Optional[AggregateCube] = None
+materialized_views: Optional[MaterializedViewManager] = None
+search_index: Optional[SearchIndex] = None
+autocomplete_index: Optional[AutocompleteIndex] = None
+response_cache: Optional[ResponseCache] = None
+query_log: Optional[QueryLog] = None
+tracer: Optional[Tracer] = None
+profiler: Optional[Profiler] = None
+query_config: Optional[QueryConfig] = None
+health_monitor: Optional[HealthMonitor] = None
+job_manager: Optional[JobManager] = None
+batch_config: Optional[BatchConfig] = None
 
 
 # Pydantic models
@@ -66,13 +128,18 @@ class QueryRequest(BaseModel):
     question: str = Field(..., description="自然語言問題", min_length=1)
     model: Optional[str] = Field(None, description="使用的模型（可選，不指定則使用當前模型）")
     use_llm_answer: bool = Field(True, description="是否使用 LLM 生成回答（False 則只用程式化格式，更快）")
+    timeout: Optional[float] = Field(None, description="總時限（秒，可選），各階段只使用剩餘時間，超時或斷線即取消", gt=0)
+    profile: Optional[Literal['cpu', 'memory']] = Field(
+        None, description="剖析此請求（需 PROFILING_ENABLED，僅 /query 支援）：cpu 為 cProfile 統計，memory 為 tracemalloc 配置位置"
+    )
 
     class Config:
         json_schema_extra = {
             "example": {
                 "question": "請列出所有有庫存的AED除顫器，包含品牌、型號和庫存數量",
                 "model": "llama3:70b",
-                "use_llm_answer": True
+                "use_llm_answer": True,
+                "timeout": 60
             }
         }
 
@@ -91,6 +158,8 @@ class ModelSelectRequest(BaseModel):
 class TimingInfo(BaseModel):
     """計時資訊"""
     sql_generation: Optional[float] = Field(None, description="SQL 生成耗時（秒）")
+    sql_rewrite: Optional[float] = Field(None, description="SQL 改寫耗時（秒）")
+    cost_check: Optional[float] = Field(None, description="EXPLAIN 成本檢查耗時（秒）")
     query_execution: Optional[float] = Field(None, description="查詢執行耗時（秒）")
     formatting: Optional[float] = Field(None, description="格式化耗時（秒）")
     llm_response: Optional[float] = Field(None, description="LLM 回答生成耗時（秒）")
@@ -106,14 +175,75 @@ class QueryResponse(BaseModel):
     answer_html: Optional[str] = Field(None, description="HTML 表格格式（完美對齊，推薦用於 Web）")
     results: Optional[List[Dict[str, Any]]] = Field(None, description="原始查詢結果")
     result_count: Optional[int] = Field(None, description="結果筆數")
+    estimated_rows: Optional[int] = Field(None, description="執行前 EXPLAIN 預估筆數")
     model_used: Optional[str] = Field(None, description="實際使用的模型名稱")
     use_llm_answer: Optional[bool] = Field(None, description="是否使用 LLM 生成回答（實際執行的模式）")
+    llm_answer_skipped: Optional[bool] = Field(None, description="LLM 回答是否略過（負載過高或預估筆數過多，降級為程式化結果）")
+    degraded_reason: Optional[str] = Field(None, description="降級原因（如果有）")
+    llm_skip_cause: Optional[str] = Field(None, description="略過 LLM 回答的原因類型：load（負載過高）或 result_size（預估筆數超過上限）")
     elapsed_time: Optional[float] = Field(None, description="總耗時（秒）")
     timing: Optional[TimingInfo] = Field(None, description="詳細計時資訊")
+    profile: Optional[str] = Field(None, description="請求剖析結果（request.profile 時）")
     success: bool = Field(..., description="查詢是否成功")
     error: Optional[str] = Field(None, description="錯誤訊息（如果有）")
 
 
+class JobSubmitResponse(BaseModel):
+    """非同步任務提交回應"""
+    job_id: str = Field(..., description="任務 ID")
+    status: str = Field(..., description="任務狀態")
+    status_url: str = Field(..., description="查詢任務狀態的 URL")
+
+
+class JobStatusResponse(BaseModel):
+    """非同步任務狀態回應"""
+    job_id: str = Field(..., description="任務 ID")
+    status: str = Field(..., description="任務狀態（pending / running / succeeded / failed）")
+    question: str = Field(..., description="原始問題")
+    model_used: Optional[str] = Field(None, description="使用的模型名稱")
+    use_llm_answer: bool = Field(..., description="是否使用 LLM 生成回答")
+    partial: Dict[str, Any] = Field(default_factory=dict, description="部分結果（SQL、表格先行，LLM 回答最後）")
+    result: Optional[QueryResponse] = Field(None, description="最終結果（任務完成後）")
+    error: Optional[str] = Field(None, description="錯誤訊息（如果有）")
+    elapsed_time: Optional[float] = Field(None, description="已耗時（秒）")
+
+
+class BatchQueryRequest(BaseModel):
+    """批次查詢請求"""
+    questions: List[str] = Field(..., description="自然語言問題列表", min_length=1)
+    model: Optional[str] = Field(None, description="使用的模型（可選，不指定則使用當前模型）")
+    use_llm_answer: bool = Field(True, description="是否使用 LLM 生成回答")
+    max_concurrency: Optional[int] = Field(None, description="並行度（可選，不超過伺服器上限）", ge=1)
+    timeout: Optional[float] = Field(None, description="整個批次的時限（秒，可選，不指定則使用伺服器預設值）", gt=0)
+
+
+class BatchItemResponse(QueryResponse):
+    """批次查詢單項結果"""
+    index: int = Field(..., description="在請求中的位置")
+    duplicate_of: Optional[int] = Field(None, description="重複問題時，引用的第一次出現位置")
+    sql_shared: bool = Field(False, description="SQL 結果是否與其他問題共用（相同 SQL 只執行一次）")
+
+
+class BatchSummary(BaseModel):
+    """批次查詢彙總"""
+    total_items: int = Field(..., description="問題總數")
+    unique_questions: int = Field(..., description="不同問題數（實際執行數）")
+    unique_sql: int = Field(..., description="對資料庫執行的不同 SQL 數")
+    succeeded: int = Field(..., description="成功數")
+    failed: int = Field(..., description="失敗數")
+    concurrency: int = Field(..., description="使用的並行度")
+    wall_time: float = Field(..., description="批次總耗時（秒）")
+    sequential_time: float = Field(..., description="各問題耗時總和（秒，逐一發送的預估耗時）")
+    max_item_time: float = Field(..., description="單一問題最長耗時（秒）")
+    stage_totals: Dict[str, float] = Field(default_factory=dict, description="各階段耗時總和（秒）")
+
+
+class BatchQueryResponse(BaseModel):
+    """批次查詢回應"""
+    items: List[BatchItemResponse] = Field(..., description="各問題結果（依請求順序）")
+    summary: BatchSummary = Field(..., description="彙總計時資訊")
+
+
 class HealthResponse(BaseModel):
     """健康檢查回應"""
     status: str
@@ -121,6 +251,307 @@ class HealthResponse(BaseModel):
     ollama: bool
     model: str
     version: str
+    llm_degraded: Optional[bool] = None
+    breakers: Optional[Dict[str, Dict[str, Any]]] = None
+
+
+class IndexRecommendationInfo(BaseModel):
+    """索引建議"""
+    table: str
+    column: str
+    kind: str = Field(..., description="trigram / expression / btree")
+    occurrences: int
+    name: str
+    reason: str
+    ddl: str
+
+
+class IndexAdviceResponse(BaseModel):
+    """索引建議回應"""
+    observed_statements: int
+    recommendations: List[IndexRecommendationInfo]
+    migration: List[str] = Field(..., description="遷移指令（可交由 python -m ambulance_inventory.index_advisor --apply 套用）")
+    warnings: List[str] = []
+
+
+class SnapshotStatsResponse(BaseModel):
+    """inventory 快照統計"""
+    enabled: bool
+    ready: bool
+    row_count: int
+    hits: int
+    misses: int
+    hit_rate: Optional[float] = Field(None, description="本地執行命中率（無查詢時為 null）")
+    refresh_errors: int
+    seconds_since_refresh: Optional[float] = None
+    seconds_since_full_load: Optional[float] = None
+
+
+class MaterializedViewInfo(BaseModel):
+    """物化視圖狀態"""
+    view_name: str
+    pending_changes: Optional[int] = Field(None, description="尚未刷新的 inventory 變更陳述式數")
+    staleness_seconds: Optional[float] = Field(None, description="自第一筆未刷新變更起算的落後秒數（無變更時為 0）")
+    seconds_since_refresh: Optional[float] = None
+    last_refresh_ms: Optional[float] = None
+    refresh_count: int
+    refresh_errors: int
+
+
+class MaterializedViewStatsResponse(BaseModel):
+    """物化視圖統計"""
+    enabled: bool
+    routed_queries: int = Field(..., description="改讀 low_stock_alert 的查詢數")
+    poll_errors: int
+    views: List[MaterializedViewInfo]
+
+
+class StatsRow(BaseModel):
+    """彙總列（分組維度欄位依查詢而定）"""
+    model_config = {"extra": "allow"}
+
+    product_count: int
+    total_stock: Optional[int] = None
+    total_value: Optional[float] = None
+    avg_price: Optional[float] = None
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+
+
+class StatsResponse(BaseModel):
+    """庫存彙總回應"""
+    source: str = Field(..., description="資料來源：cube（記憶體彙總）或 database（cube 未載入時回退 SQL）")
+    dimensions: List[str]
+    rows: List[StatsRow]
+    elapsed_ms: float
+
+
+class SearchResultItem(BaseModel):
+    """搜尋結果項目"""
+    product_id: str
+    product_name: str
+    category: Optional[str] = None
+    brand: Optional[str] = None
+    model: Optional[str] = None
+    stock_quantity: Optional[int] = None
+    unit_price: Optional[float] = None
+    supplier: Optional[str] = None
+    score: Optional[float] = Field(None, description="BM25 分數（資料庫回退時為 null）")
+
+
+class SearchResponse(BaseModel):
+    """產品搜尋回應"""
+    query: str
+    source: str = Field(..., description="資料來源：index（記憶體倒排索引）或 database（索引未載入時回退 ILIKE）")
+    total: int = Field(..., description="符合筆數")
+    total_estimated: bool = Field(False, description="符合筆數是否為估計值（關鍵字都非常常見時提前結束計分）")
+    matched_all_terms: bool = Field(True, description="是否所有詞都符合（否則為符合任一詞的結果）")
+    results: List[SearchResultItem]
+    elapsed_ms: float
+
+
+class SearchIndexStatsResponse(BaseModel):
+    """搜尋索引統計"""
+    enabled: bool
+    ready: bool
+    document_count: int
+    term_count: int
+    delta_documents: int = Field(..., description="尚未合併進主索引的新增或變更筆數")
+    removed_documents: int
+    merges: int
+    build_seconds: Optional[float] = None
+    seconds_since_build: Optional[float] = None
+
+
+class AutocompleteSuggestion(BaseModel):
+    """自動完成建議"""
+    text: str
+    kind: str = Field(..., description="種類：question（歷史問題）、category、brand、model")
+    weight: int = Field(..., description="問題為成功執行次數，目錄詞為品項數")
+
+
+class AutocompleteResponse(BaseModel):
+    """自動完成回應"""
+    prefix: str
+    suggestions: List[AutocompleteSuggestion]
+    elapsed_ms: float
+
+
+class AutocompleteStatsResponse(BaseModel):
+    """自動完成索引統計"""
+    enabled: bool
+    questions: int
+    catalog_entries: int
+    catalog_source: Optional[str] = Field(None, description="目錄詞來源：snapshot 或 database（尚未載入時為 null）")
+    nodes: int
+    lookups: int
+
+
+class ResponseCacheNamespaceStats(BaseModel):
+    """LLM 快取命名空間統計"""
+    entries: int
+    hits: int
+    misses: int
+    hit_rate: Optional[float] = Field(None, description="命中率（無查詢時為 null）")
+
+
+class ResponseCacheStatsResponse(BaseModel):
+    """LLM 快取統計"""
+    enabled: bool
+    persistent: bool = Field(..., description="是否同步寫入 RESPONSE_CACHE_PATH")
+    max_entries: int
+    ttl: float
+    evictions: int
+    persist_errors: int
+    namespaces: Dict[str, ResponseCacheNamespaceStats] = Field(..., description="sql（生成的 SQL）與 answer（LLM 回答）")
+
+
+class QueryLogStatsResponse(BaseModel):
+    """查詢日誌寫入統計"""
+    enabled: bool
+    active: bool = Field(..., description="是否正在記錄（檔案無法開啟時為 false）")
+    path: str
+    written: int
+    dropped: int = Field(..., description="佇列已滿而丟棄的紀錄數")
+    pending: int = Field(..., description="等待背景寫入的紀錄數")
+    write_errors: int
+    entries: int = Field(..., description="檔案中的紀錄數")
+
+
+class SlowQuestion(BaseModel):
+    """慢問題（依正規化問題合併）"""
+    question_key: str
+    question: str = Field(..., description="範例問題")
+    count: int
+    avg_seconds: float
+    max_seconds: float
+    errors: int
+    avg_tokens: Optional[float] = Field(None, description="平均 prompt + completion token 數")
+
+
+class SlowQuestionsResponse(BaseModel):
+    """最慢的問題"""
+    hours: float
+    questions: List[SlowQuestion]
+
+
+class FingerprintStats(BaseModel):
+    """SQL 指紋統計"""
+    fingerprint: str = Field(..., description="常數以 ? 取代的 SQL")
+    count: int
+    distinct_questions: int = Field(..., description="產生此 SQL 的不同問題數（多時適合以規則路徑產生 SQL）")
+    example_question: str
+    avg_execution_seconds: Optional[float] = None
+    avg_total_seconds: Optional[float] = None
+    sql_cache_hits: int
+    sources: Dict[str, int] = Field(..., description="資料來源（cube、snapshot、database）次數")
+    errors: int
+
+
+class FingerprintStatsResponse(BaseModel):
+    """最常執行的 SQL 指紋"""
+    hours: float
+    fingerprints: List[FingerprintStats]
+
+
+class StagePercentiles(BaseModel):
+    """階段耗時百分位數（秒）"""
+    model: str
+    stage: str = Field(..., description="階段名稱，total 為整個查詢")
+    count: int
+    p50: float
+    p95: float
+    p99: float
+
+
+class StagePercentilesResponse(BaseModel):
+    """各模型、各階段耗時百分位數"""
+    hours: float
+    stages: List[StagePercentiles]
+
+
+class CapturedPlan(BaseModel):
+    """取樣擷取的 EXPLAIN (ANALYZE, BUFFERS) 計畫"""
+    captured_at: float
+    sql: str
+    duration_ms: float = Field(..., description="觸發擷取的那次執行耗時（毫秒）")
+    execution_ms: Optional[float] = Field(None, description="EXPLAIN ANALYZE 回報的執行時間（毫秒）")
+    planning_ms: Optional[float] = None
+    plan: Optional[Dict[str, Any]] = Field(None, description="計畫樹（各節點實際筆數、耗時與緩衝區讀取）")
+
+
+class StatementStat(BaseModel):
+    """單一 SQL 指紋的累計統計"""
+    fingerprint: str = Field(..., description="常數以 ? 取代的 SQL")
+    example_sql: str
+    calls: int
+    errors: int
+    rows: int
+    total_ms: float
+    mean_ms: float
+    min_ms: Optional[float] = None
+    max_ms: float
+    mean_rows: Optional[float] = None
+    last_called: float
+    plan_count: int
+    plans: Optional[List[CapturedPlan]] = None
+
+
+class StatementStatsResponse(BaseModel):
+    """SQL 指紋統計（仿 pg_stat_statements）"""
+    enabled: bool
+    fingerprints: int
+    max_fingerprints: int
+    evictions: int
+    capture_threshold_ms: float
+    capture_sample_rate: float
+    captures: int
+    capture_errors: int
+    reset_at: float
+    statements: List[StatementStat]
+
+
+class TraceSpan(BaseModel):
+    """追蹤區段"""
+    span_id: str
+    parent_id: Optional[str] = Field(None, description="父 span（根 span 為 null）")
+    name: str = Field(..., description="階段名稱（如 sql_generation、ollama.generate、db.query）")
+    start_ms: float = Field(..., description="相對於 trace 開始的時間（毫秒）")
+    duration_ms: Optional[float] = None
+    status: str = Field(..., description="ok 或 error")
+    error: Optional[str] = None
+    attributes: Dict[str, Any] = Field(..., description="模型、SQL 指紋、筆數、token 數等")
+
+
+class TraceSummary(BaseModel):
+    """trace 摘要"""
+    trace_id: str
+    name: str
+    started_at: float = Field(..., description="開始時間（Unix 時間戳）")
+    duration_ms: Optional[float] = None
+    status: str
+    attributes: Dict[str, Any]
+    span_count: int
+
+
+class TraceListResponse(BaseModel):
+    """最近的 trace"""
+    enabled: bool
+    sample_rate: float
+    sampled: int = Field(..., description="啟動後取樣的請求數")
+    started: int = Field(..., description="啟動後的請求數")
+    traces: List[TraceSummary] = Field(..., description="新到舊")
+
+
+class TraceResponse(BaseModel):
+    """完整 trace"""
+    trace_id: str
+    name: str
+    started_at: float
+    duration_ms: Optional[float] = None
+    status: str
+    attributes: Dict[str, Any]
+    spans: List[TraceSpan] = Field(..., description="依開始時間排序")
 
 
 class TableInfo(BaseModel):
@@ -132,25 +563,75 @@ class TableInfo(BaseModel):
 @app.on_event("startup")
 async def startup_event():
     """服務器啟動時初始化"""
-    global db_client, ollama_client, query_engine
+    global db_client, ollama_client, query_engine, llm_policy, sql_rewriter, cost_guard, index_advisor, inventory_snapshot, aggregate_cube, materialized_views, search_index, autocomplete_index, response_cache, query_log, tracer, profiler, query_config, health_monitor, job_manager, batch_config
 
     try:
+        setup_logging(LoggingConfig.from_env())
         logger.info("🚀 Initializing API server...")
 
+        tracer = configure_tracing(TracingConfig.from_env())
+        profiler = Profiler(ProfilingConfig.from_env())
+
         # Initialize database client
         db_config = DatabaseConfig.from_env()
-        db_client = DatabaseClient(db_config)
+        db_client = DatabaseClient(db_config, StatementStatsConfig.from_env())
         logger.info("✅ Database client initialized")
 
         # Initialize Ollama client
         ollama_config = OllamaConfig.from_env()
         ollama_client = OllamaClient(ollama_config)
         logger.info(f"✅ Ollama client initialized (model: {ollama_config.model})")
-
-        # Initialize query engine
-        query_engine = QueryEngine(db_client, ollama_client)
+        if ollama_client.replay is not None:
+            logger.info(f"✅ Ollama replay mode: {ollama_config.replay_path} (speed: {ollama_config.replay_speed})")
+        elif ollama_client.recorder is not None:
+            logger.info(f"✅ Ollama record mode: {ollama_config.record_path}")
+
+        # Background health probes with circuit breakers (/health reads from memory)
+        health_monitor = HealthMonitor(
+            {'database': db_client.test_connection, 'ollama': ollama_client.test_connection},
+            HealthConfig.from_env()
+        )
+        health_monitor.start()
+
+        # Initialize query engine (policy, rewriter, cost guard, index advisor, snapshot, cube, views, LLM cache and query log are shared across engine rebuilds)
+        llm_policy = AdaptiveLLMPolicy(AdaptiveConfig.from_env())
+        sql_rewriter = SqlRewriter(db_client, RewriteConfig.from_env())
+        cost_guard = QueryCostGuard(db_client, CostGuardConfig.from_env())
+        index_advisor = IndexAdvisor(db_client, IndexAdvisorConfig.from_env())
+        inventory_snapshot = InventorySnapshot(db_client, SnapshotConfig.from_env())
+        # Snapshot changes keep the rewriter's enum values current (new categories/brands are not dropped by ILIKE rewrites)
+        inventory_snapshot.add_listener(sql_rewriter)
+        # The cube is fed by snapshot refreshes (loaded in the background at startup, with or
+        # without SNAPSHOT_ENABLED); until the first load /stats falls back to SQL
+        aggregate_cube = AggregateCube(db_client)
+        inventory_snapshot.add_listener(aggregate_cube)
+        # Same for the keyword index; /search falls back to ILIKE until the first snapshot load.
+        # The snapshot loads and refreshes for its listeners even when SNAPSHOT_ENABLED=false
+        # (local SQL execution stays off), so the index is always filled
+        search_index = SearchIndex(db_client, SearchConfig.from_env())
+        inventory_snapshot.add_listener(search_index)
+        # Catalog terms come from the snapshot when enabled, otherwise from one GROUP BY on first use
+        autocomplete_index = AutocompleteIndex(db_client, AutocompleteConfig.from_env())
+        inventory_snapshot.add_listener(autocomplete_index)
+        inventory_snapshot.start()
+        materialized_views = MaterializedViewManager(db_client, MaterializedViewConfig.from_env())
+        materialized_views.start()
+        response_cache = ResponseCache(ResponseCacheConfig.from_env())
+        query_log = QueryLog(QueryLogConfig.from_env())
+        query_engine = QueryEngine(
+            db_client, ollama_client, llm_policy, sql_rewriter, cost_guard, index_advisor, inventory_snapshot,
+            aggregate_cube, materialized_views, response_cache, query_log
+        )
+        query_config = QueryConfig.from_env()
         logger.info("✅ Query engine initialized")
 
+        # Initialize async job manager (engine is looked up per job, model switch recreates it)
+        job_config = JobConfig.from_env()
+        job_manager = JobManager(lambda: query_engine, job_config)
+        logger.info(f"✅ Job manager initialized (workers: {job_config.max_workers})")
+
+        batch_config = BatchConfig.from_env()
+
         logger.info("🎉 API server ready for remote connections!")
 
     except Exception as e:
@@ -161,11 +642,31 @@ async def startup_event():
 @app.on_event("shutdown")
 async def shutdown_event():
     """服務器關閉時清理"""
-    global db_client
+    # DatabaseClient opens a connection per query, so there is nothing to close;
+    # logging stops last and even when an earlier step fails, so its error is written
+    try:
+        if health_monitor:
+            health_monitor.stop()
+            logger.info("Health monitor stopped")
+
+        if job_manager:
+            job_manager.shutdown()
+            logger.info("Job manager stopped")
+
+        if inventory_snapshot:
+            inventory_snapshot.stop()
+
+        if materialized_views:
+            materialized_views.stop()
+
+        if response_cache:
+            response_cache.close()
 
-    if db_client:
-        db_client.close()
-        logger.info("Database connection closed")
+        # After the job manager so queries still running at shutdown are written
+        if query_log:
+            query_log.close()
+    finally:
+        shutdown_logging()
 
 
 @app.get("/", tags=["General"])
@@ -202,54 +703,183 @@ async def health_check():
     """
     健康檢查端點
 
-    檢查資料庫和 Ollama 連接狀態
+    讀取背景健康監控的斷路器狀態（不會建立新的資料庫連線或呼叫 Ollama）
     """
-    try:
-        # Check database
-        db_ok = db_client.test_connection() if db_client else False
+    if not health_monitor:
+        raise HTTPException(status_code=503, detail="Health monitor not initialized")
 
-        # Check Ollama
-        ollama_ok = ollama_client.test_connection() if ollama_client else False
+    breakers = health_monitor.status()
+    db_ok = breakers['database']['available']
+    ollama_ok = breakers['ollama']['available']
 
-        model_name = ollama_client.config.model if ollama_client else "unknown"
+    model_name = ollama_client.config.model if ollama_client else "unknown"
 
-        status = "healthy" if (db_ok and ollama_ok) else "unhealthy"
+    status = "healthy" if (db_ok and ollama_ok) else "unhealthy"
 
-        return HealthResponse(
-            status=status,
-            database=db_ok,
-            ollama=ollama_ok,
-            model=model_name,
-            version="2.1.0"
-        )
-    except Exception as e:
-        logger.error(f"Health check failed: {e}")
-        raise HTTPException(status_code=503, detail=f"Service unavailable: {str(e)}")
+    return HealthResponse(
+        status=status,
+        database=db_ok,
+        ollama=ollama_ok,
+        model=model_name,
+        version="2.1.0",
+        llm_degraded=llm_policy.status()['degraded'] if llm_policy else None,
+        breakers=breakers
+    )
+
+
+@app.get("/metrics", response_class=PlainTextResponse, tags=["General"])
+async def metrics():
+    """
+    Prometheus 指標（文字格式 0.0.4）
+
+    包含各查詢階段耗時直方圖（依模型與模式）、快取命中、SQL 驗證失敗、
+    Ollama 與資料庫錯誤計數，以及進行中的請求、資料庫連線與任務工作池使用量
+
+    Returns:
+        PlainTextResponse: 指標文字
+    """
+    if job_manager:
+        counts = {status.value: 0 for status in JobStatus}
+        for job in job_manager.list_jobs():
+            counts[job.status.value] += 1
+        for status, count in counts.items():
+            JOBS.set(count, status=status)
+        JOB_WORKERS.set(job_manager.config.max_workers)
+
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+def _unavailable_dependency() -> Optional[str]:
+    """
+    檢查依賴的斷路器狀態
+
+    Returns:
+        斷路器開啟時的錯誤訊息，全部可用時返回 None
+    """
+    if not health_monitor:
+        return None
+    if not health_monitor.is_available('ollama'):
+        return "Ollama service is not available. Please ensure Ollama is running on the server."
+    if not health_monitor.is_available('database'):
+        return "Database is not available. Please check the PostgreSQL service."
+    return None
+
+
+def _resolve_model(requested: Optional[str]) -> str:
+    """
+    解析實際使用的模型（請求指定的模型不可用時使用預設模型）
+
+    Args:
+        requested: 請求指定的模型
+
+    Returns:
+        實際使用的模型名稱
+    """
+    default_model = ollama_client.config.model if ollama_client else "unknown"
+
+    if requested and ollama_client:
+        if requested in ollama_client.get_available_models():
+            logger.info(f"📝 Using requested model: {requested}")
+            return requested
+        logger.warning(f"⚠️ Requested model '{requested}' not available, using default: {default_model}")
+
+    return default_model
+
+
+async def _run_until_disconnect(http_request: Request, deadline: Deadline, func, *args, **kwargs):
+    """
+    在執行緒池中執行函數，並在客戶端斷線時取消請求時限
+
+    Args:
+        http_request: HTTP 請求（用於偵測斷線）
+        deadline: 請求時限
+        func: 要執行的同步函數
+
+    Returns:
+        函數的返回值
+    """
+    task = asyncio.ensure_future(run_in_threadpool(func, *args, **kwargs))
+
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=0.5)
+        if done:
+            return task.result()
+        if not deadline.cancelled and await http_request.is_disconnected():
+            logger.warning("⚠️ Client disconnected, cancelling in-flight query")
+            deadline.cancel("client disconnected")
 
 
 @app.post("/query", response_model=QueryResponse, tags=["Query"])
-async def query(request: QueryRequest):
+async def query(request: QueryRequest, http_request: Request, response: Response):
     """
     執行自然語言查詢
 
     接收自然語言問題，生成 SQL，執行查詢，返回回答
 
+    請求時限（timeout 或伺服器預設值）會傳遞到每個階段，
+    超時或客戶端斷線時取消進行中的 Ollama 生成與資料庫查詢
+
     Args:
-        request: 包含問題的查詢請求，可選指定模型和輸出模式
+        request: 包含問題的查詢請求，可選指定模型、輸出模式和時限
+        http_request: HTTP 請求（用於偵測客戶端斷線）
 
     Returns:
         QueryResponse: 包含 SQL、答案等資訊
         - answer: LLM 生成的自然語言回答
         - answer_formatted: 程式化表格格式（快速一致）
         - results: 原始查詢結果（JSON）
+        各階段耗時同時以 Server-Timing 標頭（毫秒）回傳；
+        請求被取樣追蹤（或帶 X-Trace: 1 標頭）時以 X-Trace-Id 標頭回傳 trace ID
     """
-    start_time = time.time()
+    if request.profile:
+        _require_profiling(http_request)
+
+    force_trace = http_request.headers.get('x-trace') == '1'
+    with REQUESTS_IN_FLIGHT.track_inprogress(endpoint='/query'), \
+            start_trace('POST /query', force=force_trace, use_llm_answer=request.use_llm_answer) as root_span:
+        result = await _run_query(request, http_request)
+        root_span.set_attributes(model=result.model_used, success=result.success, result_count=result.result_count)
+
+    if root_span.trace_id:
+        response.headers['X-Trace-Id'] = root_span.trace_id
+
+    timing = result.timing.model_dump(exclude_none=True) if result.timing else {'total': result.elapsed_time}
+    response.headers['Server-Timing'] = server_timing(timing)
+    QUERIES_TOTAL.inc(endpoint='/query', status='success' if result.success else 'failed')
+    if result.elapsed_time is not None:
+        QUERY_STAGE_SECONDS.observe(
+            result.elapsed_time,
+            stage='total',
+            model=result.model_used or '',
+            mode='llm' if request.use_llm_answer else 'fast'
+        )
+    return result
+
+
+async def _run_query(request: QueryRequest, http_request: Request) -> QueryResponse:
+    """
+    執行 /query 的查詢流程（失敗時以 success=False 的回應表示）
+
+    Args:
+        request: 查詢請求
+        http_request: HTTP 請求（用於偵測客戶端斷線）
+
+    Returns:
+        QueryResponse: 查詢回應
+
+    Raises:
+        HTTPException: 查詢引擎未初始化
+    """
+    start_time = time.perf_counter()
 
     if not query_engine:
         raise HTTPException(status_code=503, detail="Query engine not initialized")
 
-    # Check Ollama connection first
-    if ollama_client and not ollama_client.test_connection():
+    deadline = Deadline(query_config.resolve_timeout(request.timeout) if query_config else request.timeout)
+
+    # Fail fast while a dependency's circuit breaker is open
+    unavailable = _unavailable_dependency()
+    if unavailable:
         return QueryResponse(
             question=request.question,
             sql="",
@@ -260,38 +890,49 @@ async def query(request: QueryRequest):
             result_count=None,
             model_used=ollama_client.config.model if ollama_client else None,
             use_llm_answer=request.use_llm_answer,
-            elapsed_time=round(time.time() - start_time, 2),
+            elapsed_time=round(time.perf_counter() - start_time, 3),
             success=False,
-            error="Ollama service is not available. Please ensure Ollama is running on the server."
+            error=unavailable
         )
 
     try:
         # Determine which model to use (from request or default)
         # NOTE: We pass the model as a parameter, NOT modifying global state
         # This ensures thread-safety for concurrent requests
-        default_model = ollama_client.config.model if ollama_client else "unknown"
-        actual_model_used = default_model
+        actual_model_used = await run_in_threadpool(_resolve_model, request.model)
 
-        if request.model and ollama_client:
-            available_models = ollama_client.get_available_models()
-            if request.model in available_models:
-                actual_model_used = request.model
-                logger.info(f"📝 Using requested model: {request.model}")
-            else:
-                logger.warning(f"⚠️ Requested model '{request.model}' not available, using default: {default_model}")
+        logger.info(f"📝 Received query: {request.question} (use_llm_answer={request.use_llm_answer}, model={actual_model_used}, timeout={deadline.timeout})")
 
-        logger.info(f"📝 Received query: {request.question} (use_llm_answer={request.use_llm_answer}, model={actual_model_used})")
+        # Collect stage events (LLM answer may be skipped under load)
+        events: Dict[str, Any] = {}
+
+        # Profiled requests run the same pipeline wrapped by the profiler (in the worker thread)
+        run = query_engine.query_with_mode
+        if request.profile:
+            run = functools.partial(profiler.profile_call, request.profile, query_engine.query_with_mode)
 
         # Execute query with mode - pass model as parameter (thread-safe)
-        sql, llm_answer, formatted_answer, html_table, raw_results, step_timing = query_engine.query_with_mode(
+        outcome = await _run_until_disconnect(
+            http_request,
+            deadline,
+            run,
             request.question,
             use_llm_answer=request.use_llm_answer,
-            model=actual_model_used
+            model=actual_model_used,
+            on_progress=lambda stage, payload: events.update(payload),
+            deadline=deadline
         )
+        profile_report = None
+        if request.profile:
+            outcome, profile_report = outcome
+        sql, llm_answer, formatted_answer, html_table, raw_results, step_timing = outcome
+        degraded_reason = events.get('llm_skip_reason')
 
         # Handle None values (Ollama might have failed silently)
         if sql is None:
-            elapsed = round(time.time() - start_time, 2)
+            if health_monitor:
+                health_monitor.record_failure('ollama', "SQL generation returned no result")
+            elapsed = round(time.perf_counter() - start_time, 3)
             return QueryResponse(
                 question=request.question,
                 sql="",
@@ -311,8 +952,18 @@ async def query(request: QueryRequest):
                 error="Query failed - Ollama may not be responding. Check if Ollama service is running."
             )
 
-        elapsed = round(time.time() - start_time, 2)
-        logger.info(f"✅ Query successful, {len(raw_results) if raw_results else 0} results, {elapsed}s")
+        # Only a real Ollama call is evidence of health (cached SQL never reached it)
+        if health_monitor and not events.get('sql_cached'):
+            health_monitor.record_success('ollama')
+
+        if autocomplete_index and raw_results is not None:
+            autocomplete_index.record_question(request.question)
+
+        elapsed = round(time.perf_counter() - start_time, 3)
+        logger.info(
+            f"✅ Query successful, {len(raw_results) if raw_results else 0} results, {elapsed}s",
+            extra={'model': actual_model_used, 'timing': step_timing, 'elapsed': elapsed}
+        )
 
         return QueryResponse(
             question=request.question,
@@ -322,20 +973,54 @@ async def query(request: QueryRequest):
             answer_html=html_table,
             results=raw_results,
             result_count=len(raw_results) if raw_results else 0,
+            estimated_rows=events.get('estimated_rows'),
             model_used=actual_model_used,
-            use_llm_answer=request.use_llm_answer,
+            use_llm_answer=request.use_llm_answer and not degraded_reason,
+            llm_answer_skipped=bool(degraded_reason),
+            degraded_reason=degraded_reason,
+            llm_skip_cause=events.get('llm_skip_cause'),
             elapsed_time=elapsed,
             timing=TimingInfo(
                 sql_generation=step_timing.get('sql_generation'),
+                sql_rewrite=step_timing.get('sql_rewrite'),
+                cost_check=step_timing.get('cost_check'),
                 query_execution=step_timing.get('query_execution'),
                 formatting=step_timing.get('formatting'),
                 llm_response=step_timing.get('llm_response'),
                 total=elapsed
             ),
+            profile=profile_report,
             success=True,
             error=None
         )
 
+    except QueryCostExceeded as e:
+        logger.warning(f"💸 Query rejected by cost guard: {e}")
+        return QueryResponse(
+            question=request.question,
+            sql=e.sql,
+            answer="",
+            estimated_rows=e.estimate.plan_rows,
+            model_used=request.model or (ollama_client.config.model if ollama_client else None),
+            use_llm_answer=request.use_llm_answer,
+            elapsed_time=round(time.perf_counter() - start_time, 3),
+            success=False,
+            error=str(e)
+        )
+
+    except QueryAborted as e:
+        logger.warning(f"⏱️ Query aborted: {e}")
+        return QueryResponse(
+            question=request.question,
+            sql="",
+            answer="",
+            model_used=request.model or (ollama_client.config.model if ollama_client else None),
+            use_llm_answer=request.use_llm_answer,
+            elapsed_time=round(time.perf_counter() - start_time, 3),
+            success=False,
+            error=str(e)
+        )
+
     except Exception as e:
         logger.error(f"❌ Query failed: {e}")
         return QueryResponse(
@@ -348,12 +1033,200 @@ async def query(request: QueryRequest):
             result_count=None,
             model_used=request.model or (ollama_client.config.model if ollama_client else None),
             use_llm_answer=request.use_llm_answer,
-            elapsed_time=round(time.time() - start_time, 2),
+            elapsed_time=round(time.perf_counter() - start_time, 3),
             success=False,
             error=str(e)
         )
 
 
+@app.post("/query/batch", response_model=BatchQueryResponse, tags=["Query"])
+async def query_batch(request: BatchQueryRequest, http_request: Request):
+    """
+    執行批次查詢
+
+    以有界並行度執行多個問題；重複問題只執行一次，
+    生成相同 SQL 的問題共用同一次資料庫查詢。
+    批次時限與客戶端斷線會中止未完成的項目
+
+    Args:
+        request: 批次查詢請求
+        http_request: HTTP 請求（用於偵測客戶端斷線）
+
+    Returns:
+        BatchQueryResponse: 各問題結果與彙總計時
+    """
+    if not query_engine or not batch_config:
+        raise HTTPException(status_code=503, detail="Query engine not initialized")
+
+    unavailable = _unavailable_dependency()
+    if unavailable:
+        raise HTTPException(status_code=503, detail=unavailable)
+
+    if len(request.questions) > batch_config.max_questions:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many questions: {len(request.questions)} (max {batch_config.max_questions})"
+        )
+
+    deadline = Deadline(query_config.resolve_timeout(request.timeout) if query_config else request.timeout)
+    model = await run_in_threadpool(_resolve_model, request.model)
+    runner = BatchQueryRunner(query_engine, batch_config, health_monitor)
+
+    with REQUESTS_IN_FLIGHT.track_inprogress(endpoint='/query/batch'), \
+            start_trace('POST /query/batch', model=model, question_count=len(request.questions)):
+        batch = await _run_until_disconnect(
+            http_request,
+            deadline,
+            runner.run,
+            request.questions,
+            request.use_llm_answer,
+            model,
+            request.max_concurrency,
+            deadline
+        )
+
+    items = []
+    for item in batch['items']:
+        step_timing = item['timing']
+        if item['duplicate_of'] is None:
+            QUERIES_TOTAL.inc(endpoint='/query/batch', status='success' if item['success'] else 'failed')
+        if autocomplete_index and item['success']:
+            autocomplete_index.record_question(item['question'])
+        items.append(BatchItemResponse(
+            index=item['index'],
+            duplicate_of=item['duplicate_of'],
+            sql_shared=item['sql_shared'],
+            question=item['question'],
+            sql=item['sql'] or "",
+            answer=item['answer'],
+            answer_formatted=item['answer_formatted'],
+            answer_html=item['answer_html'],
+            results=item['results'],
+            result_count=item['result_count'],
+            model_used=model,
+            use_llm_answer=request.use_llm_answer and not item['llm_skip_reason'],
+            llm_answer_skipped=bool(item['llm_skip_reason']),
+            degraded_reason=item['llm_skip_reason'],
+            llm_skip_cause=item['llm_skip_cause'],
+            elapsed_time=step_timing.get('total'),
+            timing=TimingInfo(**step_timing),
+            success=item['success'],
+            error=item['error']
+        ))
+
+    logger.info(
+        f"✅ Batch finished: {batch['summary']['total_items']} questions, "
+        f"{batch['summary']['wall_time']}s"
+    )
+
+    return BatchQueryResponse(items=items, summary=BatchSummary(**batch['summary']))
+
+
+@app.post("/query/jobs", response_model=JobSubmitResponse, status_code=202, tags=["Query"])
+async def submit_query_job(request: QueryRequest):
+    """
+    提交非同步查詢任務
+
+    立即返回任務 ID，查詢在背景工作池中執行，
+    以 GET /query/jobs/{job_id} 取得進度與結果
+
+    Args:
+        request: 查詢請求
+
+    Returns:
+        JobSubmitResponse: 任務 ID 與狀態查詢 URL
+    """
+    if not job_manager:
+        raise HTTPException(status_code=503, detail="Job manager not initialized")
+
+    unavailable = _unavailable_dependency()
+    if unavailable:
+        raise HTTPException(status_code=503, detail=unavailable)
+
+    model = await run_in_threadpool(_resolve_model, request.model)
+
+    try:
+        job = job_manager.submit(
+            request.question,
+            use_llm_answer=request.use_llm_answer,
+            model=model,
+            timeout=query_config.resolve_timeout(request.timeout)
+        )
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+
+    return JobSubmitResponse(
+        job_id=job.job_id,
+        status=job.status.value,
+        status_url=f"/query/jobs/{job.job_id}"
+    )
+
+
+@app.get("/query/jobs/{job_id}", response_model=JobStatusResponse, tags=["Query"])
+async def get_query_job(job_id: str):
+    """
+    取得非同步查詢任務狀態
+
+    Args:
+        job_id: 任務 ID
+
+    Returns:
+        JobStatusResponse: 任務狀態、部分結果與最終結果
+    """
+    if not job_manager:
+        raise HTTPException(status_code=503, detail="Job manager not initialized")
+
+    data = job_manager.job_dict(job_id)
+    if data is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found or expired")
+
+    end_time = data['finished_at'] or time.time()
+    elapsed = round(end_time - (data['started_at'] or data['created_at']), 2)
+
+    result = None
+    if data['result']:
+        step_timing = data['result']['timing']
+        result = QueryResponse(
+            question=data['question'],
+            sql=data['result']['sql'],
+            answer=data['result']['answer'],
+            answer_formatted=data['result']['answer_formatted'],
+            answer_html=data['result']['answer_html'],
+            results=data['result']['results'],
+            result_count=data['result']['result_count'],
+            estimated_rows=data['result'].get('estimated_rows'),
+            model_used=data['model'],
+            use_llm_answer=data['use_llm_answer'] and not data['result']['llm_skip_reason'],
+            llm_answer_skipped=bool(data['result']['llm_skip_reason']),
+            degraded_reason=data['result']['llm_skip_reason'],
+            llm_skip_cause=data['result']['llm_skip_cause'],
+            elapsed_time=elapsed,
+            timing=TimingInfo(
+                sql_generation=step_timing.get('sql_generation'),
+                sql_rewrite=step_timing.get('sql_rewrite'),
+                cost_check=step_timing.get('cost_check'),
+                query_execution=step_timing.get('query_execution'),
+                formatting=step_timing.get('formatting'),
+                llm_response=step_timing.get('llm_response'),
+                total=elapsed
+            ),
+            success=True,
+            error=None
+        )
+
+    return JobStatusResponse(
+        job_id=data['job_id'],
+        status=data['status'],
+        question=data['question'],
+        model_used=data['model'],
+        use_llm_answer=data['use_llm_answer'],
+        partial=data['partial'],
+        result=result,
+        error=data['error'],
+        elapsed_time=elapsed
+    )
+
+
 @app.get("/tables", response_model=List[TableInfo], tags=["Database"])
 async def get_tables():
     """
@@ -407,6 +1280,486 @@ async def get_tables():
         raise HTTPException(status_code=500, detail=f"Failed to get tables: {str(e)}")
 
 
+@app.get("/admin/index-advice", response_model=IndexAdviceResponse, tags=["Database"])
+async def get_index_advice():
+    """
+    依已執行 SQL 的 ILIKE/範圍條件建議索引
+
+    Returns:
+        IndexAdviceResponse: 索引建議與遷移指令（不會自動套用）
+    """
+    if not index_advisor:
+        raise HTTPException(status_code=503, detail="Index advisor not initialized")
+
+    try:
+        recommendations = await run_in_threadpool(index_advisor.recommend)
+        warnings = await run_in_threadpool(index_advisor.warnings, recommendations)
+
+        return IndexAdviceResponse(
+            observed_statements=index_advisor.observed_statements,
+            recommendations=[IndexRecommendationInfo(**item.to_dict()) for item in recommendations],
+            migration=index_advisor.migration(recommendations),
+            warnings=warnings
+        )
+
+    except Exception as e:
+        logger.error(f"Failed to get index advice: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to get index advice: {str(e)}")
+
+
+@app.get("/admin/snapshot", response_model=SnapshotStatsResponse, tags=["Database"])
+async def get_snapshot_stats():
+    """
+    取得 inventory 快照狀態與本地執行命中率
+
+    Returns:
+        SnapshotStatsResponse: 筆數、命中率與刷新狀態
+    """
+    if not inventory_snapshot:
+        raise HTTPException(status_code=503, detail="Inventory snapshot not initialized")
+
+    return SnapshotStatsResponse(**inventory_snapshot.stats())
+
+
+@app.get("/admin/materialized-views", response_model=MaterializedViewStatsResponse, tags=["Database"])
+async def get_materialized_view_stats():
+    """
+    取得物化視圖的新舊程度與刷新統計
+
+    Returns:
+        MaterializedViewStatsResponse: 各視圖的待刷新變更數、落後秒數與刷新耗時
+    """
+    if not materialized_views:
+        raise HTTPException(status_code=503, detail="Materialized views not initialized")
+
+    return MaterializedViewStatsResponse(**materialized_views.stats())
+
+
+@app.post("/admin/materialized-views/refresh", response_model=MaterializedViewStatsResponse, tags=["Database"])
+async def refresh_materialized_views():
+    """
+    立即刷新有待處理變更的物化視圖（忽略最小刷新間隔）
+
+    Returns:
+        MaterializedViewStatsResponse: 刷新後的統計
+    """
+    if not materialized_views:
+        raise HTTPException(status_code=503, detail="Materialized views not initialized")
+
+    try:
+        await run_in_threadpool(materialized_views.refresh_pending, True)
+    except Exception as e:
+        logger.error(f"Failed to refresh materialized views: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to refresh materialized views: {str(e)}")
+
+    return MaterializedViewStatsResponse(**materialized_views.stats())
+
+
+@app.get("/admin/search-index", response_model=SearchIndexStatsResponse, tags=["Database"])
+async def get_search_index_stats():
+    """
+    取得產品搜尋索引狀態
+
+    Returns:
+        SearchIndexStatsResponse: 文件數、詞數、差異區段大小與重建資訊
+    """
+    if not search_index:
+        raise HTTPException(status_code=503, detail="Search index not initialized")
+
+    return SearchIndexStatsResponse(**search_index.stats())
+
+
+@app.get("/admin/autocomplete", response_model=AutocompleteStatsResponse, tags=["Database"])
+async def get_autocomplete_stats():
+    """
+    取得自動完成索引狀態
+
+    Returns:
+        AutocompleteStatsResponse: 問題數、目錄詞數與查詢次數
+    """
+    if not autocomplete_index:
+        raise HTTPException(status_code=503, detail="Autocomplete index not initialized")
+
+    return AutocompleteStatsResponse(**autocomplete_index.stats())
+
+
+@app.get("/admin/response-cache", response_model=ResponseCacheStatsResponse, tags=["Database"])
+async def get_response_cache_stats():
+    """
+    取得 LLM 快取（生成的 SQL 與回答）命中統計
+
+    Returns:
+        ResponseCacheStatsResponse: 各命名空間的項目數與命中率
+    """
+    if not response_cache:
+        raise HTTPException(status_code=503, detail="Response cache not initialized")
+
+    return ResponseCacheStatsResponse(**response_cache.stats())
+
+
+@app.delete("/admin/response-cache", response_model=ResponseCacheStatsResponse, tags=["Database"])
+async def clear_response_cache():
+    """
+    清除 LLM 快取（如修正資料但未改變查詢結果、或想重新產生回答時）
+
+    Returns:
+        ResponseCacheStatsResponse: 清除後的統計
+    """
+    if not response_cache:
+        raise HTTPException(status_code=503, detail="Response cache not initialized")
+
+    await run_in_threadpool(response_cache.clear)
+    return ResponseCacheStatsResponse(**response_cache.stats())
+
+
+@app.get("/admin/query-log", response_model=QueryLogStatsResponse, tags=["Database"])
+async def get_query_log_stats():
+    """
+    取得查詢日誌寫入統計
+
+    Returns:
+        QueryLogStatsResponse: 已寫入、丟棄與待寫入的紀錄數
+    """
+    if not query_log:
+        raise HTTPException(status_code=503, detail="Query log not initialized")
+
+    return QueryLogStatsResponse(**await run_in_threadpool(query_log.stats))
+
+
+@app.get("/admin/query-log/slowest", response_model=SlowQuestionsResponse, tags=["Database"])
+async def get_slowest_questions(
+    limit: int = Query(20, ge=1, le=200, description="筆數上限"),
+    hours: float = Query(24.0, gt=0, description="統計最近幾小時")
+):
+    """
+    平均總耗時最長的問題（依正規化問題合併）
+
+    Args:
+        limit: 筆數上限
+        hours: 統計區間（小時）
+
+    Returns:
+        SlowQuestionsResponse: 由慢到快的問題
+    """
+    if not query_log:
+        raise HTTPException(status_code=503, detail="Query log not initialized")
+
+    questions = await run_in_threadpool(query_log.slowest_questions, limit, hours)
+    return SlowQuestionsResponse(hours=hours, questions=[SlowQuestion(**question) for question in questions])
+
+
+@app.get("/admin/query-log/fingerprints", response_model=FingerprintStatsResponse, tags=["Database"])
+async def get_top_fingerprints(
+    limit: int = Query(20, ge=1, le=200, description="筆數上限"),
+    hours: float = Query(24.0, gt=0, description="統計最近幾小時")
+):
+    """
+    最常執行的 SQL 指紋（找出值得快取或加入規則路徑的查詢）
+
+    Args:
+        limit: 筆數上限
+        hours: 統計區間（小時）
+
+    Returns:
+        FingerprintStatsResponse: 由多到少的指紋
+    """
+    if not query_log:
+        raise HTTPException(status_code=503, detail="Query log not initialized")
+
+    fingerprints = await run_in_threadpool(query_log.top_fingerprints, limit, hours)
+    return FingerprintStatsResponse(hours=hours, fingerprints=[FingerprintStats(**item) for item in fingerprints])
+
+
+@app.get("/admin/query-log/percentiles", response_model=StagePercentilesResponse, tags=["Database"])
+async def get_stage_percentiles(
+    hours: float = Query(24.0, gt=0, description="統計最近幾小時")
+):
+    """
+    各模型、各階段耗時的 p50/p95/p99
+
+    Args:
+        hours: 統計區間（小時）
+
+    Returns:
+        StagePercentilesResponse: 依模型與階段排序的百分位數
+    """
+    if not query_log:
+        raise HTTPException(status_code=503, detail="Query log not initialized")
+
+    stages = await run_in_threadpool(query_log.stage_percentiles, hours)
+    return StagePercentilesResponse(hours=hours, stages=[StagePercentiles(**stage) for stage in stages])
+
+
+@app.get("/admin/statement-stats", response_model=StatementStatsResponse, tags=["Database"])
+async def get_statement_stats(
+    order: Literal['total', 'mean', 'max', 'calls'] = Query('total', description="排序欄位：總耗時、平均耗時、最長耗時或呼叫次數"),
+    limit: int = Query(20, ge=1, le=500, description="筆數上限"),
+    include_plans: bool = Query(True, description="包含取樣擷取的 EXPLAIN ANALYZE 計畫")
+):
+    """
+    依 SQL 指紋的執行統計與取樣擷取的慢查詢執行計畫
+
+    Args:
+        order: 排序欄位
+        limit: 筆數上限
+        include_plans: 是否包含執行計畫
+
+    Returns:
+        StatementStatsResponse: 統計摘要與指紋列表
+    """
+    if not db_client or not db_client.statement_stats:
+        raise HTTPException(status_code=503, detail="Statement statistics not initialized")
+
+    stats = db_client.statement_stats
+    statements = stats.top(order, limit, include_plans)
+    return StatementStatsResponse(**stats.stats(), statements=[StatementStat(**item) for item in statements])
+
+
+@app.delete("/admin/statement-stats", response_model=StatementStatsResponse, tags=["Database"])
+async def reset_statement_stats():
+    """
+    清除 SQL 指紋統計（如建立索引後重新觀察）
+
+    Returns:
+        StatementStatsResponse: 清除後的統計摘要
+    """
+    if not db_client or not db_client.statement_stats:
+        raise HTTPException(status_code=503, detail="Statement statistics not initialized")
+
+    db_client.statement_stats.reset()
+    return StatementStatsResponse(**db_client.statement_stats.stats(), statements=[])
+
+
+def _require_profiling(http_request: Request) -> None:
+    """
+    檢查是否允許使用除錯端點（剖析與 trace 檢視；需 PROFILING_ENABLED，設定 PROFILING_TOKEN 時需帶 X-Debug-Token 標頭）
+
+    Raises:
+        HTTPException: 剖析未啟用（404）或 token 不符（403）
+    """
+    if not profiler or not profiler.config.enabled:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    token = profiler.config.token
+    if token and not hmac.compare_digest(http_request.headers.get('x-debug-token', ''), token):
+        raise HTTPException(status_code=403, detail="Invalid debug token")
+
+
+@app.get("/debug/profile", response_class=PlainTextResponse, tags=["Debug"])
+async def debug_profile(
+    http_request: Request,
+    seconds: float = Query(10.0, gt=0, description="剖析時間（秒，不超過 PROFILING_MAX_DURATION）"),
+    mode: Literal['cpu', 'memory'] = Query('cpu', description="cpu：取樣所有執行緒堆疊；memory：tracemalloc 快照差異"),
+    output: Literal['collapsed', 'top'] = Query('collapsed', description="cpu 輸出：collapsed stacks（火焰圖）或依函數彙總"),
+    include_idle: bool = Query(False, description="cpu：包含等待中的執行緒"),
+    limit: int = Query(50, ge=1, le=500, description="top 與 memory 輸出的項目數"),
+    app_only: bool = Query(True, description="memory：只顯示應用程式、json 與 pydantic 的配置位置")
+):
+    """
+    在運行中的服務剖析 CPU 或記憶體熱點（期間的請求照常處理）
+
+    Args:
+        seconds: 剖析時間
+        mode: cpu 或 memory
+        output: cpu 輸出格式
+        include_idle: 是否包含閒置執行緒
+        limit: 輸出項目數
+        app_only: memory 是否只顯示應用程式相關位置
+
+    Returns:
+        PlainTextResponse: collapsed stacks、函數彙總或 tracemalloc 差異
+    """
+    _require_profiling(http_request)
+
+    try:
+        if mode == 'cpu':
+            report = await run_in_threadpool(profiler.sample_cpu, seconds, output, include_idle, limit)
+        else:
+            report = await run_in_threadpool(profiler.memory_diff, seconds, limit, app_only)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    return PlainTextResponse(report)
+
+
+@app.get("/debug/traces", response_model=TraceListResponse, tags=["Debug"])
+async def list_traces(
+    http_request: Request,
+    limit: int = Query(20, ge=1, le=200, description="筆數上限"),
+    min_duration_ms: float = Query(0.0, ge=0, description="只列出總耗時不低於此值的 trace（毫秒）")
+):
+    """
+    列出最近取樣的請求 trace（記憶體環形緩衝區，新到舊；與 /debug/profile 相同的存取限制）
+
+    Args:
+        http_request: HTTP 請求（檢查 X-Debug-Token）
+        limit: 筆數上限
+        min_duration_ms: 最短總耗時（毫秒），用於找出慢查詢
+
+    Returns:
+        TraceListResponse: 取樣統計與 trace 摘要
+    """
+    _require_profiling(http_request)
+    if not tracer:
+        raise HTTPException(status_code=503, detail="Tracer not initialized")
+
+    stats = tracer.stats()
+    return TraceListResponse(
+        enabled=stats['enabled'],
+        sample_rate=stats['sample_rate'],
+        sampled=stats['sampled'],
+        started=stats['started'],
+        traces=[TraceSummary(**trace) for trace in tracer.recent(limit, min_duration_ms)]
+    )
+
+
+@app.get("/debug/traces/{trace_id}", response_model=TraceResponse, tags=["Debug"])
+async def get_trace(trace_id: str, http_request: Request):
+    """
+    取得一個請求的完整 trace（各階段 span 與屬性；與 /debug/profile 相同的存取限制）
+
+    Args:
+        trace_id: trace ID（/query 回應的 X-Trace-Id 標頭）
+        http_request: HTTP 請求（檢查 X-Debug-Token）
+
+    Returns:
+        TraceResponse: 依開始時間排序的 span
+    """
+    _require_profiling(http_request)
+    if not tracer:
+        raise HTTPException(status_code=503, detail="Tracer not initialized")
+
+    trace = tracer.get(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail=f"Trace '{trace_id}' not found or evicted")
+
+    return TraceResponse(**trace)
+
+
+async def _cube_stats(dimensions: List[str], filters: Dict[str, List[str]]) -> StatsResponse:
+    """以聚合 cube 計算彙總並組成回應"""
+    if not aggregate_cube:
+        raise HTTPException(status_code=503, detail="Aggregate cube not initialized")
+
+    start_time = time.perf_counter()
+    try:
+        rows, source = await run_in_threadpool(aggregate_cube.stats, tuple(dimensions), filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Failed to get stats: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to get stats: {str(e)}")
+
+    return StatsResponse(
+        source=source,
+        dimensions=dimensions,
+        rows=[StatsRow(**row) for row in rows],
+        elapsed_ms=round((time.perf_counter() - start_time) * 1000, 3)
+    )
+
+
+@app.get("/stats/summary", response_model=StatsResponse, tags=["Stats"])
+async def get_stats_summary():
+    """
+    取得整體庫存彙總（品項數、庫存總量、庫存總價值與單價統計）
+
+    Returns:
+        StatsResponse: 單一彙總列
+    """
+    return await _cube_stats([], {})
+
+
+@app.get("/stats/rollup", response_model=StatsResponse, tags=["Stats"])
+async def get_stats_rollup(
+    by: str = Query("category", description=f"分組維度，以逗號分隔（可用：{', '.join(CUBE_DIMENSIONS)}）"),
+    category: Optional[List[str]] = Query(None, description="只統計指定分類"),
+    brand: Optional[List[str]] = Query(None, description="只統計指定品牌"),
+    supplier: Optional[List[str]] = Query(None, description="只統計指定供應商")
+):
+    """
+    依分類、品牌或供應商彙總庫存
+
+    Args:
+        by: 分組維度（如 category,brand）
+        category: 分類過濾（可重複）
+        brand: 品牌過濾（可重複）
+        supplier: 供應商過濾（可重複）
+
+    Returns:
+        StatsResponse: 依庫存總價值排序的彙總列
+    """
+    dimensions = [dimension.strip() for dimension in by.split(',') if dimension.strip()]
+    filters = {
+        name: values
+        for name, values in (('category', category), ('brand', brand), ('supplier', supplier))
+        if values
+    }
+    return await _cube_stats(dimensions, filters)
+
+
+@app.get("/search", response_model=SearchResponse, tags=["Query"])
+async def search_products(
+    q: str = Query(..., min_length=1, max_length=200, description="關鍵字（品名、品牌、型號、規格或供應商）"),
+    limit: int = Query(20, ge=1, description="回傳筆數上限")
+):
+    """
+    以關鍵字搜尋產品（不經 LLM，依 BM25 分數排序）
+
+    Args:
+        q: 關鍵字，多個關鍵字以空白分隔
+        limit: 回傳筆數上限（不超過 SEARCH_MAX_RESULTS）
+
+    Returns:
+        SearchResponse: 依相關度排序的產品
+    """
+    if not search_index:
+        raise HTTPException(status_code=503, detail="Search index not initialized")
+
+    start_time = time.perf_counter()
+    try:
+        result = await run_in_threadpool(search_index.search, q, min(limit, search_index.config.max_results))
+    except Exception as e:
+        logger.error(f"Failed to search products: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to search products: {str(e)}")
+
+    return SearchResponse(
+        query=q,
+        source=result.source,
+        total=result.total,
+        total_estimated=result.total_estimated,
+        matched_all_terms=result.matched_all_terms,
+        results=[SearchResultItem(**item) for item in result.results],
+        elapsed_ms=round((time.perf_counter() - start_time) * 1000, 3)
+    )
+
+
+@app.get("/autocomplete", response_model=AutocompleteResponse, tags=["Query"])
+async def autocomplete(
+    q: str = Query("", max_length=200, description="已輸入的文字（空白時回傳最常用的問題）"),
+    limit: int = Query(10, ge=1, description="建議筆數上限")
+):
+    """
+    依已輸入的前綴建議過去成功的問題與分類、品牌、型號
+
+    Args:
+        q: 已輸入的文字
+        limit: 建議筆數上限（不超過 AUTOCOMPLETE_MAX_SUGGESTIONS）
+
+    Returns:
+        AutocompleteResponse: 歷史問題在前（依次數），其次為目錄詞（依品項數）
+    """
+    if not autocomplete_index:
+        raise HTTPException(status_code=503, detail="Autocomplete index not initialized")
+
+    start_time = time.perf_counter()
+    suggestions = await run_in_threadpool(autocomplete_index.suggest, q, limit)
+
+    return AutocompleteResponse(
+        prefix=q,
+        suggestions=[AutocompleteSuggestion(**suggestion) for suggestion in suggestions],
+        elapsed_ms=round((time.perf_counter() - start_time) * 1000, 3)
+    )
+
+
 @app.get("/demo-queries", tags=["Query"])
 async def get_demo_queries():
     """
@@ -484,7 +1837,10 @@ async def select_model(request: ModelSelectRequest):
         ollama_client.config.model = request.model
 
         # Recreate query engine with new model
-        query_engine = QueryEngine(db_client, ollama_client)
+        query_engine = QueryEngine(
+            db_client, ollama_client, llm_policy, sql_rewriter, cost_guard, index_advisor, inventory_snapshot,
+            aggregate_cube, materialized_views, response_cache, query_log
+        )
 
         logger.info(f"🔄 Model switched from {old_model} to {request.model}")
 
@@ -0,0 +1,114 @@
+"""
+Unit tests for AdaptiveLLMPolicy
+測試 LLM 回答的自適應降級、恢復與並行放行
+"""
+
+import pytest
+import sys
+import threading
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from ambulance_inventory.adaptive_policy import AdaptiveLLMPolicy
+from ambulance_inventory.config import AdaptiveConfig
+
+
+class TestAdaptiveLLMPolicy:
+    """測試 AdaptiveLLMPolicy"""
+
+    def test_admit_under_slo(self):
+        """測試負載正常時執行 LLM 回答"""
+        policy = AdaptiveLLMPolicy(AdaptiveConfig(latency_slo=10))
+        admitted, reason = policy.admit()
+        assert admitted is True
+        assert reason == ""
+
+    def test_degrade_on_latency(self):
+        """測試延遲超過 SLO 時降級"""
+        policy = AdaptiveLLMPolicy(AdaptiveConfig(latency_slo=10, ewma_alpha=1.0, probe_interval=60))
+        with policy._lock:
+            policy._record_latency(20)
+
+        admitted, reason = policy.admit()
+        assert admitted is False
+        assert "延遲" in reason
+        assert policy.status()['degraded'] is True
+
+    def test_degrade_on_queue_depth(self):
+        """測試排隊深度達到 SLO 時降級"""
+        policy = AdaptiveLLMPolicy(AdaptiveConfig(queue_slo=2, probe_interval=60))
+
+        assert policy.admit()[0] and policy.admit()[0]
+        admitted, reason = policy.admit()
+
+        assert admitted is False
+        assert "排隊" in reason
+        assert policy.status()['in_flight'] == 2
+
+    def test_concurrent_admit_respects_queue_slo(self):
+        """測試並行放行時進行中數不超過排隊深度 SLO"""
+        policy = AdaptiveLLMPolicy(AdaptiveConfig(queue_slo=3, probe_interval=60))
+        barrier = threading.Barrier(8)
+        admitted = []
+
+        def request():
+            barrier.wait()
+            admitted.append(policy.admit()[0])
+
+        threads = [threading.Thread(target=request) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert sum(admitted) == 3
+        assert policy.status()['in_flight'] == 3
+
+    def test_failed_call_not_recorded(self):
+        """測試失敗或中止的 LLM 呼叫不計入延遲"""
+        policy = AdaptiveLLMPolicy(AdaptiveConfig(latency_slo=100, ewma_alpha=1.0))
+        policy.admit()
+        policy.release(20)
+        assert policy.status()['latency_ewma'] == 20
+
+        policy.admit()
+        policy.release(None)
+
+        assert policy.status()['latency_ewma'] == 20
+        assert policy.status()['in_flight'] == 0
+
+    def test_recover_when_load_falls(self):
+        """測試負載下降後自動恢復"""
+        policy = AdaptiveLLMPolicy(AdaptiveConfig(latency_slo=10, ewma_alpha=1.0, probe_interval=60))
+        with policy._lock:
+            policy._record_latency(20)
+        assert policy.admit()[0] is False
+
+        with policy._lock:
+            policy._record_latency(1)
+
+        assert policy.admit()[0] is True
+        assert policy.status()['degraded'] is False
+
+    def test_probe_allowed_while_degraded(self):
+        """測試降級期間定期放行探測請求"""
+        policy = AdaptiveLLMPolicy(AdaptiveConfig(latency_slo=10, ewma_alpha=1.0, probe_interval=0))
+        with policy._lock:
+            policy._record_latency(20)
+
+        admitted, _ = policy.admit()
+        assert admitted is True
+
+    def test_disabled_policy(self):
+        """測試停用時永遠執行 LLM 回答"""
+        policy = AdaptiveLLMPolicy(AdaptiveConfig(enabled=False, queue_slo=1))
+        assert policy.admit()[0] is True
+        assert policy.admit()[0] is True
+        policy.release(100)
+        assert policy.status()['latency_ewma'] is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
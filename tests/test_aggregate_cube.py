@@ -0,0 +1,197 @@
+"""
+Unit tests for AggregateCube
+測試聚合 cube 的增量更新、快照刷新、GROUP BY 查詢與 /stats 回退（使用 Mock）
+"""
+
+import hashlib
+import pytest
+from datetime import datetime
+from decimal import Decimal
+from unittest.mock import Mock
+import sys
+import time
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Check if psycopg2 is available
+try:
+    import psycopg2
+    HAS_PSYCOPG2 = True
+except ImportError:
+    HAS_PSYCOPG2 = False
+
+if HAS_PSYCOPG2:
+    from ambulance_inventory.aggregate_cube import AggregateCube
+    from ambulance_inventory.config import SnapshotConfig
+    from ambulance_inventory.snapshot import InventorySnapshot
+
+
+pytestmark = pytest.mark.skipif(
+    not HAS_PSYCOPG2,
+    reason="psycopg2 not installed (required for aggregate cube)"
+)
+
+
+def make_row(product_id, category, brand, stock, price, supplier="供應商"):
+    """建立 inventory 資料列"""
+    return {
+        'product_id': product_id, 'product_name': product_id, 'category': category, 'brand': brand,
+        'model': None, 'specifications': None, 'stock_quantity': stock, 'unit_price': Decimal(price),
+        'supplier': supplier, 'last_updated': datetime(2026, 1, 1)
+    }
+
+
+ROWS = [
+    make_row('AED-001', 'AED除顫器', 'Philips', 15, '45000.50'),
+    make_row('AED-002', 'AED除顫器', 'ZOLL', 8, '52000'),
+    make_row('AED-003', 'AED除顫器', 'ZOLL', 2, '48000'),
+    make_row('STR-001', '擔架設備', 'Ferno', 0, '85000', supplier=None),
+]
+
+
+class TestAggregateCube:
+    """測試 AggregateCube"""
+
+    def setup_method(self):
+        """設置測試環境"""
+        self.cube = AggregateCube()
+        self.cube.reset(ROWS)
+
+    def test_group_by_category(self):
+        """測試依分類的聚合查詢"""
+        results = self.cube.execute(
+            "SELECT category, COUNT(*) AS n, SUM(stock_quantity) AS total, "
+            "SUM(stock_quantity * unit_price) AS value, AVG(unit_price) AS avg_price "
+            "FROM inventory GROUP BY category ORDER BY value DESC"
+        )
+        assert results == [
+            {'category': 'AED除顫器', 'n': 3, 'total': 25, 'value': 1187007.5, 'avg_price': 48333.5},
+            {'category': '擔架設備', 'n': 1, 'total': 0, 'value': 0.0, 'avg_price': 85000.0},
+        ]
+
+    def test_dimension_filter(self):
+        """測試維度等值條件與 MIN/MAX"""
+        results = self.cube.execute(
+            "SELECT brand, MIN(unit_price), MAX(unit_price) FROM inventory "
+            "WHERE category = 'AED除顫器' AND brand IN ('ZOLL', 'Ferno') GROUP BY brand"
+        )
+        assert results == [{'brand': 'ZOLL', 'min': 48000.0, 'max': 52000.0}]
+
+    def test_incremental_update(self):
+        """測試增量更新（含最小值被移除與維度變更）"""
+        old = ROWS[2]
+        new = dict(old, stock_quantity=5, unit_price=Decimal('60000'))
+        self.cube.update(old, new)
+        moved = dict(ROWS[0], category='擔架設備')
+        self.cube.update(ROWS[0], moved)
+
+        results = self.cube.execute(
+            "SELECT category, COUNT(*), SUM(stock_quantity), MIN(unit_price) FROM inventory GROUP BY category ORDER BY category"
+        )
+        assert results == [
+            {'category': 'AED除顫器', 'count': 2, 'sum': 13, 'min': 52000.0},
+            {'category': '擔架設備', 'count': 2, 'sum': 15, 'min': 45000.5},
+        ]
+
+    def test_stock_update_through_snapshot(self):
+        """測試資料庫的庫存 UPDATE 經由快照增量刷新改變 cube 的聚合值"""
+        rows = [dict(row) for row in ROWS]
+
+        def execute_query(sql, params=None, deadline=None):
+            if 'COUNT(*)' in sql:
+                checksum = sum(int(hashlib.md5(row['product_id'].encode('utf-8')).hexdigest()[:15], 16)
+                               for row in rows)
+                return [{'count': len(rows), 'checksum': checksum}]
+            if params:
+                return [dict(row) for row in rows if row['last_updated'] >= params[0]]
+            return [dict(row) for row in rows]
+
+        mock_db = Mock()
+        mock_db.execute_query = Mock(side_effect=execute_query)
+        snapshot = InventorySnapshot(mock_db, SnapshotConfig(enabled=True))
+        snapshot.load()
+        snapshot.add_listener(self.cube)
+        query = "SELECT SUM(stock_quantity) AS total FROM inventory WHERE category = 'AED除顫器' AND brand = 'ZOLL'"
+        assert self.cube.execute(query) == [{'total': 10}]
+
+        # UPDATE inventory SET stock_quantity = 20 WHERE product_id = 'AED-003'（觸發器更新 last_updated）
+        rows[2].update(stock_quantity=20, last_updated=datetime(2026, 3, 1))
+        assert snapshot.refresh() == 1
+
+        assert self.cube.execute(query) == [{'total': 28}]
+        summary, _ = self.cube.stats(('brand',), {'category': ['AED除顫器']})
+        assert [(row['brand'], row['total_value']) for row in summary] == [('ZOLL', 1376000.0), ('Philips', 675007.5)]
+
+    def test_loaded_on_start_without_snapshot_execution(self):
+        """測試未啟用快照本地執行時，啟動後 cube 仍由快照載入（/stats 不必回退 SQL）"""
+        mock_db = Mock()
+        mock_db.execute_query = Mock(return_value=[dict(row) for row in ROWS])
+        snapshot = InventorySnapshot(mock_db, SnapshotConfig(enabled=False, refresh_interval=60))
+        cube = AggregateCube(mock_db)
+        snapshot.add_listener(cube)
+        assert not cube.ready
+
+        snapshot.start()
+        try:
+            for _ in range(50):
+                if cube.ready:
+                    break
+                time.sleep(0.01)
+            assert cube.ready
+            assert cube.execute(
+                "SELECT SUM(stock_quantity) AS total FROM inventory WHERE category = 'AED除顫器' AND brand = 'ZOLL'"
+            ) == [{'total': 10}]
+        finally:
+            snapshot.stop()
+
+    def test_aggregate_without_group_by(self):
+        """測試無 GROUP BY 的聚合與無符合資料的結果"""
+        assert self.cube.execute("SELECT COUNT(*), SUM(stock_quantity) FROM inventory") == \
+            [{'count': 4, 'sum': 25}]
+        assert self.cube.execute("SELECT COUNT(*), MAX(unit_price) FROM inventory WHERE brand = 'nope'") == \
+            [{'count': 0, 'max': None}]
+
+    @pytest.mark.parametrize("sql", [
+        "SELECT product_name FROM inventory",
+        "SELECT model, COUNT(*) FROM inventory GROUP BY model",
+        "SELECT category, COUNT(*) FROM inventory WHERE stock_quantity > 0 GROUP BY category",
+        "SELECT category, MAX(stock_quantity) FROM inventory GROUP BY category",
+        "SELECT * FROM category_summary",
+    ])
+    def test_unsupported(self, sql):
+        """測試超出 cube 範圍的查詢"""
+        assert self.cube.execute(sql) is None
+        assert not self.cube.can_answer(sql)
+
+    def test_stats_rollup(self):
+        """測試 /stats 彙總依總價值排序並套用過濾"""
+        rows, source = self.cube.stats(('brand',), {'category': ['AED除顫器']})
+
+        assert source == 'cube'
+        assert [row['brand'] for row in rows] == ['Philips', 'ZOLL']
+        assert rows[1]['product_count'] == 2
+
+    def test_stats_invalid_dimension(self):
+        """測試不支援的維度"""
+        with pytest.raises(ValueError):
+            self.cube.stats(('model',))
+
+    def test_stats_database_fallback(self):
+        """測試 cube 未載入時以 SQL 計算"""
+        mock_db = Mock()
+        mock_db.execute_query = Mock(return_value=[{'product_count': 4}])
+        cube = AggregateCube(mock_db)
+
+        rows, source = cube.stats(('category',), {'brand': ['ZOLL']})
+
+        assert source == 'database'
+        assert rows == [{'product_count': 4}]
+        sql, params = mock_db.execute_query.call_args[0]
+        assert 'GROUP BY category' in sql
+        assert params == ('ZOLL',)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,129 @@
+"""
+Unit tests for AutocompleteIndex
+測試自動完成的前綴查詢、問題次數排序、目錄增量更新與資料庫載入（使用 Mock）
+"""
+
+import pytest
+from unittest.mock import Mock
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Check if psycopg2 is available
+try:
+    import psycopg2
+    HAS_PSYCOPG2 = True
+except ImportError:
+    HAS_PSYCOPG2 = False
+
+if HAS_PSYCOPG2:
+    from ambulance_inventory.autocomplete import AutocompleteIndex
+    from ambulance_inventory.config import AutocompleteConfig
+
+
+pytestmark = pytest.mark.skipif(
+    not HAS_PSYCOPG2,
+    reason="psycopg2 not installed (required for autocomplete)"
+)
+
+
+def make_row(product_id, category, brand, model):
+    """建立 inventory 資料列"""
+    return {'product_id': product_id, 'category': category, 'brand': brand, 'model': model}
+
+
+ROWS = [
+    make_row('AED-001', 'AED除顫器', 'Philips', 'HeartStart FRx'),
+    make_row('AED-002', 'AED除顫器', 'ZOLL', 'AED Plus'),
+    make_row('AED-003', 'AED除顫器', 'Philips', 'HeartStart HS1'),
+    make_row('MON-001', '監視器', 'Philips', 'IntelliVue X3'),
+]
+
+
+def texts(suggestions):
+    """建議文字列表"""
+    return [suggestion['text'] for suggestion in suggestions]
+
+
+class TestAutocompleteIndex:
+    """測試 AutocompleteIndex"""
+
+    def setup_method(self):
+        """設置測試環境"""
+        self.index = AutocompleteIndex(None, AutocompleteConfig(max_suggestions=3, max_questions=3))
+        self.index.reset(ROWS)
+
+    def test_catalog_prefix(self):
+        """測試目錄詞前綴查詢（不分大小寫、全形正規化、依品項數排序）"""
+        assert self.index.suggest("phi") == [{'text': 'Philips', 'kind': 'brand', 'weight': 3}]
+        assert texts(self.index.suggest("ＨＥＡＲＴ")) == ['HeartStart FRx', 'HeartStart HS1']
+        assert texts(self.index.suggest("a")) == ['AED除顫器', 'AED Plus']
+        assert self.index.suggest("xyz") == []
+
+    def test_word_start_keys(self):
+        """測試型號單字與中英交界處也可作為開頭"""
+        assert texts(self.index.suggest("frx")) == ['HeartStart FRx']
+        assert texts(self.index.suggest("除顫")) == ['AED除顫器']
+
+    def test_questions_ranked_by_frequency(self):
+        """測試歷史問題排在目錄詞之前並依次數排序"""
+        self.index.record_question("請列出所有AED除顫器")
+        for _ in range(2):
+            self.index.record_question("請列出  所有Philips產品")
+
+        assert self.index.suggest("請列出") == [
+            {'text': '請列出 所有Philips產品', 'kind': 'question', 'weight': 2},
+            {'text': '請列出所有AED除顫器', 'kind': 'question', 'weight': 1},
+        ]
+        assert texts(self.index.suggest("", limit=1)) == ['請列出 所有Philips產品']
+
+    def test_question_eviction(self):
+        """測試超過 max_questions 時移除次數最少的問題"""
+        self.index.record_question("問題甲")
+        self.index.record_question("問題甲")
+        self.index.record_question("問題乙")
+        self.index.record_question("問題丙")
+        self.index.record_question("問題丁")
+
+        assert texts(self.index.suggest("問題")) == ['問題甲', '問題丁', '問題丙']
+        assert self.index.stats()['questions'] == 3
+
+    def test_incremental_update(self):
+        """測試目錄增量更新（品項數歸零時移除，快取由子節點重新計算）"""
+        self.index.update(ROWS[0], dict(ROWS[0], brand='Physio-Control'))
+        self.index.update(ROWS[2], None)
+
+        assert self.index.suggest("ph") == [
+            {'text': 'Philips', 'kind': 'brand', 'weight': 1},
+            {'text': 'Physio-Control', 'kind': 'brand', 'weight': 1},
+        ]
+        assert texts(self.index.suggest("heart")) == ['HeartStart FRx']
+
+    def test_rebuild_keeps_questions(self):
+        """測試重建目錄詞時保留歷史問題"""
+        self.index.record_question("Philips AED 庫存")
+        self.index.reset(ROWS[3:])
+
+        assert texts(self.index.suggest("phil")) == ['Philips AED 庫存', 'Philips']
+        assert self.index.suggest("aed") == []
+
+    def test_load_catalog_from_database(self):
+        """測試未由快照提供目錄時於第一次查詢以 SQL 載入"""
+        mock_db = Mock()
+        mock_db.execute_query = Mock(return_value=[
+            {'category': 'AED除顫器', 'brand': 'ZOLL', 'model': 'AED Plus', 'product_count': 4},
+            {'category': '監視器', 'brand': 'ZOLL', 'model': None, 'product_count': 2},
+        ])
+        index = AutocompleteIndex(mock_db, AutocompleteConfig())
+
+        assert index.suggest("zoll") == [{'text': 'ZOLL', 'kind': 'brand', 'weight': 6}]
+        index.suggest("aed")
+        assert mock_db.execute_query.call_count == 1
+        assert 'GROUP BY category, brand, model' in mock_db.execute_query.call_args[0][0]
+        assert index.stats()['catalog_source'] == 'database'
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
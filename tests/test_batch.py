@@ -0,0 +1,168 @@
+"""
+Unit tests for BatchQueryRunner
+測試批次查詢的去重、並行執行、時限與斷路器（使用 Mock）
+"""
+
+import pytest
+from unittest.mock import Mock
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Check if psycopg2 is available
+try:
+    import psycopg2
+    HAS_PSYCOPG2 = True
+except ImportError:
+    HAS_PSYCOPG2 = False
+
+if HAS_PSYCOPG2:
+    from ambulance_inventory.batch import BatchQueryRunner, normalize_question, normalize_sql
+    from ambulance_inventory.config import BatchConfig, ResponseCacheConfig
+    from ambulance_inventory.query_engine import QueryEngine
+    from ambulance_inventory.response_cache import ResponseCache
+    from ambulance_inventory.utils.deadline import Deadline
+
+
+pytestmark = pytest.mark.skipif(
+    not HAS_PSYCOPG2,
+    reason="psycopg2 not installed (required for QueryEngine import)"
+)
+
+
+class TestBatchQueryRunner:
+    """測試 BatchQueryRunner"""
+
+    def setup_method(self):
+        """設置測試環境"""
+        self.mock_db = Mock()
+        self.mock_db.execute_query = Mock(return_value=[{"id": 1, "name": "AED"}])
+        self.mock_db.format_results = Mock(side_effect=lambda results, limit=50: results[:limit])
+
+        self.mock_ollama = Mock()
+        self.mock_ollama.config = Mock()
+        self.mock_ollama.config.model = "default_model"
+
+        sql_by_question = {
+            "列出AED": "SELECT * FROM inventory WHERE category = 'AED除顫器'",
+            "AED 有哪些": "SELECT *  FROM inventory WHERE category = 'AED除顫器'",
+            "列出擔架": "SELECT * FROM inventory WHERE category = '擔架設備'",
+        }
+        self.mock_ollama.generate = Mock(
+            side_effect=lambda prompt, **kwargs: sql_by_question.get(prompt, "摘要")
+        )
+
+        self.engine = QueryEngine(self.mock_db, self.mock_ollama)
+
+    def test_duplicate_questions_run_once(self):
+        """測試重複問題只執行一次"""
+        runner = BatchQueryRunner(self.engine, BatchConfig(max_concurrency=2))
+        batch = runner.run(["列出AED", "  列出AED ", "列出擔架"], use_llm_answer=False)
+
+        assert self.mock_ollama.generate.call_count == 2
+        assert batch['items'][1]['duplicate_of'] == 0
+        assert batch['items'][1]['index'] == 1
+        assert batch['summary']['unique_questions'] == 2
+        assert batch['summary']['total_items'] == 3
+
+    def test_duplicates_use_cache_normalization(self):
+        """測試去重與 SQL 快取、查詢日誌使用相同的正規化（全形、大小寫）"""
+        runner = BatchQueryRunner(self.engine, BatchConfig(max_concurrency=2))
+        batch = runner.run(["列出AED", "列出ａｅｄ"], use_llm_answer=False)
+
+        assert self.mock_ollama.generate.call_count == 1
+        assert batch['items'][1]['duplicate_of'] == 0
+        assert batch['summary']['unique_questions'] == 1
+
+    def test_identical_sql_executes_once(self):
+        """測試不同問題生成相同 SQL 時只執行一次資料庫查詢"""
+        runner = BatchQueryRunner(self.engine, BatchConfig(max_concurrency=2))
+        batch = runner.run(["列出AED", "AED 有哪些", "列出擔架"], use_llm_answer=False)
+
+        assert self.mock_db.execute_query.call_count == 2
+        assert batch['summary']['unique_sql'] == 2
+        assert sum(1 for item in batch['items'] if item['sql_shared']) == 1
+        assert all(item['success'] for item in batch['items'])
+
+    def test_results_in_request_order(self):
+        """測試結果依請求順序返回"""
+        runner = BatchQueryRunner(self.engine, BatchConfig(max_concurrency=3))
+        questions = ["列出擔架", "列出AED", "AED 有哪些"]
+        batch = runner.run(questions, use_llm_answer=False)
+
+        assert [item['question'] for item in batch['items']] == questions
+        assert [item['index'] for item in batch['items']] == [0, 1, 2]
+
+    def test_too_many_questions(self):
+        """測試超過批次上限"""
+        runner = BatchQueryRunner(self.engine, BatchConfig(max_questions=2))
+        with pytest.raises(ValueError):
+            runner.run(["a", "b", "c"])
+
+    def test_llm_answer_per_item(self):
+        """測試 LLM 模式下每個不同問題生成回答"""
+        runner = BatchQueryRunner(self.engine, BatchConfig(max_concurrency=2))
+        batch = runner.run(["列出AED", "列出擔架"], use_llm_answer=True)
+
+        assert all(item['answer'] == "摘要" for item in batch['items'])
+        assert 'llm_response' in batch['summary']['stage_totals']
+
+    def test_cancelled_deadline_aborts_items(self):
+        """測試批次時限取消後項目中止，不再呼叫 Ollama"""
+        deadline = Deadline(60)
+        deadline.cancel("client disconnected")
+        runner = BatchQueryRunner(self.engine, BatchConfig(max_concurrency=2))
+        batch = runner.run(["列出AED", "列出擔架"], use_llm_answer=False, deadline=deadline)
+
+        assert not any(item['success'] for item in batch['items'])
+        assert all("client disconnected" in item['error'] for item in batch['items'])
+        self.mock_ollama.generate.assert_not_called()
+
+    def test_open_breaker_fails_items(self):
+        """測試斷路器開啟時項目直接失敗，並回饋生成結果給斷路器"""
+        monitor = Mock()
+        monitor.is_available = Mock(side_effect=lambda name: name != 'database')
+        runner = BatchQueryRunner(self.engine, BatchConfig(), monitor)
+        batch = runner.run(["列出AED"], use_llm_answer=False)
+
+        assert batch['items'][0]['error'] == "Database is not available"
+        self.mock_ollama.generate.assert_not_called()
+
+        monitor.is_available = Mock(return_value=True)
+        batch = runner.run(["列出AED"], use_llm_answer=False)
+
+        assert batch['items'][0]['success']
+        monitor.record_success.assert_called_with('ollama')
+
+    def test_cached_sql_not_recorded_as_ollama_success(self):
+        """測試 SQL 來自快取（未呼叫 Ollama）時不回報 Ollama 成功"""
+        engine = QueryEngine(self.mock_db, self.mock_ollama, response_cache=ResponseCache(ResponseCacheConfig()))
+        monitor = Mock()
+        monitor.is_available = Mock(return_value=True)
+        runner = BatchQueryRunner(engine, BatchConfig(), monitor)
+
+        runner.run(["列出AED"], use_llm_answer=False)
+        monitor.record_success.assert_called_once_with('ollama')
+
+        batch = runner.run(["列出AED"], use_llm_answer=False)
+        assert batch['items'][0]['success']
+        assert self.mock_ollama.generate.call_count == 1
+        monitor.record_success.assert_called_once_with('ollama')
+
+
+class TestNormalization:
+    """測試正規化函數"""
+
+    def test_normalize_question(self):
+        """測試問題正規化"""
+        assert normalize_question("  列出   AED  ") == "列出 AED"
+
+    def test_normalize_sql(self):
+        """測試 SQL 正規化"""
+        assert normalize_sql("SELECT *\n FROM inventory;") == "SELECT * FROM inventory"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,132 @@
+"""
+Unit tests for QueryCostGuard
+測試 EXPLAIN 成本防護與資料庫 session 參數（使用 Mock）
+"""
+
+import pytest
+from unittest.mock import Mock
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Check if psycopg2 is available
+try:
+    import psycopg2
+    HAS_PSYCOPG2 = True
+except ImportError:
+    HAS_PSYCOPG2 = False
+
+if HAS_PSYCOPG2:
+    from ambulance_inventory.cost_guard import QueryCostGuard, QueryCostExceeded, CostEstimate
+    from ambulance_inventory.database import DatabaseClient
+    from ambulance_inventory.config import CostGuardConfig, DatabaseConfig
+
+
+pytestmark = pytest.mark.skipif(
+    not HAS_PSYCOPG2,
+    reason="psycopg2 not installed (required for DatabaseClient import)"
+)
+
+
+def make_plan(cost: float, rows: int) -> dict:
+    """建立 EXPLAIN 最上層計畫節點"""
+    return {'Node Type': 'Seq Scan', 'Total Cost': cost, 'Plan Rows': rows}
+
+
+class TestQueryCostGuard:
+    """測試 QueryCostGuard"""
+
+    def setup_method(self):
+        """設置測試環境"""
+        self.mock_db = Mock()
+        self.config = CostGuardConfig(max_cost=1000, max_rows=100, llm_max_rows=20)
+
+    def test_within_limits(self):
+        """測試成本在上限內時原樣通過"""
+        self.mock_db.explain = Mock(return_value=make_plan(50, 10))
+        guard = QueryCostGuard(self.mock_db, self.config)
+
+        estimate = guard.check("SELECT product_name FROM inventory")
+
+        assert estimate.sql == "SELECT product_name FROM inventory"
+        assert estimate.plan_rows == 10
+        assert estimate.limited is False
+
+    def test_auto_limit_large_result(self):
+        """測試預估筆數過多時自動加上 LIMIT"""
+        self.mock_db.explain = Mock(
+            side_effect=lambda sql, deadline=None: make_plan(80, 100) if 'LIMIT' in sql else make_plan(900, 5000)
+        )
+        guard = QueryCostGuard(self.mock_db, self.config)
+
+        estimate = guard.check("SELECT product_name FROM inventory")
+
+        assert estimate.sql == "SELECT product_name FROM inventory LIMIT 100"
+        assert estimate.limited is True
+
+    def test_reject_when_limit_does_not_help(self):
+        """測試加上 LIMIT 後成本仍過高時拒絕"""
+        self.mock_db.explain = Mock(return_value=make_plan(50000, 100))
+        guard = QueryCostGuard(self.mock_db, self.config)
+
+        with pytest.raises(QueryCostExceeded) as exc_info:
+            guard.check("SELECT a.product_name FROM inventory a, inventory b ORDER BY a.specifications")
+
+        assert exc_info.value.estimate.total_cost == 50000
+
+    def test_reject_without_auto_limit(self):
+        """測試停用自動 LIMIT 時直接拒絕"""
+        self.mock_db.explain = Mock(return_value=make_plan(50, 5000))
+        config = CostGuardConfig(max_cost=1000, max_rows=100, auto_limit=False)
+        guard = QueryCostGuard(self.mock_db, config)
+
+        with pytest.raises(QueryCostExceeded):
+            guard.check("SELECT product_name FROM inventory")
+
+    def test_reuses_given_plan(self):
+        """測試傳入已取得的執行計畫時不再 EXPLAIN"""
+        self.mock_db.explain = Mock()
+        guard = QueryCostGuard(self.mock_db, self.config)
+
+        estimate = guard.check("SELECT product_name FROM inventory LIMIT 5", plan=make_plan(10, 5))
+
+        assert estimate.total_cost == 10
+        self.mock_db.explain.assert_not_called()
+
+    def test_explain_failure_skips_check(self):
+        """測試 EXPLAIN 失敗時略過檢查（由實際執行回報錯誤）"""
+        self.mock_db.explain = Mock(side_effect=Exception("syntax error"))
+        guard = QueryCostGuard(self.mock_db, self.config)
+
+        assert guard.check("SELECT nope FROM inventory") is None
+
+    def test_llm_skip_reason(self):
+        """測試預估筆數超過 LLM 上限時略過 LLM 回答"""
+        guard = QueryCostGuard(self.mock_db, self.config)
+
+        assert guard.llm_skip_reason(CostEstimate("SELECT 1", 1.0, 5)) == ""
+        assert "超過 LLM 回答上限" in guard.llm_skip_reason(CostEstimate("SELECT 1", 1.0, 50))
+
+
+class TestDatabaseSessionOptions:
+    """測試 DatabaseClient 的 session 參數"""
+
+    def make_client(self, **kwargs) -> 'DatabaseClient':
+        config = DatabaseConfig(host="localhost", database="db", user="u", password="p", port=5432, **kwargs)
+        return DatabaseClient(config)
+
+    def test_default_options(self):
+        """測試預設 statement_timeout 與 work_mem"""
+        client = self.make_client(statement_timeout=30000, work_mem='16MB')
+        assert client._session_options() == "-c standard_conforming_strings=on -c statement_timeout=30000 -c work_mem=16MB"
+
+    def test_timeout_capped_by_deadline(self):
+        """測試 statement_timeout 不超過請求剩餘時間"""
+        client = self.make_client(statement_timeout=30000, work_mem='')
+        assert client._session_options(remaining=2.5) == "-c standard_conforming_strings=on -c statement_timeout=2500"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,87 @@
+"""
+Unit tests for deadline module
+測試請求時限與取消機制
+"""
+
+import pytest
+import time
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from ambulance_inventory.utils.deadline import (
+    Deadline, DeadlineExceeded, QueryCancelled, QueryAborted, check_deadline
+)
+
+
+class TestDeadline:
+    """測試 Deadline"""
+
+    def test_unlimited_deadline(self):
+        """測試不限時"""
+        deadline = Deadline()
+        assert deadline.remaining() is None
+        assert deadline.expired is False
+        assert deadline.timeout_for(120) == 120
+
+    def test_timeout_for_uses_remaining_budget(self):
+        """測試階段超時不超過剩餘時間"""
+        deadline = Deadline(10)
+        assert deadline.timeout_for(120) <= 10
+        assert deadline.timeout_for(5) == 5
+
+    def test_expired_deadline_raises(self):
+        """測試超時後檢查會拋出例外"""
+        deadline = Deadline(0.01)
+        time.sleep(0.02)
+        assert deadline.expired is True
+        with pytest.raises(DeadlineExceeded):
+            deadline.check("sql_generation")
+        with pytest.raises(QueryAborted):
+            deadline.timeout_for(120)
+
+    def test_cancel_runs_callbacks(self):
+        """測試取消時執行已註冊的取消動作"""
+        deadline = Deadline(60)
+        called = []
+
+        with deadline.on_cancel(lambda: called.append("ollama")):
+            deadline.cancel("client disconnected")
+
+        assert called == ["ollama"]
+        assert deadline.cancelled is True
+        with pytest.raises(QueryCancelled) as exc_info:
+            deadline.check()
+        assert "client disconnected" in str(exc_info.value)
+
+    def test_callback_unregistered_after_scope(self):
+        """測試區塊結束後取消動作不再執行"""
+        deadline = Deadline(60)
+        called = []
+
+        with deadline.on_cancel(lambda: called.append("db")):
+            pass
+        deadline.cancel()
+
+        assert called == []
+
+    def test_register_after_cancel_runs_immediately(self):
+        """測試已取消時註冊的動作立即執行"""
+        deadline = Deadline()
+        deadline.cancel()
+        called = []
+
+        with deadline.on_cancel(lambda: called.append("late")):
+            pass
+
+        assert called == ["late"]
+
+    def test_check_deadline_none(self):
+        """測試未提供時限時不檢查"""
+        check_deadline(None, "any")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
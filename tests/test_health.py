@@ -0,0 +1,131 @@
+"""
+Unit tests for health module
+測試斷路器狀態轉換與背景健康監控
+"""
+
+import pytest
+import time
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from ambulance_inventory.health import CircuitBreaker, BreakerState, HealthMonitor
+from ambulance_inventory.config import HealthConfig
+
+
+class TestCircuitBreaker:
+    """測試 CircuitBreaker"""
+
+    def test_opens_after_threshold(self):
+        """測試連續失敗達門檻後開啟"""
+        breaker = CircuitBreaker("ollama", HealthConfig(failure_threshold=2, probe_base_backoff=60))
+
+        breaker.record_failure("timeout")
+        assert breaker.state == BreakerState.CLOSED
+        assert breaker.allow_request() is True
+
+        breaker.record_failure("timeout")
+        assert breaker.state == BreakerState.OPEN
+        assert breaker.allow_request() is False
+
+    def test_half_open_after_backoff(self):
+        """測試退避時間後轉為半開"""
+        breaker = CircuitBreaker("database", HealthConfig(failure_threshold=1, probe_base_backoff=0.01))
+        breaker.record_failure()
+        time.sleep(0.02)
+
+        assert breaker.state == BreakerState.HALF_OPEN
+        assert breaker.allow_request() is True
+
+    def test_half_open_admits_single_trial(self):
+        """測試半開時只放行一個試探請求，回報結果後依結果關閉或重新開啟"""
+        breaker = CircuitBreaker("ollama", HealthConfig(failure_threshold=1, probe_base_backoff=0.01))
+        breaker.record_failure()
+        time.sleep(0.02)
+
+        assert breaker.allow_request() is True
+        assert breaker.allow_request() is False
+
+        breaker.record_failure("timeout")
+        assert breaker.state == BreakerState.OPEN
+        time.sleep(0.03)
+        assert breaker.allow_request() is True
+        assert breaker.allow_request() is False
+
+        breaker.record_success()
+        assert breaker.allow_request() is True
+        assert breaker.allow_request() is True
+
+    def test_success_closes_breaker(self):
+        """測試探測成功後關閉"""
+        breaker = CircuitBreaker("database", HealthConfig(failure_threshold=1, probe_base_backoff=0.01))
+        breaker.record_failure()
+        time.sleep(0.02)
+        breaker.record_success()
+
+        assert breaker.state == BreakerState.CLOSED
+        assert breaker.snapshot()['consecutive_failures'] == 0
+
+    def test_exponential_backoff(self):
+        """測試半開探測失敗時退避時間加倍"""
+        config = HealthConfig(failure_threshold=1, probe_base_backoff=1, probe_max_backoff=3)
+        breaker = CircuitBreaker("ollama", config)
+
+        breaker.record_failure()
+        assert breaker._backoff == 1
+        breaker.record_failure()
+        assert breaker._backoff == 2
+        breaker.record_failure()
+        assert breaker._backoff == 3
+
+
+class TestHealthMonitor:
+    """測試 HealthMonitor"""
+
+    def test_check_now_updates_breakers(self):
+        """測試探測結果寫入斷路器"""
+        monitor = HealthMonitor(
+            {'database': lambda: True, 'ollama': lambda: False},
+            HealthConfig(failure_threshold=1, probe_base_backoff=60)
+        )
+        monitor.check_now()
+
+        status = monitor.status()
+        assert status['database']['available'] is True
+        assert status['ollama']['available'] is False
+        assert monitor.is_available('ollama') is False
+
+    def test_check_exception_counts_as_failure(self):
+        """測試探測例外視為失敗"""
+        def failing_check():
+            raise ConnectionError("refused")
+
+        monitor = HealthMonitor({'database': failing_check}, HealthConfig(failure_threshold=1))
+        monitor.check_now()
+
+        assert monitor.status()['database']['last_error'] == "refused"
+
+    def test_closed_breaker_probes_on_interval(self):
+        """測試正常狀態依固定間隔探測"""
+        calls = []
+        monitor = HealthMonitor({'database': lambda: calls.append(1) or True}, HealthConfig(check_interval=60))
+
+        monitor.check_now()
+        monitor.check_now()
+
+        assert len(calls) == 1
+
+    def test_background_thread(self):
+        """測試背景執行緒啟動與停止"""
+        monitor = HealthMonitor({'database': lambda: True}, HealthConfig(tick_interval=0.01))
+        monitor.start()
+        time.sleep(0.05)
+        monitor.stop()
+
+        assert monitor.status()['database']['seconds_since_check'] is not None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,150 @@
+"""
+Unit tests for IndexAdvisor
+測試已執行 SQL 的條件擷取與索引建議（使用 Mock）
+"""
+
+import pytest
+from unittest.mock import Mock
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Check if psycopg2 is available
+try:
+    import psycopg2
+    HAS_PSYCOPG2 = True
+except ImportError:
+    HAS_PSYCOPG2 = False
+
+if HAS_PSYCOPG2:
+    from ambulance_inventory.index_advisor import IndexAdvisor, IndexRecommendation, IndexKind, extract_predicates
+    from ambulance_inventory.config import IndexAdvisorConfig
+
+
+pytestmark = pytest.mark.skipif(
+    not HAS_PSYCOPG2,
+    reason="psycopg2 not installed (required for DatabaseClient import)"
+)
+
+
+EXISTING_INDEXES = [
+    "CREATE UNIQUE INDEX inventory_pkey ON public.inventory USING btree (product_id)",
+    "CREATE INDEX idx_brand ON public.inventory USING btree (brand)",
+    "CREATE INDEX idx_stock_quantity ON public.inventory USING btree (stock_quantity)",
+]
+
+
+class TestExtractPredicates:
+    """測試 extract_predicates"""
+
+    def test_ilike_and_range(self):
+        """測試 ILIKE、lower() 比對與範圍條件"""
+        predicates = extract_predicates(
+            "SELECT product_name FROM inventory WHERE product_name ILIKE '%ZOLL%' "
+            "AND lower(brand) = 'zoll' AND unit_price BETWEEN 100 AND 500 AND stock_quantity >= 3"
+        )
+        assert predicates == [
+            ('inventory', 'product_name', IndexKind.TRIGRAM, ''),
+            ('inventory', 'brand', IndexKind.EXPRESSION, 'lower'),
+            ('inventory', 'unit_price', IndexKind.BTREE, ''),
+            ('inventory', 'stock_quantity', IndexKind.BTREE, ''),
+        ]
+
+    def test_prefix_like_and_not_ilike_ignored(self):
+        """測試前綴 LIKE 與 NOT ILIKE 不建議 trigram 索引"""
+        assert extract_predicates(
+            "SELECT product_name FROM inventory WHERE model LIKE 'HS%' AND brand NOT ILIKE '%x%'"
+        ) == []
+
+    def test_join_ignored(self):
+        """測試多資料表查詢不擷取（欄位歸屬不明確）"""
+        assert extract_predicates(
+            "SELECT a.product_name FROM inventory a JOIN suppliers s ON s.id = a.supplier_id "
+            "WHERE product_name ILIKE '%aed%'"
+        ) == []
+
+
+class TestIndexAdvisor:
+    """測試 IndexAdvisor"""
+
+    def setup_method(self):
+        """設置測試環境"""
+        def execute_query(sql, params=None, deadline=None):
+            if sql.startswith("SHOW"):
+                return [{'lc_ctype': 'C'}]
+            return [{'indexdef': indexdef} for indexdef in EXISTING_INDEXES]
+
+        self.mock_db = Mock()
+        self.mock_db.execute_query = Mock(side_effect=execute_query)
+        self.advisor = IndexAdvisor(self.mock_db, IndexAdvisorConfig(min_occurrences=2))
+
+    def test_recommend_above_threshold(self):
+        """測試出現次數達門檻才建議，且依次數排序"""
+        self.advisor.observe_many([
+            "SELECT product_name FROM inventory WHERE product_name ILIKE '%ZOLL%'",
+            "SELECT product_name FROM inventory WHERE product_name ILIKE '%HS1%' AND unit_price > 100",
+            "SELECT product_name FROM inventory WHERE product_name ILIKE '%AED%' AND unit_price < 900",
+            "SELECT product_name FROM inventory WHERE model ILIKE '%C2%'",
+        ])
+
+        recommendations = self.advisor.recommend()
+
+        assert [item.name for item in recommendations] == [
+            'idx_inventory_product_name_trgm', 'idx_inventory_unit_price'
+        ]
+        assert self.advisor.observed_statements == 4
+
+    def test_existing_index_excluded(self):
+        """測試已有 B-tree 索引的範圍條件不再建議"""
+        self.advisor.observe_many(["SELECT product_name FROM inventory WHERE stock_quantity < 5"] * 3)
+        assert self.advisor.recommend() == []
+
+    def test_disabled(self):
+        """測試停用時不記錄"""
+        advisor = IndexAdvisor(self.mock_db, IndexAdvisorConfig(enabled=False))
+        advisor.observe("SELECT product_name FROM inventory WHERE product_name ILIKE '%a%'")
+        assert advisor.observed_statements == 0
+
+    def test_c_locale_warning(self):
+        """測試 C locale 下中文 ILIKE 的警告"""
+        self.advisor.observe_many(["SELECT product_name FROM inventory WHERE product_name ILIKE '%除顫器%'"] * 2)
+        warnings = self.advisor.warnings(self.advisor.recommend())
+        assert len(warnings) == 1
+        assert "lc_ctype=C" in warnings[0]
+
+    def test_apply_migration(self):
+        """測試套用時依序建立擴充、索引並 ANALYZE"""
+        recommendation = IndexRecommendation('inventory', 'model', IndexKind.TRIGRAM, 3)
+
+        statements = self.advisor.apply([recommendation])
+
+        assert statements == [
+            "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_inventory_model_trgm "
+            "ON inventory USING gin (model gin_trgm_ops)",
+            "ANALYZE inventory",
+        ]
+        self.mock_db.execute_commands.assert_called_once_with(statements)
+
+
+class TestIndexRecommendation:
+    """測試 IndexRecommendation"""
+
+    def test_covered_by(self):
+        """測試判斷現有索引是否涵蓋建議"""
+        trigram = IndexRecommendation('inventory', 'brand', IndexKind.TRIGRAM, 3)
+        expression = IndexRecommendation('inventory', 'brand', IndexKind.EXPRESSION, 3, 'lower')
+
+        assert not trigram.is_covered_by(EXISTING_INDEXES[1])
+        assert trigram.is_covered_by(
+            "CREATE INDEX idx_brand_trgm ON public.inventory USING gin (brand gin_trgm_ops)"
+        )
+        assert expression.is_covered_by(
+            "CREATE INDEX idx_lower_brand ON public.inventory USING btree (lower((brand)::text))"
+        )
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
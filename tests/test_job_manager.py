@@ -0,0 +1,158 @@
+"""
+Unit tests for JobManager
+測試非同步查詢任務管理（使用 Mock）
+"""
+
+import pytest
+import threading
+import time
+from unittest.mock import Mock
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Check if psycopg2 is available
+try:
+    import psycopg2
+    HAS_PSYCOPG2 = True
+except ImportError:
+    HAS_PSYCOPG2 = False
+
+if HAS_PSYCOPG2:
+    from ambulance_inventory.config import JobConfig
+    from ambulance_inventory.job_manager import JobManager, JobStatus, JobQueueFullError
+
+
+pytestmark = pytest.mark.skipif(
+    not HAS_PSYCOPG2,
+    reason="psycopg2 not installed (required for QueryEngine import)"
+)
+
+
+def _wait_finished(manager, job_id, timeout=2.0):
+    """等待任務結束"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = manager.get(job_id)
+        if job and job.is_finished:
+            return job
+        time.sleep(0.01)
+    raise AssertionError("任務未在時限內完成")
+
+
+class TestJobManager:
+    """測試 JobManager"""
+
+    def setup_method(self):
+        """設置測試環境"""
+        self.engine = Mock()
+
+        def query_with_mode(question, use_llm_answer=True, model=None, on_progress=None, deadline=None):
+            on_progress('sql_generated', {'sql': 'SELECT 1 FROM inventory'})
+            on_progress('results_formatted', {'answer_html': '<table></table>', 'result_count': 1})
+            return ('SELECT 1 FROM inventory', '找到 1 筆', 'table', '<table></table>',
+                    [{'id': 1}], {'sql_generation': 0.1})
+
+        self.engine.query_with_mode = Mock(side_effect=query_with_mode)
+
+    def test_submit_and_complete(self):
+        """測試提交任務並取得最終結果"""
+        manager = JobManager(lambda: self.engine, JobConfig(max_workers=2))
+        job = manager.submit("列出庫存", use_llm_answer=True, model="qwen3:8b")
+
+        finished = _wait_finished(manager, job.job_id)
+        assert finished.status == JobStatus.SUCCEEDED
+        assert finished.result['sql'] == 'SELECT 1 FROM inventory'
+        assert finished.result['answer'] == '找到 1 筆'
+        assert finished.result['result_count'] == 1
+        manager.shutdown(wait=True)
+
+    def test_partial_results_recorded(self):
+        """測試部分結果（SQL 與表格）先行寫入"""
+        manager = JobManager(lambda: self.engine, JobConfig(max_workers=1))
+        job = manager.submit("列出庫存")
+
+        finished = _wait_finished(manager, job.job_id)
+        assert finished.partial['sql'] == 'SELECT 1 FROM inventory'
+        assert finished.partial['answer_html'] == '<table></table>'
+        assert finished.partial['stage'] == 'results_formatted'
+        manager.shutdown(wait=True)
+
+    def test_job_dict_while_progress_updates(self):
+        """測試任務持續更新部分結果時讀取字典格式（持有鎖複製，不會在迭代中被修改）"""
+        def query_with_mode(question, use_llm_answer=True, model=None, on_progress=None, deadline=None):
+            for index in range(2000):
+                on_progress('streaming', {f'key_{index}': index})
+            return ('SELECT 1 FROM inventory', '', None, None, [], {})
+
+        self.engine.query_with_mode = Mock(side_effect=query_with_mode)
+        manager = JobManager(lambda: self.engine, JobConfig(max_workers=1))
+        job = manager.submit("列出庫存")
+
+        data = manager.job_dict(job.job_id)
+        while data['status'] != JobStatus.SUCCEEDED.value:
+            data = manager.job_dict(job.job_id)
+
+        assert data['partial']['key_1999'] == 1999
+        assert manager.job_dict("missing") is None
+        manager.shutdown(wait=True)
+
+    def test_failed_job(self):
+        """測試 SQL 生成失敗時任務標記為失敗"""
+        self.engine.query_with_mode = Mock(return_value=(None, None, None, None, None, {}))
+        manager = JobManager(lambda: self.engine, JobConfig(max_workers=1))
+        job = manager.submit("列出庫存")
+
+        finished = _wait_finished(manager, job.job_id)
+        assert finished.status == JobStatus.FAILED
+        assert finished.error
+        manager.shutdown(wait=True)
+
+    def test_job_timeout(self):
+        """測試任務以提交時的時限建立 Deadline，超時時標記為失敗"""
+        def query_with_mode(question, use_llm_answer=True, model=None, on_progress=None, deadline=None):
+            while True:
+                deadline.check("sql_generation")
+                time.sleep(0.01)
+
+        self.engine.query_with_mode = Mock(side_effect=query_with_mode)
+        manager = JobManager(lambda: self.engine, JobConfig(max_workers=1))
+        job = manager.submit("列出庫存", timeout=0.1)
+
+        finished = _wait_finished(manager, job.job_id)
+        assert finished.status == JobStatus.FAILED
+        assert "超過時限" in finished.error
+        assert self.engine.query_with_mode.call_args.kwargs['deadline'].timeout == 0.1
+        manager.shutdown(wait=True)
+
+    def test_queue_full(self):
+        """測試待處理任務上限"""
+        release = threading.Event()
+        self.engine.query_with_mode = Mock(side_effect=lambda *a, **k: release.wait())
+        manager = JobManager(lambda: self.engine, JobConfig(max_workers=1, max_pending=2))
+
+        manager.submit("q1")
+        manager.submit("q2")
+        with pytest.raises(JobQueueFullError):
+            manager.submit("q3")
+
+        release.set()
+        manager.shutdown(wait=True)
+
+    def test_finished_jobs_expire(self):
+        """測試已完成任務超過 TTL 後被清除"""
+        manager = JobManager(lambda: self.engine, JobConfig(max_workers=1, ttl_seconds=0))
+        job = manager.submit("列出庫存")
+
+        deadline = time.time() + 2.0
+        while manager.get(job.job_id) is not None and time.time() < deadline:
+            time.sleep(0.01)
+
+        assert manager.get(job.job_id) is None
+        manager.shutdown(wait=True)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,258 @@
+"""
+Unit tests for local executor and InventorySnapshot
+測試欄位式快照的本地查詢執行與增量刷新（使用 Mock）
+"""
+
+import hashlib
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import Mock
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Check if psycopg2 and numpy are available
+try:
+    import psycopg2
+    import numpy
+    HAS_DEPENDENCIES = True
+except ImportError:
+    HAS_DEPENDENCIES = False
+
+if HAS_DEPENDENCIES:
+    from ambulance_inventory.local_executor import ColumnStore, UnsupportedQuery, compile_sql, execute_plan
+    from ambulance_inventory.snapshot import InventorySnapshot
+    from ambulance_inventory.config import SnapshotConfig
+
+
+pytestmark = pytest.mark.skipif(
+    not HAS_DEPENDENCIES,
+    reason="psycopg2/numpy not installed (required for local executor)"
+)
+
+
+def make_row(product_id, name, category, brand, stock, price, supplier="供應商", updated=None):
+    """建立 inventory 資料列"""
+    return {
+        'product_id': product_id, 'product_name': name, 'category': category, 'brand': brand,
+        'model': product_id[-3:], 'specifications': None, 'stock_quantity': stock,
+        'unit_price': price, 'supplier': supplier, 'last_updated': updated or datetime(2026, 1, 1)
+    }
+
+
+def id_checksum(rows):
+    """與資料庫相同的 product_id 校驗和（md5 前 15 個十六進位數字的加總）"""
+    return sum(int(hashlib.md5(row['product_id'].encode('utf-8')).hexdigest()[:15], 16) for row in rows)
+
+
+ROWS = [
+    make_row('AED-001', 'HeartStart HS1 除顫器', 'AED除顫器', 'Philips', 15, 45000),
+    make_row('AED-002', 'ZOLL AED Plus', 'AED除顫器', 'ZOLL', 8, 52000),
+    make_row('STR-001', 'Ferno 35-X 擔架', '擔架設備', 'Ferno', 0, 85000, supplier=None),
+    make_row('STR-002', 'Spencer 403 擔架', '擔架設備', None, 10, 35000),
+]
+
+
+class TestLocalExecutor:
+    """測試 compile_sql / execute_plan"""
+
+    def setup_method(self):
+        """設置測試環境"""
+        self.store = ColumnStore(ROWS)
+
+    def run(self, sql):
+        return execute_plan(compile_sql(sql), self.store)
+
+    def test_filter_order_limit(self):
+        """測試等值、範圍條件、排序與 LIMIT"""
+        results = self.run(
+            "SELECT product_name, stock_quantity FROM inventory "
+            "WHERE category = 'AED除顫器' AND stock_quantity > 0 ORDER BY unit_price DESC LIMIT 1"
+        )
+        assert results == [{'product_name': 'ZOLL AED Plus', 'stock_quantity': 8}]
+
+    def test_ilike_case_insensitive(self):
+        """測試 ILIKE 不分大小寫、LIKE 區分大小寫"""
+        assert [row['product_id'] for row in self.run(
+            "SELECT product_id FROM inventory WHERE product_name ILIKE '%zoll%'"
+        )] == ['AED-002']
+        assert self.run("SELECT product_id FROM inventory WHERE product_name LIKE '%zoll%'") == []
+
+    def test_null_three_valued_logic(self):
+        """測試 NULL 不符合 NOT 條件（三值邏輯）"""
+        results = self.run("SELECT product_id FROM inventory WHERE NOT brand = 'ZOLL' ORDER BY product_id")
+        assert [row['product_id'] for row in results] == ['AED-001', 'STR-001']
+
+    def test_group_by_aggregates(self):
+        """測試 GROUP BY 聚合與依別名排序"""
+        results = self.run(
+            "SELECT category, COUNT(*) AS n, SUM(stock_quantity) AS total, "
+            "SUM(stock_quantity * unit_price) AS value FROM inventory GROUP BY category ORDER BY value DESC"
+        )
+        assert results == [
+            {'category': 'AED除顫器', 'n': 2, 'total': 23, 'value': 1091000.0},
+            {'category': '擔架設備', 'n': 2, 'total': 10, 'value': 350000.0},
+        ]
+
+    def test_aggregate_without_rows(self):
+        """測試無符合資料時聚合仍回傳一列"""
+        assert self.run("SELECT COUNT(*), MAX(unit_price) FROM inventory WHERE brand = 'nope'") == \
+            [{'count': 0, 'max': None}]
+
+    def test_nulls_order(self):
+        """測試 ASC 時 NULL 排最後、DESC 時排最前"""
+        assert self.run("SELECT DISTINCT brand FROM inventory ORDER BY brand")[-1] == {'brand': None}
+        assert self.run("SELECT brand FROM inventory ORDER BY brand DESC")[0] == {'brand': None}
+
+    @pytest.mark.parametrize("sql", [
+        "SELECT * FROM low_stock_alert",
+        "SELECT brand, COUNT(*) FROM inventory",
+        "SELECT a.brand FROM inventory a JOIN suppliers s ON s.id = a.supplier_id",
+        "SELECT product_name FROM inventory WHERE lower(brand) = 'zoll'",
+        "SELECT product_name FROM inventory WHERE last_updated > '2026-01-01'",
+    ])
+    def test_unsupported(self, sql):
+        """測試超出支援範圍的 SQL"""
+        with pytest.raises(UnsupportedQuery):
+            compile_sql(sql)
+
+
+class TestInventorySnapshot:
+    """測試 InventorySnapshot"""
+
+    def setup_method(self):
+        """設置測試環境"""
+        self.rows = [dict(row) for row in ROWS]
+        self.mock_db = Mock()
+        self.mock_db.execute_query = Mock(side_effect=self.execute_query)
+        self.snapshot = InventorySnapshot(self.mock_db, SnapshotConfig(enabled=True))
+        self.snapshot.load()
+
+    def execute_query(self, sql, params=None, deadline=None):
+        if 'COUNT(*)' in sql:
+            return [{'count': len(self.rows), 'checksum': id_checksum(self.rows)}]
+        if sql == "SELECT product_id FROM inventory":
+            return [{'product_id': row['product_id']} for row in self.rows]
+        if params:
+            return [dict(row) for row in self.rows if row['last_updated'] >= params[0]]
+        return [dict(row) for row in self.rows]
+
+    def test_hit_rate(self):
+        """測試本地命中與回退資料庫的統計"""
+        assert self.snapshot.execute("SELECT COUNT(*) FROM inventory") == [{'count': 4}]
+        assert self.snapshot.execute("SELECT * FROM low_stock_alert") is None
+
+        stats = self.snapshot.stats()
+        assert stats['hits'] == 1
+        assert stats['misses'] == 1
+        assert stats['hit_rate'] == 0.5
+
+    def test_incremental_refresh(self):
+        """測試以 last_updated 增量刷新"""
+        self.rows[1]['stock_quantity'] = 2
+        self.rows[1]['last_updated'] = datetime(2026, 2, 1)
+
+        assert self.snapshot.refresh() == 1
+        assert self.snapshot.execute("SELECT stock_quantity FROM inventory WHERE brand = 'ZOLL'") == \
+            [{'stock_quantity': 2}]
+
+    def update_row(self, index, transaction_start, **values):
+        """模擬 UPDATE：觸發器將 last_updated 設為交易開始時間"""
+        self.rows[index].update(values, last_updated=transaction_start)
+
+    def test_update_reaches_snapshot(self):
+        """測試一般的庫存 UPDATE 在下次 refresh() 反映到快照"""
+        self.update_row(3, datetime(2026, 3, 1, 12, 0), stock_quantity=0)
+
+        assert self.snapshot.refresh() == 1
+        assert self.snapshot.execute("SELECT COUNT(*) FROM inventory WHERE stock_quantity = 0") == [{'count': 2}]
+
+    def test_late_commit_within_overlap(self):
+        """測試較晚提交、時間戳早於水位的交易仍在重疊範圍內被刷新"""
+        watermark = datetime(2026, 3, 1, 12, 0)
+        self.update_row(0, watermark, stock_quantity=7)
+        assert self.snapshot.refresh() == 1
+
+        self.update_row(1, watermark - timedelta(seconds=30), stock_quantity=3)
+
+        assert self.snapshot.refresh() == 1
+        assert self.snapshot.execute("SELECT stock_quantity FROM inventory WHERE brand = 'ZOLL'") == \
+            [{'stock_quantity': 3}]
+
+    def test_deleted_row_removed_without_reload(self):
+        """測試刪除的資料列以遮罩排除，不重新載入整個資料表"""
+        del self.rows[0]
+
+        assert self.snapshot.refresh() == 1
+
+        assert self.snapshot.stats()['row_count'] == 3
+        assert self.snapshot.execute("SELECT COUNT(*) FROM inventory WHERE category = 'AED除顫器'") == \
+            [{'count': 1}]
+        full_loads = [
+            call for call in self.mock_db.execute_query.call_args_list
+            if call[0][0].startswith('SELECT product_id, product_name') and 'WHERE' not in call[0][0]
+        ]
+        assert len(full_loads) == 1
+
+    def test_delete_and_insert_detected(self):
+        """測試先刪除再新增（筆數不變）仍由校驗和偵測到刪除"""
+        del self.rows[0]
+        self.rows.append(make_row('MON-001', 'Mindray 監視器', '監視器', 'Mindray', 3, 120000,
+                                  updated=datetime(2026, 2, 1)))
+
+        assert self.snapshot.refresh() == 2
+
+        assert self.snapshot.execute("SELECT product_name FROM inventory WHERE brand = 'Philips'") == []
+        assert self.snapshot.execute("SELECT product_name FROM inventory WHERE category = '監視器'") == \
+            [{'product_name': 'Mindray 監視器'}]
+
+    def test_refresh_patches_changed_columns(self):
+        """測試增量刷新只替換有變更的欄位陣列，未變更的陣列共用"""
+        before = self.snapshot._store
+        self.update_row(1, datetime(2026, 2, 1), stock_quantity=2)
+
+        assert self.snapshot.refresh() == 1
+
+        after = self.snapshot._store
+        assert after is not before
+        assert after.numeric['unit_price'] is before.numeric['unit_price']
+        assert after.codes['brand'] is before.codes['brand']
+        assert after.numeric['stock_quantity'][1] == 2
+        assert before.numeric['stock_quantity'][1] == 8
+
+    def test_listener_receives_changes(self):
+        """測試監聽者收到完整載入與增量變更"""
+        listener = Mock()
+        self.snapshot.add_listener(listener)
+        listener.reset.assert_called_once()
+
+        self.rows[0]['stock_quantity'] = 1
+        self.rows[0]['last_updated'] = datetime(2026, 2, 1)
+        self.snapshot.refresh()
+
+        old, new = listener.update.call_args[0]
+        assert (old['stock_quantity'], new['stock_quantity']) == (15, 1)
+
+    def test_listeners_loaded_when_disabled(self):
+        """測試未啟用本地執行時，有監聽者仍會在背景載入（不建立欄位陣列、不在本地執行）"""
+        snapshot = InventorySnapshot(self.mock_db, SnapshotConfig(enabled=False, refresh_interval=60))
+        snapshot.start()
+        assert snapshot._thread is None
+
+        listener = Mock()
+        snapshot.add_listener(listener)
+        snapshot.start()
+        try:
+            snapshot._thread.join(timeout=0.2)
+            listener.reset.assert_called_once()
+            assert len(listener.reset.call_args[0][0]) == 4
+            assert not snapshot.ready
+            assert snapshot.execute("SELECT COUNT(*) FROM inventory") is None
+        finally:
+            snapshot.stop()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,116 @@
+"""
+Unit tests for logger
+測試 JSON 日誌格式、請求 ID、佇列已滿時不阻塞與 DEBUG 訊息取樣
+"""
+
+import io
+import json
+import logging
+import queue
+import threading
+import time
+import pytest
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from ambulance_inventory.config import LoggingConfig
+from ambulance_inventory.utils.logger import (
+    AsyncLogHandler, JsonFormatter, setup_logging, shutdown_logging, set_request_id, reset_request_id
+)
+
+
+def make_record(level=logging.INFO, msg="查詢完成 %s 筆", args=(3,), **extra):
+    """建立日誌紀錄"""
+    record = logging.LogRecord('ambulance_inventory.test', level, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+class TestAsyncLogging:
+    """測試結構化非阻塞日誌"""
+
+    def teardown_method(self):
+        """停止背景執行緒"""
+        shutdown_logging()
+
+    def test_json_format(self):
+        """測試 JSON 欄位包含訊息、請求 ID 與 extra 欄位"""
+        handler = AsyncLogHandler(queue.Queue())
+        record = handler.prepare(make_record(timing={'sql_generation': 0.812}), request_id='req-1')
+        entry = json.loads(JsonFormatter().format(record))
+
+        assert entry['message'] == "查詢完成 3 筆"
+        assert entry['level'] == 'INFO'
+        assert entry['request_id'] == 'req-1'
+        assert entry['timing'] == {'sql_generation': 0.812}
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        """測試佇列已滿時丟棄並計數"""
+        handler = AsyncLogHandler(queue.Queue(maxsize=1))
+        handler.emit(make_record())
+        handler.emit(make_record())
+
+        assert handler.queue.qsize() == 1
+        assert handler.dropped == 1
+
+    def test_debug_sampling_per_request(self):
+        """測試 DEBUG 訊息依請求取樣：同一請求全部保留或全部略過，INFO 不取樣"""
+        handler = AsyncLogHandler(queue.Queue(), debug_sample_rate=0.5)
+        kept = {}
+        for index in range(200):
+            token = set_request_id(f"req-{index}")
+            try:
+                before = handler.queue.qsize()
+                handler.emit(make_record(logging.DEBUG))
+                handler.emit(make_record(logging.DEBUG))
+                handler.emit(make_record(logging.INFO))
+                kept[index] = handler.queue.qsize() - before
+            finally:
+                reset_request_id(token)
+
+        assert set(kept.values()) == {1, 3}
+        assert 50 < sum(1 for count in kept.values() if count == 3) < 150
+        assert handler.sampled_out == 2 * sum(1 for count in kept.values() if count == 1)
+
+    def test_setup_logging_writes_in_background(self):
+        """測試 setup_logging 由背景執行緒輸出，停止時寫出佇列中剩餘的日誌"""
+        stream = io.StringIO()
+        setup_logging(LoggingConfig(level='INFO'), stream=stream)
+        token = set_request_id('req-9')
+        try:
+            logging.getLogger('ambulance_inventory.test').info("完成", extra={'elapsed': 1.5})
+            logging.getLogger('ambulance_inventory.test').debug("不輸出")
+        finally:
+            reset_request_id(token)
+        shutdown_logging()
+
+        lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+        assert [(line['message'], line['request_id'], line['elapsed']) for line in lines] == [("完成", 'req-9', 1.5)]
+
+    def test_shutdown_with_full_queue(self):
+        """測試佇列已滿時停止仍會寫出剩餘日誌，不拋出 queue.Full"""
+        release = threading.Event()
+
+        class SlowStream(io.StringIO):
+            def write(self, text):
+                release.wait(5)
+                return super().write(text)
+
+        stream = SlowStream()
+        setup_logging(LoggingConfig(level='INFO', queue_size=1), stream=stream)
+        logger = logging.getLogger('ambulance_inventory.test')
+        logger.info("第一筆")
+        time.sleep(0.1)  # 背景執行緒取出第一筆後卡在輸出
+        logger.info("第二筆")
+        threading.Timer(0.2, release.set).start()
+        shutdown_logging()
+
+        messages = [json.loads(line)['message'] for line in stream.getvalue().splitlines()]
+        assert messages == ["第一筆", "第二筆"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,141 @@
+"""
+Unit tests for MaterializedViewManager
+測試物化視圖的刷新排程、新舊程度判斷與低庫存查詢路由（使用 Mock）
+"""
+
+import pytest
+from unittest.mock import Mock
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Check if psycopg2 is available
+try:
+    import psycopg2
+    HAS_PSYCOPG2 = True
+except ImportError:
+    HAS_PSYCOPG2 = False
+
+if HAS_PSYCOPG2:
+    from ambulance_inventory.materialized_views import MaterializedViewManager, route_low_stock
+    from ambulance_inventory.config import MaterializedViewConfig
+
+
+pytestmark = pytest.mark.skipif(
+    not HAS_PSYCOPG2,
+    reason="psycopg2 not installed (required for materialized views)"
+)
+
+
+class TestRouteLowStock:
+    """測試 route_low_stock"""
+
+    def test_dashboard_query(self):
+        """測試低庫存儀表板查詢改讀物化視圖"""
+        sql = ("SELECT product_name, category, stock_quantity FROM inventory "
+               "WHERE stock_quantity < 10 ORDER BY stock_quantity ASC LIMIT 50")
+        assert route_low_stock(sql) == sql.replace("FROM inventory", "FROM low_stock_alert")
+
+    def test_narrower_conditions(self):
+        """測試更嚴格的庫存條件與其他條件組合"""
+        assert route_low_stock(
+            "SELECT COUNT(*) FROM inventory WHERE category = 'AED除顫器' AND stock_quantity BETWEEN 1 AND 5"
+        ) == "SELECT COUNT(*) FROM low_stock_alert WHERE category = 'AED除顫器' AND stock_quantity BETWEEN 1 AND 5"
+
+    @pytest.mark.parametrize("sql", [
+        "SELECT product_name FROM inventory WHERE stock_quantity < 20",
+        "SELECT product_name FROM inventory WHERE stock_quantity < 5 OR brand = 'ZOLL'",
+        "SELECT product_name, specifications FROM inventory WHERE stock_quantity < 5",
+        "SELECT * FROM inventory WHERE stock_quantity < 5",
+        "SELECT product_name FROM inventory WHERE inventory.stock_quantity < 5",
+        "SELECT product_name FROM inventory",
+    ])
+    def test_not_routed(self, sql):
+        """測試條件未限定低庫存或引用視圖以外欄位時不改寫"""
+        assert route_low_stock(sql) is None
+
+
+class TestMaterializedViewManager:
+    """測試 MaterializedViewManager"""
+
+    def setup_method(self):
+        """設置測試環境"""
+        self.pending = {'low_stock_alert': 2, 'category_summary': 0}
+        self.mock_db = Mock()
+        self.mock_db.execute_query = Mock(side_effect=self.execute_query)
+        self.mock_db.execute_commands = Mock()
+        self.manager = MaterializedViewManager(self.mock_db, MaterializedViewConfig(max_staleness=60))
+
+    def execute_query(self, sql, params=None, deadline=None):
+        if params:
+            return [{'version': 7}]
+        return [
+            {'view_name': view, 'refreshed_count': 5, 'version': 5 + pending, 'seconds_since_refresh': 45.0}
+            for view, pending in self.pending.items()
+        ]
+
+    def test_refresh_pending_only_stale_views(self):
+        """測試只刷新有待處理變更的視圖，並記錄刷新前讀到的變更版本"""
+        assert self.manager.refresh_pending() == ['low_stock_alert']
+
+        statements = self.mock_db.execute_commands.call_args[0][0]
+        assert statements[0] == "REFRESH MATERIALIZED VIEW CONCURRENTLY low_stock_alert"
+        assert "refreshed_count = 7" in statements[1]
+        assert self.manager.stats()['views'][0]['refresh_count'] == 1
+
+    def test_min_refresh_interval(self):
+        """測試最小刷新間隔內不重複刷新（force 時仍刷新）"""
+        self.manager.refresh_pending()
+        assert self.manager.refresh_pending() == []
+        assert self.manager.refresh_pending(force=True) == ['low_stock_alert']
+
+    def test_refresh_error_counted(self):
+        """測試刷新失敗計入統計且不中斷其他視圖"""
+        self.mock_db.execute_commands.side_effect = Exception("lock timeout")
+
+        assert self.manager.refresh_pending() == []
+        assert self.manager.stats()['views'][0]['refresh_errors'] == 1
+
+    def test_route_requires_fresh_view(self):
+        """測試視圖落後超過 max_staleness 時不改讀"""
+        sql = "SELECT product_name FROM inventory WHERE stock_quantity < 10"
+        assert self.manager.route(sql) is None
+
+        self.manager.poll()
+        assert self.manager.route(sql) == "SELECT product_name FROM low_stock_alert WHERE stock_quantity < 10"
+
+        self.pending['low_stock_alert'] = 0
+        self.manager.config.max_staleness = 10
+        self.manager.poll()
+        assert self.manager.staleness('low_stock_alert') == 0.0
+        assert self.manager.route(sql) is not None
+
+    def test_staleness_since_last_clean_poll(self):
+        """測試落後時間自上次確認沒有變更起算，尚未確認過時以上次刷新時間估計"""
+        self.manager.poll()
+        assert 45.0 <= self.manager.staleness('low_stock_alert') < 46.0
+
+        self.pending['low_stock_alert'] = 0
+        self.manager.poll()
+        self.pending['low_stock_alert'] = 3
+        state = self.manager.poll()
+
+        assert state['low_stock_alert']['pending_changes'] == 3
+        assert self.manager.staleness('low_stock_alert') < 1.0
+
+    def test_stats_reset_counts_as_pending(self):
+        """測試異動統計被重設（版本小於已刷新版本）時視為有變更"""
+        self.pending['category_summary'] = -5
+
+        assert self.manager.poll()['category_summary']['pending_changes'] == 1
+
+    def test_refresh_unknown_view(self):
+        """測試拒絕刷新非受管理的視圖"""
+        with pytest.raises(ValueError):
+            self.manager.refresh("inventory")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
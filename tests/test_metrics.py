@@ -0,0 +1,101 @@
+"""
+Unit tests for metrics
+測試計數器、量表、直方圖的 Prometheus 文字輸出與階段計時
+"""
+
+import pytest
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from ambulance_inventory.metrics import (
+    Counter, Gauge, Histogram, MetricsRegistry, CACHE_LOOKUPS_TOTAL, QUERY_STAGE_SECONDS,
+    record_stage, server_timing
+)
+from ambulance_inventory.response_cache import ResponseCache
+from ambulance_inventory.config import ResponseCacheConfig
+
+
+class TestMetrics:
+    """測試指標類別與輸出格式"""
+
+    def setup_method(self):
+        """設置測試環境"""
+        self.registry = MetricsRegistry()
+
+    def test_counter_render(self):
+        """測試計數器依標籤輸出並跳脫標籤值"""
+        counter = self.registry.register(Counter('test_errors_total', "錯誤次數", ('reason',)))
+        counter.inc(reason='timeout')
+        counter.inc(2, reason='timeout')
+        counter.inc(reason='say "hi"')
+
+        lines = self.registry.render().splitlines()
+        assert lines[:2] == ['# HELP test_errors_total 錯誤次數', '# TYPE test_errors_total counter']
+        assert 'test_errors_total{reason="timeout"} 3' in lines
+        assert 'test_errors_total{reason="say \\"hi\\""} 1' in lines
+
+    def test_invalid_usage(self):
+        """測試標籤不符、計數器減少與名稱重複時拋出錯誤"""
+        counter = self.registry.register(Counter('test_total', "次數", ('reason',)))
+
+        with pytest.raises(ValueError):
+            counter.inc(kind='x')
+        with pytest.raises(ValueError):
+            counter.inc(-1, reason='x')
+        with pytest.raises(ValueError):
+            self.registry.register(Counter('test_total', "重複"))
+
+    def test_gauge_track_inprogress(self):
+        """測試進行中計數於區塊結束（含例外）後恢復"""
+        gauge = Gauge('test_in_flight', "進行中", ('endpoint',))
+
+        with pytest.raises(RuntimeError):
+            with gauge.track_inprogress(endpoint='/query'):
+                assert gauge.value(endpoint='/query') == 1
+                raise RuntimeError("失敗")
+
+        assert gauge.value(endpoint='/query') == 0
+
+    def test_histogram_cumulative_buckets(self):
+        """測試直方圖分界為累積計數並輸出 +Inf、sum 與 count"""
+        histogram = self.registry.register(Histogram('test_seconds', "耗時", ('stage',), buckets=(0.1, 1.0)))
+        for value in (0.05, 0.5, 0.5, 3.0):
+            histogram.observe(value, stage='sql')
+
+        lines = self.registry.render().splitlines()
+        assert 'test_seconds_bucket{stage="sql",le="0.1"} 1' in lines
+        assert 'test_seconds_bucket{stage="sql",le="1"} 3' in lines
+        assert 'test_seconds_bucket{stage="sql",le="+Inf"} 4' in lines
+        assert 'test_seconds_sum{stage="sql"} 4.05' in lines
+        assert 'test_seconds_count{stage="sql"} 4' in lines
+
+    def test_record_stage_and_server_timing(self):
+        """測試階段計時寫入回應（毫秒精度）、加入直方圖並轉為 Server-Timing"""
+        before = QUERY_STAGE_SECONDS.count(stage='formatting', model='test-model', mode='fast')
+        timing = {}
+        elapsed = record_stage(timing, 'formatting', 0.0, 'test-model', 'fast')
+
+        assert timing['formatting'] == round(elapsed, 3)
+        assert QUERY_STAGE_SECONDS.count(stage='formatting', model='test-model', mode='fast') == before + 1
+        assert server_timing({'sql_generation': 0.8125, 'llm_response': None, 'total': 1.5}) == (
+            "sql_generation;dur=812.5, total;dur=1500.0"
+        )
+
+    def test_response_cache_lookups(self):
+        """測試 LLM 快取的命中與未命中計入全域指標"""
+        hits = CACHE_LOOKUPS_TOTAL.value(cache='sql', result='hit')
+        misses = CACHE_LOOKUPS_TOTAL.value(cache='sql', result='miss')
+        cache = ResponseCache(ResponseCacheConfig())
+        cache.get('sql', ('問題',))
+        cache.put('sql', ('問題',), "SELECT 1")
+        cache.get('sql', ('問題',))
+
+        assert CACHE_LOOKUPS_TOTAL.value(cache='sql', result='hit') == hits + 1
+        assert CACHE_LOOKUPS_TOTAL.value(cache='sql', result='miss') == misses + 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,147 @@
+"""
+Unit tests for Ollama record/replay
+測試 OllamaClient 錄製串流回應與時間，以及重播的比對、速度、token 數與請求時限（使用 Mock）
+"""
+
+import json
+import time
+import pytest
+from unittest.mock import MagicMock, patch
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from ambulance_inventory.config import OllamaConfig
+from ambulance_inventory.ollama_client import OllamaClient
+from ambulance_inventory.ollama_recording import OllamaReplay
+from ambulance_inventory.query_log import collect_usage
+from ambulance_inventory.utils.deadline import Deadline
+
+
+SQL = "SELECT product_name FROM inventory WHERE stock_quantity < 10"
+
+
+def stream_response(text: str, chunk_chars: int = 10) -> MagicMock:
+    """建立串流 NDJSON 回應"""
+    lines = [json.dumps({'response': text[i:i + chunk_chars], 'done': False}).encode()
+             for i in range(0, len(text), chunk_chars)]
+    lines.append(json.dumps({
+        'response': '', 'done': True, 'prompt_eval_count': 120, 'eval_count': 18,
+        'prompt_eval_duration': 200_000_000, 'eval_duration': 300_000_000, 'total_duration': 510_000_000
+    }).encode())
+    response = MagicMock()
+    response.__enter__.return_value = response
+    response.iter_lines.return_value = iter(lines)
+    return response
+
+
+class TestOllamaRecordReplay:
+    """測試 Ollama 錄製與重播"""
+
+    def record(self, tmp_path, text=SQL, prompt="列出低庫存產品", model="qwen3:8b"):
+        """以 Mock 的 Ollama 錄製一次生成，返回錄製檔案路徑"""
+        path = tmp_path / "ollama.jsonl"
+        client = OllamaClient(OllamaConfig(host="http://ollama", model=model, record_path=str(path)))
+        with patch('ambulance_inventory.ollama_client.requests.post', return_value=stream_response(text)):
+            assert client.generate(prompt, "system") == text
+        return path
+
+    def replay_client(self, path, speed=0.0, model="qwen3:8b"):
+        """建立重播模式的客戶端"""
+        return OllamaClient(OllamaConfig(host="http://unused", model=model, replay_path=str(path), replay_speed=speed))
+
+    def test_record_writes_chunks_and_stats(self, tmp_path):
+        """測試錄製請求、含相對時間的片段與最後片段的 token 數"""
+        path = self.record(tmp_path)
+
+        entry = json.loads(path.read_text(encoding='utf-8'))
+        assert (entry['model'], entry['prompt'], entry['system']) == ("qwen3:8b", "列出低庫存產品", "system")
+        assert ''.join(text for _, text in entry['chunks']) == SQL
+        offsets = [offset for offset, _ in entry['chunks']]
+        assert offsets == sorted(offsets)
+        assert entry['final']['prompt_eval_count'] == 120 and 'response' not in entry['final']
+
+    def test_replay_without_network(self, tmp_path):
+        """測試重播返回錄製的文本與 token 數，且不呼叫 Ollama"""
+        path = self.record(tmp_path)
+        client = self.replay_client(path)
+
+        with patch('ambulance_inventory.ollama_client.requests.post') as post, collect_usage() as usage:
+            assert client.generate("列出低庫存產品", "system") == SQL
+        post.assert_not_called()
+        assert usage == {'prompt_tokens': 120, 'completion_tokens': 18}
+        assert client.get_available_models() == ["qwen3:8b"]
+        assert client.test_connection()
+
+    def test_replay_miss_and_model_fallback(self, tmp_path):
+        """測試找不到錄製時返回 None，不同模型時改用其他模型的錄製"""
+        path = self.record(tmp_path)
+        client = self.replay_client(path, model="llama3:70b")
+
+        assert client.generate("列出低庫存產品", "system") == SQL
+        assert client.generate("未錄製的問題", "system") is None
+        assert client.replay.stats()['hits'] == 1 and client.replay.stats()['misses'] == 1
+
+    def test_replay_speed(self, tmp_path):
+        """測試依錄製時間重播，速度倍數縮放等待時間"""
+        path = tmp_path / "ollama.jsonl"
+        entry = {
+            'key': '', 'model': 'qwen3:8b', 'system': '', 'prompt': 'p', 'temperature': 0.1,
+            'chunks': [[100.0, 'SELECT 1'], [200.0, '']], 'final': {'done': True}
+        }
+        path.write_text(json.dumps(entry) + '\n', encoding='utf-8')
+
+        start = time.perf_counter()
+        assert list(OllamaReplay(str(path), speed=1.0).stream(entry)) == ['SELECT 1', '']
+        assert time.perf_counter() - start >= 0.2
+
+        start = time.perf_counter()
+        list(OllamaReplay(str(path), speed=0.0).stream(entry))
+        assert time.perf_counter() - start < 0.1
+
+    def test_replay_respects_deadline(self, tmp_path):
+        """測試重播等待期間取消時中止生成"""
+        path = self.record(tmp_path)
+        client = self.replay_client(path, speed=1.0)
+        deadline = Deadline(10)
+        deadline.cancel("client disconnected")
+
+        assert client.generate("列出低庫存產品", "system", deadline=deadline) is None
+
+    def test_stream_without_done_fails(self):
+        """測試串流在 done 片段前結束時視為失敗（不返回截斷的文字）"""
+        response = stream_response(SQL)
+        lines = list(response.iter_lines.return_value)[:-1]
+        response.iter_lines.return_value = iter(lines)
+        client = OllamaClient(OllamaConfig(host="http://ollama", model="qwen3:8b"))
+
+        with patch('ambulance_inventory.ollama_client.requests.post', return_value=response):
+            assert client.generate("列出低庫存產品", "system") is None
+
+    def test_slow_stream_bounded_by_total_timeout(self):
+        """測試持續有片段的慢速串流在 Ollama 配置的總時限到時中止"""
+        def trickle():
+            while True:
+                time.sleep(0.05)
+                yield json.dumps({'response': 'S', 'done': False}).encode()
+
+        response = MagicMock()
+        response.__enter__.return_value = response
+        response.iter_lines.return_value = trickle()
+        client = OllamaClient(OllamaConfig(host="http://ollama", model="qwen3:8b", timeout=0.3))
+
+        start = time.perf_counter()
+        with patch('ambulance_inventory.ollama_client.requests.post', return_value=response):
+            assert client.generate("列出低庫存產品", "system") is None
+        assert time.perf_counter() - start < 1.0
+
+    def test_record_and_replay_exclusive(self, tmp_path):
+        """測試不可同時設定錄製與重播"""
+        with pytest.raises(ValueError):
+            OllamaClient(OllamaConfig(host="h", model="m", record_path=str(tmp_path / "a"), replay_path=str(tmp_path / "b")))
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,95 @@
+"""
+Unit tests for Profiler
+測試 CPU 堆疊取樣、單一呼叫的 cProfile/tracemalloc 剖析與同時剖析的限制
+"""
+
+import json
+import threading
+import time
+import pytest
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from ambulance_inventory.profiler import Profiler, ProfilerBusy
+from ambulance_inventory.config import ProfilingConfig
+
+
+def busy_loop(stop: threading.Event) -> None:
+    """持續佔用 CPU 直到 stop"""
+    while not stop.is_set():
+        sum(i * i for i in range(1000))
+
+
+def serialize_rows(count: int) -> list:
+    """產生 JSON 字串（配置記憶體）"""
+    return [json.dumps({'product_id': f"AED-{index:03d}", 'stock_quantity': index}) for index in range(count)]
+
+
+class TestProfiler:
+    """測試 Profiler"""
+
+    def setup_method(self):
+        """設置測試環境"""
+        self.profiler = Profiler(ProfilingConfig(enabled=True, max_duration=1.0, sample_interval=0.002))
+
+    def test_sample_cpu_collects_busy_threads(self):
+        """測試取樣其他執行緒的堆疊（collapsed 以執行緒名稱開頭，top 依函數彙總）"""
+        stop = threading.Event()
+        worker = threading.Thread(target=busy_loop, args=(stop,), name="busy-worker")
+        worker.start()
+        try:
+            collapsed = self.profiler.sample_cpu(0.1)
+            top = self.profiler.sample_cpu(0.1, output='top', limit=5)
+        finally:
+            stop.set()
+            worker.join()
+
+        first_line = collapsed.splitlines()[0]
+        assert first_line.startswith("busy-worker;threading.py:_bootstrap;")
+        assert "test_profiler.py:busy_loop" in first_line
+        assert int(first_line.rsplit(' ', 1)[1]) > 0
+        assert "test_profiler.py:" in top.splitlines()[2]
+
+    def test_profile_call_cpu(self):
+        """測試以 cProfile 剖析單一呼叫並返回原結果"""
+        result, report = self.profiler.profile_call('cpu', serialize_rows, 100)
+
+        assert len(result) == 100
+        assert "Ordered by: cumulative time" in report
+        assert "serialize_rows" in report
+
+    def test_profile_call_memory(self):
+        """測試 tracemalloc 顯示結果存活時的配置位置"""
+        result, report = self.profiler.profile_call('memory', serialize_rows, 2000)
+
+        assert len(result) == 2000
+        assert report.startswith("# tracemalloc 峰值")
+        assert "json" in report
+
+    def test_one_profile_at_a_time(self):
+        """測試剖析進行中時再次剖析拋出 ProfilerBusy，模式錯誤拋出 ValueError"""
+        def nested():
+            return self.profiler.sample_cpu(0.01)
+
+        with pytest.raises(ProfilerBusy):
+            self.profiler.profile_call('cpu', nested)
+        with pytest.raises(ValueError):
+            self.profiler.profile_call('disk', serialize_rows, 1)
+
+        assert self.profiler.sample_cpu(0.01, output='top').startswith("#")
+
+    def test_duration_capped(self):
+        """測試剖析時間不超過 max_duration"""
+        profiler = Profiler(ProfilingConfig(enabled=True, max_duration=0.05))
+        start = time.perf_counter()
+        report = profiler.memory_diff(30.0)
+
+        assert time.perf_counter() - start < 5.0
+        assert report.startswith("# tracemalloc 差異 0.05s")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -22,6 +22,13 @@ except ImportError:
 if HAS_PSYCOPG2:
     from ambulance_inventory.query_engine import QueryEngine
     from ambulance_inventory.config import OllamaConfig
+    from ambulance_inventory.utils.deadline import Deadline, QueryCancelled
+    from ambulance_inventory.adaptive_policy import AdaptiveLLMPolicy
+    from ambulance_inventory.config import AdaptiveConfig, RewriteConfig, CostGuardConfig
+    from ambulance_inventory.sql_rewriter import SqlRewriter
+    from ambulance_inventory.cost_guard import QueryCostGuard, QueryCostExceeded
+    from ambulance_inventory.response_cache import ResponseCache
+    from ambulance_inventory.config import ResponseCacheConfig
 
 
 # Skip all tests in this module if psycopg2 is not available
@@ -133,6 +140,205 @@ class TestQueryEngineModelParameter:
         assert 'llm_response' not in timing
 
 
+    def test_query_with_mode_passes_deadline(self):
+        """測試 query_with_mode 將請求時限傳遞到每個階段"""
+        self.mock_ollama_client.generate = Mock(
+            side_effect=["SELECT * FROM inventory", "找到結果"]
+        )
+        deadline = Deadline(60)
+
+        engine = QueryEngine(self.mock_db_client, self.mock_ollama_client)
+        engine.query_with_mode("列出庫存", use_llm_answer=True, deadline=deadline)
+
+        calls = self.mock_ollama_client.generate.call_args_list
+        assert all(call[1].get('deadline') is deadline for call in calls)
+        assert self.mock_db_client.execute_query.call_args[1].get('deadline') is deadline
+
+    def test_query_with_mode_cancelled(self):
+        """測試請求取消後不再執行後續階段"""
+        deadline = Deadline(60)
+
+        def generate(**kwargs):
+            deadline.cancel("client disconnected")
+            return None
+
+        self.mock_ollama_client.generate = Mock(side_effect=generate)
+
+        engine = QueryEngine(self.mock_db_client, self.mock_ollama_client)
+        with pytest.raises(QueryCancelled):
+            engine.query_with_mode("列出庫存", deadline=deadline)
+
+        self.mock_db_client.execute_query.assert_not_called()
+
+    def test_query_with_mode_skips_llm_when_degraded(self):
+        """測試降級模式下略過 LLM 回答但仍返回程式化結果"""
+        self.mock_ollama_client.generate = Mock(return_value="SELECT * FROM inventory")
+        policy = AdaptiveLLMPolicy(AdaptiveConfig(queue_slo=1, probe_interval=60))
+        events = {}
+
+        engine = QueryEngine(self.mock_db_client, self.mock_ollama_client, llm_policy=policy)
+        # 另一個進行中的 LLM 回答佔滿排隊深度
+        assert policy.admit()[0]
+        sql, llm_answer, formatted, html, results, timing = engine.query_with_mode(
+            "列出庫存",
+            use_llm_answer=True,
+            on_progress=lambda stage, payload: events.update(payload)
+        )
+
+        assert self.mock_ollama_client.generate.call_count == 1
+        assert llm_answer is None
+        assert formatted is not None
+        assert 'llm_response' not in timing
+        assert events.get('llm_skip_reason')
+        assert events['llm_skip_cause'] == 'load'
+
+    def test_query_with_mode_rewrites_before_execution(self):
+        """測試改寫後的 SQL 才送往資料庫執行"""
+        self.mock_ollama_client.generate = Mock(return_value="SELECT product_name FROM inventory")
+        rewriter = SqlRewriter(None, RewriteConfig(max_rows=20))
+
+        engine = QueryEngine(self.mock_db_client, self.mock_ollama_client, rewriter=rewriter)
+        sql, _, _, _, _, timing = engine.query_with_mode("列出產品", use_llm_answer=False)
+
+        assert sql == "SELECT product_name FROM inventory LIMIT 20"
+        assert self.mock_db_client.execute_query.call_args[0][0] == sql
+        assert 'sql_rewrite' in timing
+
+    def test_query_with_mode_skips_llm_for_large_estimate(self):
+        """測試預估筆數過多時執行前即決定略過 LLM 回答"""
+        self.mock_ollama_client.generate = Mock(return_value="SELECT product_name FROM inventory")
+        self.mock_db_client.explain = Mock(return_value={'Total Cost': 10.0, 'Plan Rows': 500})
+        guard = QueryCostGuard(self.mock_db_client, CostGuardConfig(llm_max_rows=100))
+        events = {}
+
+        engine = QueryEngine(self.mock_db_client, self.mock_ollama_client, cost_guard=guard)
+        _, llm_answer, formatted, _, _, timing = engine.query_with_mode(
+            "列出產品",
+            use_llm_answer=True,
+            on_progress=lambda stage, payload: events.update(payload)
+        )
+
+        assert self.mock_ollama_client.generate.call_count == 1
+        assert llm_answer is None
+        assert formatted is not None
+        assert events['estimated_rows'] == 500
+        assert events['llm_skip_cause'] == 'result_size'
+        assert 'cost_check' in timing
+
+    def test_query_with_mode_rejects_costly_query(self):
+        """測試成本過高的查詢不執行"""
+        self.mock_ollama_client.generate = Mock(return_value="SELECT COUNT(*) FROM inventory a, inventory b")
+        self.mock_db_client.explain = Mock(return_value={'Total Cost': 1e9, 'Plan Rows': 1})
+        guard = QueryCostGuard(self.mock_db_client, CostGuardConfig(max_cost=1000))
+
+        engine = QueryEngine(self.mock_db_client, self.mock_ollama_client, cost_guard=guard)
+        with pytest.raises(QueryCostExceeded):
+            engine.query_with_mode("交叉比對", use_llm_answer=False)
+
+        self.mock_db_client.execute_query.assert_not_called()
+
+    def test_query_with_mode_runs_locally_on_snapshot(self):
+        """測試快照支援的 SQL 不經過 EXPLAIN 與資料庫"""
+        self.mock_ollama_client.generate = Mock(return_value="SELECT product_name FROM inventory")
+        self.mock_db_client.explain = Mock()
+        snapshot = Mock()
+        snapshot.can_execute = Mock(return_value=True)
+        snapshot.execute = Mock(return_value=[{'product_name': 'AED'}])
+        guard = QueryCostGuard(self.mock_db_client, CostGuardConfig())
+
+        engine = QueryEngine(self.mock_db_client, self.mock_ollama_client, cost_guard=guard, snapshot=snapshot)
+        _, _, _, _, _, timing = engine.query_with_mode("列出產品", use_llm_answer=False)
+
+        snapshot.execute.assert_called_once()
+        assert 'cost_check' not in timing
+        self.mock_db_client.explain.assert_not_called()
+        self.mock_db_client.execute_query.assert_not_called()
+
+    def test_execute_query_prefers_cube(self):
+        """測試 cube 可回答的 GROUP BY 查詢不經過快照與資料庫"""
+        cube = Mock()
+        cube.execute = Mock(return_value=[{'category': 'AED', 'count': 2}])
+        snapshot = Mock()
+
+        engine = QueryEngine(self.mock_db_client, self.mock_ollama_client, snapshot=snapshot, cube=cube)
+        results = engine.execute_query("SELECT category, COUNT(*) FROM inventory GROUP BY category")
+
+        assert results == [{'category': 'AED', 'count': 2}]
+        snapshot.execute.assert_not_called()
+        self.mock_db_client.execute_query.assert_not_called()
+
+    def test_query_with_mode_routes_to_materialized_view(self):
+        """測試低庫存查詢改讀物化視圖後才做成本檢查與執行"""
+        self.mock_ollama_client.generate = Mock(
+            return_value="SELECT product_name FROM inventory WHERE stock_quantity < 10"
+        )
+        views = Mock()
+        views.route = Mock(return_value="SELECT product_name FROM low_stock_alert WHERE stock_quantity < 10")
+
+        engine = QueryEngine(self.mock_db_client, self.mock_ollama_client, materialized_views=views)
+        sql, _, _, _, _, _ = engine.query_with_mode("列出低庫存產品", use_llm_answer=False)
+
+        assert sql == "SELECT product_name FROM low_stock_alert WHERE stock_quantity < 10"
+        assert self.mock_db_client.execute_query.call_args[0][0] == sql
+
+    def test_query_with_mode_uses_response_cache(self):
+        """測試重複問題在資料未變時不再呼叫 LLM，結果改變時重新產生回答"""
+        self.mock_ollama_client.generate = Mock(side_effect=["SELECT * FROM inventory", "有 10 台 AED"])
+        self.mock_db_client.format_results = Mock(side_effect=lambda rows, limit=20: rows)
+        cache = ResponseCache(ResponseCacheConfig())
+
+        engine = QueryEngine(self.mock_db_client, self.mock_ollama_client, response_cache=cache)
+        first = engine.query_with_mode("列出庫存")
+        second = engine.query_with_mode(" 列出庫存 ")
+
+        assert second[:2] == first[:2] == ("SELECT * FROM inventory", "有 10 台 AED")
+        assert self.mock_ollama_client.generate.call_count == 2
+
+        self.mock_db_client.execute_query.return_value = [{"id": 1, "name": "AED", "stock_quantity": 9}]
+        self.mock_ollama_client.generate = Mock(return_value="有 9 台 AED")
+        assert engine.query_with_mode("列出庫存")[1] == "有 9 台 AED"
+        assert self.mock_ollama_client.generate.call_count == 1
+
+    def test_cached_response_bypasses_degraded_policy(self):
+        """測試回答快取命中時不受降級策略影響"""
+        self.mock_ollama_client.generate = Mock(return_value="有 10 台 AED")
+        policy = AdaptiveLLMPolicy(AdaptiveConfig(queue_slo=1, probe_interval=60))
+        cache = ResponseCache(ResponseCacheConfig())
+        results = [{"id": 1, "name": "AED", "stock_quantity": 10}]
+
+        engine = QueryEngine(self.mock_db_client, self.mock_ollama_client, llm_policy=policy, response_cache=cache)
+        assert engine.generate_response_adaptive("列出庫存", results) == ("有 10 台 AED", "")
+        assert policy.admit()[0]
+        assert engine.generate_response_adaptive("列出庫存", results) == ("有 10 台 AED", "")
+
+        assert self.mock_ollama_client.generate.call_count == 1
+        assert cache.stats()['namespaces']['answer'] == {'entries': 1, 'hits': 1, 'misses': 1, 'hit_rate': 0.5}
+
+    def test_failed_llm_answer_not_recorded(self):
+        """測試 LLM 回答失敗時改用簡單格式化，且不計入延遲"""
+        self.mock_ollama_client.generate = Mock(return_value=None)
+        policy = AdaptiveLLMPolicy(AdaptiveConfig())
+        results = [{"id": 1, "name": "AED", "stock_quantity": 10}]
+
+        engine = QueryEngine(self.mock_db_client, self.mock_ollama_client, llm_policy=policy)
+        answer, skip_reason = engine.generate_response_adaptive("列出庫存", results)
+
+        assert answer and skip_reason == ""
+        assert policy.status()['latency_ewma'] is None
+        assert policy.status()['in_flight'] == 0
+
+    def test_invalid_sql_not_cached(self):
+        """測試驗證失敗的 SQL 不寫入快取"""
+        self.mock_ollama_client.generate = Mock(return_value="DELETE FROM inventory")
+        cache = ResponseCache(ResponseCacheConfig())
+
+        engine = QueryEngine(self.mock_db_client, self.mock_ollama_client, response_cache=cache)
+        engine.generate_sql("刪除資料")
+        engine.generate_sql("刪除資料")
+
+        assert self.mock_ollama_client.generate.call_count == 2
+
+
 class TestQueryEngineFormatting:
     """測試 QueryEngine 的格式化功能"""
 
@@ -0,0 +1,214 @@
+"""
+Unit tests for QueryLog
+測試查詢日誌的背景批次寫入、慢問題/SQL 指紋/百分位數分析，以及查詢引擎寫入的欄位（使用 Mock）
+"""
+
+import sqlite3
+import time
+import pytest
+from unittest.mock import Mock
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from ambulance_inventory.config import QueryLogConfig, ResponseCacheConfig
+from ambulance_inventory.query_log import QueryLog, QueryLogEntry, add_tokens, collect_usage, note_usage
+
+# Check if psycopg2 is available
+try:
+    import psycopg2
+    HAS_PSYCOPG2 = True
+except ImportError:
+    HAS_PSYCOPG2 = False
+
+if HAS_PSYCOPG2:
+    from ambulance_inventory.query_engine import QueryEngine
+    from ambulance_inventory.response_cache import ResponseCache
+
+
+def make_entry(question="列出低庫存產品", model="qwen3:8b", total=1.0, **fields):
+    """建立查詢紀錄"""
+    fields.setdefault('timing', {'sql_generation': total * 0.8, 'query_execution': total * 0.1})
+    return QueryLogEntry(
+        question=question,
+        question_key=question.strip(),
+        model=model,
+        mode='llm',
+        total_seconds=total,
+        **fields
+    )
+
+
+class TestQueryLog:
+    """測試 QueryLog"""
+
+    def setup_method(self):
+        """設置測試環境"""
+        self.logs = []
+
+    def teardown_method(self):
+        """關閉寫入執行緒"""
+        for log in self.logs:
+            log.close()
+
+    def open_log(self, tmp_path, **overrides):
+        """開啟測試用查詢日誌"""
+        overrides.setdefault('flush_interval', 0.05)
+        config = QueryLogConfig(path=str(tmp_path / "query_log.db"), **overrides)
+        log = QueryLog(config)
+        self.logs.append(log)
+        return log
+
+    def test_batched_write(self, tmp_path):
+        """測試紀錄由背景執行緒批次寫入 SQLite"""
+        log = self.open_log(tmp_path, batch_size=10)
+        for _ in range(25):
+            log.record(make_entry(sql_fingerprint="SELECT * FROM inventory WHERE stock_quantity < ?"))
+        log.flush()
+
+        stats = log.stats()
+        assert stats['written'] == stats['entries'] == 25
+        assert stats['pending'] == 0 and stats['dropped'] == 0
+
+    def test_close_writes_pending_entries(self, tmp_path):
+        """測試關閉時寫出佇列中剩餘的紀錄，重新開啟後仍可查詢"""
+        log = self.open_log(tmp_path, flush_interval=5.0)
+        for _ in range(3):
+            log.record(make_entry())
+        log.close()
+
+        reopened = self.open_log(tmp_path)
+        assert reopened.stats()['entries'] == 3
+
+    def test_disabled(self, tmp_path):
+        """測試停用時不建立檔案也不記錄"""
+        log = self.open_log(tmp_path, enabled=False)
+        log.record(make_entry())
+
+        assert not log.active
+        assert log.stats()['entries'] == 0
+        assert not (tmp_path / "query_log.db").exists()
+
+    def test_slowest_questions(self, tmp_path):
+        """測試依正規化問題合併並依平均耗時排序"""
+        log = self.open_log(tmp_path)
+        log.record(make_entry("列出低庫存產品", total=2.0, prompt_tokens=300, completion_tokens=20))
+        log.record(make_entry("列出低庫存產品", total=4.0, error="SQL execution failed"))
+        log.record(make_entry("AED 庫存", total=1.0))
+        log.record(make_entry("舊的問題", total=9.0, created_at=time.time() - 7200))
+        log.flush()
+
+        slowest = log.slowest_questions(limit=10, hours=1.0)
+        assert [item['question_key'] for item in slowest] == ["列出低庫存產品", "AED 庫存"]
+        assert slowest[0]['count'] == 2
+        assert slowest[0]['avg_seconds'] == 3.0 and slowest[0]['max_seconds'] == 4.0
+        assert slowest[0]['errors'] == 1
+        assert slowest[0]['avg_tokens'] == 320.0
+
+    def test_top_fingerprints(self, tmp_path):
+        """測試依指紋計數，並統計不同問題數、SQL 快取命中與資料來源"""
+        log = self.open_log(tmp_path)
+        low_stock = "SELECT product_name FROM inventory WHERE stock_quantity < ?"
+        log.record(make_entry("低庫存", sql_fingerprint=low_stock, sql_cache='miss', source='snapshot'))
+        log.record(make_entry("低庫存", sql_fingerprint=low_stock, sql_cache='hit', source='snapshot'))
+        log.record(make_entry("庫存不足的產品", sql_fingerprint=low_stock, sql_cache='miss', source='database'))
+        log.record(make_entry("分類統計", sql_fingerprint="SELECT category, COUNT(*) FROM inventory GROUP BY category"))
+        log.record(make_entry("失敗", sql_fingerprint=None))
+        log.flush()
+
+        top = log.top_fingerprints(limit=1)
+        assert len(top) == 1
+        assert top[0]['fingerprint'] == low_stock
+        assert top[0]['count'] == 3 and top[0]['distinct_questions'] == 2
+        assert top[0]['sql_cache_hits'] == 1
+        assert top[0]['sources'] == {'snapshot': 2, 'database': 1}
+        assert top[0]['avg_execution_seconds'] == 0.1
+
+    def test_stage_percentiles(self, tmp_path):
+        """測試各模型、各階段的最近排名法百分位數"""
+        log = self.open_log(tmp_path)
+        for index in range(1, 101):
+            log.record(make_entry(total=index / 10, timing={'sql_generation': index / 100}))
+        log.record(make_entry(model="llama3", total=0.5, timing={'sql_generation': 0.4}))
+        log.flush()
+
+        stages = {(item['model'], item['stage']): item for item in log.stage_percentiles()}
+        assert set(stages) == {('llama3', 'sql_generation'), ('llama3', 'total'),
+                               ('qwen3:8b', 'sql_generation'), ('qwen3:8b', 'total')}
+        generation = stages[('qwen3:8b', 'sql_generation')]
+        assert generation['count'] == 100
+        assert (generation['p50'], generation['p95'], generation['p99']) == (0.5, 0.95, 0.99)
+        assert stages[('qwen3:8b', 'total')]['p99'] == 9.9
+        assert stages[('llama3', 'total')]['p50'] == 0.5
+
+    def test_usage_collection(self):
+        """測試 collect_usage 區塊內累加 token 數與記錄欄位，區塊外不做事"""
+        add_tokens(10, 5)
+        with collect_usage() as usage:
+            add_tokens(100, 20)
+            add_tokens(50, None)
+            note_usage(sql_cache='hit')
+
+        assert usage == {'prompt_tokens': 150, 'completion_tokens': 20, 'sql_cache': 'hit'}
+
+
+@pytest.mark.skipif(not HAS_PSYCOPG2, reason="psycopg2 not installed (required for QueryEngine import)")
+class TestQueryEngineLogging:
+    """測試查詢引擎寫入查詢日誌"""
+
+    def setup_method(self):
+        """設置測試環境"""
+        self.mock_db = Mock()
+        self.mock_db.execute_query = Mock(return_value=[{'product_name': 'AED', 'stock_quantity': 5}])
+        self.mock_db.format_results = Mock(side_effect=lambda results, limit=20: results)
+        self.mock_ollama = Mock()
+        self.mock_ollama.config.model = "qwen3:8b"
+
+    def read_rows(self, tmp_path, log):
+        """寫出並讀取所有紀錄"""
+        log.close()
+        db = sqlite3.connect(str(tmp_path / "query_log.db"))
+        db.row_factory = sqlite3.Row
+        rows = [dict(row) for row in db.execute("SELECT * FROM query_log ORDER BY id")]
+        db.close()
+        return rows
+
+    def test_query_with_mode_logs_entry(self, tmp_path):
+        """測試記錄正規化問題、SQL 指紋、筆數、來源、token 數與快取結果"""
+        def generate(prompt, **kwargs):
+            add_tokens(200, 15)
+            return "SELECT product_name FROM inventory WHERE stock_quantity < 10"
+
+        self.mock_ollama.generate = Mock(side_effect=generate)
+        log = QueryLog(QueryLogConfig(path=str(tmp_path / "query_log.db")))
+        engine = QueryEngine(
+            self.mock_db, self.mock_ollama, response_cache=ResponseCache(ResponseCacheConfig()), query_log=log
+        )
+        engine.query_with_mode(" 低庫存  產品 ", use_llm_answer=False)
+        engine.query_with_mode("低庫存 產品", use_llm_answer=False)
+
+        first, second = self.read_rows(tmp_path, log)
+        assert first['question_key'] == second['question_key'] == "低庫存 產品"
+        assert first['sql_fingerprint'] == "SELECT product_name FROM inventory WHERE stock_quantity < ?"
+        assert (first['row_count'], first['source'], first['mode']) == (1, 'database', 'fast')
+        assert (first['prompt_tokens'], first['completion_tokens'], first['sql_cache']) == (200, 15, 'miss')
+        assert (second['prompt_tokens'], second['sql_cache']) == (None, 'hit')
+        assert first['error'] is None and first['total_seconds'] is not None
+
+    def test_failed_query_logged(self, tmp_path):
+        """測試 SQL 執行失敗的查詢也會記錄錯誤"""
+        self.mock_ollama.generate = Mock(return_value="SELECT * FROM inventory")
+        self.mock_db.execute_query = Mock(side_effect=RuntimeError("connection refused"))
+        log = QueryLog(QueryLogConfig(path=str(tmp_path / "query_log.db")))
+        engine = QueryEngine(self.mock_db, self.mock_ollama, query_log=log)
+        engine.query_with_mode("列出庫存", use_llm_answer=False)
+
+        rows = self.read_rows(tmp_path, log)
+        assert rows[0]['error'] == "SQL execution failed"
+        assert rows[0]['row_count'] is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,79 @@
+"""
+Unit tests for ResponseCache
+測試 LLM 快取的 TTL/LRU 淘汰、命中統計與 SQLite 持久化
+"""
+
+import pytest
+from unittest.mock import patch
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from ambulance_inventory.response_cache import ResponseCache
+from ambulance_inventory.config import ResponseCacheConfig
+
+
+class TestResponseCache:
+    """測試 ResponseCache"""
+
+    def test_get_and_put(self):
+        """測試以組成值為鍵讀寫，不同命名空間互不影響"""
+        cache = ResponseCache(ResponseCacheConfig())
+        cache.put('answer', ('問題', 'model', 'abc'), "回答")
+
+        assert cache.get('answer', ('問題', 'model', 'abc')) == "回答"
+        assert cache.get('answer', ('問題', 'model', 'def')) is None
+        assert cache.get('sql', ('問題', 'model', 'abc')) is None
+        assert cache.stats()['namespaces']['answer']['hit_rate'] == 0.5
+
+    def test_ttl_expiry(self):
+        """測試過期項目視為未命中"""
+        cache = ResponseCache(ResponseCacheConfig(ttl=10))
+        with patch('ambulance_inventory.response_cache.time.time', return_value=1000.0):
+            cache.put('sql', ('q',), "SELECT 1")
+        with patch('ambulance_inventory.response_cache.time.time', return_value=1009.0):
+            assert cache.get('sql', ('q',)) == "SELECT 1"
+        with patch('ambulance_inventory.response_cache.time.time', return_value=1011.0):
+            assert cache.get('sql', ('q',)) is None
+        assert cache.stats()['namespaces']['sql']['entries'] == 0
+
+    def test_lru_eviction(self):
+        """測試超過 max_entries 時淘汰最久未使用的項目"""
+        cache = ResponseCache(ResponseCacheConfig(max_entries=2))
+        cache.put('sql', ('a',), "A")
+        cache.put('sql', ('b',), "B")
+        cache.get('sql', ('a',))
+        cache.put('sql', ('c',), "C")
+
+        assert cache.get('sql', ('b',)) is None
+        assert cache.get('sql', ('a',)) == "A"
+        assert cache.stats()['evictions'] == 1
+
+    def test_disabled(self):
+        """測試停用時不快取"""
+        cache = ResponseCache(ResponseCacheConfig(enabled=False))
+        cache.put('sql', ('a',), "A")
+
+        assert cache.get('sql', ('a',)) is None
+
+    def test_persistence(self, tmp_path):
+        """測試重新建立快取時載入未過期且未被清除的項目"""
+        path = str(tmp_path / "cache.sqlite")
+        cache = ResponseCache(ResponseCacheConfig(path=path))
+        cache.put('answer', ('a',), "A")
+        cache.put('answer', ('b',), "B")
+        cache.close()
+
+        reloaded = ResponseCache(ResponseCacheConfig(path=path))
+        assert reloaded.stats()['persistent']
+        assert reloaded.get('answer', ('a',)) == "A"
+        assert reloaded.clear() == 2
+        reloaded.close()
+
+        assert ResponseCache(ResponseCacheConfig(path=path)).get('answer', ('b',)) is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
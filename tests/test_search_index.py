@@ -0,0 +1,177 @@
+"""
+Unit tests for SearchIndex
+測試產品關鍵字倒排索引的切詞、BM25 排序、增量更新與資料庫回退（使用 Mock）
+"""
+
+import pytest
+from datetime import datetime
+from decimal import Decimal
+from unittest.mock import Mock
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Check if psycopg2 and numpy are available
+try:
+    import psycopg2
+    import numpy
+    HAS_DEPENDENCIES = True
+except ImportError:
+    HAS_DEPENDENCIES = False
+
+if HAS_DEPENDENCIES:
+    from ambulance_inventory import search_index as search_module
+    from ambulance_inventory.search_index import SearchIndex, tokenize_text
+    from ambulance_inventory.config import SearchConfig
+
+
+pytestmark = pytest.mark.skipif(
+    not HAS_DEPENDENCIES,
+    reason="psycopg2/numpy not installed (required for search index)"
+)
+
+
+def make_row(product_id, name, brand, model=None, specifications=None, supplier="醫療器材公司"):
+    """建立 inventory 資料列"""
+    return {
+        'product_id': product_id, 'product_name': name, 'category': '測試分類', 'brand': brand,
+        'model': model, 'specifications': specifications, 'stock_quantity': 5,
+        'unit_price': Decimal('1000'), 'supplier': supplier, 'last_updated': datetime(2026, 1, 1)
+    }
+
+
+ROWS = [
+    make_row('AED-001', '自動體外除顫器', 'Philips', 'HeartStart FRx', '半自動、語音指導'),
+    make_row('AED-002', '全自動體外除顫器', 'ZOLL', 'AED Plus', '全自動、CPR回饋'),
+    make_row('STR-001', '折疊式擔架', 'Ferno', 'Model 35-A', '鋁合金、可折疊'),
+    make_row('STR-002', '鏟式擔架', 'Ferno', 'Scoop EXL', '可分離'),
+    make_row('MON-001', '生理監視器', 'Philips', 'IntelliVue X3', '血氧、心電圖'),
+]
+
+
+class TestTokenize:
+    """測試 tokenize_text"""
+
+    def test_cjk_bigrams_and_ascii_words(self):
+        """測試中文切成 bigram、英數字以單字為單位並轉小寫"""
+        assert tokenize_text("Philips 除顫器 FRx-2") == ['philips', '除顫', '顫器', 'frx', '2']
+
+    def test_single_character_and_fullwidth(self):
+        """測試單一中文字保留原字，全形英數字正規化"""
+        assert tokenize_text("氧 ＡＥＤ") == ['氧', 'aed']
+        assert tokenize_text(None) == []
+
+
+class TestSearchIndex:
+    """測試 SearchIndex"""
+
+    def setup_method(self):
+        """設置測試環境"""
+        self.index = SearchIndex(None, SearchConfig(merge_ratio=1.0))
+        self.index.reset(ROWS)
+
+    def test_all_terms_ranked(self):
+        """測試所有詞都需符合，品名符合的分數高於僅規格符合"""
+        result = self.index.search("除顫器")
+
+        assert result.source == 'index'
+        assert result.matched_all_terms
+        assert result.total == 2
+        assert [item['product_id'] for item in result.results] == ['AED-001', 'AED-002']
+
+        result = self.index.search("Ferno 擔架")
+        assert {item['product_id'] for item in result.results} == {'STR-001', 'STR-002'}
+
+        result = self.index.search("Philips 血氧")
+        assert [item['product_id'] for item in result.results] == ['MON-001']
+
+    def test_model_lookup(self):
+        """測試型號查詢與回傳欄位"""
+        result = self.index.search("scoop exl")
+
+        assert result.total == 1
+        item = result.results[0]
+        assert item['product_id'] == 'STR-002'
+        assert item['score'] > 0
+        assert 'specifications' not in item
+
+    def test_fallback_to_any_term(self):
+        """測試沒有文件符合所有詞時改為符合任一詞"""
+        result = self.index.search("Masimo 擔架")
+
+        assert not result.matched_all_terms
+        assert result.total == 2
+        assert self.index.search("Masimo").total == 0
+
+    def test_limit(self):
+        """測試筆數上限不影響符合筆數"""
+        result = self.index.search("醫療器材", limit=2)
+
+        assert len(result.results) == 2
+        assert result.total == 5
+
+    def test_incremental_update(self):
+        """測試新增、變更與刪除寫入差異區段"""
+        self.index.update(None, make_row('AED-003', '除顫器訓練機', 'Laerdal'))
+        self.index.update(ROWS[0], dict(ROWS[0], product_name='自動體外心臟電擊器', specifications=None))
+        self.index.update(ROWS[1], None)
+
+        result = self.index.search("除顫器")
+        assert [item['product_id'] for item in result.results] == ['AED-003']
+        assert self.index.search("電擊").results[0]['product_id'] == 'AED-001'
+
+        stats = self.index.stats()
+        assert stats['delta_documents'] == 2
+        assert stats['removed_documents'] == 2
+        assert stats['document_count'] == 5
+
+    def test_merge(self):
+        """測試差異區段超過 merge_ratio 時合併重建"""
+        self.index.config.merge_ratio = 0.2
+        self.index.update(ROWS[2], dict(ROWS[2], brand='Stryker'))
+        self.index.update(ROWS[3], None)
+
+        stats = self.index.stats()
+        assert stats['merges'] == 1
+        assert stats['delta_documents'] == 0
+        assert stats['document_count'] == 4
+        assert [item['product_id'] for item in self.index.search("Stryker").results] == ['STR-001']
+
+    def test_early_termination_on_common_terms(self, monkeypatch):
+        """測試主詞非常常見時依分數提前結束，前幾名與完整計分一致且符合筆數為估計值"""
+        rows = [
+            make_row(f'P{number:05d}', '擔架' + '加長' * (number % 5), 'Ferno', supplier=f'供應商{number % 3}')
+            for number in range(3000)
+        ]
+        self.index.reset(rows)
+        exact = self.index.search("擔架 ferno", limit=5)
+        assert not exact.total_estimated
+
+        monkeypatch.setattr(search_module, '_SCAN_LIMIT', 100)
+        monkeypatch.setattr(search_module, '_CHUNK', 64)
+        estimated = self.index.search("擔架 ferno", limit=5)
+
+        assert estimated.total_estimated
+        assert estimated.total == exact.total == 3000
+        assert [item['score'] for item in estimated.results] == [item['score'] for item in exact.results]
+
+    def test_database_fallback(self):
+        """測試索引未載入時以 ILIKE 查詢資料庫並跳脫萬用字元"""
+        mock_db = Mock()
+        mock_db.execute_query = Mock(return_value=[{'product_id': 'AED-001', 'unit_price': Decimal('1000')}])
+        index = SearchIndex(mock_db, SearchConfig())
+
+        result = index.search("100% Philips", limit=5)
+
+        assert result.source == 'database'
+        assert result.results == [{'product_id': 'AED-001', 'unit_price': 1000.0}]
+        sql, params = mock_db.execute_query.call_args[0]
+        assert sql.count('product_name ILIKE %s') == 2
+        assert params[0] == '%100\\%%'
+        assert params[-1] == 5
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,171 @@
+"""
+Unit tests for sql_lexer module
+測試 SQL 詞法分析、安全判定與指紋
+"""
+
+import pytest
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from ambulance_inventory.utils.sql_lexer import (
+    tokenize, analyze_sql, fingerprint_sql, TokenType
+)
+from ambulance_inventory.utils.validators import (
+    is_dangerous_sql, validate_sql, clean_sql, inspect_sql
+)
+
+
+class TestTokenize:
+    """測試 tokenize"""
+
+    def test_basic_tokens(self):
+        """測試基本 token 類型"""
+        tokens = tokenize("SELECT name FROM inventory WHERE price > 100")
+        types = [token.type for token in tokens]
+
+        assert types == [
+            TokenType.KEYWORD, TokenType.IDENTIFIER, TokenType.KEYWORD, TokenType.IDENTIFIER,
+            TokenType.KEYWORD, TokenType.IDENTIFIER, TokenType.OPERATOR, TokenType.NUMBER
+        ]
+
+    def test_string_with_escaped_quote(self):
+        """測試字串中的跳脫引號"""
+        tokens = tokenize("SELECT * FROM t WHERE name = 'O''Brien'")
+        assert tokens[-1].type == TokenType.STRING
+        assert tokens[-1].value == "'O''Brien'"
+
+    def test_chinese_identifiers(self):
+        """測試中文字元視為識別字"""
+        tokens = tokenize("SELECT 品名 FROM inventory")
+        assert tokens[1].type == TokenType.IDENTIFIER
+
+
+class TestAnalyzeSql:
+    """測試 analyze_sql"""
+
+    def test_keyword_in_string_is_safe(self):
+        """測試字串常值中的危險關鍵字不誤判"""
+        analysis = analyze_sql("SELECT * FROM inventory WHERE product_name ILIKE '%drop%'")
+        assert analysis.dangerous_keyword is None
+        assert analysis.danger() == (False, "")
+
+    def test_comment_in_string_is_safe(self):
+        """測試字串常值中的註解符號不誤判"""
+        is_dangerous, _ = is_dangerous_sql("SELECT * FROM inventory WHERE model = 'A--B'")
+        assert is_dangerous is False
+
+    def test_semicolon_in_string(self):
+        """測試字串常值中的分號不計為多語句"""
+        analysis = analyze_sql("SELECT * FROM inventory WHERE notes = 'a;b;c';")
+        assert analysis.statement_count == 1
+
+    def test_multiple_statements(self):
+        """測試多語句偵測"""
+        analysis = analyze_sql("SELECT * FROM a; SELECT * FROM b")
+        assert analysis.statement_count == 2
+        assert analysis.danger()[0] is True
+
+    def test_unterminated_string(self):
+        """測試未結束的字串視為危險"""
+        is_dangerous, reason = is_dangerous_sql("SELECT * FROM inventory WHERE brand = 'Zoll")
+        assert is_dangerous is True
+        assert "未結束" in reason
+
+    def test_escape_string_backslash_quote(self):
+        """測試 E'...' 中的反斜線跳脫：E'\\'' 是完整的常值，之後的語句與註解仍會被偵測"""
+        tokens = tokenize("SELECT 1 FROM inventory WHERE brand = E'\\'' ; DROP TABLE inventory; --'")
+        assert (tokens[7].type, tokens[7].value) == (TokenType.STRING, "E'\\''")
+        analysis = analyze_sql("SELECT product_name FROM inventory WHERE brand = E'\\'' ; DROP TABLE inventory; --'")
+        assert analysis.dangerous_keyword == 'DROP'
+        assert analysis.statement_count > 1 and analysis.has_comment
+
+    def test_escape_string_safe_literal(self):
+        """測試 E'...' 中跳脫的引號不結束字串"""
+        analysis = analyze_sql("SELECT * FROM inventory WHERE brand = e'O\\'Neil; DROP'")
+        assert analysis.danger() == (False, "")
+        assert analysis.fingerprint == "SELECT * FROM inventory WHERE brand = ?"
+
+    def test_unterminated_escape_string(self):
+        """測試未結束的 E'...'（以反斜線跳脫結尾引號）視為危險"""
+        is_dangerous, reason = is_dangerous_sql("SELECT * FROM inventory WHERE brand = E'\\'")
+        assert is_dangerous is True
+        assert "未結束" in reason
+
+    def test_dollar_quote_rejected(self):
+        """測試 $ 引號字串無法可靠分析，一律視為危險"""
+        is_dangerous, reason = is_dangerous_sql("SELECT * FROM inventory WHERE brand = $q$Zoll$q$")
+        assert is_dangerous is True
+        assert "$" in reason
+
+    def test_parens_in_string_ignored(self):
+        """測試字串常值中的括號不影響括號匹配"""
+        is_valid, _ = validate_sql("SELECT * FROM inventory WHERE product_name = 'AED (Pro'")
+        assert is_valid is True
+
+    def test_tables_and_columns(self):
+        """測試解析引用的資料表與欄位"""
+        analysis = analyze_sql(
+            "SELECT i.product_name, SUM(i.stock_quantity) AS total "
+            "FROM inventory i WHERE i.category = 'AED' GROUP BY i.product_name"
+        )
+        assert analysis.tables == {'inventory'}
+        assert analysis.columns == {'product_name', 'stock_quantity', 'category'}
+
+    def test_extract_from_is_not_table(self):
+        """測試 EXTRACT(... FROM ...) 中的欄位不視為資料表"""
+        analysis = analyze_sql(
+            "SELECT EXTRACT(YEAR FROM created_at) FROM inventory"
+        )
+        assert analysis.tables == {'inventory'}
+
+
+class TestFingerprint:
+    """測試 fingerprint_sql"""
+
+    def test_literals_replaced(self):
+        """測試常值以 ? 取代"""
+        assert fingerprint_sql("select * from inventory where price > 100 and brand = 'Zoll'") == \
+            "SELECT * FROM inventory WHERE price > ? AND brand = ?"
+
+    def test_whitespace_and_case_normalized(self):
+        """測試空白與大小寫差異產生相同指紋"""
+        a = analyze_sql("SELECT name\n  FROM   inventory WHERE price>1;")
+        b = analyze_sql("select NAME from inventory where price > 2")
+        assert a.fingerprint == b.fingerprint
+        assert a.fingerprint_id == b.fingerprint_id
+
+    def test_in_list_collapsed(self):
+        """測試 IN 清單合併為單一 ?"""
+        assert fingerprint_sql("SELECT * FROM t WHERE brand IN ('A', 'B', 'C')") == \
+            fingerprint_sql("SELECT * FROM t WHERE brand IN ('A')")
+
+    def test_canonical_keeps_literals(self):
+        """測試 canonical 保留常值"""
+        analysis = analyze_sql("select * from inventory where brand = 'Zoll';")
+        assert analysis.canonical == "SELECT * FROM inventory WHERE brand = 'Zoll'"
+
+
+class TestInspectSql:
+    """測試 inspect_sql"""
+
+    def test_matches_clean_then_analyze(self):
+        """測試共用 token 的分析結果與清理後重新分析一致"""
+        raw = "```sql\nSELECT product_name,\n  brand\nFROM inventory\nWHERE price > 100;\n```"
+        cleaned, analysis = inspect_sql(raw)
+
+        assert cleaned == clean_sql(raw)
+        assert analysis.fingerprint == analyze_sql(cleaned).fingerprint
+        assert analysis.tables == {'inventory'}
+
+    def test_explanation_lines_excluded(self):
+        """測試解釋文字不進入分析結果"""
+        _, analysis = inspect_sql("Here is the query:\nSELECT * FROM inventory\nThis drops nothing.")
+        assert analysis.dangerous_keyword is None
+        assert analysis.fingerprint == "SELECT * FROM inventory"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
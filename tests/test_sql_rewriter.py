@@ -0,0 +1,198 @@
+"""
+Unit tests for SqlRewriter
+測試執行前的 SQL 改寫（使用 Mock）
+"""
+
+import pytest
+from unittest.mock import Mock
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Check if psycopg2 is available
+try:
+    import psycopg2
+    HAS_PSYCOPG2 = True
+except ImportError:
+    HAS_PSYCOPG2 = False
+
+if HAS_PSYCOPG2:
+    from ambulance_inventory.sql_rewriter import SqlRewriter, like_to_regex
+    from ambulance_inventory.config import RewriteConfig
+
+
+pytestmark = pytest.mark.skipif(
+    not HAS_PSYCOPG2,
+    reason="psycopg2 not installed (required for DatabaseClient import)"
+)
+
+
+KNOWN_VALUES = {
+    'category': ['AED除顫器', '擔架設備', '氧氣設備', '監視器'],
+    'brand': ['Philips', 'ZOLL', 'Ferno', 'Mindray'],
+}
+
+
+class TestSqlRewriter:
+    """測試 SqlRewriter"""
+
+    def setup_method(self):
+        """設置測試環境"""
+        def execute_query(sql, deadline=None):
+            column = 'category' if 'DISTINCT category' in sql else 'brand'
+            return [{'value': value} for value in KNOWN_VALUES[column]]
+
+        self.mock_db = Mock()
+        self.mock_db.execute_query = Mock(side_effect=execute_query)
+        self.mock_db.explain = Mock(
+            side_effect=lambda sql, deadline=None: {'Total Cost': 20.0 if 'ILIKE' in sql else 8.0}
+        )
+        self.rewriter = SqlRewriter(self.mock_db, RewriteConfig(max_rows=50))
+
+    def test_ilike_to_equality(self):
+        """測試 ILIKE 唯一對應已知值時改為等值比對"""
+        result = self.rewriter.rewrite(
+            "SELECT product_name FROM inventory WHERE category ILIKE '%AED%' LIMIT 10"
+        )
+        assert result.sql == "SELECT product_name FROM inventory WHERE category = 'AED除顫器' LIMIT 10"
+
+    def test_ilike_to_in_list(self):
+        """測試 ILIKE 對應多個已知值時改為 IN 清單"""
+        result = self.rewriter.rewrite(
+            "SELECT product_name FROM inventory WHERE category ILIKE '%設備' LIMIT 10"
+        )
+        assert "category IN ('擔架設備', '氧氣設備')" in result.sql
+
+    def test_ilike_without_match_unchanged(self):
+        """測試無對應已知值時保留 ILIKE"""
+        sql = "SELECT product_name FROM inventory WHERE brand ILIKE '%Laerdal%' LIMIT 10"
+        assert self.rewriter.rewrite(sql).sql == sql
+
+    @pytest.mark.parametrize("sql", [
+        "SELECT product_name FROM inventory WHERE category ILIKE '%' || 'AED' || '%' LIMIT 10",
+        "SELECT product_name FROM inventory WHERE 'x' || category ILIKE '%AED%' LIMIT 10",
+        "SELECT product_name FROM inventory WHERE category ILIKE '%AED!%' ESCAPE '!' LIMIT 10",
+    ])
+    def test_ilike_inside_expression_unchanged(self, sql):
+        """測試 ILIKE 兩側不是完整條件（字串串接、ESCAPE）時不改寫"""
+        assert self.rewriter.rewrite(sql).sql == sql
+
+    def test_ilike_in_parenthesized_condition(self):
+        """測試括號內、後接 OR 的 ILIKE 仍會改寫"""
+        result = self.rewriter.rewrite(
+            "SELECT product_name FROM inventory WHERE (category ILIKE '%AED%' OR brand = 'ZOLL') LIMIT 10"
+        )
+        assert result.sql == (
+            "SELECT product_name FROM inventory WHERE (category = 'AED除顫器' OR brand = 'ZOLL') LIMIT 10"
+        )
+
+    def test_new_value_from_snapshot_update(self):
+        """測試快照通知新類別後，ILIKE 改寫包含新值（快取未過期也不漏掉新資料列）"""
+        sql = "SELECT product_name FROM inventory WHERE category ILIKE '%設備' LIMIT 10"
+        assert "category IN ('擔架設備', '氧氣設備')" in self.rewriter.rewrite(sql).sql
+
+        self.rewriter.update(None, {'product_id': 'NEW-1', 'category': '照明設備', 'brand': 'ZOLL'})
+        assert "category IN ('擔架設備', '氧氣設備', '照明設備')" in self.rewriter.rewrite(sql).sql
+
+    def test_values_reset_from_snapshot(self):
+        """測試快照完整載入時直接以資料列重建值域，不查詢資料庫"""
+        self.rewriter.reset([
+            {'product_id': 'A', 'category': '急救包', 'brand': 'ZOLL'},
+            {'product_id': 'B', 'category': None, 'brand': 'Ferno'},
+        ])
+        assert self.rewriter.known_values() == {'category': ['急救包'], 'brand': ['Ferno', 'ZOLL']}
+        self.mock_db.execute_query.assert_not_called()
+
+    def test_non_enum_column_unchanged(self):
+        """測試非有限值域欄位的 ILIKE 不改寫"""
+        sql = "SELECT product_name FROM inventory WHERE product_name ILIKE '%AED%' LIMIT 10"
+        assert self.rewriter.rewrite(sql).sql == sql
+
+    def test_select_star_projected(self):
+        """測試 SELECT * 改為投影顯示欄位"""
+        result = self.rewriter.rewrite("SELECT * FROM inventory WHERE brand = 'ZOLL' LIMIT 10")
+        assert result.sql.startswith("SELECT product_id, product_name, category, brand")
+        assert "specifications" not in result.sql
+
+    def test_row_cap(self):
+        """測試補上與降低 LIMIT"""
+        assert self.rewriter.rewrite("SELECT product_name FROM inventory;").sql == \
+            "SELECT product_name FROM inventory LIMIT 50;"
+        assert self.rewriter.rewrite("SELECT product_name FROM inventory LIMIT 500").sql == \
+            "SELECT product_name FROM inventory LIMIT 50"
+
+    def test_aggregate_without_group_not_capped(self):
+        """測試無 GROUP BY 的聚合查詢不加 LIMIT"""
+        sql = "SELECT COUNT(*) FROM inventory WHERE brand = 'ZOLL'"
+        assert self.rewriter.rewrite(sql).sql == sql
+
+    def test_window_aggregate_capped(self):
+        """測試視窗函式的聚合每列都回傳，仍加上 LIMIT"""
+        assert self.rewriter.rewrite("SELECT product_name, count(*) OVER () FROM inventory").sql == \
+            "SELECT product_name, count(*) OVER () FROM inventory LIMIT 50"
+
+    def test_stock_filter_injected(self):
+        """測試選取庫存欄位且無庫存條件時補上 stock_quantity > 0"""
+        result = self.rewriter.rewrite(
+            "SELECT brand, stock_quantity FROM inventory WHERE brand = 'ZOLL' OR brand = 'Ferno' "
+            "ORDER BY brand LIMIT 10"
+        )
+        assert result.sql == (
+            "SELECT brand, stock_quantity FROM inventory WHERE (brand = 'ZOLL' OR brand = 'Ferno') "
+            "AND stock_quantity > 0 ORDER BY brand LIMIT 10"
+        )
+
+    def test_stock_order_not_filtered(self):
+        """測試依庫存排序時不補上條件（庫存最少的品項可能為零）"""
+        sql = "SELECT product_name, stock_quantity FROM inventory ORDER BY stock_quantity ASC LIMIT 5"
+        assert self.rewriter.rewrite(sql).sql == sql
+
+    def test_existing_stock_condition_kept(self):
+        """測試已有庫存條件時不補上預設條件"""
+        sql = "SELECT product_name, stock_quantity FROM inventory WHERE stock_quantity < 10 LIMIT 10"
+        assert self.rewriter.rewrite(sql).sql == sql
+
+    def test_invalid_sql_not_rewritten(self):
+        """測試未通過驗證的 SQL 不改寫"""
+        sql = "DELETE FROM inventory"
+        result = self.rewriter.rewrite(sql)
+        assert result.sql == sql
+        assert result.changed is False
+
+    def test_explain_cost_recorded(self):
+        """測試啟用 explain 時記錄改寫前後的 EXPLAIN 成本"""
+        sql = "SELECT product_name FROM inventory WHERE brand ILIKE 'zoll' LIMIT 5"
+        assert self.rewriter.rewrite(sql).cost_before is None
+        self.mock_db.explain.assert_not_called()
+
+        self.rewriter.config.explain = True
+        result = self.rewriter.rewrite(sql)
+        assert result.cost_before == 20.0
+        assert result.cost_after == 8.0
+
+    def test_values_cached(self):
+        """測試欄位值域在 TTL 內只載入一次"""
+        self.rewriter.known_values()
+        self.rewriter.known_values()
+        assert self.mock_db.execute_query.call_count == 2  # category + brand
+
+
+class TestLikeToRegex:
+    """測試 like_to_regex"""
+
+    def test_wildcards(self):
+        """測試 % 與 _ 萬用字元"""
+        assert like_to_regex('%aed%').fullmatch('AED除顫器')
+        assert like_to_regex('zol_').fullmatch('ZOLL')
+        assert not like_to_regex('zol_').fullmatch('ZOLLX')
+
+    def test_escaped_percent(self):
+        """測試跳脫的 % 視為字面字元"""
+        assert like_to_regex('100\\%').fullmatch('100%')
+        assert not like_to_regex('100\\%').fullmatch('1000')
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,172 @@
+"""
+Unit tests for StatementStats
+測試依 SQL 指紋累計執行統計、淘汰、取樣擷取 EXPLAIN ANALYZE，以及 DatabaseClient 的記錄（使用 Mock）
+"""
+
+import time
+import pytest
+from unittest.mock import Mock, patch
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from ambulance_inventory.config import StatementStatsConfig, DatabaseConfig
+from ambulance_inventory.statement_stats import StatementStats
+
+# Check if psycopg2 is available
+try:
+    import psycopg2
+    HAS_PSYCOPG2 = True
+except ImportError:
+    HAS_PSYCOPG2 = False
+
+if HAS_PSYCOPG2:
+    from ambulance_inventory.database import DatabaseClient
+
+
+PLAN = {'Plan': {'Node Type': 'Seq Scan', 'Actual Rows': 3}, 'Planning Time': 0.1, 'Execution Time': 812.5}
+
+
+def wait_for_capture(stats: StatementStats, timeout: float = 5.0) -> None:
+    """等待背景擷取完成"""
+    deadline = time.monotonic() + timeout
+    while stats.stats()['captures'] + stats.stats()['capture_errors'] == 0:
+        assert time.monotonic() < deadline, "執行計畫擷取逾時"
+        time.sleep(0.01)
+
+
+class TestStatementStats:
+    """測試 StatementStats"""
+
+    def make_stats(self, explain=None, **overrides):
+        """建立統計（預設不擷取計畫）"""
+        overrides.setdefault('capture_sample_rate', 0.0)
+        return StatementStats(StatementStatsConfig(**overrides), explain or Mock(return_value=PLAN))
+
+    def test_aggregates_by_fingerprint(self):
+        """測試常數不同的 SQL 合併為同一指紋，累計次數、耗時、筆數與錯誤"""
+        stats = self.make_stats()
+        stats.record("SELECT * FROM inventory WHERE stock_quantity < 10", 20.0, 3)
+        stats.record("SELECT * FROM inventory WHERE stock_quantity < 5", 40.0, 1)
+        stats.record("SELECT * FROM inventory WHERE stock_quantity < 1", 90.0, error=True)
+        stats.record("SELECT COUNT(*) FROM inventory", 5.0, 1)
+
+        top = stats.top()
+        assert len(top) == 2
+        first = top[0]
+        assert first['fingerprint'] == "SELECT * FROM inventory WHERE stock_quantity < ?"
+        assert (first['calls'], first['errors'], first['rows']) == (3, 1, 4)
+        assert (first['total_ms'], first['mean_ms'], first['min_ms'], first['max_ms']) == (150.0, 50.0, 20.0, 90.0)
+        assert first['mean_rows'] == 2.0
+        assert first['example_sql'] == "SELECT * FROM inventory WHERE stock_quantity < 10"
+
+    def test_order_and_invalid_order(self):
+        """測試依呼叫次數與平均耗時排序，不支援的欄位拋出 ValueError"""
+        stats = self.make_stats()
+        for _ in range(3):
+            stats.record("SELECT product_name FROM inventory", 1.0, 10)
+        stats.record("SELECT category, SUM(stock_quantity) FROM inventory GROUP BY category", 30.0, 5)
+
+        assert stats.top('calls')[0]['calls'] == 3
+        assert stats.top('mean')[0]['mean_ms'] == 30.0
+        with pytest.raises(ValueError):
+            stats.top('rows')
+
+    def test_evicts_least_recently_called(self):
+        """測試超過最大指紋數時淘汰最久未執行的指紋"""
+        stats = self.make_stats(max_fingerprints=2)
+        stats.record("SELECT a FROM inventory", 1.0, 1)
+        stats.record("SELECT b FROM inventory", 1.0, 1)
+        stats.record("SELECT a FROM inventory", 1.0, 1)
+        stats.record("SELECT c FROM inventory", 1.0, 1)
+
+        assert {item['example_sql'] for item in stats.top()} == {"SELECT a FROM inventory", "SELECT c FROM inventory"}
+        assert stats.stats()['evictions'] == 1
+
+    def test_captures_slow_select_plan(self):
+        """測試超過門檻的 SELECT 在背景擷取計畫，冷卻時間內不重複擷取"""
+        stats = self.make_stats(capture_threshold_ms=100.0, capture_sample_rate=1.0)
+        stats.record("SELECT * FROM inventory WHERE product_name ILIKE '%AED%'", 50.0, 1)
+        stats.record("SELECT * FROM inventory WHERE product_name ILIKE '%AED%'", 800.0, 1)
+        wait_for_capture(stats)
+        stats.record("SELECT * FROM inventory WHERE product_name ILIKE '%CPR%'", 900.0, 1)
+
+        assert stats.explain_analyze.call_count == 1
+        plans = stats.top()[0]['plans']
+        assert len(plans) == 1
+        assert plans[0]['execution_ms'] == 812.5 and plans[0]['duration_ms'] == 800.0
+        assert plans[0]['plan']['Node Type'] == 'Seq Scan'
+
+    def test_skips_non_select_and_errors(self):
+        """測試 EXPLAIN、寫入語句與失敗的執行不擷取計畫"""
+        stats = self.make_stats(capture_threshold_ms=0.0, capture_sample_rate=1.0)
+        stats.record("EXPLAIN (FORMAT JSON) SELECT * FROM inventory", 900.0, 1)
+        stats.record("REFRESH MATERIALIZED VIEW CONCURRENTLY low_stock_alert", 900.0, 0)
+        stats.record("SELECT * FROM inventory", 900.0, error=True)
+
+        assert stats.explain_analyze.call_count == 0
+        assert stats.stats()['fingerprints'] == 3
+
+    def test_disabled_and_reset(self):
+        """測試停用時不記錄，reset 清除所有指紋"""
+        disabled = self.make_stats(enabled=False)
+        disabled.record("SELECT 1", 1.0, 1)
+        assert disabled.top() == []
+
+        stats = self.make_stats()
+        stats.record("SELECT 1", 1.0, 1)
+        assert stats.reset() == 1
+        assert stats.top() == []
+
+
+@pytest.mark.skipif(not HAS_PSYCOPG2, reason="psycopg2 not installed (required for DatabaseClient import)")
+class TestDatabaseClientStatementStats:
+    """測試 DatabaseClient 記錄指紋統計"""
+
+    def make_client(self) -> 'DatabaseClient':
+        config = DatabaseConfig(host="localhost", database="db", user="u", password="p", port=5432)
+        return DatabaseClient(config, StatementStatsConfig(capture_sample_rate=0.0))
+
+    @patch('ambulance_inventory.database.psycopg2.connect')
+    def test_execute_query_records(self, mock_connect):
+        """測試成功與失敗的查詢都會記錄"""
+        cursor = mock_connect.return_value.cursor.return_value
+        cursor.fetchall.return_value = [{'product_name': 'AED'}]
+        client = self.make_client()
+        client.execute_query("SELECT product_name FROM inventory WHERE stock_quantity < 10")
+
+        cursor.execute.side_effect = psycopg2.OperationalError("canceling statement due to statement timeout")
+        with pytest.raises(psycopg2.OperationalError):
+            client.execute_query("SELECT product_name FROM inventory WHERE stock_quantity < 3")
+
+        statement = client.statement_stats.top()[0]
+        assert statement['fingerprint'] == "SELECT product_name FROM inventory WHERE stock_quantity < ?"
+        assert (statement['calls'], statement['errors'], statement['rows']) == (2, 1, 1)
+
+    @patch('ambulance_inventory.database.psycopg2.connect')
+    def test_explain_analyze(self, mock_connect):
+        """測試 explain_analyze 以 EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) 執行"""
+        cursor = mock_connect.return_value.cursor.return_value
+        cursor.fetchall.return_value = [{'QUERY PLAN': [PLAN]}]
+        client = self.make_client()
+
+        assert client.explain_analyze("SELECT * FROM inventory") == PLAN
+        assert cursor.execute.call_args[0][0] == "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) SELECT * FROM inventory"
+
+    @patch('ambulance_inventory.database.psycopg2.connect')
+    def test_explain_not_recorded(self, mock_connect):
+        """測試 EXPLAIN 與擷取計畫的 EXPLAIN ANALYZE 不計入指紋統計"""
+        cursor = mock_connect.return_value.cursor.return_value
+        cursor.fetchall.return_value = [{'QUERY PLAN': [PLAN]}]
+        client = self.make_client()
+
+        client.explain("SELECT * FROM inventory")
+        client.explain_analyze("SELECT * FROM inventory")
+
+        assert client.statement_stats.top() == []
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
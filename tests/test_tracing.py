@@ -0,0 +1,145 @@
+"""
+Unit tests for tracing
+測試 trace 取樣、巢狀 span、環形緩衝區與 JSONL 匯出，以及查詢引擎各階段的 span（使用 Mock）
+"""
+
+import contextvars
+import json
+import threading
+import pytest
+from unittest.mock import Mock
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from ambulance_inventory.config import TracingConfig
+from ambulance_inventory.tracing import NOOP_SPAN, Tracer, configure, span, current_trace_id
+
+# Check if psycopg2 is available
+try:
+    import psycopg2
+    HAS_PSYCOPG2 = True
+except ImportError:
+    HAS_PSYCOPG2 = False
+
+if HAS_PSYCOPG2:
+    from ambulance_inventory.query_engine import QueryEngine
+
+
+class TestTracer:
+    """測試 Tracer"""
+
+    def test_unsampled_requests_are_noop(self):
+        """測試未取樣的請求與 trace 外的 span 不記錄"""
+        tracer = Tracer(TracingConfig(sample_rate=0.0))
+
+        with tracer.trace('POST /query') as root:
+            with span('sql_generation') as child:
+                child.set_attributes(model='m')
+        with span('db.query') as outside:
+            pass
+
+        assert root is NOOP_SPAN and child is NOOP_SPAN and outside is NOOP_SPAN
+        assert tracer.recent() == []
+        assert tracer.stats()['started'] == 1
+
+    def test_nested_spans(self):
+        """測試子 span 記錄父 span、屬性與錯誤"""
+        tracer = Tracer(TracingConfig(sample_rate=0.0))
+
+        with tracer.trace('POST /query', force=True, model='m') as root:
+            trace_id = current_trace_id()
+            with span('query_execution') as stage:
+                with pytest.raises(ValueError):
+                    with span('db.query', row_count=0):
+                        raise ValueError("連線失敗")
+                stage.set_attributes(source='database')
+
+        trace = tracer.get(trace_id)
+        spans = {item['name']: item for item in trace['spans']}
+        assert root.trace_id == trace_id and current_trace_id() is None
+        assert trace['attributes'] == {'model': 'm'}
+        assert spans['query_execution']['parent_id'] == spans['POST /query']['span_id']
+        assert spans['query_execution']['attributes'] == {'source': 'database'}
+        assert spans['db.query']['parent_id'] == spans['query_execution']['span_id']
+        assert spans['db.query']['status'] == 'error'
+        assert spans['db.query']['error'] == "ValueError: 連線失敗"
+
+    def test_context_propagates_to_threads(self):
+        """測試以 copy_context 執行的工作執行緒 span 掛在同一個 trace 下"""
+        tracer = Tracer(TracingConfig(sample_rate=1.0))
+
+        def work():
+            with span('batch.item'):
+                pass
+
+        with tracer.trace('POST /query/batch') as root:
+            thread = threading.Thread(target=contextvars.copy_context().run, args=(work,))
+            thread.start()
+            thread.join()
+
+        names = [item['name'] for item in tracer.get(root.trace_id)['spans']]
+        assert names == ['POST /query/batch', 'batch.item']
+
+    def test_ring_buffer_and_filter(self):
+        """測試環形緩衝區只保留最近的 trace，並可依耗時過濾"""
+        tracer = Tracer(TracingConfig(sample_rate=1.0, max_traces=2))
+        for index in range(3):
+            with tracer.trace('POST /query', index=index):
+                pass
+
+        recent = tracer.recent()
+        assert [trace['attributes']['index'] for trace in recent] == [2, 1]
+        assert recent[0]['span_count'] == 1
+        assert tracer.recent(min_duration_ms=60000) == []
+
+    def test_jsonl_export(self, tmp_path):
+        """測試設定 path 時每個 trace 附加一行 JSON"""
+        path = tmp_path / "traces.jsonl"
+        tracer = Tracer(TracingConfig(sample_rate=1.0, path=str(path)))
+        for _ in range(2):
+            with tracer.trace('POST /query', question="AED 庫存"):
+                pass
+
+        lines = path.read_text(encoding='utf-8').splitlines()
+        assert len(lines) == 2
+        assert json.loads(lines[0])['attributes'] == {'question': "AED 庫存"}
+
+
+@pytest.mark.skipif(not HAS_PSYCOPG2, reason="psycopg2 not installed (required for QueryEngine import)")
+class TestQueryEngineTracing:
+    """測試查詢引擎的階段 span"""
+
+    def teardown_method(self):
+        """還原全域追蹤器"""
+        configure(TracingConfig(enabled=False))
+
+    def test_stage_spans(self):
+        """測試各階段產生 span 並記錄模型、SQL 指紋、資料來源與筆數"""
+        mock_db = Mock()
+        mock_db.execute_query = Mock(return_value=[{'product_name': 'AED', 'stock_quantity': 5}])
+        mock_db.format_results = Mock(side_effect=lambda results, limit=20: results)
+        mock_ollama = Mock()
+        mock_ollama.config.model = "qwen3:8b"
+        mock_ollama.generate = Mock(return_value="SELECT product_name FROM inventory WHERE stock_quantity < 10")
+        engine = QueryEngine(mock_db, mock_ollama)
+
+        tracer = configure(TracingConfig(sample_rate=1.0))
+        with tracer.trace('POST /query') as root:
+            engine.query_with_mode("低庫存產品", use_llm_answer=False)
+
+        spans = {item['name']: item for item in tracer.get(root.trace_id)['spans']}
+        assert set(spans) == {'POST /query', 'sql_generation', 'query_execution', 'formatting'}
+        assert spans['sql_generation']['attributes'] == {'model': 'qwen3:8b'}
+        assert spans['query_execution']['attributes'] == {
+            'sql_fingerprint': "SELECT product_name FROM inventory WHERE stock_quantity < ?",
+            'source': 'database',
+            'row_count': 1
+        }
+        assert spans['formatting']['attributes'] == {'row_count': 1}
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
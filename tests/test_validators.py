@@ -130,6 +130,18 @@ class TestValidateSql:
         is_valid, error = validate_sql(sql)
         assert is_valid is True
 
+    def test_escape_string_injection(self):
+        """測試 E'...' 反斜線跳脫後的多語句注入被拒絕"""
+        sql = "SELECT product_name FROM inventory WHERE brand = E'\\'' ; DROP TABLE inventory; --'"
+        is_valid, error = validate_sql(sql)
+        assert is_valid is False
+        assert "DROP" in error
+
+    def test_escape_string_valid(self):
+        """測試含跳脫引號的 E'...' 常值可通過驗證"""
+        is_valid, error = validate_sql("SELECT * FROM inventory WHERE brand = E'O\\'Neil'")
+        assert is_valid is True
+
 
 class TestIsDangerousSql:
     """測試 is_dangerous_sql 函數"""
@@ -207,6 +219,12 @@ class TestIsDangerousSql:
         # This should be safe because UPDATE is checked as a word boundary
         assert is_dangerous is False
 
+    def test_escape_string_injection(self):
+        """測試 E'...' 中以反斜線跳脫的引號不會隱藏後續的危險語句"""
+        is_dangerous, reason = is_dangerous_sql("SELECT 1 FROM inventory WHERE brand = E'\\'' ; DROP TABLE inventory; --'")
+        assert is_dangerous is True
+        assert reason == "包含危險操作: DROP"
+
 
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])